@@ -22,6 +22,7 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from agentlz.core.external_services import close_all_connections
 from agentlz.services.mq_service import start_mq_service, stop_mq_service
+from agentlz.services.rag.ingest_pool_service import shutdown_ingest_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"停止MQ服务时出错: {e}")
     
+    # 关闭入库进程池（仅 process 模式下被创建过）
+    try:
+        shutdown_ingest_pool(wait=False)
+    except Exception as e:
+        logger.error(f"关闭入库进程池时出错: {e}")
+
     # 关闭时清理所有外部服务连接
     try:
         close_all_connections()
@@ -104,6 +111,24 @@ async def _general_exc_handler(request: Request, exc: Exception):
 def health() -> Dict[str, str]:
     return Result.ok({"status": "ok"})
 
+@app.get("/v1/health/embedding", response_model=Result)
+def health_embedding() -> Dict[str, Any]:
+    """嵌入链路指标：微批调度（队列深度/批大小）、查询向量缓存命中、向量热层状态、检索结果缓存与查询改写决策"""
+    from agentlz.services.rag.chunk_embeddings_service import (
+        embedding_batcher_metrics,
+        query_embedding_cache_stats,
+    )
+    from agentlz.services.rag.vector_hot_tier_service import hot_tier_stats
+    from agentlz.services.rag.retrieval_cache_service import result_cache_stats
+    from agentlz.services.rag.query_rewrite_service import rewrite_stats
+    return Result.ok({
+        "batcher": embedding_batcher_metrics(),
+        "query_cache": query_embedding_cache_stats(),
+        "hot_tier": hot_tier_stats(),
+        "result_cache": result_cache_stats(),
+        "rewrite": rewrite_stats(),
+    })
+
 @app.get("/v1/health/rabbitmq", response_model=Result)
 def health_rabbitmq() -> Dict[str, Any]:
     """RabbitMQ健康检查端点"""
@@ -197,7 +197,7 @@ def publish_document_chunk(
     
     说明：
     - 鉴权复用 document_service.get_document_service 内部逻辑
-    - 每个策略将发布一条解析任务到队列 doc_parse_tasks
+    - 全部策略合并为一条解析任务发布到队列 doc_parse_tasks，文档只转换一次
     """
     tenant_id = require_tenant_id(request)
     ret = document_service.publish_document_chunk_tasks_service(
@@ -99,6 +99,18 @@ class Settings(BaseSettings):
     hf_embedding_model: str = Field(
         default="BAAI/bge-small-zh-v1.5", env="HF_EMBEDDING_MODEL")
 
+    # 向量存储：padded=补零到 1536（兼容旧表）/ native=模型原生维度；列类型 vector 或 halfvec
+    embedding_storage_mode: str = Field(default="padded", env="EMBEDDING_STORAGE_MODE")
+    embedding_vector_type: str = Field(default="vector", env="EMBEDDING_VECTOR_TYPE")
+    # native 模式下显式指定维度（为空则按模型查表）
+    embedding_dimension: int | None = Field(default=None, env="EMBEDDING_DIMENSION")
+    # 嵌入推理后端：torch（默认）/ onnx（ONNX Runtime，需安装 optimum[onnxruntime]）
+    embedding_backend: str = Field(default="torch", env="EMBEDDING_BACKEND")
+    # onnx 后端是否使用 int8 动态量化模型，及量化指令集配置（avx512_vnni/avx512/avx2/arm64）
+    embedding_onnx_quantize: bool = Field(default=False, env="EMBEDDING_ONNX_QUANTIZE")
+    embedding_onnx_quant_config: str = Field(default="avx2", env="EMBEDDING_ONNX_QUANT_CONFIG")
+    # onnx 导出目录（导出/量化后的模型缓存在此，按模型名分子目录）
+    embedding_onnx_cache_dir: str = Field(default=".cache/onnx_embeddings", env="EMBEDDING_ONNX_CACHE_DIR")
     # sql 表名称
     user_table_name: str = Field(default="users", env="USER_TABLE_NAME")
     document_table_name: str = Field(
@@ -171,6 +183,85 @@ class Settings(BaseSettings):
     rag_bm25_enabled: bool = Field(default=True, env="RAG_BM25_ENABLED")
     rag_rerank_enabled: bool = Field(default=False, env="RAG_RERANK_ENABLED")
     rag_rerank_model: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", env="RAG_RERANK_MODEL")
+    # 关键词召回后端：tsquery=PG 全文检索；memory=进程内 BM25（按 Agent 懒加载、增量同步；缓存 Agent 数、TTL 秒、k1/b 参数）
+    rag_keyword_backend: str = Field(default="tsquery", env="RAG_KEYWORD_BACKEND")
+    rag_keyword_index_cache_size: int = Field(default=256, env="RAG_KEYWORD_INDEX_CACHE_SIZE")
+    rag_keyword_index_ttl: int = Field(default=3600, env="RAG_KEYWORD_INDEX_TTL")
+    rag_bm25_k1: float = Field(default=1.5, env="RAG_BM25_K1")
+    rag_bm25_b: float = Field(default=0.75, env="RAG_BM25_B")
+    # 检索默认切割策略：Agent 关联未固定策略（agent_document.strategy）时使用；文档没有该策略的分块时取其最小策略；负数表示检索全部策略
+    rag_default_strategy: int = Field(default=0, env="RAG_DEFAULT_STRATEGY")
+    # 混合召回融合位置：sql=单条语句内完成 RRF 与元数据提升；python=分路查询后在应用内融合
+    rag_hybrid_mode: str = Field(default="sql", env="RAG_HYBRID_MODE")
+    # 重排候选上限（仅对融合分数 Top-N 重排，是重排开销的硬上限；limit 更大时其余结果按融合分数排在重排结果之后）、
+    # 单批前向大小、设备与 int8 量化（仅 CPU）
+    rag_rerank_max_candidates: int = Field(default=30, env="RAG_RERANK_MAX_CANDIDATES")
+    rag_rerank_batch_size: int = Field(default=32, env="RAG_RERANK_BATCH_SIZE")
+    rag_rerank_device: str = Field(default="cpu", env="RAG_RERANK_DEVICE")
+    rag_rerank_quantize_int8: bool = Field(default=False, env="RAG_RERANK_QUANTIZE_INT8")
+
+    # Agent 检索范围缓存（进程内 LRU 容量与 Redis/进程内 TTL 秒数）
+    rag_scope_cache_size: int = Field(default=1024, env="RAG_SCOPE_CACHE_SIZE")
+    rag_scope_cache_ttl: int = Field(default=600, env="RAG_SCOPE_CACHE_TTL")
+
+    # 检索结果缓存（按 Agent 检索范围版本 + 归一化查询；只存分块 ID 与分数，进程内 LRU 容量与 Redis/进程内 TTL 秒数）
+    rag_result_cache_enabled: bool = Field(default=True, env="RAG_RESULT_CACHE_ENABLED")
+    rag_result_cache_size: int = Field(default=4096, env="RAG_RESULT_CACHE_SIZE")
+    rag_result_cache_ttl: int = Field(default=600, env="RAG_RESULT_CACHE_TTL")
+
+    # 检索前查询改写：auto=自包含短消息走本地规则（不调用 LLM）+ 改写缓存 + LLM；llm=缓存 + LLM；rules=只用本地规则
+    rag_rewrite_mode: str = Field(default="auto", env="RAG_REWRITE_MODE")
+    rag_rewrite_fast_max_chars: int = Field(default=24, env="RAG_REWRITE_FAST_MAX_CHARS")
+    # 推测执行：LLM 改写期间先用原始消息检索，改写返回后按 RRF 合并两路结果
+    rag_rewrite_speculative: bool = Field(default=False, env="RAG_REWRITE_SPECULATIVE")
+    # 改写缓存（按 Agent + 归一化消息 + 历史摘要；进程内 LRU 容量与 Redis/进程内 TTL 秒数）
+    rag_rewrite_cache_size: int = Field(default=2048, env="RAG_REWRITE_CACHE_SIZE")
+    rag_rewrite_cache_ttl: int = Field(default=3600, env="RAG_REWRITE_CACHE_TTL")
+
+    # 检索上下文打包：送入 LLM 的文档 token 预算（Agent meta.rag_context_tokens 优先；<=0 不限制，仍去除相邻分块重叠）与 tiktoken 编码
+    rag_context_token_budget: int = Field(default=3000, env="RAG_CONTEXT_TOKEN_BUDGET")
+    rag_context_encoding: str = Field(default="cl100k_base", env="RAG_CONTEXT_ENCODING")
+    # 按 Agent 缓存的上下文预算（进程内容量、TTL 秒）；本进程更新/删除 Agent 时立即失效，其他进程最多延迟 TTL
+    rag_context_budget_cache_size: int = Field(default=1024, env="RAG_CONTEXT_BUDGET_CACHE_SIZE")
+    rag_context_budget_cache_ttl: int = Field(default=60, env="RAG_CONTEXT_BUDGET_CACHE_TTL")
+
+    # 查询向量缓存（进程内 LRU 容量、TTL 秒数；可选 Redis 共享层，float32 二进制存储）
+    rag_query_emb_cache_size: int = Field(default=2048, env="RAG_QUERY_EMB_CACHE_SIZE")
+    rag_query_emb_cache_ttl: int = Field(default=3600, env="RAG_QUERY_EMB_CACHE_TTL")
+    rag_query_emb_redis_enabled: bool = Field(default=False, env="RAG_QUERY_EMB_REDIS_ENABLED")
+
+    # 查询向量微批调度（合并并发请求为一次前向：凑满批大小或等待超时即下发）
+    rag_embed_batcher_enabled: bool = Field(default=False, env="RAG_EMBED_BATCHER_ENABLED")
+    rag_embed_batch_max_size: int = Field(default=32, env="RAG_EMBED_BATCH_MAX_SIZE")
+    rag_embed_batch_max_wait_ms: float = Field(default=5.0, env="RAG_EMBED_BATCH_MAX_WAIT_MS")
+
+    # 向量检索 ANN 参数（SET LOCAL 按请求生效）：HNSW 候选宽度、IVFFlat 探测列表数、
+    # pgvector 0.8+ 迭代扫描（off/strict_order/relaxed_order）；带文档过滤时依靠迭代扫描 + (tenant_id, doc_id, strategy) 复合索引。
+    # 精确检索回退为可选项（默认 0=关闭）：开启后每次过滤检索多一次计数查询，命中分块数不超过该值时关闭索引扫描
+    rag_hnsw_ef_search: int = Field(default=100, env="RAG_HNSW_EF_SEARCH")
+    rag_ivfflat_probes: int = Field(default=10, env="RAG_IVFFLAT_PROBES")
+    rag_ann_iterative_scan: str = Field(default="relaxed_order", env="RAG_ANN_ITERATIVE_SCAN")
+    rag_ann_exact_max_rows: int = Field(default=0, env="RAG_ANN_EXACT_MAX_ROWS")
+
+    # 进程内向量热层（hnswlib，按租户懒加载；内存预算 MB、单租户分块上限、重建 TTL 秒、检索 ef）
+    rag_hot_tier_enabled: bool = Field(default=False, env="RAG_HOT_TIER_ENABLED")
+    rag_hot_tier_max_mb: int = Field(default=512, env="RAG_HOT_TIER_MAX_MB")
+    rag_hot_tier_max_chunks: int = Field(default=50000, env="RAG_HOT_TIER_MAX_CHUNKS")
+    rag_hot_tier_ttl: int = Field(default=3600, env="RAG_HOT_TIER_TTL")
+    rag_hot_tier_ef_search: int = Field(default=64, env="RAG_HOT_TIER_EF_SEARCH")
+    # 热层跨进程版本校验间隔（毫秒）：间隔内检索不访问 Redis，其他进程的写入最多延迟该时长可见；0=每次检索都校验
+    rag_hot_tier_version_check_ms: int = Field(default=1000, env="RAG_HOT_TIER_VERSION_CHECK_MS")
+
+    # RAG 文档入库配置（批量向量化 + 批量写库）
+    rag_ingest_batch_size: int = Field(default=64, env="RAG_INGEST_BATCH_SIZE")
+    # 内容哈希向量库：相同文本（跨文档/策略/租户）复用已计算向量，不可用时自动退化为直接计算
+    rag_embedding_store_enabled: bool = Field(default=True, env="RAG_EMBEDDING_STORE_ENABLED")
+    # 入库执行模式：inline（MQ 线程内）/ process（工作进程池，切块与向量化并行）
+    rag_ingest_mode: str = Field(default="inline", env="RAG_INGEST_MODE")
+    # 工作进程数（0=核数/4）、每进程 torch 线程数（0=核数/进程数）、在途批次上限（0=进程数*2）
+    rag_ingest_workers: int = Field(default=0, env="RAG_INGEST_WORKERS")
+    rag_ingest_torch_threads: int = Field(default=0, env="RAG_INGEST_TORCH_THREADS")
+    rag_ingest_max_inflight: int = Field(default=0, env="RAG_INGEST_MAX_INFLIGHT")
 
 def get_settings() -> Settings:
     return Settings()
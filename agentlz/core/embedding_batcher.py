@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from agentlz.core.logger import setup_logging
+
+"""嵌入请求微批调度器
+
+将来自多个线程/协程的单条嵌入请求合并为批量前向：
+- 队列中首个请求到达后开始计时，凑满 `max_batch_size` 或等待超过 `max_wait_ms` 即刻下发；
+- 一次调用 `embed_fn(texts)`（通常为 `embed_documents`）完成整批计算，再把结果分发回各调用方；
+- 同一批内重复文本只计算一次。
+"""
+
+logger = setup_logging(level="INFO", name="agentlz.embedding_batcher", prefix="[嵌入微批]")
+
+
+class _Request:
+    __slots__ = ("text", "future", "enqueued_at")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class EmbeddingBatcher:
+    """嵌入微批调度器
+
+    参数:
+        - embed_fn: 批量嵌入函数，输入文本列表，返回等长向量列表
+        - max_batch_size: 单批最大条数
+        - max_wait_ms: 首条请求入队后的最长等待毫秒数
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Sequence[Sequence[float]]],
+        *,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._wait_ms_total = 0.0
+        self._forward_ms_total = 0.0
+        self._errors = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """提交单条文本，返回 concurrent.futures.Future（结果为向量 List[float]）"""
+        if self._closed:
+            raise RuntimeError("embedding_batcher_closed")
+        req = _Request(str(text))
+        self._queue.put(req)
+        return req.future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """同步获取单条文本向量（供线程池中的同步调用方使用）"""
+        return self.submit(text).result(timeout=timeout)
+
+    def embed_many(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """同步获取多条文本向量；各条可能与其他调用方的请求合并进同一批"""
+        futures = [self.submit(t) for t in texts]
+        return [f.result(timeout=timeout) for f in futures]
+
+    async def aembed(self, text: str) -> List[float]:
+        """异步获取单条文本向量（供协程调用方使用，不阻塞事件循环）"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回调度指标：队列深度、批次数、条数、平均/最近/最大批大小、平均等待与前向耗时"""
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_batch_seen,
+                "avg_wait_ms": round(self._wait_ms_total / self._items, 3) if self._items else 0.0,
+                "avg_forward_ms": round(self._forward_ms_total / batches, 3) if batches else 0.0,
+                "errors": self._errors,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """停止调度线程；已入队的请求会先处理完"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout=timeout)
+
+    def _collect(self, first: _Request) -> tuple[List[_Request], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        stop = False
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            self._dispatch(batch)
+            if stop:
+                # 处理关闭信号之前已入队的请求
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        return
+                    if item is not None:
+                        self._dispatch([item])
+
+    def _dispatch(self, batch: List[_Request]) -> None:
+        start = time.monotonic()
+        uniq: Dict[str, int] = {}
+        texts: List[str] = []
+        for req in batch:
+            if req.text not in uniq:
+                uniq[req.text] = len(texts)
+                texts.append(req.text)
+        try:
+            vectors = self.embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise RuntimeError(f"embed_fn 返回数量不匹配: {len(vectors)} != {len(texts)}")
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_result(list(vectors[uniq[req.text]]))
+        except Exception as e:
+            logger.error(f"批量嵌入失败 batch={len(batch)}: {e}")
+            with self._stats_lock:
+                self._errors += 1
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_exception(e)
+        end = time.monotonic()
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._last_batch_size = len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._wait_ms_total += sum((start - r.enqueued_at) * 1000.0 for r in batch)
+            self._forward_ms_total += (end - start) * 1000.0
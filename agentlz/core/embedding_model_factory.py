@@ -1,5 +1,6 @@
 
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
 import threading
 
 from agentlz.config.settings import get_settings
@@ -21,11 +22,130 @@ except Exception:
 
 _HF_EMBEDDINGS_INIT_LOCK = threading.Lock()
 
+DEFAULT_EMBEDDING_MODEL = "BAAI/bge-small-zh-v1.5"
+# 兼容旧表结构：padded 模式下统一补零到该维度
+PADDED_EMBEDDING_DIM = 1536
+# 常用模型的原生输出维度；未列出的模型需通过 EMBEDDING_DIMENSION 显式配置
+_NATIVE_EMBEDDING_DIMS = {
+    "BAAI/bge-small-zh-v1.5": 512,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-zh-v1.5": 768,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-large-zh-v1.5": 1024,
+    "BAAI/bge-large-en-v1.5": 1024,
+    "BAAI/bge-m3": 1024,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "shibing624/text2vec-base-chinese": 768,
+}
+
+
+def get_embedding_storage_mode() -> str:
+    """向量存储模式：padded（补零到 1536，兼容旧表）或 native（模型原生维度）"""
+    mode = str(getattr(get_settings(), "embedding_storage_mode", "padded") or "padded").lower().strip()
+    return mode if mode in ("padded", "native") else "padded"
+
+
+def get_vector_type() -> str:
+    """pgvector 列类型：vector（float32）或 halfvec（float16，需 pgvector >= 0.7）"""
+    t = str(getattr(get_settings(), "embedding_vector_type", "vector") or "vector").lower().strip()
+    return t if t in ("vector", "halfvec") else "vector"
+
+
+def get_embedding_dimension(model_name: Optional[str] = None) -> Optional[int]:
+    """
+    返回当前存储模式下的向量维度。
+
+    参数:
+        model_name: 模型名称，为空时使用默认嵌入模型
+
+    返回:
+        padded 模式固定返回 1536；native 模式优先读取配置 `embedding_dimension`，
+        其次按模型查表；均无法确定时返回 None（由数据库列维度兜底校验）
+    """
+    if get_embedding_storage_mode() == "padded":
+        return PADDED_EMBEDDING_DIM
+    return get_native_embedding_dimension(model_name)
+
+
+def get_native_embedding_dimension(model_name: Optional[str] = None) -> Optional[int]:
+    """模型原生维度：优先读取配置 `embedding_dimension`，其次按模型查表；未知时返回 None"""
+    override = getattr(get_settings(), "embedding_dimension", None)
+    if override:
+        return int(override)
+    return _NATIVE_EMBEDDING_DIMS.get(str(model_name or DEFAULT_EMBEDDING_MODEL))
+
+
+def get_embedding_backend() -> str:
+    """嵌入推理后端：torch（PyTorch，默认）或 onnx（ONNX Runtime，CPU 推理更快）"""
+    b = str(getattr(get_settings(), "embedding_backend", "torch") or "torch").lower().strip()
+    return b if b in ("torch", "onnx") else "torch"
+
+
+def _onnx_export_dir(model_name: str) -> Path:
+    cache_dir = getattr(get_settings(), "embedding_onnx_cache_dir", "") or ".cache/onnx_embeddings"
+    return Path(cache_dir) / str(model_name).strip("/").replace("/", "__")
+
+
+def prepare_onnx_model(
+    model_name: str,
+    *,
+    quantize: bool = False,
+    quant_config: str = "avx2",
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    导出（必要时量化）ONNX 模型，返回可交给 SentenceTransformer 加载的路径与参数。
+
+    参数:
+        model_name: HuggingFace 模型名或本地路径
+        quantize: 是否使用 int8 动态量化模型
+        quant_config: 量化指令集配置（avx512_vnni/avx512/avx2/arm64）
+
+    返回:
+        (模型目录, model_kwargs)；model_kwargs 含 backend="onnx" 与待加载的 onnx 文件名
+
+    行为:
+        - 首次调用时将模型导出为 ONNX 并保存到 `embedding_onnx_cache_dir/<模型名>`；
+        - quantize=True 时在导出目录下生成 `onnx/model_qint8_<config>.onnx`，后续直接复用；
+        - 调用方需持有 `_HF_EMBEDDINGS_INIT_LOCK`，避免并发导出同一模型。
+
+    异常:
+        RuntimeError: 未安装 sentence-transformers 或 optimum[onnxruntime] 时抛出
+    """
+    try:
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    except Exception as e:
+        raise RuntimeError(
+            "ONNX 嵌入后端需要 sentence-transformers>=3.2 与 optimum[onnxruntime]，请先安装。"
+        ) from e
+
+    export_dir = _onnx_export_dir(model_name)
+    fp32_file = export_dir / "onnx" / "model.onnx"
+    cfg = str(quant_config or "avx2").strip()
+    quant_file = export_dir / "onnx" / f"model_qint8_{cfg}.onnx"
+
+    model = None
+    if not fp32_file.exists():
+        export_dir.mkdir(parents=True, exist_ok=True)
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save_pretrained(str(export_dir))
+    if not quantize:
+        return str(export_dir), {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model.onnx"}}
+
+    if not quant_file.exists():
+        if model is None:
+            model = SentenceTransformer(
+                str(export_dir), backend="onnx", device="cpu", model_kwargs={"file_name": "onnx/model.onnx"}
+            )
+        export_dynamic_quantized_onnx_model(model, cfg, str(export_dir))
+    return str(export_dir), {"backend": "onnx", "model_kwargs": {"file_name": f"onnx/{quant_file.name}"}}
+
 
 def get_hf_embeddings(
-    model_name: Optional[str] = "BAAI/bge-small-zh-v1.5",
+    model_name: Optional[str] = DEFAULT_EMBEDDING_MODEL,
     device: Optional[str] = "cpu",
     normalize_embeddings: bool = True,
+    backend: Optional[str] = None,
+    quantize: Optional[bool] = None,
 ):
     """
     创建并返回一个 HuggingFace 中文句向量嵌入模型（LangChain 兼容）。
@@ -34,12 +154,14 @@ def get_hf_embeddings(
         model_name: 模型名称或本地路径，默认使用 "BAAI/bge-small-zh-v1.5"
         device: 设备标识（如 "cpu"/"cuda"），不传则默认 cpu
         normalize_embeddings: 是否归一化向量，默认 True
+        backend: 推理后端 "torch"/"onnx"，不传则读取配置 `embedding_backend`
+        quantize: onnx 后端是否加载 int8 动态量化模型，不传则读取配置 `embedding_onnx_quantize`
 
     返回:
-        HuggingFaceEmbeddings 实例
+        HuggingFaceEmbeddings 实例；padded 存储模式下包装为补零到 1536 维的 DimensionExtendedEmbeddings
 
     异常:
-        RuntimeError: 当环境缺失 HuggingFaceEmbeddings 依赖时抛出
+        RuntimeError: 当环境缺失 HuggingFaceEmbeddings 依赖（或 onnx 后端依赖）时抛出
     """
     
     settings = get_settings()
@@ -59,12 +181,29 @@ def get_hf_embeddings(
 
     encode_kwargs = {"normalize_embeddings": normalize_embeddings}
 
-    logger.info(f"加载 Embeddings 模型: {name} (device={device or 'auto'})")
+    backend = str(backend or get_embedding_backend()).lower().strip()
+    if quantize is None:
+        quantize = bool(getattr(settings, "embedding_onnx_quantize", False))
+
+    logger.info(
+        f"加载 Embeddings 模型: {name} (device={device or 'auto'}, backend={backend}"
+        f"{', int8' if backend == 'onnx' and quantize else ''})"
+    )
     
     with _HF_EMBEDDINGS_INIT_LOCK:
+        load_name = name
+        if backend == "onnx":
+            load_name, onnx_kwargs = prepare_onnx_model(
+                name,
+                quantize=quantize,
+                quant_config=getattr(settings, "embedding_onnx_quant_config", "avx2"),
+            )
+            model_kwargs.update(onnx_kwargs)
         base_embeddings = HuggingFaceEmbeddings(
-            model_name=name,
+            model_name=load_name,
             model_kwargs=model_kwargs if model_kwargs else {},
             encode_kwargs=encode_kwargs,
         )
-        return DimensionExtendedEmbeddings(base_embeddings=base_embeddings, target_dimension=1536)
+        if get_embedding_storage_mode() == "native":
+            return base_embeddings
+        return DimensionExtendedEmbeddings(base_embeddings=base_embeddings, target_dimension=PADDED_EMBEDDING_DIM)
@@ -12,6 +12,7 @@ _COS_CLIENT = None
 _RABBITMQ_CONNECTION = None
 _RABBITMQ_CHANNEL = None
 _REDIS_CLIENT = None
+_REDIS_BINARY_CLIENT = None
 
 
 def get_cos_client():
@@ -162,6 +163,40 @@ def get_redis_client():
     return _REDIS_CLIENT
 
 
+def get_redis_binary_client():
+    """获取返回原始 bytes 的 Redis 客户端（单例模式，decode_responses=False）
+
+    用于存取二进制数据（如 float32 向量），与 `get_redis_client` 共用同一组连接配置。
+    """
+    global _REDIS_BINARY_CLIENT
+    if _REDIS_BINARY_CLIENT is None:
+        try:
+            import redis  # type: ignore
+            s = get_settings()
+            redis_url = getattr(s, "redis_url", None)
+            if redis_url:
+                client = redis.from_url(redis_url, decode_responses=False)
+            else:
+                client = redis.Redis(
+                    host=getattr(s, "redis_host", "127.0.0.1"),
+                    port=getattr(s, "redis_port", 6379),
+                    db=getattr(s, "redis_db", 0),
+                    password=getattr(s, "redis_password", None),
+                    decode_responses=False,
+                    socket_keepalive=True,
+                    socket_keepalive_options={},
+                    health_check_interval=30,
+                )
+            client.ping()
+            _REDIS_BINARY_CLIENT = client
+            logger.info("Redis二进制客户端初始化成功")
+        except Exception as e:
+            logger.error(f"Redis二进制客户端初始化失败: {e}")
+            raise RuntimeError(f"Redis二进制客户端初始化失败: {e}") from e
+
+    return _REDIS_BINARY_CLIENT
+
+
 def publish_to_rabbitmq(queue_name: str, message: Dict[str, Any], durable: bool = True) -> None:
     """
     发布消息到RabbitMQ队列
@@ -286,7 +321,7 @@ def test_rabbitmq_connection() -> Dict[str, Any]:
 
 def close_all_connections() -> None:
     """关闭所有外部服务连接（用于应用关闭时）"""
-    global _COS_CLIENT, _RABBITMQ_CONNECTION, _RABBITMQ_CHANNEL, _REDIS_CLIENT
+    global _COS_CLIENT, _RABBITMQ_CONNECTION, _RABBITMQ_CHANNEL, _REDIS_CLIENT, _REDIS_BINARY_CLIENT
 
     try:
         if _RABBITMQ_CHANNEL and not _RABBITMQ_CHANNEL.is_closed:
@@ -309,8 +344,15 @@ def close_all_connections() -> None:
     except Exception as e:
         logger.warning(f"关闭Redis连接时出错: {e}")
 
+    try:
+        if _REDIS_BINARY_CLIENT:
+            _REDIS_BINARY_CLIENT.close()
+    except Exception as e:
+        logger.warning(f"关闭Redis二进制连接时出错: {e}")
+
     # 重置全局变量
     _COS_CLIENT = None
     _RABBITMQ_CONNECTION = None
     _RABBITMQ_CHANNEL = None
     _REDIS_CLIENT = None
+    _REDIS_BINARY_CLIENT = None
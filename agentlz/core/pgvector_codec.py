@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import io
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+"""pgvector 二进制编解码
+
+psycopg2 只能以文本协议绑定参数，这里提供两条绕开逐元素字符串格式化/解析的路径：
+- 写入：按 PostgreSQL `COPY ... FROM STDIN (FORMAT BINARY)` 格式组装数据流，
+  向量字段直接使用 pgvector 的二进制表示（vector_recv/halfvec_recv）；
+- 读取：SQL 中用 `vector_send(embedding)` / `halfvec_send(embedding)` 取回 bytea，
+  由 numpy 直接按大端 float32/float16 视图解码为数组。
+
+向量二进制格式：int16 维度 + int16 保留位（0）+ dim 个大端 float4（halfvec 为 float2）。
+"""
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+_TEXT_FORMATS: Dict[int, str] = {}
+
+
+def _element_dtype(vtype: str) -> str:
+    return ">f2" if vtype == "halfvec" else ">f4"
+
+
+def to_float32_array(vec: Any) -> np.ndarray:
+    """转换为一维 float32 数组（已是 float32 数组时不复制）"""
+    return np.asarray(vec, dtype=np.float32).reshape(-1)
+
+
+def _text_format(dim: int) -> str:
+    fmt = _TEXT_FORMATS.get(dim)
+    if fmt is None:
+        # float32 以 9 位有效数字即可无损往返
+        fmt = "[" + ",".join(["%.9g"] * dim) + "]"
+        _TEXT_FORMATS[dim] = fmt
+    return fmt
+
+
+def vector_to_text(vec: Any) -> str:
+    """生成 pgvector 文本字面量（仅用于查询参数等单条向量场景）
+
+    按维度缓存格式串，一次 `%` 格式化完成，避免 Python 逐元素 str(float(x)) 拼接。
+    """
+    arr = to_float32_array(vec)
+    return _text_format(arr.shape[0]) % tuple(arr.tolist())
+
+
+def encode_vector(vec: Any, vtype: str = "vector") -> bytes:
+    """编码为 pgvector 二进制表示"""
+    arr = to_float32_array(vec)
+    return struct.pack(">HH", arr.shape[0], 0) + arr.astype(_element_dtype(vtype)).tobytes()
+
+
+def decode_vector(buf: Any, vtype: str = "vector") -> Optional[np.ndarray]:
+    """将 `vector_send`/`halfvec_send` 返回的 bytea 解码为 float32 数组；空值返回 None"""
+    if buf is None:
+        return None
+    dim = struct.unpack_from(">H", buf, 0)[0]
+    return np.frombuffer(buf, dtype=_element_dtype(vtype), count=dim, offset=4).astype(np.float32)
+
+
+def vector_send_sql(column: str, vtype: str = "vector") -> str:
+    """返回以二进制取回向量列的 SQL 表达式"""
+    return f"{vtype}_send({column})"
+
+
+def _encode_field(value: Any, kind: str) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    if kind in ("vector", "halfvec"):
+        payload = encode_vector(value, kind)
+    elif kind == "int4":
+        payload = struct.pack(">i", int(value))
+    elif kind == "int8":
+        payload = struct.pack(">q", int(value))
+    elif kind == "float8":
+        payload = struct.pack(">d", float(value))
+    else:
+        payload = str(value).encode("utf-8")
+    return struct.pack(">i", len(payload)) + payload
+
+
+def build_copy_binary(rows: Iterable[Sequence[Any]], kinds: Sequence[str]) -> bytes:
+    """组装 COPY BINARY 数据流
+
+    参数：
+        - rows: 行数据，每行字段顺序与 kinds 一致
+        - kinds: 字段类型：text / int4 / int8 / float8 / vector / halfvec
+
+    返回：
+        - 可直接交给 `cursor.copy_expert` 的二进制内容
+    """
+    field_count = struct.pack(">h", len(kinds))
+    parts: List[bytes] = [_COPY_HEADER]
+    for row in rows:
+        parts.append(field_count)
+        for value, kind in zip(row, kinds):
+            parts.append(_encode_field(value, kind))
+    parts.append(_COPY_TRAILER)
+    return b"".join(parts)
+
+
+def copy_binary(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]], kinds: Sequence[str]) -> None:
+    """以 COPY BINARY 方式写入 table（通常是事务内的临时暂存表）"""
+    buf = io.BytesIO(build_copy_binary(rows, kinds))
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)", buf)
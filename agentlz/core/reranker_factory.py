@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import threading
+
+from agentlz.config.settings import get_settings
+from agentlz.core.logger import setup_logging
+
+"""重排模型（Cross-Encoder）注册表
+
+进程级缓存：同一 (模型, 设备, 是否量化) 只加载一次，多线程并发获取时保证只初始化一次。
+"""
+
+_RERANKERS: Dict[Tuple[str, str, bool], Any] = {}
+_RERANKER_INIT_LOCK = threading.Lock()
+
+
+def _quantize_int8(ce: Any) -> Any:
+    """对 Cross-Encoder 内部模型做动态 int8 量化（仅 CPU 有效，Linear 层）"""
+    import torch
+
+    ce.model = torch.quantization.quantize_dynamic(ce.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return ce
+
+
+def get_cross_encoder(
+    model_name: Optional[str] = None,
+    device: Optional[str] = None,
+    quantize_int8: Optional[bool] = None,
+):
+    """
+    获取（必要时加载）进程级共享的 Cross-Encoder 实例。
+
+    参数:
+        model_name: 模型名称或本地路径，为空时读取配置 `rag_rerank_model`
+        device: 设备标识（如 "cpu"/"cuda"），为空时读取配置 `rag_rerank_device`
+        quantize_int8: 是否启用 int8 动态量化，为空时读取配置 `rag_rerank_quantize_int8`；非 CPU 设备忽略
+
+    返回:
+        sentence_transformers.CrossEncoder 实例
+
+    异常:
+        ImportError: 当环境缺失 sentence-transformers 依赖时抛出
+    """
+    s = get_settings()
+    name = str(model_name or getattr(s, "rag_rerank_model", "") or "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    dev = str(device or getattr(s, "rag_rerank_device", "cpu") or "cpu")
+    if quantize_int8 is None:
+        quantize_int8 = bool(getattr(s, "rag_rerank_quantize_int8", False))
+    quant = bool(quantize_int8) and dev == "cpu"
+    key = (name, dev, quant)
+
+    ce = _RERANKERS.get(key)
+    if ce is not None:
+        return ce
+    with _RERANKER_INIT_LOCK:
+        ce = _RERANKERS.get(key)
+        if ce is None:
+            logger = setup_logging(s.log_level)
+            logger.info(f"加载 Rerank 模型: {name} (device={dev}, int8={quant})")
+            from sentence_transformers import CrossEncoder
+
+            ce = CrossEncoder(name, device=dev)
+            if quant:
+                try:
+                    ce = _quantize_int8(ce)
+                except Exception:
+                    logger.exception("Rerank 模型 int8 量化失败，回退为原始精度")
+            _RERANKERS[key] = ce
+    return ce
+
+
+def rerank_scores(
+    query: str,
+    passages: Sequence[str],
+    *,
+    model_name: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> List[float]:
+    """
+    使用共享的 Cross-Encoder 为 (query, passage) 对打分。
+
+    参数:
+        query: 查询文本
+        passages: 候选文本列表
+        model_name: 模型名称，为空时读取配置
+        batch_size: 单次前向的样本数，为空时读取配置 `rag_rerank_batch_size`
+
+    返回:
+        与 passages 一一对应的分数列表
+    """
+    if not passages:
+        return []
+    bs = int(batch_size or getattr(get_settings(), "rag_rerank_batch_size", 32) or 32)
+    ce = get_cross_encoder(model_name)
+    pairs = [(query, str(p or "")) for p in passages]
+    scores = ce.predict(pairs, batch_size=max(1, bs), show_progress_bar=False)
+    return [float(x) for x in scores]
+
+
+def clear_rerankers() -> None:
+    """清空已加载的重排模型（用于测试或热切换模型）"""
+    with _RERANKER_INIT_LOCK:
+        _RERANKERS.clear()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import re
+from typing import List
+
+"""中文/英文混合分词（BM25 入库与查询共用）
+
+入库写入 `chunk_bm25.content_seg` 与查询侧关键词召回必须使用同一分词规则，否则词条对不上：
+- 优先使用 jieba 精确模式；
+- jieba 不可用时回退为正则：英文/数字按词，中文按单字。
+"""
+
+_FALLBACK_RE = re.compile(r"[A-Za-z0-9]+|[\u4e00-\u9fff]")
+# 查询词条只保留含字母/数字/汉字的片段，过滤标点与空白
+_TERM_RE = re.compile(r"[A-Za-z0-9\u4e00-\u9fff]")
+
+
+def segment(text: str) -> List[str]:
+    """分词，返回非空词条列表（保持原顺序）"""
+    content = str(text or "")
+    try:
+        import jieba  # type: ignore
+        return [t for t in jieba.lcut(content) if str(t).strip() != ""]
+    except Exception:
+        return [t for t in _FALLBACK_RE.findall(content) if t.strip() != ""]
+
+
+def segment_for_bm25(text: str) -> str:
+    """入库分词：空格拼接的词条串（写入 chunk_bm25.content_seg）"""
+    return " ".join(segment(text))
+
+
+def query_terms(text: str) -> List[str]:
+    """查询分词：与入库相同的规则，去掉标点，英文统一小写后去重"""
+    out: List[str] = []
+    seen: set[str] = set()
+    for t in segment(text):
+        if not _TERM_RE.search(t):
+            continue
+        key = t.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(key)
+    return out
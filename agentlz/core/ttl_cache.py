@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+import time
+
+"""进程内 LRU + TTL 缓存
+
+线程安全的有界缓存：超过容量时淘汰最久未使用的条目，条目超过 TTL 后视为失效；
+内置命中/未命中计数，便于在指标或日志中观察缓存效果。
+"""
+
+
+class TTLCache:
+    """有界 LRU 缓存（带过期时间与命中统计）
+
+    参数:
+        - maxsize: 最大条目数，<=0 时视为 1
+        - ttl: 过期秒数，<=0 表示永不过期
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        self.maxsize = max(1, int(maxsize or 1))
+        self.ttl = float(ttl or 0.0)
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取条目；命中时刷新 LRU 顺序，过期条目被移除并计为未命中"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at and expires_at <= now:
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入条目；超出容量时淘汰最久未使用的条目"""
+        t = self.ttl if ttl is None else float(ttl)
+        expires_at = time.monotonic() + t if t > 0 else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计：size/hits/misses/hit_rate"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -86,6 +86,20 @@ def list_agent_documents(*, agent_id: int, table_name: str) -> List[Dict[str, An
     return out
 
 
+def list_agent_ids_by_document(*, document_id: str, table_name: str) -> List[int]:
+    """按文档列出关联的 agent_id（去重）。"""
+    sql = text(
+        f"""
+        SELECT DISTINCT agent_id
+        FROM `{table_name}` WHERE document_id = :document_id
+        """
+    )
+    engine = get_mysql_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"document_id": document_id}).mappings().all()
+    return [int(r["agent_id"]) for r in rows if r.get("agent_id") is not None]
+
+
 def get_agent_document_by_id(*, rel_id: int, table_name: str) -> Optional[Dict[str, Any]]:
     """按主键查询单条关联记录。"""
     # 精确匹配主键
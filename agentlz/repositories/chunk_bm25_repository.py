@@ -4,6 +4,7 @@ from typing import Any, Dict, List, Sequence, Optional
 from contextlib import closing
 
 from agentlz.core.database import get_pg_conn
+from agentlz.repositories.chunk_embeddings_repository import _doc_scope_conditions
 
 
 def _set_tenant(cur, tenant_id: str) -> None:
@@ -67,7 +68,8 @@ def search_chunks_by_tsquery(
     tenant_id: str,
     doc_ids: Sequence[str],
     tsquery: str,
-    limit: int = 50
+    limit: int = 50,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
 ) -> List[Dict[str, Any]]:
     """
     使用中文全文检索（zhparser + zh_cn 配置）按照 tsquery 检索分块
@@ -77,6 +79,7 @@ def search_chunks_by_tsquery(
     - doc_ids: 文档ID列表（过滤范围）
     - tsquery: tsquery 查询字符串（例如: '配置 & Agent & MCP'）
     - limit: 返回条数上限
+    - doc_strategies: 可选 {doc_id: [strategy]}；按 chunk_id 关联 chunk_embeddings 限定切割策略
     
     返回:
     - 列表: {chunk_id, doc_id, content, score}
@@ -85,20 +88,27 @@ def search_chunks_by_tsquery(
     ids = [x for x in ids if x]
     if not ids or not isinstance(tsquery, str) or tsquery.strip() == "":
         return []
+    strategy_clause = ""
+    strategy_params: List[Any] = []
+    conditions, scope_params = _doc_scope_conditions(doc_ids=ids, doc_strategies=doc_strategies)
+    if len(conditions) > 1:
+        strategy_clause = f"AND chunk_id IN (SELECT chunk_id FROM chunk_embeddings WHERE {' AND '.join(conditions)})"
+        strategy_params = list(scope_params)
     with closing(get_pg_conn()) as conn:
         with conn.cursor() as cur:
             _set_tenant(cur, tenant_id)
             cur.execute(
-                """
+                f"""
                 SELECT chunk_id, doc_id, content,
                        ts_rank(content_seg_fts, to_tsquery('simple', %s)) AS score
                 FROM chunk_bm25
                 WHERE doc_id = ANY(%s)
                   AND content_seg_fts @@ to_tsquery('simple', %s)
+                  {strategy_clause}
                 ORDER BY score DESC
                 LIMIT %s
                 """,
-                (tsquery, list(ids), tsquery, int(limit)),
+                (tsquery, list(ids), tsquery, *strategy_params, int(limit)),
             )
             rows = cur.fetchall()
     return [
@@ -110,3 +120,74 @@ def search_chunks_by_tsquery(
         }
         for r in rows or []
     ]
+
+
+def _scope_where(doc_ids: Sequence[str], doc_strategies: Optional[Dict[str, Sequence[int]]]) -> tuple[str, List[Any]]:
+    """chunk_bm25 的文档范围条件；限定策略时按 chunk_id 关联 chunk_embeddings"""
+    conditions, params = _doc_scope_conditions(doc_ids=list(doc_ids), doc_strategies=doc_strategies)
+    where = "WHERE doc_id = ANY(%s)"
+    if len(conditions) > 1:
+        where += f" AND chunk_id IN (SELECT chunk_id FROM chunk_embeddings WHERE {' AND '.join(conditions)})"
+        return where, [list(doc_ids), *params]
+    return where, [list(doc_ids)]
+
+
+def list_chunk_terms_by_doc_ids(
+    *,
+    tenant_id: str,
+    doc_ids: Sequence[str],
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    按文档ID集返回分块文本与入库分词结果（用于构建进程内 BM25 索引）
+    返回字段：chunk_id, doc_id, content, content_seg
+    """
+    ids = [str(x or "").strip() for x in (doc_ids or [])]
+    ids = [x for x in ids if x]
+    if not ids:
+        return []
+    where, params = _scope_where(ids, doc_strategies)
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            cur.execute(f"SELECT chunk_id, doc_id, content, content_seg FROM chunk_bm25 {where}", params)
+            rows = cur.fetchall()
+    return [
+        {
+            "chunk_id": r[0],
+            "doc_id": r[1],
+            "content": r[2],
+            "content_seg": r[3],
+        }
+        for r in rows or []
+    ]
+
+
+def fingerprint_chunks_by_doc_ids(
+    *,
+    tenant_id: str,
+    doc_ids: Sequence[str],
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+) -> Dict[str, str]:
+    """
+    按文档计算 BM25 分块指纹（进程内索引据此判断文档是否需要重新加载）
+    指纹 = 分块数 + 按 chunk_id 排序的 (chunk_id, content, content_seg) 摘要；
+    重新切片或原地更新文本后分块数不变时指纹同样变化，只有摘要离开数据库
+    返回：{doc_id: "count:md5"}；没有分块的文档不出现
+    """
+    ids = [str(x or "").strip() for x in (doc_ids or [])]
+    ids = [x for x in ids if x]
+    if not ids:
+        return {}
+    where, params = _scope_where(ids, doc_strategies)
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            cur.execute(
+                "SELECT doc_id, count(*), "
+                "md5(string_agg(md5(chunk_id || ':' || content || ':' || content_seg), ',' ORDER BY chunk_id)) "
+                f"FROM chunk_bm25 {where} GROUP BY doc_id",
+                params,
+            )
+            rows = cur.fetchall()
+    return {str(r[0]): f"{int(r[1])}:{r[2]}" for r in rows or []}
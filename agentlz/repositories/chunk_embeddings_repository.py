@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Sequence, Literal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Literal, Tuple
 from contextlib import closing
 
+from agentlz.config.settings import get_settings
 from agentlz.core.database import get_pg_conn
+from agentlz.core.embedding_model_factory import get_embedding_dimension, get_vector_type
+from agentlz.core.pgvector_codec import copy_binary, decode_vector, vector_send_sql, vector_to_text
+from agentlz.core.text_segmenter import segment_for_bm25
 
 
 def _to_vector_literal(vec: Sequence[float]) -> str:
-    return "[" + ",".join(str(float(x)) for x in vec) + "]"
+    return vector_to_text(vec)
 
 
 def _parse_vector_text(s: str) -> List[float]:
@@ -19,31 +23,40 @@ def _parse_vector_text(s: str) -> List[float]:
     return [float(x) for x in t.split(",") if x]
 
 
+def _decode(buf: Any):
+    return decode_vector(buf, get_vector_type())
+
+
 def _set_tenant(cur, tenant_id: str) -> None:
     cur.execute("SET LOCAL app.current_tenant = %s", (tenant_id,))
 
 
+def _validate_dimension(embedding: Sequence[float]) -> None:
+    expected = get_embedding_dimension()
+    if expected and len(embedding) != expected:
+        raise ValueError(f"向量维度不匹配: 期望{expected}维，实际{len(embedding)}维")
+
+
+def _segment_for_bm25(content: str) -> str:
+    """BM25 分词：优先使用 jieba；不可用时回退为简单正则分词（与查询侧共用 text_segmenter）"""
+    return segment_for_bm25(content)
+
+
 def create_chunk_embedding(*, tenant_id: str, chunk_id: str, doc_id: str, embedding: Sequence[float], content: Optional[str] = None, chunk_index: int = 0, length: int = 0, strategy: int = 0) -> Dict[str, Any]:
     v = _to_vector_literal(embedding)
+    vtype = get_vector_type()
     with closing(get_pg_conn()) as conn:
         with conn.cursor() as cur:
             cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
             _set_tenant(cur, tenant_id)
             cur.execute(
-                "INSERT INTO chunk_embeddings (chunk_id, tenant_id, doc_id, embedding, content, chunk_index, length, strategy) VALUES (%s,%s,%s,%s::vector,%s,%s,%s,%s) ON CONFLICT (chunk_id) DO NOTHING",
+                f"INSERT INTO chunk_embeddings (chunk_id, tenant_id, doc_id, embedding, content, chunk_index, length, strategy) VALUES (%s,%s,%s,%s::{vtype},%s,%s,%s,%s) ON CONFLICT (chunk_id) DO NOTHING",
                 (chunk_id, tenant_id, doc_id, v, content, chunk_index, length, strategy),
             )
             # 同步写入 BM25 文本分块表（用于关键词召回链路）
             if content is not None:
                 try:
-                    # 代码分词：优先使用 jieba；不可用时回退为简单正则分词
-                    try:
-                        import jieba  # type: ignore
-                        seg = " ".join([t for t in jieba.lcut(str(content)) if str(t).strip() != ""])
-                    except Exception:
-                        import re
-                        terms = re.findall(r"[A-Za-z0-9]+|[\u4e00-\u9fff]", str(content))
-                        seg = " ".join([t for t in terms if str(t).strip() != ""])
+                    seg = _segment_for_bm25(content)
                     cur.execute(
                         """
                         INSERT INTO chunk_bm25 (chunk_id, tenant_id, doc_id, content, content_seg)
@@ -75,13 +88,134 @@ def create_chunk_embedding(*, tenant_id: str, chunk_id: str, doc_id: str, embedd
     }
 
 
+_STAGE_COLUMNS = ("chunk_id", "tenant_id", "doc_id", "embedding", "content", "chunk_index", "length", "strategy")
+
+
+def bulk_create_chunk_embeddings(*, tenant_id: str, rows: Sequence[Dict[str, Any]], page_size: int = 500) -> int:
+    """批量写入分块嵌入（单事务，向量 COPY BINARY）
+
+    参数：
+        - tenant_id: 租户标识（RLS）
+        - rows: 分块列表，每项包含 chunk_id, doc_id, embedding, content, chunk_index, length, strategy
+        - page_size: `chunk_bm25` 单条 INSERT 语句携带的最大行数
+
+    行为：
+        - 同一连接、同一事务内写入 `chunk_embeddings` 与 `chunk_bm25`，最后统一提交
+        - 向量走 COPY BINARY（pgvector 二进制格式），不做逐元素字符串格式化
+        - `chunk_bm25` 写入放在 SAVEPOINT 中，失败时回滚该部分，不影响向量写入
+
+    返回：
+        - 实际新插入的 `chunk_embeddings` 行数（已存在的 chunk_id 不计入）
+    """
+    if not rows:
+        return 0
+    from psycopg2.extras import execute_values
+
+    vtype = get_vector_type()
+    emb_values = [
+        (
+            r["chunk_id"],
+            tenant_id,
+            r["doc_id"],
+            r["embedding"],
+            r.get("content"),
+            int(r.get("chunk_index") or 0),
+            int(r.get("length") or 0),
+            int(r.get("strategy") or 0),
+        )
+        for r in rows
+    ]
+    bm25_values = [
+        (r["chunk_id"], tenant_id, r["doc_id"], r.get("content"), _segment_for_bm25(r.get("content")))
+        for r in rows
+        if r.get("content") is not None
+    ]
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            # 向量以二进制 COPY 进事务内临时表，再 INSERT ... SELECT 合并（保留 ON CONFLICT 语义与 RLS 检查）
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS _ce_stage (LIKE chunk_embeddings INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            copy_binary(
+                cur,
+                "_ce_stage",
+                _STAGE_COLUMNS,
+                emb_values,
+                ("text", "text", "text", vtype, "text", "int4", "int4", "int4"),
+            )
+            cur.execute(
+                f"INSERT INTO chunk_embeddings ({', '.join(_STAGE_COLUMNS)}) "
+                f"SELECT {', '.join(_STAGE_COLUMNS)} FROM _ce_stage ON CONFLICT (chunk_id) DO NOTHING RETURNING chunk_id"
+            )
+            inserted = cur.fetchall()
+            if bm25_values:
+                cur.execute("SAVEPOINT bm25_bulk")
+                try:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO chunk_bm25 (chunk_id, tenant_id, doc_id, content, content_seg)
+                        VALUES %s
+                        ON CONFLICT (chunk_id) DO UPDATE SET content = EXCLUDED.content, content_seg = EXCLUDED.content_seg, doc_id = EXCLUDED.doc_id
+                        """,
+                        bm25_values,
+                        page_size=page_size,
+                    )
+                    cur.execute("RELEASE SAVEPOINT bm25_bulk")
+                except Exception:
+                    # 容错：bm25 表不存在或扩展未启用时不影响主流程
+                    cur.execute("ROLLBACK TO SAVEPOINT bm25_bulk")
+        conn.commit()
+    return len(inserted or [])
+
+
+def count_tenant_chunks(*, tenant_id: str) -> int:
+    """统计租户下的分块数量"""
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            cur.execute("SELECT count(*) FROM chunk_embeddings WHERE tenant_id=%s", (tenant_id,))
+            row = cur.fetchone()
+        conn.commit()
+    return int(row[0]) if row else 0
+
+
+def iter_tenant_chunk_vectors(*, tenant_id: str, page_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    """流式读取租户全部分块及向量（服务端游标分页，向量二进制取回）
+
+    返回：
+        - 迭代器，每项包含 chunk_id, doc_id, content, created_at, strategy, embedding(numpy float32)
+    """
+    vtype = get_vector_type()
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+        with conn.cursor(name="tenant_chunk_vectors") as cur:
+            cur.itersize = int(page_size)
+            cur.execute(
+                f"SELECT chunk_id, doc_id, content, created_at, strategy, {vector_send_sql('embedding', vtype)} FROM chunk_embeddings WHERE tenant_id=%s",
+                (tenant_id,),
+            )
+            for r in cur:
+                yield {
+                    "chunk_id": r[0],
+                    "doc_id": r[1],
+                    "content": r[2],
+                    "created_at": r[3],
+                    "strategy": int(r[4] or 0),
+                    "embedding": decode_vector(r[5], vtype),
+                }
+        conn.commit()
+
+
 def get_chunk_embedding(*, tenant_id: str, chunk_id: str, include_vector: bool = False) -> Optional[Dict[str, Any]]:
     with closing(get_pg_conn()) as conn:
         with conn.cursor() as cur:
             _set_tenant(cur, tenant_id)
             if include_vector:
                 cur.execute(
-                    "SELECT chunk_id, tenant_id, doc_id, content, created_at, embedding::text FROM chunk_embeddings WHERE chunk_id=%s",
+                    f"SELECT chunk_id, tenant_id, doc_id, content, created_at, {vector_send_sql('embedding', get_vector_type())} FROM chunk_embeddings WHERE chunk_id=%s",
                     (chunk_id,),
                 )
             else:
@@ -99,7 +233,7 @@ def get_chunk_embedding(*, tenant_id: str, chunk_id: str, include_vector: bool =
             "doc_id": row[2],
             "content": row[3],
             "created_at": row[4],
-            "embedding": _parse_vector_text(row[5] or ""),
+            "embedding": _decode(row[5]),
         }
     return {
         "chunk_id": row[0],
@@ -110,6 +244,34 @@ def get_chunk_embedding(*, tenant_id: str, chunk_id: str, include_vector: bool =
     }
 
 
+def get_chunks_by_ids(*, tenant_id: str, chunk_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """按 chunk_id 批量取回分块内容（一次查询）
+
+    参数：
+        - tenant_id: 租户标识（RLS）
+        - chunk_ids: 分块ID列表
+
+    返回：
+        - {chunk_id: {chunk_id, doc_id, content, created_at}}；不存在的分块不出现
+    """
+    ids = list(dict.fromkeys(str(c) for c in chunk_ids if c))
+    if not ids:
+        return {}
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            cur.execute(
+                "SELECT chunk_id, doc_id, content, created_at FROM chunk_embeddings WHERE chunk_id = ANY(%s)",
+                (ids,),
+            )
+            rows = cur.fetchall()
+        conn.commit()
+    return {
+        str(r[0]): {"chunk_id": r[0], "doc_id": r[1], "content": r[2], "created_at": r[3]}
+        for r in rows
+    }
+
+
 def list_chunk_embeddings(*, tenant_id: str, doc_id: Optional[str] = None, limit: int = 20, offset: int = 0, include_vector: bool = False) -> List[Dict[str, Any]]:
     """列出分块嵌入（支持返回 chunk_index 与 strategy）
     
@@ -117,28 +279,29 @@ def list_chunk_embeddings(*, tenant_id: str, doc_id: Optional[str] = None, limit
         - tenant_id: 租户标识（RLS）
         - doc_id: 可选文档ID过滤
         - limit/offset: 分页参数
-        - include_vector: 是否同时返回 embedding 向量（文本形式）
+        - include_vector: 是否同时返回 embedding 向量（二进制取回）
     
     返回：
         - 每条记录包含：chunk_id, tenant_id, doc_id, content, created_at, chunk_index, strategy
-        - 当 include_vector=True 时，额外返回 embedding（解析为 float 数组）
+        - 当 include_vector=True 时，额外返回 embedding（numpy float32 数组）
     """
     with closing(get_pg_conn()) as conn:
         with conn.cursor() as cur:
             _set_tenant(cur, tenant_id)
             if include_vector:
+                vec_sql = vector_send_sql("embedding", get_vector_type())
                 if doc_id:
                     cur.execute(
-                        "SELECT chunk_id, tenant_id, doc_id, content, created_at, chunk_index, strategy, embedding::text FROM chunk_embeddings WHERE doc_id=%s ORDER BY created_at DESC LIMIT %s OFFSET %s",
+                        f"SELECT chunk_id, tenant_id, doc_id, content, created_at, chunk_index, strategy, {vec_sql} FROM chunk_embeddings WHERE doc_id=%s ORDER BY created_at DESC LIMIT %s OFFSET %s",
                         (doc_id, limit, offset),
                     )
                 else:
                     cur.execute(
-                        "SELECT chunk_id, tenant_id, doc_id, content, created_at, chunk_index, strategy, embedding::text FROM chunk_embeddings ORDER BY created_at DESC LIMIT %s OFFSET %s",
+                        f"SELECT chunk_id, tenant_id, doc_id, content, created_at, chunk_index, strategy, {vec_sql} FROM chunk_embeddings ORDER BY created_at DESC LIMIT %s OFFSET %s",
                         (limit, offset),
                     )
                 rows = cur.fetchall()
-                # 索引说明：0-id,1-tenant,2-doc,3-content,4-created,5-chunk_index,6-strategy,7-embedding::text
+                # 索引说明：0-id,1-tenant,2-doc,3-content,4-created,5-chunk_index,6-strategy,7-embedding(bytea)
                 return [
                     {
                         "chunk_id": r[0],
@@ -148,7 +311,7 @@ def list_chunk_embeddings(*, tenant_id: str, doc_id: Optional[str] = None, limit
                         "created_at": r[4],
                         "chunk_index": r[5],
                         "strategy": str(r[6]) if r[6] is not None else "0",
-                        "embedding": _parse_vector_text(r[7] or ""),
+                        "embedding": _decode(r[7]),
                     }
                     for r in rows
                 ]
@@ -253,7 +416,7 @@ def update_chunk_embedding(*, tenant_id: str, chunk_id: str, embedding: Optional
     sets: List[str] = []
     params: List[Any] = []
     if embedding is not None:
-        sets.append("embedding=%s::vector")
+        sets.append(f"embedding=%s::{get_vector_type()}")
         params.append(_to_vector_literal(embedding))
     if content is not None:
         sets.append("content=%s")
@@ -291,6 +454,101 @@ def delete_chunk_embedding(*, tenant_id: str, chunk_id: str) -> bool:
     return deleted
 
 
+def _doc_scope_conditions(
+    *,
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+) -> Optional[Tuple[List[str], List[Any]]]:
+    """构造文档范围过滤条件（doc_id 或 (doc_id, strategy) 组合）
+
+    参数:
+        - doc_id / doc_ids: 文档过滤条件（doc_ids 优先；传入空列表表示范围为空）
+        - doc_strategies: {doc_id: [strategy]}；出现在其中的文档只检索指定策略的分块，其余文档不限策略
+
+    返回值:
+        - (条件列表, 参数列表)；范围为空时返回 None（调用方直接返回空结果）
+    """
+    pinned = {str(k): [int(x) for x in v] for k, v in (doc_strategies or {}).items() if v}
+    if doc_ids is not None:
+        ids = [str(d) for d in doc_ids]
+        if not ids:
+            return None
+        conditions = ["doc_id = ANY(%s)"]
+        params: List[Any] = [ids]
+        pairs = [(d, st) for d in ids if d in pinned for st in pinned[d]]
+        if pairs:
+            # (doc_id, strategy) 组合过滤，配合 (tenant_id, doc_id, strategy) 复合索引
+            pair_sql = "(doc_id, strategy) IN (SELECT p.d, p.s FROM unnest(%s::varchar[], %s::int[]) AS p(d, s))"
+            pair_params: List[Any] = [[d for d, _ in pairs], [st for _, st in pairs]]
+            free = [d for d in ids if d not in pinned]
+            if free:
+                conditions.append(f"(doc_id = ANY(%s) OR {pair_sql})")
+                params.extend([free, *pair_params])
+            else:
+                conditions.append(pair_sql)
+                params.extend(pair_params)
+        return conditions, params
+    if doc_id:
+        conditions = ["doc_id = %s"]
+        params = [doc_id]
+        if str(doc_id) in pinned:
+            conditions.append("strategy = ANY(%s)")
+            params.append(pinned[str(doc_id)])
+        return conditions, params
+    return [], []
+
+
+def _set_local_guc(cur, name: str, value: Any) -> bool:
+    """在 SAVEPOINT 内 SET LOCAL；参数不被当前 pgvector 版本识别时回滚该步并返回 False"""
+    cur.execute("SAVEPOINT ann_guc")
+    try:
+        cur.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
+        cur.execute("RELEASE SAVEPOINT ann_guc")
+        return True
+    except Exception:
+        cur.execute("ROLLBACK TO SAVEPOINT ann_guc")
+        return False
+
+
+def _prepare_ann_search(cur, *, where_clause: str, filter_params: Sequence[Any]) -> str:
+    """为本次检索设置 ANN 参数并选择执行方式
+
+    行为：
+        - 默认按配置设置 `hnsw.ef_search` / `ivfflat.probes`，并开启 pgvector 0.8+ 的迭代扫描
+          （`*.iterative_scan`）：带文档过滤时结果不足，索引继续向外扫描，避免 ANN 先取 Top-K 再过滤导致召回塌缩；
+        - 可选的精确检索回退（`rag_ann_exact_max_rows` > 0，默认关闭）：带文档过滤时先计数，
+          命中分块数不超过该值则关闭索引扫描（位图扫描 tenant/doc 复合索引后排序）；代价是每次检索多一次查询；
+        - 所有设置均为 SET LOCAL，仅作用于当前事务。
+
+    返回：
+        - "exact" 或 "ann"
+    """
+    s = get_settings()
+    exact_max = int(getattr(s, "rag_ann_exact_max_rows", 0) or 0)
+    if where_clause and exact_max > 0:
+        cur.execute(
+            f"SELECT count(*) FROM (SELECT 1 FROM chunk_embeddings {where_clause} LIMIT %s) t",
+            (*filter_params, exact_max + 1),
+        )
+        row = cur.fetchone()
+        if row is not None and int(row[0]) <= exact_max:
+            cur.execute("SET LOCAL enable_indexscan = off")
+            return "exact"
+    ef_search = int(getattr(s, "rag_hnsw_ef_search", 100) or 0)
+    probes = int(getattr(s, "rag_ivfflat_probes", 10) or 0)
+    if ef_search > 0:
+        _set_local_guc(cur, "hnsw.ef_search", ef_search)
+    if probes > 0:
+        _set_local_guc(cur, "ivfflat.probes", probes)
+    mode = str(getattr(s, "rag_ann_iterative_scan", "relaxed_order") or "off").strip().lower()
+    if mode in ("strict_order", "relaxed_order"):
+        _set_local_guc(cur, "hnsw.iterative_scan", mode)
+        # ivfflat 仅支持 relaxed_order
+        _set_local_guc(cur, "ivfflat.iterative_scan", "relaxed_order")
+    return "ann"
+
+
 def search_similar_chunks(
     *,
     tenant_id: str,
@@ -299,7 +557,8 @@ def search_similar_chunks(
     doc_ids: Optional[Sequence[str]] = None,
     distance_metric: Literal["euclidean", "cosine"] = "euclidean",
     limit: int = 10,
-    include_vector: bool = False
+    include_vector: bool = False,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
 ) -> List[Dict[str, Any]]:
     """向量相似度搜索
     
@@ -307,11 +566,12 @@ def search_similar_chunks(
     
     参数:
         - tenant_id: 租户标识，用于RLS隔离
-        - embedding: 查询向量，维度需与存储向量一致(1536维)
+        - embedding: 查询向量，维度需与存储向量一致（padded 模式 1536 维，native 模式为模型原生维度）
         - doc_id: 可选的文档ID过滤条件，为空则搜索所有文档
         - distance_metric: 距离度量方式，可选"euclidean"或"cosine"
         - limit: 返回结果数量上限
         - include_vector: 是否返回向量字段
+        - doc_strategies: 可选 {doc_id: [strategy]}，按 (doc_id, strategy) 限定检索的切割策略
     
     返回值:
         - 相似文本块列表，按相似度升序排列（距离越小越相似）
@@ -326,8 +586,7 @@ def search_similar_chunks(
         raise ValueError(f"不支持的度量方式: {distance_metric}，请选择 'euclidean' 或 'cosine'")
     
     # 验证向量维度
-    if len(embedding) != 1536:
-        raise ValueError(f"向量维度不匹配: 期望1536维，实际{len(embedding)}维")
+    _validate_dimension(embedding)
     
     # 将向量转换为pgvector格式
     vector_literal = _to_vector_literal(embedding)
@@ -338,25 +597,20 @@ def search_similar_chunks(
             cur.execute("SET LOCAL app.current_tenant = %s", (tenant_id,))
             
             # 构建查询SQL
+            vtype = get_vector_type()
             if distance_metric == "euclidean":
                 # 欧几里得距离: 使用内置的<->操作符
-                distance_expr = "embedding <-> %s::vector"
+                distance_expr = f"embedding <-> %s::{vtype}"
             else:
                 # 余弦相似度: 使用<=>操作符 (1 - cosine_similarity)
-                distance_expr = "embedding <=> %s::vector"
+                distance_expr = f"embedding <=> %s::{vtype}"
             
             # 构建WHERE条件
-            where_conditions = []
-            params = [vector_literal]
-            
-            if doc_ids is not None:
-                if len(doc_ids) == 0:
-                    return []
-                where_conditions.append("doc_id = ANY(%s)")
-                params.append(list(doc_ids))
-            elif doc_id:
-                where_conditions.append("doc_id = %s")
-                params.append(doc_id)
+            scope = _doc_scope_conditions(doc_id=doc_id, doc_ids=doc_ids, doc_strategies=doc_strategies)
+            if scope is None:
+                return []
+            where_conditions, filter_params = scope
+            params = [vector_literal, *filter_params]
             
             where_clause = ""
             if where_conditions:
@@ -364,20 +618,25 @@ def search_similar_chunks(
             
             # 选择字段
             if include_vector:
-                select_fields = "chunk_id, tenant_id, doc_id, content, created_at, embedding::text, "
+                select_fields = f"chunk_id, tenant_id, doc_id, content, created_at, {vector_send_sql('embedding', get_vector_type())}, "
             else:
                 select_fields = "chunk_id, tenant_id, doc_id, content, created_at, "
             
             # 完整的SQL查询 - 按距离升序排列（距离越小越相似）
+            # 迭代扫描（relaxed_order）下索引返回顺序可能略有偏差，物化后再按距离排序一次
             sql = f"""
-                SELECT {select_fields} {distance_expr} as distance
-                FROM chunk_embeddings
-                {where_clause}
-                ORDER BY distance
-                LIMIT %s
+                WITH hits AS MATERIALIZED (
+                    SELECT {select_fields} {distance_expr} as distance
+                    FROM chunk_embeddings
+                    {where_clause}
+                    ORDER BY distance
+                    LIMIT %s
+                )
+                SELECT * FROM hits ORDER BY distance
             """
             
             params.append(limit)
+            _prepare_ann_search(cur, where_clause=where_clause, filter_params=params[1:-1])
             
             try:
                 cur.execute(sql, params)
@@ -394,7 +653,7 @@ def search_similar_chunks(
                         "doc_id": row[2], 
                         "content": row[3],
                         "created_at": row[4],
-                        "embedding": _parse_vector_text(row[5] or ""),
+                        "embedding": _decode(row[5]),
                         "similarity_score": float(row[6]),
                     }
                 else:
@@ -409,3 +668,298 @@ def search_similar_chunks(
                 results.append(result)
             
             return results
+
+
+def search_similar_chunks_multi(
+    *,
+    tenant_id: str,
+    embeddings: Sequence[Sequence[float]],
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    distance_metric: Literal["euclidean", "cosine"] = "euclidean",
+    limit: int = 10,
+    include_vector: bool = False,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+) -> List[Dict[str, Any]]:
+    """多查询向量相似度搜索（单条 SQL）
+
+    对每个查询向量通过 LATERAL 子查询各取 Top-`limit`，在同一条语句内按 chunk_id 保留最小距离，
+    最后整体按距离升序返回全局 Top-`limit`。一次连接、一次往返完成全部查询。
+
+    参数:
+        - tenant_id: 租户标识，用于RLS隔离
+        - embeddings: 查询向量列表，维度需与存储向量一致
+        - doc_id / doc_ids: 可选的文档过滤条件（doc_ids 优先）
+        - distance_metric: 距离度量方式，可选"euclidean"或"cosine"
+        - limit: 每个查询向量的候选数，同时也是合并后返回数量上限
+        - include_vector: 是否返回向量字段
+        - doc_strategies: 可选 {doc_id: [strategy]}，按 (doc_id, strategy) 限定检索的切割策略
+
+    返回值:
+        - 相似文本块列表（按 chunk_id 去重），按距离升序排列
+        - 每个结果包含: chunk_id, tenant_id, doc_id, content, created_at, similarity_score, query_index
+        - 当include_vector=True时额外包含embedding向量
+
+    异常:
+        - ValueError: 当distance_metric不合法或向量维度不匹配时
+        - RuntimeError: 当数据库查询失败时
+    """
+    if distance_metric not in ["euclidean", "cosine"]:
+        raise ValueError(f"不支持的度量方式: {distance_metric}，请选择 'euclidean' 或 'cosine'")
+    vecs = [v for v in (embeddings or []) if v is not None and len(v) > 0]
+    if not vecs:
+        return []
+    for v in vecs:
+        _validate_dimension(v)
+    op = "<->" if distance_metric == "euclidean" else "<=>"
+    vtype = get_vector_type()
+
+    scope = _doc_scope_conditions(doc_id=doc_id, doc_ids=doc_ids, doc_strategies=doc_strategies)
+    if scope is None:
+        return []
+    where_conditions, filter_params = scope
+    where_clause = ("WHERE " + " AND ".join(where_conditions)) if where_conditions else ""
+    vector_field = f"{vector_send_sql('embedding', vtype)} AS embedding_bin, " if include_vector else ""
+    outer_vector_field = "embedding_bin, " if include_vector else ""
+
+    sql = f"""
+        WITH q AS (
+            SELECT (t.ord - 1)::int AS query_index, t.v::{vtype} AS qv
+            FROM unnest(%s::text[]) WITH ORDINALITY AS t(v, ord)
+        )
+        SELECT chunk_id, tenant_id, doc_id, content, created_at, {outer_vector_field}distance, query_index
+        FROM (
+            SELECT DISTINCT ON (hit.chunk_id) hit.*, q.query_index
+            FROM q
+            CROSS JOIN LATERAL (
+                SELECT chunk_id, tenant_id, doc_id, content, created_at, {vector_field}embedding {op} q.qv AS distance
+                FROM chunk_embeddings
+                {where_clause}
+                ORDER BY embedding {op} q.qv
+                LIMIT %s
+            ) hit
+            ORDER BY hit.chunk_id, hit.distance
+        ) best
+        ORDER BY distance
+        LIMIT %s
+    """
+    params: List[Any] = [[_to_vector_literal(v) for v in vecs], *filter_params, int(limit), int(limit)]
+
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            _prepare_ann_search(cur, where_clause=where_clause, filter_params=filter_params)
+            try:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            except Exception as e:
+                raise RuntimeError(f"多查询向量搜索失败: {str(e)}")
+
+    results: List[Dict[str, Any]] = []
+    for row in rows:
+        item = {
+            "chunk_id": row[0],
+            "tenant_id": row[1],
+            "doc_id": row[2],
+            "content": row[3],
+            "created_at": row[4],
+        }
+        if include_vector:
+            item["embedding"] = _decode(row[5])
+            item["similarity_score"] = float(row[6])
+            item["query_index"] = int(row[7])
+        else:
+            item["similarity_score"] = float(row[5])
+            item["query_index"] = int(row[6])
+        results.append(item)
+    return results
+
+
+def search_hybrid_chunks(
+    *,
+    tenant_id: str,
+    embeddings: Sequence[Sequence[float]],
+    doc_ids: Sequence[str],
+    tsquery: Optional[str] = None,
+    doc_boosts: Optional[Dict[str, float]] = None,
+    distance_metric: Literal["euclidean", "cosine"] = "euclidean",
+    vector_top_k: int = 50,
+    bm25_top_k: int = 50,
+    limit: int = 20,
+    rrf_k: float = 60.0,
+    boost_weight: float = 0.02,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+    keyword_hits: Optional[Sequence[Tuple[str, float]]] = None,
+) -> List[Dict[str, Any]]:
+    """混合检索（单条 SQL）：向量召回 + 全文召回，在库内完成 RRF 融合与元数据提升
+
+    语句结构：
+        - vec：每个查询向量 LATERAL 取 Top-`vector_top_k`，按 chunk 取最小距离后再取全局 Top-`vector_top_k` 并排名；
+        - fts：`chunk_bm25` 上 tsquery 命中按 ts_rank 取 Top-`bm25_top_k` 并排名（tsquery 为空时跳过）；
+        - 两路 FULL JOIN 计算 `1/(k+rank)` 之和，叠加按 doc_id 传入的元数据提升；
+        - 只回表取最终 Top-`limit` 的正文，其余候选不出库。
+
+    参数:
+        - tenant_id: 租户标识，用于RLS隔离
+        - embeddings: 查询向量列表
+        - doc_ids: 检索范围（文档ID列表）
+        - tsquery: 全文检索表达式（例如 '配置 & Agent'），为空时只走向量链路
+        - doc_boosts: {doc_id: 提升值}，融合分数加 `boost_weight * boost`
+        - distance_metric: 向量距离度量，"euclidean" 或 "cosine"
+        - vector_top_k / bm25_top_k: 两路召回各自的候选数
+        - limit: 返回数量上限
+        - rrf_k: RRF 常数
+        - doc_strategies: 可选 {doc_id: [strategy]}，两路召回均按 (doc_id, strategy) 限定切割策略
+        - keyword_hits: 可选 [(chunk_id, score)]，由进程内 BM25 等外部关键词后端给出；
+          传入时替代 tsquery 全文召回，作为数组参数参与库内 RRF 融合
+
+    返回值:
+        - 按 fused_score 降序的列表，每项包含: chunk_id, doc_id, content, created_at, score, type,
+          distance, bm25_score, rrf_score, boost, fused_score
+          （score/type 与旧的 Python 融合保持一致：取两路原始分数的较大者，向量命中时 type 为 "vector"）
+
+    异常:
+        - ValueError: 当distance_metric不合法或向量维度不匹配时
+        - RuntimeError: 当数据库查询失败时
+    """
+    if distance_metric not in ["euclidean", "cosine"]:
+        raise ValueError(f"不支持的度量方式: {distance_metric}，请选择 'euclidean' 或 'cosine'")
+    ids = [str(x or "").strip() for x in (doc_ids or [])]
+    ids = [x for x in ids if x]
+    vecs = [v for v in (embeddings or []) if v is not None and len(v) > 0]
+    if not ids or not vecs:
+        return []
+    for v in vecs:
+        _validate_dimension(v)
+    op = "<->" if distance_metric == "euclidean" else "<=>"
+    vtype = get_vector_type()
+    use_fts = isinstance(tsquery, str) and tsquery.strip() != ""
+    boosts = {str(k): float(v) for k, v in (doc_boosts or {}).items() if v}
+    scope_conditions, scope_params = _doc_scope_conditions(doc_ids=ids, doc_strategies=doc_strategies)
+    where_clause = "WHERE " + " AND ".join(scope_conditions)
+
+    if keyword_hits is not None:
+        fts_cte = """
+            fts AS (
+                SELECT k.chunk_id, k.score
+                FROM unnest(%s::varchar[], %s::float8[]) AS k(chunk_id, score)
+            ),"""
+        fts_params = [[str(c) for c, _ in keyword_hits], [float(x) for _, x in keyword_hits]]
+    elif use_fts:
+        # chunk_bm25 不含 strategy 列，按 chunk_id 回到 chunk_embeddings 做同样的范围过滤
+        strategy_clause = ""
+        strategy_params: List[Any] = []
+        if len(scope_conditions) > 1:
+            strategy_clause = f"AND chunk_id IN (SELECT chunk_id FROM chunk_embeddings {where_clause})"
+            strategy_params = list(scope_params)
+        fts_cte = f"""
+            fts AS (
+                SELECT chunk_id, ts_rank(content_seg_fts, to_tsquery('simple', %s)) AS score
+                FROM chunk_bm25
+                WHERE doc_id = ANY(%s)
+                  AND content_seg_fts @@ to_tsquery('simple', %s)
+                  {strategy_clause}
+                ORDER BY score DESC
+                LIMIT %s
+            ),"""
+        fts_params: List[Any] = [tsquery, ids, tsquery, *strategy_params, int(bm25_top_k)]
+    else:
+        fts_cte = """
+            fts AS (
+                SELECT NULL::varchar AS chunk_id, NULL::real AS score WHERE false
+            ),"""
+        fts_params = []
+
+    sql = f"""
+        WITH q AS (
+            SELECT t.v::{vtype} AS qv
+            FROM unnest(%s::text[]) AS t(v)
+        ),
+        vec AS MATERIALIZED (
+            SELECT hit.chunk_id, min(hit.distance) AS distance
+            FROM q
+            CROSS JOIN LATERAL (
+                SELECT chunk_id, embedding {op} q.qv AS distance
+                FROM chunk_embeddings
+                {where_clause}
+                ORDER BY embedding {op} q.qv
+                LIMIT %s
+            ) hit
+            GROUP BY hit.chunk_id
+            ORDER BY distance
+            LIMIT %s
+        ),
+        {fts_cte}
+        ranked AS (
+            SELECT COALESCE(v.chunk_id, f.chunk_id) AS chunk_id,
+                   v.distance,
+                   f.score AS bm25_score,
+                   COALESCE(1.0 / (%s + v.rnk), 0) + COALESCE(1.0 / (%s + f.rnk), 0) AS rrf_score
+            FROM (SELECT chunk_id, distance, row_number() OVER (ORDER BY distance, chunk_id) AS rnk FROM vec) v
+            FULL JOIN (SELECT chunk_id, score, row_number() OVER (ORDER BY score DESC, chunk_id) AS rnk FROM fts) f
+              ON f.chunk_id = v.chunk_id
+        ),
+        boost AS (
+            SELECT b.doc_id, b.boost
+            FROM unnest(%s::text[], %s::float8[]) AS b(doc_id, boost)
+        ),
+        top AS (
+            SELECT r.chunk_id, ce.doc_id, r.distance, r.bm25_score, r.rrf_score,
+                   COALESCE(b.boost, 0) AS boost,
+                   r.rrf_score + %s * COALESCE(b.boost, 0) AS fused_score
+            FROM ranked r
+            JOIN chunk_embeddings ce ON ce.chunk_id = r.chunk_id
+            LEFT JOIN boost b ON b.doc_id = ce.doc_id
+            ORDER BY fused_score DESC, r.chunk_id
+            LIMIT %s
+        )
+        SELECT t.chunk_id, t.doc_id, ce.content, ce.created_at, t.distance, t.bm25_score,
+               t.rrf_score, t.boost, t.fused_score, ce.chunk_index
+        FROM top t
+        JOIN chunk_embeddings ce ON ce.chunk_id = t.chunk_id
+        ORDER BY t.fused_score DESC, t.chunk_id
+    """
+    params: List[Any] = [
+        [_to_vector_literal(v) for v in vecs],
+        *scope_params,
+        int(vector_top_k),
+        int(vector_top_k),
+        *fts_params,
+        float(rrf_k),
+        float(rrf_k),
+        list(boosts.keys()),
+        list(boosts.values()),
+        float(boost_weight),
+        int(limit),
+    ]
+
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            _set_tenant(cur, tenant_id)
+            _prepare_ann_search(cur, where_clause=where_clause, filter_params=scope_params)
+            try:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            except Exception as e:
+                raise RuntimeError(f"混合检索失败: {str(e)}")
+
+    results: List[Dict[str, Any]] = []
+    for row in rows or []:
+        distance = None if row[4] is None else float(row[4])
+        bm25_score = None if row[5] is None else float(row[5])
+        vec_score = 1.0 / (1.0 + distance) if distance is not None else None
+        results.append({
+            "chunk_id": str(row[0]),
+            "doc_id": str(row[1]),
+            "content": row[2],
+            "created_at": row[3],
+            "score": max(x for x in (vec_score, bm25_score) if x is not None),
+            "type": "vector" if distance is not None else "bm25",
+            "distance": distance,
+            "bm25_score": bm25_score,
+            "rrf_score": float(row[6] or 0.0),
+            "boost": float(row[7] or 0.0),
+            "fused_score": float(row[8] or 0.0),
+            "chunk_index": None if row[9] is None else int(row[9]),
+        })
+    return results
@@ -397,6 +397,38 @@ def get_document_with_names_by_id_any_tenant(
     return dict(row) if row else None
 
 
+def list_documents_meta_by_ids(
+    *,
+    doc_ids: List[str],
+    table_name: str,
+) -> Dict[str, Dict[str, Any]]:
+    '''
+    批量获取文档检索元数据（不按租户隔离），单次查询
+    参数
+    - doc_ids: 文档ID列表
+    - table_name: 文档表名
+    返回
+    - 字典 {doc_id: {id, tenant_id, disabled, title, tags, description}}，不存在的文档不出现在结果中
+    '''
+    ids = [str(x or "").strip() for x in (doc_ids or [])]
+    ids = list(dict.fromkeys([x for x in ids if x]))
+    if not ids:
+        return {}
+    names = {f"id{i}": v for i, v in enumerate(ids)}
+    placeholders = ",".join([f":{k}" for k in names.keys()])
+    sql = text(
+        f"""
+        SELECT d.id, d.tenant_id, d.disabled, d.title, d.tags, d.description
+        FROM `{table_name}` d
+        WHERE d.id IN ({placeholders})
+        """
+    )
+    engine = get_mysql_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(sql, names).mappings().all()
+    return {str(r["id"]): dict(r) for r in rows}
+
+
 def list_documents_with_names(
     *,
     page: int,
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence, Tuple
+from contextlib import closing
+
+import numpy as np
+
+from agentlz.core.database import get_pg_conn
+from agentlz.core.pgvector_codec import copy_binary, decode_vector
+
+"""内容哈希向量库（embedding_store）
+
+按 (content_hash, model_id) 存储已计算的向量，跨文档、跨策略、跨租户复用。
+键只由文本内容哈希与模型标识决定，不含租户信息，因此表不启用 RLS。
+"""
+
+
+def get_embeddings_by_hashes(*, model_id: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+    """批量查询已存储的向量
+
+    参数：
+        - model_id: 模型标识（模型名 + 输出维度）
+        - hashes: 内容哈希列表
+
+    返回：
+        - {content_hash: float32 向量数组}；未命中的哈希不出现在结果中
+    """
+    keys = list(dict.fromkeys(h for h in hashes if h))
+    if not keys:
+        return {}
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT content_hash, vector_send(embedding) FROM embedding_store WHERE model_id = %s AND content_hash = ANY(%s)",
+                (model_id, keys),
+            )
+            rows = cur.fetchall()
+        conn.commit()
+    return {r[0]: decode_vector(r[1]) for r in rows or []}
+
+
+def put_embeddings(*, model_id: str, items: Sequence[Tuple[str, Sequence[float]]]) -> int:
+    """批量写入向量（已存在的键保持不变）
+
+    参数：
+        - model_id: 模型标识
+        - items: (content_hash, 向量) 列表；向量以 COPY BINARY 写入
+
+    返回：
+        - 实际新插入的行数
+    """
+    if not items:
+        return 0
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS _es_stage (content_hash CHAR(64), model_id VARCHAR(255), embedding VECTOR) ON COMMIT DROP"
+            )
+            copy_binary(
+                cur,
+                "_es_stage",
+                ("content_hash", "model_id", "embedding"),
+                ((h, model_id, v) for h, v in items),
+                ("text", "text", "vector"),
+            )
+            cur.execute(
+                "INSERT INTO embedding_store (content_hash, model_id, embedding) "
+                "SELECT content_hash, model_id, embedding FROM _es_stage "
+                "ON CONFLICT (content_hash, model_id) DO NOTHING RETURNING content_hash"
+            )
+            inserted = cur.fetchall()
+        conn.commit()
+    return len(inserted or [])
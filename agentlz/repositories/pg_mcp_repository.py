@@ -3,13 +3,22 @@ from typing import Any, Dict, List, Sequence
 from sqlalchemy import text
 from contextlib import closing
 from agentlz.core.database import get_pg_engine, get_pg_conn
+from agentlz.core.embedding_model_factory import (
+    PADDED_EMBEDDING_DIM,
+    get_embedding_dimension,
+    get_vector_type,
+)
+from agentlz.core.pgvector_codec import vector_to_text
 
-_MCP_VEC_DIM = 1536
+
+def _mcp_vec_dim() -> int:
+    """`mcp_agents_vec.embedding` 列维度：随嵌入模型与存储模式确定"""
+    return int(get_embedding_dimension() or PADDED_EMBEDDING_DIM)
 
 
 def _to_vector_literal(vec: Sequence[float]) -> str:
     """将 Python 向量序列化为 pgvector 字面量，例如 "[0.1,0.2]"。"""
-    return "[" + ",".join(str(float(x)) for x in vec) + "]"
+    return vector_to_text(vec)
 
 def _to_bigint_array_literal(ids: Sequence[int]) -> str:
     return "{" + ",".join(str(int(i)) for i in ids) + "}"
@@ -22,14 +31,15 @@ def _ensure_pg_schema(conn) -> None:
       - `transport`/`command`：与 `name` 共同唯一标识 MCP
       - `trust_score`：可信度得分（trust score，浮点，默认 0），用于融合排序的质量信号
     """
+    vtype = get_vector_type()
     with conn.cursor() as cur:
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
         cur.execute(
-            f"CREATE TABLE IF NOT EXISTS mcp_agents_vec (id BIGINT PRIMARY KEY, name TEXT, transport TEXT, command TEXT, description TEXT, category TEXT, embedding VECTOR({_MCP_VEC_DIM}), trust_score REAL DEFAULT 0);"
+            f"CREATE TABLE IF NOT EXISTS mcp_agents_vec (id BIGINT PRIMARY KEY, name TEXT, transport TEXT, command TEXT, description TEXT, category TEXT, embedding {vtype.upper()}({_mcp_vec_dim()}), trust_score REAL DEFAULT 0);"
         )
         try:
             cur.execute(
-                "CREATE INDEX IF NOT EXISTS idx_mcp_agents_vec_embedding ON mcp_agents_vec USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);"
+                f"CREATE INDEX IF NOT EXISTS idx_mcp_agents_vec_embedding ON mcp_agents_vec USING ivfflat (embedding {vtype}_l2_ops) WITH (lists = 100);"
             )
         except Exception:
             pass
@@ -46,11 +56,12 @@ def upsert_mcp_agent_vector(agent_id: int, name: str, transport: str, command: s
     - 若主键存在则进行 UPSERT，更新 `name/transport/command/description/category/embedding`
     """
     v = _to_vector_literal(embedding)
+    vtype = get_vector_type()
     with closing(get_pg_conn()) as conn:
         _ensure_pg_schema(conn)
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO mcp_agents_vec (id, name, transport, command, description, category, embedding) VALUES (%s,%s,%s,%s,%s,%s,%s::vector) ON CONFLICT (id) DO UPDATE SET name=EXCLUDED.name, transport=EXCLUDED.transport, command=EXCLUDED.command, description=EXCLUDED.description, category=EXCLUDED.category, embedding=%s::vector",
+                f"INSERT INTO mcp_agents_vec (id, name, transport, command, description, category, embedding) VALUES (%s,%s,%s,%s,%s,%s,%s::{vtype}) ON CONFLICT (id) DO UPDATE SET name=EXCLUDED.name, transport=EXCLUDED.transport, command=EXCLUDED.command, description=EXCLUDED.description, category=EXCLUDED.category, embedding=%s::{vtype}",
                 (agent_id, name, transport, command, description, category, v, v),
             )
         conn.commit()
@@ -64,7 +75,7 @@ def search_ids_by_vector(embedding: Sequence[float], k: int = 5) -> List[int]:
         _ensure_pg_schema(conn)
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT id FROM mcp_agents_vec ORDER BY embedding <-> %s::vector LIMIT %s",
+                f"SELECT id FROM mcp_agents_vec ORDER BY embedding <-> %s::{get_vector_type()} LIMIT %s",
                 (v, k),
             )
             rows = cur.fetchall()
@@ -99,14 +110,14 @@ def search_mcp_hybrid_pg(
           SELECT id, name, transport, command, description, trust_score, embedding
           FROM mcp_agents_vec
           {where_clause}
-          ORDER BY embedding <=> %s::vector
+          ORDER BY embedding <=> %s::{vtype}
           LIMIT %s
         ),
         norm AS (
           SELECT *,
                  COALESCE((trust_score - MIN(COALESCE(trust_score, 0)) OVER ())
                  / NULLIF(MAX(COALESCE(trust_score, 0)) OVER () - MIN(COALESCE(trust_score, 0)) OVER (), 0), 0) AS trust_score_norm,
-                 GREATEST(0, 1 - (embedding <=> %s::vector)) AS sem_score
+                 GREATEST(0, 1 - (embedding <=> %s::{vtype})) AS sem_score
           FROM candidates
         )
         , ranked AS (
@@ -126,10 +137,10 @@ def search_mcp_hybrid_pg(
         v = _to_vector_literal(query_vec)
         if allowed_ids and len(allowed_ids) > 0:
             arr = _to_bigint_array_literal(allowed_ids)
-            sql = base.format(where_clause="WHERE id = ANY(%s::bigint[])")
+            sql = base.format(where_clause="WHERE id = ANY(%s::bigint[])", vtype=get_vector_type())
             args = (arr, v, int(N), v, float(alpha), float(alpha), float(theta), int(k))
         else:
-            sql = base.format(where_clause="")
+            sql = base.format(where_clause="", vtype=get_vector_type())
             args = (v, int(N), v, float(alpha), float(alpha), float(theta), int(k))
         rows = conn.exec_driver_sql(sql, args).mappings().all()
     return [dict(r) for r in rows]
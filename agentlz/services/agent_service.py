@@ -17,6 +17,8 @@ from agentlz.repositories import mcp_repository as mcp_repo
 from agentlz.repositories import document_repository as doc_repo
 from agentlz.repositories import evaluation_repository as eva_repo
 from agentlz.services.rag.rag_service import agent_chat_get_rag
+from agentlz.services.rag.retrieval_scope_service import bump_agent_scope_version
+from agentlz.services.rag.context_packer_service import invalidate_agent_context_budget
 from agentlz.repositories import record_repository as record_repo
 from langchain_core.prompts import ChatPromptTemplate
 from agentlz.core.model_factory import get_model, get_model_by_name
@@ -314,6 +316,7 @@ def create_agent_service(*, payload: Dict[str, Any], tenant_id: str, claims: Opt
                 },
                 table_name=_tables()["agent_document"],
             )
+        bump_agent_scope_version(int(row["id"]))
     r = _process_agent_meta(row)
     r.pop("api_name", None)
     r.pop("api_key", None)
@@ -400,6 +403,8 @@ def update_agent_basic_service(*, agent_id: int, payload: Dict[str, Any], tenant
     update_payload["updated_by_id"] = uid
     updated = repo.update_agent(agent_id=agent_id, payload=update_payload, tenant_id=str(
         row.get("tenant_id") or tenant_id), table_name=agent_table)
+    if "meta" in update_payload:
+        invalidate_agent_context_budget(agent_id)
     mcp_ids = payload.get("mcp_agent_ids")
     if isinstance(mcp_ids, list):
         current = mcp_rel_repo.list_agent_mcp(
@@ -441,6 +446,8 @@ def update_agent_basic_service(*, agent_id: int, payload: Dict[str, Any], tenant
         for did in to_del_d:
             doc_rel_repo.delete_agent_document_by_pair(
                 agent_id=agent_id, document_id=did, table_name=_tables()["agent_document"])
+        if to_add_d or to_del_d or (target_doc_ids & current_doc_ids & strategy_provided):
+            bump_agent_scope_version(agent_id)
     
     # 返回更新后的agent信息，处理meta字段反序列化
     if updated:
@@ -530,7 +537,11 @@ def delete_agent_service(*, agent_id: int, tenant_id: str, claims: Optional[Dict
         return False
     if not _check_agent_permission(row, uid, tenant_id):
         raise HTTPException(status_code=403, detail="没有权限")
-    return repo.delete_agent(agent_id=agent_id, tenant_id=str(row.get("tenant_id") or tenant_id), table_name=agent_table)
+    deleted = repo.delete_agent(agent_id=agent_id, tenant_id=str(row.get("tenant_id") or tenant_id), table_name=agent_table)
+    if deleted:
+        bump_agent_scope_version(agent_id)
+        invalidate_agent_context_budget(agent_id)
+    return deleted
 
 
 def _list_self_agents(*, page: int, per_page: int, sort: str, order: str, q: Optional[str], user_id: int, table_name: str) -> Tuple[List[Dict[str, Any]], int]:
@@ -1569,6 +1580,8 @@ def agent_chat_service(*, agent_id: int, message: str, record_id: int = -1, meta
                 "rag_time_ms": int(rag_time_ms),
                 "stream_mode": stream_mode,
                 "stream_decision_source": stream_decision_source,
+                # 查询改写决策（fast_path/cache/llm/rules_fallback）、推测执行与各阶段耗时
+                **(out.get("rag_metrics") or {}),
             },
             is_observation=bool(is_observation),
         )
@@ -166,16 +166,21 @@ class MQService:
             document_type = message.get('document_type')
             tenant_id = message.get('tenant_id')
             strategy = message.get('strategy', 0)
+            # 新消息一次携带全部策略（strategies），只下载与转换一次文档
+            strategies = message.get('strategies')
             
             if not all([doc_id, save_https, document_type,tenant_id]):
                 raise BizError("消息格式不完整，缺少必要字段")
                 
             # 3. 真正处理文档
-            logger.info(f"开始处理文档 {doc_id}，类型: {document_type}，策略: {strategy}")
+            logger.info(f"开始处理文档 {doc_id}，类型: {document_type}，策略: {strategies or strategy}")
             
             
             # 调用文档处理服务
-            process_document_from_cos_https(save_https, document_type, doc_id, tenant_id, strategy)
+            process_document_from_cos_https(
+                save_https, document_type, doc_id, tenant_id, strategy,
+                strategies=strategies if isinstance(strategies, list) else None,
+            )
             
             logger.info(f"文档 {doc_id} 处理完成")
             
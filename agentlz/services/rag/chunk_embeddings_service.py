@@ -6,22 +6,54 @@ from agentlz.core.logger import setup_logging
 
 封装对 `chunk_embeddings` 的增删改查业务逻辑，复用仓储层操作；
 当未显式提供向量时，基于内容文本自动生成嵌入向量。
+切片策略同时提供列表与流式（`iter_*` 生成器）两种形式，流式切片可直接接入分批向量化写库流水线。
 """
 
-from typing import Any, Dict, List, Optional, Sequence, Literal
+import functools
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Literal, Tuple
 
+import numpy as np
+
+from agentlz.config.settings import get_settings
+from agentlz.core.embedding_batcher import EmbeddingBatcher
 from agentlz.core.embedding_model_factory import get_hf_embeddings
+from agentlz.core.external_services import get_redis_binary_client
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.services.rag.ingest_pool_service import get_ingest_mode, iter_embedded_batches, iter_text_batches
+from agentlz.services.rag import vector_hot_tier_service as hot_tier
+from agentlz.services.rag.retrieval_scope_service import bump_document_scope_versions
 from agentlz.repositories.chunk_embeddings_repository import (
     create_chunk_embedding as _create,
+    bulk_create_chunk_embeddings as _bulk_create,
     get_chunk_embedding as _get,
     list_chunk_embeddings as _list,
     update_chunk_embedding as _update,
     delete_chunk_embedding as _delete,
     search_similar_chunks as _search_similar,
+    search_similar_chunks_multi as _search_similar_multi,
+    search_hybrid_chunks as _search_hybrid,
+)
+from agentlz.repositories.embedding_store_repository import (
+    get_embeddings_by_hashes as _store_get,
+    put_embeddings as _store_put,
 )
 
 
+logger = setup_logging(level="DEBUG", name="agentlz.chunk_embeddings", prefix="[分块嵌入]")
+
 _EMB = None
+_BATCHER: Optional[EmbeddingBatcher] = None
+_BATCHER_LOCK = threading.Lock()
+_QUERY_EMB_CACHE: Optional[TTLCache] = None
+_QUERY_EMB_CACHE_LOCK = threading.Lock()
+# Redis 层命中统计（进程内 LRU 的统计由 TTLCache 自带）
+_QUERY_EMB_REDIS_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "errors": 0}
 
 
 def _get_embedder():
@@ -42,9 +74,119 @@ def _get_embedder():
     return _EMB
 
 
+def _get_batcher() -> Optional[EmbeddingBatcher]:
+    """获取查询向量微批调度器；配置 `rag_embed_batcher_enabled` 关闭时返回 None"""
+    global _BATCHER
+    s = get_settings()
+    if not bool(getattr(s, "rag_embed_batcher_enabled", False)):
+        return None
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                emb = _get_embedder()
+                _BATCHER = EmbeddingBatcher(
+                    emb.embed_documents,
+                    max_batch_size=int(getattr(s, "rag_embed_batch_max_size", 32) or 32),
+                    max_wait_ms=float(getattr(s, "rag_embed_batch_max_wait_ms", 5.0) or 0.0),
+                )
+    return _BATCHER
+
+
+def _compute_query_vectors(texts: List[str]) -> List[List[float]]:
+    """对未命中缓存的查询文本做前向计算：启用微批时与并发请求合并，否则直接批量前向"""
+    batcher = _get_batcher()
+    if batcher is not None:
+        return batcher.embed_many(texts)
+    if len(texts) == 1:
+        return [list(_get_embedder().embed_query(texts[0]))]
+    return [list(v) for v in _get_embedder().embed_documents(texts)]
+
+
+def embedding_batcher_metrics() -> Dict[str, Any]:
+    """微批调度器指标（未启用时返回 enabled=False）"""
+    batcher = _BATCHER
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.metrics()}
+
+
+def _embedding_model_id() -> str:
+    """当前嵌入模型标识（模型名 + 输出维度包装），用作缓存键前缀"""
+    emb = _get_embedder()
+    base = getattr(emb, "base_embeddings", emb)
+    name = str(getattr(base, "model_name", "") or type(base).__name__)
+    # onnx 后端（含 int8 量化）输出与 torch 略有差异，按加载的模型文件区分缓存
+    onnx_file = ((getattr(base, "model_kwargs", None) or {}).get("model_kwargs") or {}).get("file_name")
+    if onnx_file:
+        name = f"{name}@{onnx_file}"
+    dim = getattr(emb, "target_dimension", None)
+    return f"{name}:{dim}" if dim else name
+
+
+def _normalize_query_text(text: str) -> str:
+    """查询文本归一化：NFKC 全半角统一 + 折叠空白"""
+    return " ".join(unicodedata.normalize("NFKC", str(text)).split())
+
+
+def _get_query_cache() -> TTLCache:
+    global _QUERY_EMB_CACHE
+    if _QUERY_EMB_CACHE is None:
+        with _QUERY_EMB_CACHE_LOCK:
+            if _QUERY_EMB_CACHE is None:
+                s = get_settings()
+                _QUERY_EMB_CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_query_emb_cache_size", 2048) or 2048),
+                    ttl=float(getattr(s, "rag_query_emb_cache_ttl", 3600) or 3600),
+                )
+    return _QUERY_EMB_CACHE
+
+
+def _query_redis_key(model_id: str, text: str) -> str:
+    digest = hashlib.sha1(f"{model_id}\n{text}".encode("utf-8")).hexdigest()
+    return f"rag:qemb:{digest}"
+
+
+def _query_redis_get(key: str) -> Optional[List[float]]:
+    """从 Redis 读取 float32 二进制向量；未启用或失败时返回 None"""
+    if not bool(getattr(get_settings(), "rag_query_emb_redis_enabled", False)):
+        return None
+    try:
+        raw = get_redis_binary_client().get(key)
+    except Exception:
+        _QUERY_EMB_REDIS_STATS["errors"] += 1
+        return None
+    if not raw:
+        _QUERY_EMB_REDIS_STATS["misses"] += 1
+        return None
+    _QUERY_EMB_REDIS_STATS["hits"] += 1
+    return np.frombuffer(raw, dtype=np.float32).astype(float).tolist()
+
+
+def _query_redis_set(key: str, vec: Sequence[float]) -> None:
+    """以 float32 二进制写入 Redis（每维 4 字节）"""
+    s = get_settings()
+    if not bool(getattr(s, "rag_query_emb_redis_enabled", False)):
+        return
+    try:
+        ttl = int(getattr(s, "rag_query_emb_cache_ttl", 3600) or 3600)
+        get_redis_binary_client().set(key, np.asarray(vec, dtype=np.float32).tobytes(), ex=ttl)
+    except Exception:
+        _QUERY_EMB_REDIS_STATS["errors"] += 1
+
+
+def query_embedding_cache_stats() -> Dict[str, Any]:
+    """查询向量缓存统计：进程内 LRU（size/hits/misses/hit_rate）与 Redis 层计数"""
+    out = _get_query_cache().stats()
+    out["redis"] = dict(_QUERY_EMB_REDIS_STATS)
+    return out
+
+
 def embed_message_service(*, message: str) -> Sequence[float]:
     """将输入消息转换为嵌入向量
 
+    行为:
+        - 按 (模型, 归一化文本) 查进程内 LRU 缓存，其次查 Redis（可选，float32 二进制），均未命中才做前向计算
+
     参数:
         - message: 原始文本消息
 
@@ -53,7 +195,61 @@ def embed_message_service(*, message: str) -> Sequence[float]:
     """
     if not isinstance(message, str) or message.strip() == "":
        return []
-    return _get_embedder().embed_query(message)
+    text = _normalize_query_text(message)
+    model_id = _embedding_model_id()
+    cache = _get_query_cache()
+    key = (model_id, text)
+    vec = cache.get(key)
+    if vec is not None:
+        return list(vec)
+    rkey = _query_redis_key(model_id, text)
+    vec = _query_redis_get(rkey)
+    if vec is None:
+        vec = _compute_query_vectors([text])[0]
+        _query_redis_set(rkey, vec)
+    cache.set(key, vec)
+    return list(vec)
+
+
+def embed_messages_service(*, messages: Sequence[str]) -> List[List[float]]:
+    """批量将多条查询消息转换为嵌入向量
+
+    行为:
+        - 逐条查询向量缓存；所有未命中的文本合并为一次 `embed_documents` 前向后回填缓存
+
+    参数:
+        - messages: 查询消息列表（空白消息会被跳过）
+
+    返回值:
+        - 与非空消息一一对应的向量列表
+    """
+    texts = [_normalize_query_text(m) for m in (messages or []) if isinstance(m, str) and m.strip() != ""]
+    if not texts:
+        return []
+    model_id = _embedding_model_id()
+    cache = _get_query_cache()
+    out: List[Optional[List[float]]] = [None] * len(texts)
+    missing: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        vec = cache.get((model_id, text))
+        if vec is None:
+            vec = _query_redis_get(_query_redis_key(model_id, text))
+            if vec is not None:
+                cache.set((model_id, text), vec)
+        if vec is not None:
+            out[i] = list(vec)
+        else:
+            missing.setdefault(text, []).append(i)
+    if missing:
+        pending = list(missing.keys())
+        vectors = _compute_query_vectors(pending)
+        for text, vec in zip(pending, vectors):
+            vec = list(vec)
+            cache.set((model_id, text), vec)
+            _query_redis_set(_query_redis_key(model_id, text), vec)
+            for i in missing[text]:
+                out[i] = list(vec)
+    return [v for v in out if v is not None]
 
 
 def create_chunk_embedding_service(*, tenant_id: str, chunk_id: str, doc_id: str, content: Optional[str] = None, embedding: Optional[Sequence[float]] = None, chunk_index: int = 0, length: int = 0, strategy: str = "0") -> Dict[str, Any]:
@@ -61,7 +257,8 @@ def create_chunk_embedding_service(*, tenant_id: str, chunk_id: str, doc_id: str
 
     行为:
         - 若显式提供 `embedding` 则直接写入；
-        - 否则使用 `content` 文本生成向量后写入（需保证模型维度与表列维度一致）。
+        - 否则使用 `content` 文本生成向量后写入（需保证模型维度与表列维度一致）；
+          相同内容已计算过时直接复用内容哈希向量库中的向量。
 
     参数:
         - tenant_id: 租户标识，用于行级安全隔离（RLS）。
@@ -85,8 +282,273 @@ def create_chunk_embedding_service(*, tenant_id: str, chunk_id: str, doc_id: str
     else:
         if not content:
             raise ValueError("content_or_embedding_required")
-        vec = _get_embedder().embed_query(str(content))
-    return _create(tenant_id=tenant_id, chunk_id=chunk_id, doc_id=doc_id, embedding=vec, content=content, chunk_index=chunk_index, length=length, strategy=strategy)
+        vectors, _ = embed_texts_dedup_service(texts=[str(content)])
+        vec = vectors[0]
+    row = _create(tenant_id=tenant_id, chunk_id=chunk_id, doc_id=doc_id, embedding=vec, content=content, chunk_index=chunk_index, length=length, strategy=strategy)
+    if row:
+        hot_tier.on_chunks_written(tenant_id=tenant_id, rows=[{**row, "embedding": vec}])
+        bump_document_scope_versions(doc_id)
+    return row
+
+
+def embed_texts_service(*, texts: Sequence[str]) -> List[List[float]]:
+    """批量将文本转换为嵌入向量（单次 `embed_documents` 前向）
+
+    参数:
+        - texts: 文本列表
+
+    返回值:
+        - 与输入一一对应的向量列表；输入为空时返回空列表
+    """
+    items = [str(t or "") for t in (texts or [])]
+    if not items:
+        return []
+    return [list(v) for v in _get_embedder().embed_documents(items)]
+
+
+def _vector_to_list(vec: Any) -> List[float]:
+    """仓储层读取的向量为 numpy float32 数组；对外返回（JSON）或缓存前转为 float 列表"""
+    return vec.tolist() if isinstance(vec, np.ndarray) else list(vec)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+def embed_texts_dedup_service(*, texts: Sequence[str]) -> Tuple[List[List[float]], Dict[str, int]]:
+    """批量向量化（先查内容哈希向量库，仅对未命中的文本调用模型）
+
+    参数:
+        - texts: 文本列表
+
+    返回值:
+        - (与输入一一对应的向量列表, 统计 {"lookups", "hits", "computed"})
+
+    行为:
+        - 以 sha256(文本) + 模型标识为键，单次批量查询 `embedding_store`；
+        - 同批内重复文本只计算一次，新计算的向量回写向量库；
+        - 向量库不可用或 `rag_embedding_store_enabled=False` 时退化为直接计算。
+    """
+    items = [str(t or "") for t in (texts or [])]
+    stats = {"lookups": len(items), "hits": 0, "computed": 0}
+    if not items:
+        return [], stats
+    if not bool(getattr(get_settings(), "rag_embedding_store_enabled", True)):
+        stats["computed"] = len(items)
+        return embed_texts_service(texts=items), stats
+
+    model_id = _embedding_model_id()
+    hashes = [_content_hash(t) for t in items]
+    try:
+        found = _store_get(model_id=model_id, hashes=hashes)
+    except Exception as e:
+        logger.warning(f"查询内容哈希向量库失败，改为直接计算: {e}")
+        found = {}
+    missing: Dict[str, str] = {}
+    for h, t in zip(hashes, items):
+        if h not in found and h not in missing:
+            missing[h] = t
+    if missing:
+        computed = dict(zip(missing.keys(), embed_texts_service(texts=list(missing.values()))))
+        try:
+            _store_put(model_id=model_id, items=list(computed.items()))
+        except Exception as e:
+            logger.warning(f"写入内容哈希向量库失败: {e}")
+        found.update(computed)
+    stats["computed"] = len(missing)
+    stats["hits"] = len(items) - len(missing)
+    return [_vector_to_list(found[h]) for h in hashes], stats
+
+
+def _iter_vector_batches(texts: Iterable[str], size: int):
+    """按批产出 (偏移, 批文本, 批向量, 去重统计)；process 模式下由入库进程池并行计算并按序流式返回
+
+    texts 可为生成器：按需拉取成批，inline 模式只持有当前一批，process 模式最多持有在途批次。
+    """
+    if get_ingest_mode() == "process":
+        for offset, batch, vectors, dedup in iter_embedded_batches(texts, batch_size=size):
+            yield offset, batch, vectors, dedup
+        return
+    for offset, batch in iter_text_batches(texts, size):
+        vectors, dedup = embed_texts_dedup_service(texts=batch)
+        yield offset, batch, vectors, dedup
+
+
+def make_chunk_id(doc_id: str, strategy: int, index: int) -> str:
+    """分块主键：策略 0 沿用 `{doc_id}_{index}`，其他策略为 `{doc_id}_s{strategy}_{index}`
+
+    chunk_id 为 `chunk_embeddings` 主键，同一文档的多个切割策略必须使用不同的 chunk_id，
+    否则后写入策略的分块会被 `ON CONFLICT DO NOTHING` 丢弃。
+    """
+    s = int(strategy or 0)
+    return f"{doc_id}_{int(index)}" if s == 0 else f"{doc_id}_s{s}_{int(index)}"
+
+
+def _ingest_chunk_stream(
+    *,
+    tenant_id: str,
+    doc_id: str,
+    items: Iterable[Tuple[int, int, str]],
+    batch_size: Optional[int],
+    publish_first_batch: bool,
+) -> Dict[str, Any]:
+    """向量化写库流水线：items 为 (策略, 分块序号, 文本) 流，按批拉取、向量化并写库，返回统计信息"""
+    size = int(batch_size or getattr(get_settings(), "rag_ingest_batch_size", 64) or 64)
+    size = max(1, size)
+    stats: Dict[str, Any] = {
+        "chunks": 0,
+        "inserted": 0,
+        "batches": 0,
+        "chunk_ms": 0.0,
+        "embed_ms": 0.0,
+        "write_ms": 0.0,
+        "first_batch_ms": None,
+        "dedup_hits": 0,
+        "embedded": 0,
+    }
+    # 已拉取、尚未写库的分块的 (策略, 序号)；与产出的批按顺序一一对应，长度受在途批次数限制
+    pending_meta: Deque[Tuple[int, int]] = deque()
+
+    def _pull() -> Iterator[str]:
+        # 拉取分块并计时（流式切片的耗时发生在这里）
+        it = iter(items or ())
+        while True:
+            t = time.perf_counter()
+            try:
+                strategy, index, text = next(it)
+            except StopIteration:
+                return
+            finally:
+                stats["chunk_ms"] += (time.perf_counter() - t) * 1000.0
+            stats["chunks"] += 1
+            pending_meta.append((int(strategy or 0), int(index)))
+            yield str(text)
+
+    t_start = t0 = time.perf_counter()
+    chunk_ms0 = 0.0
+    for _, batch, vectors, dedup in _iter_vector_batches(_pull(), size):
+        stats["dedup_hits"] += int(dedup.get("hits") or 0)
+        stats["embedded"] += int(dedup.get("computed") or 0)
+        t1 = time.perf_counter()
+        rows = []
+        for text, vec in zip(batch, vectors):
+            strategy, index = pending_meta.popleft()
+            rows.append(
+                {
+                    "chunk_id": make_chunk_id(doc_id, strategy, index),
+                    "doc_id": doc_id,
+                    "embedding": vec,
+                    "content": text,
+                    "chunk_index": index,
+                    "length": len(text),
+                    "strategy": strategy,
+                }
+            )
+        stats["inserted"] += _bulk_create(tenant_id=tenant_id, rows=rows)
+        hot_tier.on_chunks_written(tenant_id=tenant_id, rows=rows)
+        if stats["batches"] == 0 and publish_first_batch:
+            bump_document_scope_versions(doc_id)
+        t2 = time.perf_counter()
+        stats["batches"] += 1
+        if stats["first_batch_ms"] is None:
+            stats["first_batch_ms"] = round((t2 - t_start) * 1000.0, 2)
+        # process 模式下 embed_ms 为写库方等待向量的时间（与写库重叠的计算不计入）；切片耗时单独计入 chunk_ms
+        stats["embed_ms"] += (t1 - t0) * 1000.0 - (stats["chunk_ms"] - chunk_ms0)
+        stats["write_ms"] += (t2 - t1) * 1000.0
+        t0 = time.perf_counter()
+        chunk_ms0 = stats["chunk_ms"]
+    stats["dedup_hit_rate"] = round(stats["dedup_hits"] / stats["chunks"], 4) if stats["chunks"] else 0.0
+    stats["chunk_ms"] = round(stats["chunk_ms"], 2)
+    stats["embed_ms"] = round(max(0.0, stats["embed_ms"]), 2)
+    stats["write_ms"] = round(stats["write_ms"], 2)
+    return stats
+
+
+def bulk_create_chunk_embeddings_service(
+    *,
+    tenant_id: str,
+    doc_id: str,
+    chunks: Iterable[str],
+    strategy: int = 0,
+    batch_size: Optional[int] = None,
+    start_index: int = 1,
+    publish_first_batch: bool = False,
+) -> Dict[str, Any]:
+    """批量向量化并写入文档分块
+
+    行为:
+        - 按 `batch_size` 分批，每批先批量查询内容哈希向量库，仅未命中的分块调用一次 `embed_documents`；
+        - `rag_ingest_mode=process` 时各批在入库进程池中并行向量化，按顺序逐批写库；
+        - 每批在同一事务内写入 `chunk_embeddings` 与 `chunk_bm25`（多行 INSERT）；
+        - chunks 可为生成器（流式切片）：按批拉取，切片、向量化与写库交替进行，内存只与批大小/在途批次数有关；
+        - chunk_id 由 `make_chunk_id` 生成，index 从 `start_index` 开始递增。
+
+    参数:
+        - tenant_id: 租户标识（RLS）
+        - doc_id: 文档ID
+        - chunks: 分块文本列表或生成器
+        - strategy: 切割策略编号
+        - batch_size: 每批分块数量；为空时读取配置 `rag_ingest_batch_size`
+        - start_index: 首个分块的序号
+        - publish_first_batch: 首批写入后即递增关联 Agent 的检索范围版本，使已写入的分块在整篇完成前可被检索
+
+    返回值:
+        - 统计信息：chunks/inserted/batches/chunk_ms/embed_ms/write_ms/first_batch_ms（首批写入完成耗时），
+          以及内容哈希去重 dedup_hits/embedded（实际调用模型的条数）/dedup_hit_rate
+    """
+    s = int(strategy or 0)
+    items = ((s, start_index + i, text) for i, text in enumerate(chunks or ()))
+    return _ingest_chunk_stream(
+        tenant_id=tenant_id,
+        doc_id=doc_id,
+        items=items,
+        batch_size=batch_size,
+        publish_first_batch=publish_first_batch,
+    )
+
+
+def bulk_create_multi_strategy_chunk_embeddings_service(
+    *,
+    tenant_id: str,
+    doc_id: str,
+    streams: Sequence[Tuple[int, Iterable[str]]],
+    batch_size: Optional[int] = None,
+    start_index: int = 1,
+    publish_first_batch: bool = False,
+) -> Dict[str, Any]:
+    """同一文档的多个切割策略共用一条向量化写库流水线
+
+    行为:
+        - 各策略的分块流按顺序接续，拼成连续的批次：策略交界处的分块与下一策略同批向量化，不产生零散的小批；
+        - 同批/跨策略的重复分块由内容哈希去重，只计算一次向量；
+        - 每个策略的分块序号各自从 `start_index` 开始，chunk_id 见 `make_chunk_id`。
+
+    参数:
+        - streams: [(策略编号, 分块文本列表或生成器), ...]
+        - 其余参数同 `bulk_create_chunk_embeddings_service`
+
+    返回值:
+        - 统计信息同 `bulk_create_chunk_embeddings_service`，另含 per_strategy（{策略: 分块数}）
+    """
+    per_strategy: Dict[int, int] = {}
+
+    def _items() -> Iterator[Tuple[int, int, str]]:
+        for strategy, chunks in streams:
+            s = int(strategy or 0)
+            per_strategy.setdefault(s, 0)
+            for i, text in enumerate(chunks or ()):
+                per_strategy[s] += 1
+                yield s, start_index + i, text
+
+    stats = _ingest_chunk_stream(
+        tenant_id=tenant_id,
+        doc_id=doc_id,
+        items=_items(),
+        batch_size=batch_size,
+        publish_first_batch=publish_first_batch,
+    )
+    stats["per_strategy"] = per_strategy
+    return stats
 
 
 def get_chunk_embedding_service(*, tenant_id: str, chunk_id: str, include_vector: bool = False) -> Optional[Dict[str, Any]]:
@@ -100,7 +562,10 @@ def get_chunk_embedding_service(*, tenant_id: str, chunk_id: str, include_vector
     返回值:
         - 记录字典或 None；当 `include_vector=True` 时包含 `embedding` 字段。
     """
-    return _get(tenant_id=tenant_id, chunk_id=chunk_id, include_vector=include_vector)
+    row = _get(tenant_id=tenant_id, chunk_id=chunk_id, include_vector=include_vector)
+    if row and row.get("embedding") is not None:
+        row["embedding"] = _vector_to_list(row["embedding"])
+    return row
 
  
 def list_chunk_embeddings_service(
@@ -150,7 +615,7 @@ def list_chunk_embeddings_service(
         }
         # 当需要返回向量且底层已返回 embedding，则加入
         if include_vector and r.get("embedding") is not None:
-            item["embedding"] = r.get("embedding")
+            item["embedding"] = _vector_to_list(r.get("embedding"))
         # 获取或创建当前文档的聚合桶
         doc_bucket = grouped.get(did)
         if doc_bucket is None:
@@ -193,7 +658,14 @@ def update_chunk_embedding_service(*, tenant_id: str, chunk_id: str, content: Op
     vec: Optional[Sequence[float]] = embedding
     if vec is None and content is not None:
         vec = _get_embedder().embed_query(str(content))
-    return _update(tenant_id=tenant_id, chunk_id=chunk_id, embedding=vec, content=content)
+    row = _update(tenant_id=tenant_id, chunk_id=chunk_id, embedding=vec, content=content)
+    if row and vec is not None:
+        hot_tier.on_chunks_written(tenant_id=tenant_id, rows=[{**row, "embedding": vec}])
+    elif row and content is not None:
+        hot_tier.on_tenant_changed(tenant_id=tenant_id)
+    if row and (vec is not None or content is not None):
+        bump_document_scope_versions(str(row.get("doc_id") or ""))
+    return row
 
 
 def delete_chunk_embedding_service(*, tenant_id: str, chunk_id: str) -> bool:
@@ -206,7 +678,14 @@ def delete_chunk_embedding_service(*, tenant_id: str, chunk_id: str) -> bool:
     返回值:
         - 删除成功返回 True；否则返回 False。
     """
-    return _delete(tenant_id=tenant_id, chunk_id=chunk_id)
+    existing = _get(tenant_id=tenant_id, chunk_id=chunk_id)
+    deleted = _delete(tenant_id=tenant_id, chunk_id=chunk_id)
+    if deleted:
+        hot_tier.on_chunks_deleted(tenant_id=tenant_id, chunk_ids=[chunk_id])
+        if existing:
+            # 检索结果缓存按 Agent 检索范围版本失效
+            bump_document_scope_versions(str(existing.get("doc_id") or ""))
+    return deleted
 
 
 def search_similar_chunks_service(
@@ -218,7 +697,8 @@ def search_similar_chunks_service(
     doc_ids: Optional[Sequence[str]] = None,
     distance_metric: Literal["euclidean", "cosine"] = "euclidean",
     limit: int = 10,
-    include_vector: bool = False
+    include_vector: bool = False,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
 ) -> List[Dict[str, Any]]:
     """向量相似度搜索服务
     
@@ -226,6 +706,7 @@ def search_similar_chunks_service(
     支持欧几里得距离和余弦相似度两种度量方式。
     
     行为:
+        - 启用向量热层（`rag_hot_tier_enabled`）且租户索引已加载时在进程内 hnswlib 检索，否则回退 PG
         - 调用repository层进行向量相似度搜索
         - 支持按文档ID过滤结果
         - 返回按相似度排序的结果列表
@@ -233,17 +714,18 @@ def search_similar_chunks_service(
     参数:
         - tenant_id: 租户标识，用于RLS隔离
         - message: 查询消息，将自动向量化
-        - messages: 可选的消息列表，将对每条消息分别检索并合并去重后返回全局 Top-K
+        - messages: 可选的消息列表，批量向量化后单条 SQL 检索，按 chunk 取最小距离后返回全局 Top-K
         - doc_id: 可选的文档ID过滤条件，为空则搜索所有文档
         - distance_metric: 距离度量方式，可选"euclidean"或"cosine"
         - limit: 返回结果数量上限
         - include_vector: 是否返回向量字段
+        - doc_strategies: 可选 {doc_id: [strategy]}，只检索这些文档指定切割策略的分块
     
     返回值:
         - 相似文本块列表，按相似度升序排列（距离越小越相似）
         - 每个结果包含: chunk_id, doc_id, content, created_at, similarity_score
         - 当include_vector=True时额外包含embedding向量
-        - 当传入 `messages` 时，将对每条消息分别检索并合并去重后返回全局 Top-K
+        - 当传入 `messages` 时，批量向量化并单条 SQL 检索，按 chunk 去重后返回全局 Top-K
     
     异常:
         - ValueError: 当distance_metric不是"euclidean"或"cosine"时
@@ -262,34 +744,49 @@ def search_similar_chunks_service(
         ...     print(f"内容: {result['content'][:100]}...")
     """
     if messages and len(messages) > 0:
-        merged: List[Dict[str, Any]] = []
-        best_by_chunk: Dict[str, Dict[str, Any]] = {}
-        for msg in messages:
-            if not isinstance(msg, str) or msg.strip() == "":
-                continue
-            vec = embed_message_service(message=msg)
-            rows = _search_similar(
+        # 一次前向得到全部查询向量，一条 SQL（LATERAL）完成多查询检索与按 chunk 取最小距离
+        vecs = embed_messages_service(messages=messages)
+        if not vecs:
+            return []
+        if not include_vector:
+            hot = hot_tier.search_hot_tier(
                 tenant_id=tenant_id,
-                embedding=vec,
+                embeddings=vecs,
                 doc_id=doc_id,
                 doc_ids=doc_ids,
                 distance_metric=distance_metric,
                 limit=limit,
-                include_vector=include_vector,
+                doc_strategies=doc_strategies,
             )
-            for r in rows:
-                cid = str(r.get("chunk_id") or "")
-                score = float(r.get("similarity_score") or 1e9)
-                prev = best_by_chunk.get(cid)
-                if prev is None or float(prev.get("similarity_score") or 1e9) > score:
-                    best_by_chunk[cid] = r
-        if best_by_chunk:
-            merged = list(best_by_chunk.values())
-            merged.sort(key=lambda x: float(x.get("similarity_score") or 1e9))
-            return merged[:limit]
-        return []
+            if hot is not None:
+                return hot
+        return _search_similar_multi(
+            tenant_id=tenant_id,
+            embeddings=vecs,
+            doc_id=doc_id,
+            doc_ids=doc_ids,
+            distance_metric=distance_metric,
+            limit=limit,
+            include_vector=include_vector,
+            doc_strategies=doc_strategies,
+        )
     
     vec = embed_message_service(message=message)
+    if not include_vector:
+        # 热层命中时不访问 PG；未命中（租户索引未就绪/已失效）时安排后台构建并回退 PG
+        hot = hot_tier.search_hot_tier(
+            tenant_id=tenant_id,
+            embeddings=[vec],
+            doc_id=doc_id,
+            doc_ids=doc_ids,
+            distance_metric=distance_metric,
+            limit=limit,
+            doc_strategies=doc_strategies,
+        )
+        if hot is not None:
+            for item in hot:
+                item.pop("query_index", None)
+            return hot
     return _search_similar(
         tenant_id=tenant_id,
         embedding=vec,
@@ -298,6 +795,144 @@ def search_similar_chunks_service(
         distance_metric=distance_metric,
         limit=limit,
         include_vector=include_vector,
+        doc_strategies=doc_strategies,
+    )
+
+
+def search_hybrid_chunks_service(
+    *,
+    tenant_id: str,
+    message: str,
+    messages: Optional[Sequence[str]] = None,
+    doc_ids: Sequence[str],
+    tsquery: Optional[str] = None,
+    doc_boosts: Optional[Dict[str, float]] = None,
+    distance_metric: Literal["euclidean", "cosine"] = "euclidean",
+    vector_top_k: int = 50,
+    bm25_top_k: int = 50,
+    limit: int = 20,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+    keyword_hits: Optional[Sequence[Tuple[str, float]]] = None,
+) -> List[Dict[str, Any]]:
+    """混合检索服务：查询向量化后单条 SQL 完成向量 + 全文召回与 RRF 融合
+
+    参数:
+        - tenant_id: 租户标识
+        - message / messages: 查询消息；messages 非空时批量向量化全部短句，否则使用 message
+        - doc_ids: 检索范围
+        - tsquery: 全文检索表达式，为空时只走向量链路
+        - doc_boosts: {doc_id: 元数据提升值}
+        - doc_strategies: 可选 {doc_id: [strategy]}，按 (doc_id, strategy) 限定切割策略
+        - keyword_hits: 可选 [(chunk_id, score)]，外部关键词后端的召回结果（替代 tsquery）
+        - distance_metric / vector_top_k / bm25_top_k / limit: 透传到 repository
+
+    返回值:
+        - 按 fused_score 降序的结果列表（字段见 `search_hybrid_chunks`）
+    """
+    if messages and len(messages) > 0:
+        vecs = embed_messages_service(messages=messages)
+    else:
+        vecs = [embed_message_service(message=message)]
+    if not vecs:
+        return []
+    return _search_hybrid(
+        tenant_id=tenant_id,
+        embeddings=vecs,
+        doc_ids=doc_ids,
+        tsquery=tsquery,
+        doc_boosts=doc_boosts,
+        distance_metric=distance_metric,
+        vector_top_k=vector_top_k,
+        bm25_top_k=bm25_top_k,
+        limit=limit,
+        doc_strategies=doc_strategies,
+        keyword_hits=keyword_hits,
+    )
+
+
+_BASIC_SPLIT_RE = re.compile(r"([。！？, .\n]+|#{1,6}\s+)")
+_SENTENCE_SPLIT_RE = re.compile(r"([。！？；;!?]\s*|\n+|#{1,6}\s+)")
+_PARAGRAPH_RE = re.compile(r"\n\n+")
+_HEADING_H3_RE = re.compile(r"^#{1,3}\s+.*$", flags=re.MULTILINE)
+_LINE_BREAK_RE = re.compile(r"\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_PUNCT_DENSITY_RE = re.compile(r"[，。；；、!?]")
+_ANCHOR_RE = re.compile(r"\[[^\]]+\]\([^\)]+\)|参见|引用|see also|参考", flags=re.IGNORECASE)
+_LLM_FALLBACK_BLOCK_RE = re.compile(r"(\n{2,}|^#{1,6}\s+.*$)", flags=re.MULTILINE)
+_MARKDOWN_SEPARATORS = [
+    "\n\n",      # 段落
+    "\n",        # 换行
+    "#",         # Markdown标题
+    "##",        # Markdown二级标题
+    "###",       # Markdown三级标题
+    "####",      # Markdown四级标题
+    "。",        # 中文句号
+    "！",        # 中文感叹号
+    "？",        # 中文问号
+    "，",        # 中文逗号
+    " ",         # 空格
+    ""           # 字符级别
+]
+
+
+def _iter_split(content: str, pattern: "re.Pattern[str]") -> Iterator[str]:
+    """惰性版 `pattern.split(content)`（不含捕获组）：逐段产出，不复制整篇文本"""
+    pos = 0
+    for m in pattern.finditer(content):
+        yield content[pos:m.start()]
+        pos = m.end()
+    yield content[pos:]
+
+
+def _iter_split_pair_spans(content: str, pattern: "re.Pattern[str]") -> Iterator[Tuple[int, int]]:
+    """同 `_iter_split_pairs`，但只产出每句在原文中的 [start, end) 下标（各句首尾相接覆盖全文）"""
+    pos = 0
+    for m in pattern.finditer(content):
+        end = m.end()
+        yield pos, end
+        pos = end
+    yield pos, len(content)
+
+
+def _tail_start(start: int, end: int, k: int) -> int:
+    """`content[start:end][-k:]` 在原文中的起始下标（与切片语义一致，含 k=0 时取整段）"""
+    return start + slice(-k, None).indices(end - start)[0]
+
+
+def _iter_split_pairs(content: str, pattern: "re.Pattern[str]") -> Iterator[str]:
+    """惰性版「`pattern.split` 后将文本与其后的分隔符两两合并」：逐句产出（文本 + 分隔符），末段可能为空串"""
+    pos = 0
+    for m in pattern.finditer(content):
+        # 文本与其后的分隔符在原文中相邻，直接按下标切一次
+        end = m.end()
+        yield content[pos:end]
+        pos = end
+    yield content[pos:]
+
+
+def _is_blank(content: Any) -> bool:
+    """非字符串或全空白（等价于 `not content.strip()`，但不复制整篇文本）"""
+    return not isinstance(content, str) or not content or content.isspace()
+
+
+def _iter_lines(content: str) -> Iterator[str]:
+    """惰性版 `content.splitlines()`"""
+    pos = 0
+    for m in _LINE_BREAK_RE.finditer(content):
+        yield content[pos:m.start()]
+        pos = m.end()
+    if pos < len(content):
+        yield content[pos:]
+
+
+@functools.lru_cache(maxsize=32)
+def _markdown_splitter(chunk_size: int, chunk_overlap: int):
+    """按 (chunk_size, chunk_overlap) 缓存 RecursiveCharacterTextSplitter（无状态，可复用）；LangChain 不可用时抛出 ImportError"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=list(_MARKDOWN_SEPARATORS),
     )
 
 
@@ -318,33 +953,9 @@ def split_markdown_into_chunks(content: str, chunk_size: int = 500, chunk_overla
         List[str]: 文本块列表
     """
       
-    try:      
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-            
-        # 尝试新版本的参数格式
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=[
-                "\n\n",      # 段落
-                "\n",        # 换行
-                "#",         # Markdown标题
-                "##",        # Markdown二级标题
-                "###",       # Markdown三级标题
-                "####",      # Markdown四级标题
-                "。",        # 中文句号
-                "！",        # 中文感叹号
-                "？",        # 中文问号
-                "，",        # 中文逗号
-                " ",         # 空格
-                ""           # 字符级别
-            ]
-        )
-    
-        # 直接使用RecursiveCharacterTextSplitter切割
-        chunks = text_splitter.split_text(content)
-        return chunks
-            
+    try:
+        # 直接使用RecursiveCharacterTextSplitter切割（按参数缓存切分器实例）
+        return _markdown_splitter(int(chunk_size), int(chunk_overlap)).split_text(content)
     except ImportError as e:
         # 如果LangChain完全不可用，使用基础的中文切割
         print(f"LangChain导入失败: {e}，使用备用切割方案")
@@ -352,47 +963,46 @@ def split_markdown_into_chunks(content: str, chunk_size: int = 500, chunk_overla
    
 
 def basic_chinese_text_split(content: str, max_size: int = 500, overlap: int = 50) -> List[str]:
-    """基础中文文本切割（备用方案）"""
-    import re
-    
+    """基础中文文本切割（备用方案）；实现见 `iter_basic_chinese_text_split`"""
+    return list(iter_basic_chinese_text_split(content, max_size=max_size, overlap=overlap))
+
+
+def iter_basic_chinese_text_split(content: str, max_size: int = 500, overlap: int = 50) -> Iterator[str]:
+    """基础中文文本切割（流式）：按句子结束符与 Markdown 标题逐句累积，块满即产出
+
+    句子与分隔符在原文中首尾相接，当前块始终是原文的连续区间 content[cs:ce]：
+    累积与重叠只移动下标，产出时切片一次，总耗时与文本长度成线性。
+    """
+    cs = ce = 0
+
     # 按中文句子结束符和Markdown结构分割
-    sentences = re.split(r'([。！？, .\n]+|#{1,6}\s+)', content)
-    
-    chunks = []
-    current_chunk = ""
-    
-    for i in range(0, len(sentences), 2):
-        if i < len(sentences):
-            sentence = sentences[i]
-            if i + 1 < len(sentences) and sentences[i + 1]:
-                sentence += sentences[i + 1]
-            
-            if len(current_chunk) + len(sentence) <= max_size:
-                current_chunk += sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    # 添加重叠部分
-                    overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
-                    current_chunk = overlap_text + sentence
-                else:
-                    # 如果单句就超过max_size，需要进一步切割
-                    if len(sentence) > max_size:
-                        # 按字符切割长句
-                        for j in range(0, len(sentence), max_size - overlap):
-                            chunk_part = sentence[j:j + max_size]
-                            if j > 0:  # 添加重叠
-                                chunk_part = sentence[max(0, j - overlap):j + max_size]
-                            chunks.append(chunk_part.strip())
-                        current_chunk = ""
-                    else:
-                        current_chunk = sentence
-    
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    # 过滤空块
-    return [chunk for chunk in chunks if chunk.strip()]
+    for start, end in _iter_split_pair_spans(content, _BASIC_SPLIT_RE):
+        cur_len = ce - cs
+        sent_len = end - start
+        if cur_len + sent_len <= max_size:
+            ce = end
+        elif cur_len:
+            piece = content[cs:ce].strip()
+            if piece:
+                yield piece
+            # 添加重叠部分：保留当前块末尾 overlap 个字符，接上当前句
+            if cur_len > overlap:
+                cs = _tail_start(cs, ce, overlap)
+            ce = end
+        elif sent_len > max_size:
+            # 单句就超过max_size：按字符切割长句（相邻片段带重叠）
+            for j in range(0, sent_len, max_size - overlap):
+                a = j if j == 0 else max(0, j - overlap)
+                piece = content[start + min(a, sent_len): start + min(j + max_size, sent_len)].strip()
+                if piece:
+                    yield piece
+            cs = ce = end
+        else:
+            cs, ce = start, end
+
+    piece = content[cs:ce].strip()
+    if piece:
+        yield piece
 
 
 def chunk_fixed_length_boundary(content: str, target_length: int = 600, overlap: int = 80) -> List[str]:
@@ -411,74 +1021,72 @@ def chunk_fixed_length_boundary(content: str, target_length: int = 600, overlap:
 
     说明:
         - 仅依赖正则与中文标点；适合作为默认安全策略。
+        - 实现见 `iter_fixed_length_boundary`（流式产出）。
     """
-    import re
+    return list(iter_fixed_length_boundary(content, target_length=target_length, overlap=overlap))
 
+
+def iter_fixed_length_boundary(content: str, target_length: int = 600, overlap: int = 80) -> Iterator[str]:
+    """固定长度 + 边界感知切片（流式）：逐段落、逐句推进，块满即产出，只持有当前缓冲区"""
     # 参数校验
-    if not isinstance(content, str) or not content.strip():
-        return []
+    if _is_blank(content):
+        return
 
-    # 先按段落粗分（双换行优先）
-    # 这一步是为了快速隔离大的语义块，避免一开始就陷入细节
-    paragraphs = re.split(r"\n\n+", content)
-    chunks: List[str] = []
     buf = ""
+    # 最近一次强制切出的片段（用于构造下一个缓冲区的重叠）
+    last_piece = ""
 
-    def flush_buf():
-        """将当前缓冲区内容作为分块输出，并保留重叠部分"""
-        nonlocal buf
-        if buf.strip():
-            chunks.append(buf.strip())
-            # 重叠片段（避免跨块信息丢失）
-            # 取缓冲区末尾的 overlap 长度作为下一个块的起始
-            ov = buf[-overlap:] if len(buf) > overlap else buf
-            buf = ov
-
-    for para in paragraphs:
-        if not para.strip():
+    # 先按段落粗分（双换行优先）
+    # 这一步是为了快速隔离大的语义块，避免一开始就陷入细节
+    for para in _iter_split(content, _PARAGRAPH_RE):
+        if _is_blank(para):
             continue
-        # 二次按句子边界分割（保留分隔符）
-        # 使用正则表达式捕获组 () 保留分隔符，方便后续重建句子
-        parts = re.split(r"([。！？；;!?]\s*|\n+|#{1,6}\s+)", para)
-        # 将句子和分隔符合并
-        sentences: List[str] = []
-        for i in range(0, len(parts), 2):
-            s = parts[i] or ""
-            if i + 1 < len(parts) and parts[i + 1]:
-                s += parts[i + 1]
-            if s:
-                sentences.append(s)
-
-        for s in sentences:
-            # 如果加上当前句不超过目标长度，则加入缓冲区
+        # 二次按句子边界分割（保留分隔符），句子与分隔符合并
+        for s in _iter_split_pairs(para, _SENTENCE_SPLIT_RE):
+            if not s:
+                continue
+            # 如果加上当前句不超过目标长度，则加入缓冲区（CPython 对 str += 原地扩容，摊还线性）
             if len(buf) + len(s) <= target_length:
                 buf += s
+                continue
+            # 接近阈值: 优先在当前句结束处切分，保证句子完整性
+            piece = buf.strip()
+            if piece:
+                yield piece
+            # 如果单句太长，按字符强制切片
+            if len(s) > target_length:
+                start = 0
+                step = target_length - overlap
+                while start < len(s):
+                    end = min(start + target_length, len(s))
+                    # 强制切片时也保留重叠
+                    last_piece = s[start:end].strip() if start == 0 else s[max(0, start - overlap):end].strip()
+                    if last_piece:
+                        yield last_piece
+                    start += step
+                # 最后一个强制切片的末尾作为新的缓冲区
+                buf = last_piece[-overlap:]
             else:
-                # 接近阈值: 优先在当前句结束处切分，保证句子完整性
-                flush_buf()
-                # 如果单句太长，按字符强制切片
-                if len(s) > target_length:
-                    start = 0
-                    step = target_length - overlap
-                    while start < len(s):
-                        end = min(start + target_length, len(s))
-                        piece = s[start:end]
-                        if start > 0:
-                            # 强制切片时也保留重叠
-                            piece = s[max(0, start - overlap):end]
-                        chunks.append(piece.strip())
-                        start += step
-                    # 最后一个强制切片的末尾作为新的缓冲区
-                    buf = chunks[-1][-overlap:] if chunks else ""
-                else:
-                    # 如果单句不算太长，直接作为新缓冲区的开始
-                    buf = buf + s if not buf else s  
+                # 单句不算太长，直接作为新缓冲区的开始（已产出块的重叠尾部不会并入）
+                buf = s
 
     # 处理剩余的缓冲区
-    if buf.strip():
-        chunks.append(buf.strip())
+    piece = buf.strip()
+    if piece:
+        yield piece
+
 
-    return [c for c in chunks if c.strip()]
+def adjacent_cosine_similarities(mat: np.ndarray) -> np.ndarray:
+    """相邻行余弦相似度：返回长度为 n 的 float32 数组，第 i 项为第 i-1 行与第 i 行的相似度（首项及零向量为 0）"""
+    n = int(mat.shape[0]) if mat.ndim == 2 else 0
+    sims = np.zeros(n, dtype=np.float32)
+    if n < 2:
+        return sims
+    norms = np.linalg.norm(mat, axis=1)
+    dots = np.einsum("ij,ij->i", mat[:-1], mat[1:])
+    denom = norms[:-1] * norms[1:]
+    np.divide(dots, denom, out=sims[1:], where=denom > 0)
+    return sims
 
 
 def chunk_semantic_similarity(
@@ -504,70 +1112,58 @@ def chunk_semantic_similarity(
         - List[str]: 语义连续的文本块列表
 
     策略:
-        - 按句子分割并计算相邻句子的余弦相似度；
+        - 按句子分割，全部句子批量向量化（embed_documents），相邻句余弦相似度在 float32 矩阵上一次算出；
         - 当相似度骤降或块长度超阈值时切分；
         - 适度重叠以保留跨句线索。
     """
-    import re
-    import math
-
-    if not isinstance(content, str) or not content.strip():
+    if _is_blank(content):
         return []
 
     # 按标点和换行符分割句子
-    parts = re.split(r"([。！？；;!?]\s*|\n+|#{1,6}\s+)", content)
-    sentences: List[str] = []
-    for i in range(0, len(parts), 2):
-        s = parts[i] or ""
-        if i + 1 < len(parts) and parts[i + 1]:
-            s += parts[i + 1]
-        if s.strip():
-            sentences.append(s.strip())
-
-    def cosine(u: Sequence[float], v: Sequence[float]) -> float:
-        """计算两个向量的余弦相似度"""
-        if not u or not v:
-            return 0.0
-        dot = sum((x * y) for x, y in zip(u, v))
-        nu = math.sqrt(sum((x * x) for x in u))
-        nv = math.sqrt(sum((y * y) for y in v))
-        if nu == 0 or nv == 0:
-            return 0.0
-        return dot / (nu * nv)
-
-    # 批量计算所有句子的嵌入向量
-    # 注意：这可能会产生大量 API 调用，需注意性能和成本
-    vecs: List[Sequence[float]] = [embed_message_service(message=s) for s in sentences]
+    sentences = [s.strip() for s in _iter_split_pairs(content, _SENTENCE_SPLIT_RE) if s.strip()]
+
+    if not sentences:
+        return []
+
+    # 批量向量化：同一文档内重复句只计算一次，按 `rag_ingest_batch_size` 分批调用 embed_documents
+    batch_size = int(getattr(get_settings(), "rag_ingest_batch_size", 64) or 64)
+    unique = list(dict.fromkeys(sentences))
+    vec_by_text: Dict[str, Sequence[float]] = {}
+    for off in range(0, len(unique), batch_size):
+        part = unique[off: off + batch_size]
+        vec_by_text.update(zip(part, embed_texts_service(texts=part)))
+    sims = adjacent_cosine_similarities(np.asarray([vec_by_text[s] for s in sentences], dtype=np.float32))
+    # 语义断点：与上一句相似度低于阈值（首句相似度记为 0）
+    low_sim = (sims < threshold).tolist()
 
     chunks: List[str] = []
-    buf = ""
-    last_vec: Optional[Sequence[float]] = None
-    
-    for idx, s in enumerate(sentences):
-        v = vecs[idx]
-        sim = cosine(last_vec or [], v)
+    # 缓冲区以句子列表 + 累计长度维护，只在切分时拼接
+    parts: List[str] = []
+    buf_len = 0
 
-        buf_len = len(buf)
+    for idx, s in enumerate(sentences):
         # 判断切分条件：
         # 1. 缓冲区已达到最小长度
         # 2. 并且 (加上当前句会超过最大长度 OR 与上一句相似度低于阈值)
-        if buf_len >= min_size and (buf_len + len(s) > max_size or sim < threshold):
+        if buf_len >= min_size and (buf_len + len(s) > max_size or low_sim[idx]):
             # 触发切分
+            buf = "".join(parts)
             if buf.strip():
                 chunks.append(buf.strip())
                 # 保留重叠部分
                 ov = buf[-overlap:] if len(buf) > overlap else buf
-                buf = ov + s
+                parts, buf_len = [ov, s], len(ov) + len(s)
         else:
             # 合并到当前块
-            buf += s
-        last_vec = v
+            parts.append(s)
+            buf_len += len(s)
 
     # 处理剩余内容
+    buf = "".join(parts)
     if buf.strip():
         chunks.append(buf.strip())
 
-    return [c for c in chunks if c.strip()]
+    return chunks
 
 
 def chunk_llm_semantic(content: str, chunk_size: int = 800) -> List[str]:
@@ -615,8 +1211,7 @@ def chunk_llm_semantic(content: str, chunk_size: int = 800) -> List[str]:
         logger.error("chunk_llm_semantic failed", exc_info=True)
         pass
     # 安全回退：标题/空行粗分 + 边界感知细分
-    import re
-    blocks = re.split(r"(\n{2,}|^#{1,6}\s+.*$)", content, flags=re.MULTILINE)
+    blocks = _LLM_FALLBACK_BLOCK_RE.split(content)
     merged: List[str] = []
     for i in range(0, len(blocks), 2):
         seg = blocks[i] or ""
@@ -647,28 +1242,25 @@ def chunk_hierarchical(content: str, target_length: int = 600, overlap: int = 80
     输出:
         - List[str]: 层次化但扁平输出的块列表
     """
-    import re
+    return list(iter_hierarchical(content, target_length=target_length, overlap=overlap))
 
-    if not isinstance(content, str) or not content.strip():
-        return []
 
-    # 识别标题层级，优先 H1/H2/H3
-    pattern = re.compile(r"^#{1,3}\s+.*$", flags=re.MULTILINE)
-    indices = [m.start() for m in pattern.finditer(content)]
-    indices = [0] + indices + [len(content)]
+def iter_hierarchical(content: str, target_length: int = 600, overlap: int = 80) -> Iterator[str]:
+    """层次切片（流式）：按 H1-H3 标题逐节推进，每节内边界感知细分后依次产出"""
+    if _is_blank(content):
+        return
 
-    coarse_blocks: List[str] = []
-    for i in range(len(indices) - 1):
-        block = content[indices[i]:indices[i + 1]].strip()
+    # 识别标题层级，优先 H1/H2/H3；相邻标题之间为一个粗粒度块
+    start = 0
+    for m in _HEADING_H3_RE.finditer(content):
+        block = content[start:m.start()].strip()
         if block:
-            coarse_blocks.append(block)
-
-    final: List[str] = []
-    for b in coarse_blocks:
-        # 块内再做边界感知细分
-        final.extend(chunk_fixed_length_boundary(b, target_length=target_length, overlap=overlap))
-
-    return [c for c in final if c.strip()]
+            # 块内再做边界感知细分
+            yield from iter_fixed_length_boundary(block, target_length=target_length, overlap=overlap)
+        start = m.start()
+    block = content[start:].strip()
+    if block:
+        yield from iter_fixed_length_boundary(block, target_length=target_length, overlap=overlap)
 
 
 def chunk_sliding_window(content: str, window_size: int = 600, overlap: int = 220) -> List[str]:
@@ -685,32 +1277,34 @@ def chunk_sliding_window(content: str, window_size: int = 600, overlap: int = 22
     输出:
         - List[str]: 切片列表
     """
-    if not isinstance(content, str) or not content.strip():
-        return []
+    return list(iter_sliding_window(content, window_size=window_size, overlap=overlap))
+
+
+def iter_sliding_window(content: str, window_size: int = 600, overlap: int = 220) -> Iterator[str]:
+    """滑动窗口切片（流式）：逐窗口产出"""
+    if _is_blank(content):
+        return
 
     # 计算步长
     step = max(1, window_size - overlap)
 
-    chunks: List[str] = []
     start = 0
     n = len(content)
-    
+
     while start < n:
         end = min(start + window_size, n)
-        piece = content[start:end]
-        
-        # 尽量在换行处结束，提升可读性
+
+        # 尽量在换行处结束，提升可读性（在原文上按下标回查，不复制窗口）
         if end < n:
-            back = piece.rfind("\n")
+            back = content.rfind("\n", start, end)
             # 如果回退距离不过大，则优先在换行处截断
-            if back > 0 and (end - start - back) < 80:
-                end = start + back
-                piece = content[start:end]
-        
-        chunks.append(piece.strip())
+            if back > start and (end - back) < 80:
+                end = back
+
+        piece = content[start:end].strip()
+        if piece:
+            yield piece
         start = min(start + step, n)
-        
-    return [c for c in chunks if c.strip()]
 
 
 def chunk_structure_aware(content: str, max_size: int = 800) -> List[str]:
@@ -727,51 +1321,54 @@ def chunk_structure_aware(content: str, max_size: int = 800) -> List[str]:
     输出:
         - List[str]: 切片列表
     """
-    if not isinstance(content, str) or not content.strip():
-        return []
+    return list(iter_structure_aware(content, max_size=max_size))
+
+
+def iter_structure_aware(content: str, max_size: int = 800) -> Iterator[str]:
+    """结构感知切片（流式）：逐行推进，代码块闭合或普通文本超长时产出
+
+    缓冲区长度（按换行拼接后的长度）增量维护，不在每行重新拼接。
+    """
+    if _is_blank(content):
+        return
 
-    lines = content.splitlines()
-    chunks: List[str] = []
     buf: List[str] = []
+    # 缓冲区各行字符数之和；拼接后长度 = buf_chars + 行数 - 1
+    buf_chars = 0
     in_code = False
 
-    for line in lines:
+    for line in _iter_lines(content):
+        head = line.lstrip()
         # 代码块（fenced code）优先完整保留
-        if line.strip().startswith("```"):
+        if head.startswith("```"):
             if in_code:
                 buf.append(line)
-                chunks.append("\n".join(buf).strip())
-                buf = []
+                block = "\n".join(buf).strip()
+                if block:
+                    yield block
+                buf, buf_chars = [], 0
                 in_code = False
             else:
                 if buf:
                     # 代码块前的缓冲作为一个块输出
-                    chunks.extend(chunk_fixed_length_boundary("\n".join(buf), target_length=max_size))
-                    buf = []
-                buf.append(line)
+                    yield from iter_fixed_length_boundary("\n".join(buf), target_length=max_size)
+                buf, buf_chars = [line], len(line)
                 in_code = True
             continue
 
-        if in_code:
-            buf.append(line)
-            continue
-
-        # 表格或列表区域尽量整体保留
-        if line.strip().startswith("|") or line.strip().startswith("-") or line.strip().startswith("*"):
-            buf.append(line)
+        buf.append(line)
+        buf_chars += len(line)
+        # 代码块内、表格或列表区域尽量整体保留
+        if in_code or head.startswith(("|", "-", "*")):
             continue
 
-        # 普通文本行
-        buf.append(line)
-        # 到达较长后切分输出
-        if len("\n".join(buf)) > max_size:
-            chunks.extend(chunk_fixed_length_boundary("\n".join(buf), target_length=max_size))
-            buf = []
+        # 普通文本行：到达较长后切分输出
+        if buf_chars + len(buf) - 1 > max_size:
+            yield from iter_fixed_length_boundary("\n".join(buf), target_length=max_size)
+            buf, buf_chars = [], 0
 
     if buf:
-        chunks.extend(chunk_fixed_length_boundary("\n".join(buf), target_length=max_size))
-
-    return [c for c in chunks if c.strip()]
+        yield from iter_fixed_length_boundary("\n".join(buf), target_length=max_size)
 
 
 def chunk_dynamic_adaptive(content: str, base_chunk_size: int = 700, overlap: int = 80) -> List[str]:
@@ -803,41 +1400,43 @@ def chunk_dynamic_adaptive(content: str, base_chunk_size: int = 700, overlap: in
     性能与注意事项:
         - 阈值 0.02 为经验值，针对中文语料；可根据数据集调参。
         - 该方法不计算嵌入，成本低；如需更强语义效果，结合 chunk_semantic_similarity。
+        - 实现见 `iter_dynamic_adaptive`（流式产出）。
     """
-    if not isinstance(content, str) or not content.strip():
-        return []
+    return list(iter_dynamic_adaptive(content, base_chunk_size=base_chunk_size, overlap=overlap))
 
-    import re
 
-    # 预清洗：去除空行，按行处理更易捕捉结构
-    lines = [ln for ln in content.splitlines() if ln.strip()]
-    groups: List[str] = []
-    cur: List[str] = []
-    
-    # 将文本按固定行数分组（近似段落），控制计算窗口大小
-    for ln in lines:
-        cur.append(ln)
-        if len(cur) >= 8:
-            groups.append("\n".join(cur))
-            cur = []
-    if cur:
-        groups.append("\n".join(cur))
+def iter_dynamic_adaptive(content: str, base_chunk_size: int = 700, overlap: int = 80) -> Iterator[str]:
+    """动态自适应切片（流式）：每凑满 8 个非空行即按密度切分并产出"""
+    if _is_blank(content):
+        return
 
-    out: List[str] = []
-    for g in groups:
+    def _split_group(g: str) -> List[str]:
         # 标点密度估计：标点数量 / 文本长度
-        punct = len(re.findall(r"[，。；；、!?]", g))
+        punct = len(_PUNCT_DENSITY_RE.findall(g))
         density = punct / max(1, len(g))
-        
+
         # 动态目标长度选择：密集段采用更短、更边界友好的切片；稀疏段采用递归字符切片
         if density > 0.02:
             # 信息密集：缩短目标长度（避免过载），保持一定下限
-            out.extend(chunk_fixed_length_boundary(g, target_length=max(100, base_chunk_size - 100), overlap=overlap))
-        else:
-            # 信息稀疏：拉长（轻度放宽），递归分隔以保持结构
-            out.extend(split_markdown_into_chunks(g, chunk_size=base_chunk_size, chunk_overlap=overlap))
+            return chunk_fixed_length_boundary(g, target_length=max(100, base_chunk_size - 100), overlap=overlap)
+        # 信息稀疏：拉长（轻度放宽），递归分隔以保持结构
+        return split_markdown_into_chunks(g, chunk_size=base_chunk_size, chunk_overlap=overlap)
 
-    return [c for c in out if c.strip()]
+    # 预清洗：去除空行；将文本按固定行数分组（近似段落），控制计算窗口大小
+    cur: List[str] = []
+    for ln in _iter_lines(content):
+        if not ln.strip():
+            continue
+        cur.append(ln)
+        if len(cur) >= 8:
+            for c in _split_group("\n".join(cur)):
+                if c.strip():
+                    yield c
+            cur = []
+    if cur:
+        for c in _split_group("\n".join(cur)):
+            if c.strip():
+                yield c
 
 
 def chunk_with_relations(content: str, max_size: int = 700) -> List[str]:
@@ -856,61 +1455,54 @@ def chunk_with_relations(content: str, max_size: int = 700) -> List[str]:
 
     说明:
         - 仅返回字符串列表；若需图结构或元数据，请在此函数基础上扩展。
+        - 实现见 `iter_with_relations`（流式产出）。
     """
-    import re
+    return list(iter_with_relations(content, max_size=max_size))
 
-    if not isinstance(content, str) or not content.strip():
-        return []
 
-    # 先按句子粗分
-    parts = re.split(r"([。！？；;!?]\s*|\n+|#{1,6}\s+)", content)
-    sentences: List[str] = []
-    for i in range(0, len(parts), 2):
-        s = parts[i] or ""
-        if i + 1 < len(parts) and parts[i + 1]:
-            s += parts[i + 1]
-        if s.strip():
-            sentences.append(s.strip())
+def iter_with_relations(content: str, max_size: int = 700) -> Iterator[str]:
+    """跨块关系切片（流式）：逐句推进并前瞻一句，去重只保存已产出分块的摘要"""
+    if _is_blank(content):
+        return
 
     # 标记“关系加强”的句子（含链接/引用/参见/see also）
     def is_anchor(text: str) -> bool:
-        return bool(re.search(r"\[[^\]]+\]\([^\)]+\)|参见|引用|see also|参考", text, flags=re.IGNORECASE))
+        return bool(_ANCHOR_RE.search(text))
 
-    chunks: List[str] = []
-    buf: List[str] = []
-    
-    for i, s in enumerate(sentences):
-        buf.append(s)
-        long_enough = sum(len(x) for x in buf) > max_size
-        anchor_here = is_anchor(s)
-        next_anchor = i + 1 < len(sentences) and is_anchor(sentences[i + 1])
+    seen: set = set()
+
+    def _emit(block: str) -> Iterator[str]:
+        # 再次使用固定长度切片确保不超长；去重与清洗
+        for piece in iter_fixed_length_boundary(block, target_length=max_size):
+            key = piece.strip()
+            digest = hashlib.sha1(key.encode("utf-8")).digest()
+            if key and digest not in seen:
+                seen.add(digest)
+                yield key
 
-        if long_enough or anchor_here or next_anchor:
+    # 先按句子粗分
+    sentences = (s.strip() for s in _iter_split_pairs(content, _SENTENCE_SPLIT_RE) if s.strip())
+    buf: List[str] = []
+    buf_len = 0
+    prev = ""
+    cur = next(sentences, None)
+    cur_anchor = cur is not None and is_anchor(cur)
+    while cur is not None:
+        nxt = next(sentences, None)
+        next_anchor = nxt is not None and is_anchor(nxt)
+        buf.append(cur)
+        buf_len += len(cur)
+        long_enough = buf_len > max_size
+
+        if long_enough or cur_anchor or next_anchor:
             # 带关系的句段向前/向后各并入一条，增强上下文联结
-            prev = sentences[i - 1] if i - 1 >= 0 else ""
-            nxt = sentences[i + 1] if i + 1 < len(sentences) else ""
-            
-            # 合并上下文
-            block = (prev + "" if prev else "") + "".join(buf) + (nxt if nxt else "")
-            
-            # 再次使用固定长度切片确保不超长
-            for piece in chunk_fixed_length_boundary(block, target_length=max_size):
-                chunks.append(piece)
-            buf = []
+            block = prev + "".join(buf) + (nxt or "")
+            yield from _emit(block)
+            buf, buf_len = [], 0
+        prev, cur, cur_anchor = cur, nxt, next_anchor
 
     if buf:
-        for piece in chunk_fixed_length_boundary("".join(buf), target_length=max_size):
-            chunks.append(piece)
-
-    # 去重与清洗
-    seen = set()
-    dedup: List[str] = []
-    for c in chunks:
-        key = c.strip()
-        if key and key not in seen:
-            dedup.append(key)
-            seen.add(key)
-    return dedup
+        yield from _emit("".join(buf))
 
 def chunk_content_by_strategy(content: str, strategy: int = 0, meta: Optional[Dict[str, Any]] = None) -> List[str]:
     """统一切片入口（策略选择 + 参数绑定）
@@ -947,64 +1539,88 @@ def chunk_content_by_strategy(content: str, strategy: int = 0, meta: Optional[Di
         - 当 meta 未提供或类型不正确时，自动回退到安全默认值；
         - strategy 非法时回退到基础切割（策略 0）。
     """
-    if meta is None:
-        meta = {}
+    return list(iter_chunks_by_strategy(content, strategy, meta))
+
+
+# 可流式切片的策略：只依赖局部上下文（当前段落/行组/前后一句），可边读边产出；
+# 1（LangChain 递归切割）、3（全文句向量）、4（整篇送 LLM）需要整篇文档，流式入口内部先整体切完再逐块产出
+STREAMING_STRATEGIES = frozenset({0, 2, 5, 6, 7, 8, 9})
+
+
+def _strategy_int(strategy: Any) -> int:
     try:
-        strategy_int = int(strategy)
+        return int(strategy)
     except (ValueError, TypeError):
-        strategy_int = 0
+        return 0
+
+
+def is_streaming_strategy(strategy: Any) -> bool:
+    """策略是否支持真正的流式切片（非法编号按策略 0 处理）"""
+    s = _strategy_int(strategy)
+    return s in STREAMING_STRATEGIES or not 0 <= s <= 9
 
+
+def iter_chunks_by_strategy(content: str, strategy: int = 0, meta: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """统一切片入口（流式）：与 `chunk_content_by_strategy` 的策略编号、meta 参数与输出一致，逐块产出
+
+    行为:
+        - `STREAMING_STRATEGIES` 内的策略边切边产出，首块在读完首个段落/行组后即可得到，内存只随当前缓冲区增长；
+        - 其余策略需要整篇上下文，先整体切完再逐块产出。
+    """
+    if meta is None:
+        meta = {}
+    strategy_int = _strategy_int(strategy)
     if strategy_int == 0:
         # 基础中文切割：适合无外部依赖的默认策略
         max_size = int(meta.get("max_size", 500) or 500)
         overlap = int(meta.get("overlap", 50) or 50)
-        return basic_chinese_text_split(content, max_size=max_size, overlap=overlap)
+        yield from iter_basic_chinese_text_split(content, max_size=max_size, overlap=overlap)
     elif strategy_int == 1:
         # 递归字符切割（结构感知）：优先保持 Markdown 结构
         chunk_size = int(meta.get("chunk_size", 500) or 500)
         chunk_overlap = int(meta.get("chunk_overlap", 50) or 50)
-        return split_markdown_into_chunks(content, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        yield from split_markdown_into_chunks(content, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     elif strategy_int == 2:
         # 固定长度 + 边界感知：在句末/换行优先切分
         target_length = int(meta.get("target_length", 600) or 600)
         overlap = int(meta.get("overlap", 80) or 80)
-        return chunk_fixed_length_boundary(content, target_length=target_length, overlap=overlap)
+        yield from iter_fixed_length_boundary(content, target_length=target_length, overlap=overlap)
     elif strategy_int == 3:
         # 语义相似度驱动：计算相邻句的嵌入余弦相似度决定边界
         max_size = int(meta.get("max_size", 800) or 800)
         min_size = int(meta.get("min_size", 200) or 200)
         overlap = int(meta.get("overlap", 100) or 100)
         threshold = float(meta.get("threshold", 0.35) or 0.35)
-        return chunk_semantic_similarity(content, max_size=max_size, min_size=min_size, overlap=overlap, threshold=threshold)
+        yield from chunk_semantic_similarity(content, max_size=max_size, min_size=min_size, overlap=overlap, threshold=threshold)
     elif strategy_int == 4:
         # LLM 语义分段（占位）：标题/空行粗分 + 边界感知细分
         chunk_size = int(meta.get("chunk_size", 800) or 800)
-        return chunk_llm_semantic(content, chunk_size=chunk_size)
+        yield from chunk_llm_semantic(content, chunk_size=chunk_size)
     elif strategy_int == 5:
         # 层次切片：按标题层级粗分，再进行边界感知细分
         target_length = int(meta.get("target_length", 600) or 600)
         overlap = int(meta.get("overlap", 80) or 80)
-        return chunk_hierarchical(content, target_length=target_length, overlap=overlap)
+        yield from iter_hierarchical(content, target_length=target_length, overlap=overlap)
     elif strategy_int == 6:
         # 滑动窗口：固定窗口 + 高重叠，适合代码/规范等连续文本
         window_size = int(meta.get("window_size", 600) or 600)
         overlap = int(meta.get("overlap", 220) or 220)
-        return chunk_sliding_window(content, window_size=window_size, overlap=overlap)
+        yield from iter_sliding_window(content, window_size=window_size, overlap=overlap)
     elif strategy_int == 7:
         # 结构感知：优先保留代码块/列表/表格等结构完整性
         max_size = int(meta.get("max_size", 800) or 800)
-        return chunk_structure_aware(content, max_size=max_size)
+        yield from iter_structure_aware(content, max_size=max_size)
     elif strategy_int == 8:
         # 动态自适应：基于标点密度自适应选择策略
         base_chunk_size = int(meta.get("base_chunk_size", 700) or 700)
         overlap = int(meta.get("overlap", 80) or 80)
-        return chunk_dynamic_adaptive(content, base_chunk_size=base_chunk_size, overlap=overlap)
+        yield from iter_dynamic_adaptive(content, base_chunk_size=base_chunk_size, overlap=overlap)
     elif strategy_int == 9:
         # 关系联结：考虑引用/链接等跨块关系进行就近合并
         max_size = int(meta.get("max_size", 700) or 700)
-        return chunk_with_relations(content, max_size=max_size)
+        yield from iter_with_relations(content, max_size=max_size)
     else:
         # 非法策略编号：回退到基础中文切割
         max_size = int(meta.get("max_size", 500) or 500)
         overlap = int(meta.get("overlap", 50) or 50)
-        return basic_chinese_text_split(content, max_size=max_size, overlap=overlap)
+        yield from iter_basic_chinese_text_split(content, max_size=max_size, overlap=overlap)
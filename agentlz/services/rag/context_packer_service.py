@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""检索上下文打包（token 预算 + 相邻分块去重叠）
+
+把检索得到的分块拼成送入 LLM 的 `doc` 文本：
+- 按文档分组（文档按其最相关分块的名次排序），文档内按分块序号排序，保持原文阅读顺序；
+- 同一文档相邻分块之间的重叠片段（滑动窗口/带 overlap 的切割策略）只保留一份：
+  取前一块后缀与后一块前缀的最长重合（KMP 前缀函数，线性时间），重合不足 `_MIN_OVERLAP_CHARS` 时不处理；
+- 按相关度顺序贪心纳入分块，打包后的 token 数不超过预算（Agent meta `rag_context_tokens`，缺省 `rag_context_token_budget`）；
+  首个分块单独超出预算时按 token 截断；
+- token 用 tiktoken 计数（`rag_context_encoding`），编码不可用（未安装或编码文件无法下载）时按字符估算。
+"""
+
+import bisect
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from agentlz.config.settings import get_settings
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.repositories import agent_repository as agent_repo
+
+logger = setup_logging(level="DEBUG", name="agentlz.context_packer", prefix="[上下文打包]")
+
+_MIN_OVERLAP_CHARS = 16
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_CHUNK_INDEX_RE = re.compile(r"_(\d+)$")
+
+_ENCODER: Any = None
+_ENCODER_NAME: Optional[str] = None
+_ENCODER_LOCK = threading.Lock()
+_BUDGET_CACHE: Optional[TTLCache] = None
+_BUDGET_CACHE_LOCK = threading.Lock()
+
+
+def _get_encoder() -> Any:
+    """懒加载 tiktoken 编码（进程内只加载一次）；失败时记录一次并返回 None（之后使用字符估算）"""
+    global _ENCODER, _ENCODER_NAME
+    if _ENCODER_NAME is not None:
+        return _ENCODER
+    with _ENCODER_LOCK:
+        if _ENCODER_NAME is None:
+            name = str(getattr(get_settings(), "rag_context_encoding", "cl100k_base") or "cl100k_base")
+            try:
+                import tiktoken
+
+                _ENCODER = tiktoken.get_encoding(name)
+            except Exception as e:
+                logger.warning(f"tiktoken 编码 {name} 不可用，改用字符估算: {e}")
+                _ENCODER = None
+            _ENCODER_NAME = name
+    return _ENCODER
+
+
+def tokenizer_name() -> str:
+    return "tiktoken" if _get_encoder() is not None else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """统计 token 数：tiktoken 编码；不可用时中日韩字符按 1 个、其余字符按 4 个折 1 个估算"""
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使其不超过 max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    enc = _get_encoder()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def overlap_length(prev: str, nxt: str) -> int:
+    """前一块后缀与后一块前缀的最长重合长度（KMP 前缀函数，O(len)）"""
+    n = min(len(prev), len(nxt))
+    if n < _MIN_OVERLAP_CHARS:
+        return 0
+    s = nxt[:n] + "\x00" + prev[-n:]
+    pi = [0] * len(s)
+    for i in range(1, len(s)):
+        k = pi[i - 1]
+        while k and s[i] != s[k]:
+            k = pi[k - 1]
+        if s[i] == s[k]:
+            k += 1
+        pi[i] = k
+    k = pi[-1]
+    return k if k >= _MIN_OVERLAP_CHARS else 0
+
+
+def _chunk_index(item: Dict[str, Any]) -> Optional[int]:
+    idx = item.get("chunk_index")
+    if idx is not None:
+        try:
+            return int(idx)
+        except Exception:
+            pass
+    m = _CHUNK_INDEX_RE.search(str(item.get("chunk_id") or ""))
+    return int(m.group(1)) if m else None
+
+
+def _assemble_doc(
+    entries: List[Tuple[int, int, Dict[str, Any]]],
+    overlap_memo: Dict[Tuple[int, int], int],
+) -> Tuple[List[str], int, int]:
+    """单个文档的已选分块（按分块序号排序）去除相邻重叠，返回 (段落列表, 重叠字符数, 完全重复被略去的分块数)
+
+    相邻两块的重合长度按分块对缓存：新分块插入时只需为新出现的相邻对计算重合。
+    """
+    parts: List[str] = []
+    overlap_chars = 0
+    dropped = 0
+    prev: Optional[Dict[str, Any]] = None
+    prev_text = ""
+    for _, _, item in entries:
+        text = str(item.get("content") or "")
+        if prev is not None and prev_text:
+            if text and text in prev_text:
+                overlap_chars += len(text)
+                dropped += 1
+                continue
+            key = (id(prev), id(item))
+            k = overlap_memo.get(key)
+            if k is None:
+                k = overlap_memo[key] = overlap_length(prev_text, text)
+            if k:
+                overlap_chars += k
+                parts[-1] = parts[-1] + text[k:]
+                prev, prev_text = item, text
+                continue
+        parts.append(text)
+        prev, prev_text = item, text
+    return parts, overlap_chars, dropped
+
+
+def pack_context(chunks: List[Dict[str, Any]], *, budget_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """把检索结果打包为 LLM 上下文
+
+    参数：
+    - chunks: 检索结果（按相关度降序），每项含 chunk_id/doc_id/content，可选 chunk_index
+    - budget_tokens: token 预算，<=0 表示不限制
+
+    行为：
+    - 按相关度依次尝试纳入分块；文档按其首个入选分块的名次排序，文档内按分块序号排序；
+    - 纳入分块只重新拼接其所在文档，token 数按段落增量累计（段落计数缓存，段落间换行各计 1），
+      不对整段上下文重复分词；最终文本再精确计数一次，超出预算时截断兜底。
+
+    返回：
+    - (doc 文本, 指标字典)：context_tokens_raw（原始逐块拼接）、context_tokens_packed、context_tokens_saved、
+      context_chunks_in/packed、context_overlap_chars、context_budget、context_tokenizer
+    """
+    items = [c for c in chunks or [] if c.get("content")]
+    raw_tokens = count_tokens("\n".join(str(c.get("content")) for c in items))
+
+    part_tokens: Dict[str, int] = {}
+    overlap_memo: Dict[Tuple[int, int], int] = {}
+
+    def _tokens(parts: List[str]) -> int:
+        total = 0
+        for p in parts:
+            n = part_tokens.get(p)
+            if n is None:
+                n = part_tokens[p] = count_tokens(p)
+            total += n
+        return total
+
+    doc_order: List[str] = []
+    entries: Dict[str, List[Tuple[int, int, Dict[str, Any]]]] = {}
+    # did -> (段落, 段落 token 数之和, 重叠字符数, 略去分块数)
+    segments: Dict[str, Tuple[List[str], int, int, int]] = {}
+    total_tokens = 0
+    total_parts = 0
+    selected = 0
+    for rank, item in enumerate(items):
+        did = str(item.get("doc_id") or "")
+        idx = _chunk_index(item)
+        doc_entries = list(entries.get(did, []))
+        bisect.insort(doc_entries, (idx if idx is not None else 1 << 30, rank, item))
+        parts, ov, dr = _assemble_doc(doc_entries, overlap_memo)
+        seg_tokens = _tokens(parts)
+        old_parts, old_tokens, _, _ = segments.get(did, ([], 0, 0, 0))
+        new_parts_total = total_parts - len(old_parts) + len(parts)
+        new_total = total_tokens - old_tokens + seg_tokens
+        # 段落之间的换行按 1 个 token 计
+        if budget_tokens > 0 and new_total + max(0, new_parts_total - 1) > budget_tokens and selected:
+            continue
+        if did not in entries:
+            doc_order.append(did)
+        entries[did] = doc_entries
+        segments[did] = (parts, seg_tokens, ov, dr)
+        total_tokens, total_parts = new_total, new_parts_total
+        selected += 1
+        if budget_tokens > 0 and total_tokens + max(0, total_parts - 1) > budget_tokens:
+            # 首个分块单独超出预算：只保留它（截断），后续分块均放不下
+            break
+
+    packed = "\n".join(p for did in doc_order for p in segments[did][0] if p)
+    if budget_tokens > 0 and count_tokens(packed) > budget_tokens:
+        packed = truncate_to_tokens(packed, budget_tokens)
+    overlap_chars = sum(seg[2] for seg in segments.values())
+    dropped = sum(seg[3] for seg in segments.values())
+    packed_tokens = count_tokens(packed)
+    return packed, {
+        "context_chunks_in": len(items),
+        "context_chunks_packed": selected - dropped,
+        "context_tokens_raw": raw_tokens,
+        "context_tokens_packed": packed_tokens,
+        "context_tokens_saved": max(0, raw_tokens - packed_tokens),
+        "context_overlap_chars": overlap_chars,
+        "context_budget": int(budget_tokens),
+        "context_tokenizer": tokenizer_name(),
+    }
+
+
+def _get_budget_cache() -> TTLCache:
+    global _BUDGET_CACHE
+    if _BUDGET_CACHE is None:
+        with _BUDGET_CACHE_LOCK:
+            if _BUDGET_CACHE is None:
+                s = get_settings()
+                _BUDGET_CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_context_budget_cache_size", 1024) or 1024),
+                    ttl=float(getattr(s, "rag_context_budget_cache_ttl", 60) or 60),
+                )
+    return _BUDGET_CACHE
+
+
+def agent_context_budget(agent_id: int) -> int:
+    """Agent 的上下文 token 预算：meta.rag_context_tokens 优先，否则 `rag_context_token_budget`（结果按 Agent 缓存）"""
+    default = int(getattr(get_settings(), "rag_context_token_budget", 3000) or 0)
+    cache = _get_budget_cache()
+    aid = int(agent_id)
+    budget = cache.get(aid)
+    if budget is not None:
+        return int(budget)
+    budget = default
+    try:
+        agent_table = getattr(get_settings(), "agent_table_name", "agent")
+        row = agent_repo.get_agent_by_id_any_tenant(agent_id=aid, table_name=agent_table) or {}
+        meta = row.get("meta")
+        if isinstance(meta, str):
+            meta = json.loads(meta)
+        if isinstance(meta, dict) and meta.get("rag_context_tokens") is not None:
+            budget = int(meta.get("rag_context_tokens"))
+    except Exception as e:
+        logger.debug(f"读取 Agent 上下文预算失败 agent_id={aid}: {e}")
+    cache.set(aid, budget)
+    return budget
+
+
+def invalidate_agent_context_budget(agent_id: int) -> None:
+    """Agent meta 变更或删除后丢弃其缓存的上下文预算"""
+    _get_budget_cache().pop(int(agent_id))
@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Any, Dict, Optional, Tuple, List
 from fastapi import HTTPException
 import re
+import time
 from agentlz.config.settings import get_settings
 from agentlz.core.logger import setup_logging
 from agentlz.repositories import document_repository as repo
@@ -12,11 +13,15 @@ from agentlz.repositories import chunk_embeddings_repository as emb_repo
 from agentlz.schemas.document import DocumentUpload
 
 from agentlz.services.rag.chunk_embeddings_service import (
-    create_chunk_embedding_service,
+    bulk_create_multi_strategy_chunk_embeddings_service,
     split_markdown_into_chunks,
     search_similar_chunks_service,
-    chunk_content_by_strategy,
+    iter_chunks_by_strategy,
+    is_streaming_strategy,
 )
+from agentlz.services.rag.ingest_pool_service import get_ingest_mode, submit_chunk_task
+from agentlz.services.rag.retrieval_scope_service import bump_document_scope_versions
+from agentlz.services.rag.vector_hot_tier_service import on_chunks_deleted
 from agentlz.services.cos_service import (
     upload_document_to_cos,
     get_origin_url_from_save_https,
@@ -92,7 +97,7 @@ def publish_document_chunk_tasks_after_scan(
     '''发布文档切割任务
     1. 解析策略列表，过滤无效值
     2. 检查是否包含负数策略，若有则更新文档状态为 NEED_CHUNK
-    3. 发布切割任务到 RabbitMQ
+    3. 发布切割任务到 RabbitMQ（所有策略合并为一条消息，只下载与转换一次）
     '''
     table_name, _ = _get_table_and_header()
     strategies = []
@@ -104,7 +109,8 @@ def publish_document_chunk_tasks_after_scan(
             continue
         if v < 0:
             has_negative = True
-        strategies.append(v)
+        if v not in strategies:
+            strategies.append(v)
     if has_negative:
         repo.update_document(
             doc_id=doc_id,
@@ -113,27 +119,29 @@ def publish_document_chunk_tasks_after_scan(
             table_name=table_name,
         )
         return
-    if strategies:
-        for strat in strategies:
-            msg = {
-                "doc_id": doc_id,
-                "save_https": save_https,
-                "document_type": document_type,
-                "tenant_id": tenant_id,
-                "strategy": strat,
-            }
-            publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
-            logger.info(f"创建文档 文件,已经发布解析任务: {msg}")
-    else:
-        msg = {
-            "doc_id": doc_id,
-            "save_https": save_https,
-            "document_type": document_type,
-            "tenant_id": tenant_id,
-            "strategy": 0,
-        }
-        publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
-        logger.info(f"创建文档 文件,已经发布解析任务: {msg}")
+    msg = build_parse_task_message(
+        doc_id=doc_id,
+        save_https=save_https,
+        document_type=document_type,
+        tenant_id=tenant_id,
+        strategies=strategies or [0],
+    )
+    publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
+    logger.info(f"创建文档 文件,已经发布解析任务: {msg}")
+
+
+def build_parse_task_message(
+    *, doc_id: str, save_https: str, document_type: str, tenant_id: str, strategies: List[int]
+) -> Dict[str, Any]:
+    """构造 doc_parse_tasks 消息：一条消息携带全部策略（strategies），strategy 保留首个策略以兼容旧消费者"""
+    return {
+        "doc_id": doc_id,
+        "save_https": save_https,
+        "document_type": document_type,
+        "tenant_id": tenant_id,
+        "strategy": strategies[0],
+        "strategies": list(strategies),
+    }
 
 
 suffix_map = {
@@ -524,6 +532,8 @@ def update_document_service(
         tenant_id=str(row.get("tenant_id") or tenant_id),
         table_name=table_name,
     )
+    # 文档元数据/禁用状态变化：使关联 Agent 的检索范围缓存失效
+    bump_document_scope_versions(doc_id)
     if row and row.get("upload_time") is not None:
         row["upload_time"] = str(row["upload_time"])
     return row
@@ -583,11 +593,15 @@ def delete_document_service(
     ):
         raise HTTPException(status_code=403, detail="没有权限删除此文档")
 
-    return repo.delete_document(
+    deleted = repo.delete_document(
         doc_id=doc_id,
         tenant_id=str(row.get("tenant_id") or tenant_id),
         table_name=table_name,
     )
+    if deleted:
+        bump_document_scope_versions(doc_id)
+        on_chunks_deleted(tenant_id=str(row.get("tenant_id") or tenant_id), doc_id=doc_id)
+    return deleted
 
 
 def get_download_payload_service(
@@ -886,6 +900,8 @@ def create_document_service(
     if row and row.get("upload_time") is not None:
         row["upload_time"] = str(row["upload_time"])
     logger.info(f"创建文档 文件,已经插入数据库: {row}")
+    if row and row.get("id"):
+        bump_document_scope_versions(str(row.get("id")))
 
     try:
         s = get_settings()
@@ -947,7 +963,8 @@ def publish_document_chunk_tasks_service(
     行为：
         - 校验策略列表有效性（去重、过滤非法值）
         - 获取文档信息（含 save_https、type）
-        - 按策略逐条发布到队列 doc_parse_tasks，消息包含：doc_id、tenant_id、save_https、document_type、strategy
+        - 全部策略合并为一条消息发布到队列 doc_parse_tasks，消息包含：doc_id、tenant_id、save_https、document_type、
+          strategies（及兼容字段 strategy）；消费端只转换一次文档，已有 Markdown 内容时直接复用
         - 失败时重试并记录错误
 
     返回：
@@ -986,37 +1003,34 @@ def publish_document_chunk_tasks_service(
 
     published = 0
     last_err: Optional[Exception] = None
-    for strat in cleaned:
-        msg = {
-            "doc_id": doc_id,
-            "save_https": save_https,
-            "document_type": doc_type,
-            "tenant_id": tenant_id,
-            "strategy": strat,
-        }
+    msg = build_parse_task_message(
+        doc_id=doc_id,
+        save_https=save_https,
+        document_type=doc_type,
+        tenant_id=tenant_id,
+        strategies=cleaned,
+    )
+    try:
+        publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
+        published = len(cleaned)
+        logger.info(f"发布分块解析任务成功: {msg}")
+    except Exception as e:
+        logger.error(f"发布分块解析任务失败: {e}")
+        last_err = e
+        # 重试一次
         try:
+            from agentlz.core.external_services import close_all_connections
+            import time
+
+            close_all_connections()
+            time.sleep(1)
             publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
-            published += 1
-            logger.info(f"发布分块解析任务成功: {msg}")
-        except Exception as e:
-            logger.error(f"发布分块解析任务失败: {e}")
-            last_err = e
-            # 重试一次
-            try:
-                from agentlz.core.external_services import close_all_connections
-                import time
-
-                close_all_connections()
-                time.sleep(1)
-                publish_to_rabbitmq("doc_parse_tasks", msg, durable=True)
-                published += 1
-                logger.info(f"重试发布分块解析任务成功: {msg}")
-                last_err = None
-            except Exception as retry_e:
-                logger.error(f"重试发布分块解析任务失败: {retry_e}")
-                last_err = retry_e
-                # 不中断其他策略的发布，继续下一个
-                continue
+            published = len(cleaned)
+            logger.info(f"重试发布分块解析任务成功: {msg}")
+            last_err = None
+        except Exception as retry_e:
+            logger.error(f"重试发布分块解析任务失败: {retry_e}")
+            last_err = retry_e
 
     result = {
         "doc_id": doc_id,
@@ -1033,7 +1047,12 @@ def publish_document_chunk_tasks_service(
 
 
 def process_document_from_cos_https(
-    save_https: str, document_type: str, doc_id: str, tenant_id: str, strategy: int = 0
+    save_https: str,
+    document_type: str,
+    doc_id: str,
+    tenant_id: str,
+    strategy: int = 0,
+    strategies: Optional[List[int]] = None,
 ) -> str:
     """从COS下载文档并转换为Markdown格式,存入数据库document表,并切割成小文本块,存入向量数据库
 
@@ -1042,6 +1061,13 @@ def process_document_from_cos_https(
     - `document_type`: 文档类型，用于确定转换规则。
     - `doc_id`: 文档ID，用于数据库存储。
     - `tenant_id`: 租户ID，用于确定数据库表名。
+    - `strategy`: 切割策略（旧消息格式，仅一个策略）。
+    - `strategies`: 切割策略列表；提供时忽略 `strategy`。
+
+    行为：
+    - 文档只下载、转换、保存一次；document 表已有 Markdown 内容时直接复用，不再访问 COS；
+    - 各策略的分块共用一条向量化写库流水线（见 `bulk_create_multi_strategy_chunk_embeddings_service`）；
+    - 单个策略切片失败不影响其他策略，结束后文档状态置为 NEED_RECHUNK；向量化/写库失败置为 NEED_EMBEDDING。
 
     返回：
     - 转换后的Markdown文本。
@@ -1049,11 +1075,92 @@ def process_document_from_cos_https(
 
     ori_url = ""
     stage = "init"
+    # 分阶段耗时（毫秒），入库结束后统一输出
+    timings: Dict[str, Any] = {}
+    strategy_list: List[int] = []
+    for s in strategies if strategies else [strategy]:
+        try:
+            v = int(s or 0)
+        except Exception:
+            continue
+        if v >= 0 and v not in strategy_list:
+            strategy_list.append(v)
+    strategy_list = strategy_list or [0]
+
+    def _chunk_and_embed(text_content: str) -> str:
+        """按全部策略切片并共用一条流水线向量化写库；可流式的策略边切边写（首批写入后即可检索）"""
+        nonlocal stage
+        failed: Dict[int, str] = {}
+
+        def _stream(strat: int, future: Any = None):
+            # 单个策略切片失败时记录并结束该策略的分块流，不影响其他策略
+            try:
+                if future is not None:
+                    yield from future.result()
+                else:
+                    yield from iter_chunks_by_strategy(text_content, strat)
+            except Exception as e:
+                failed[strat] = str(e)
+                logger.error(f"文档 {doc_id} 策略 {strat} 切片失败: {e}")
+
+        # 第二部分 切割为Markdown块 可选策略 数字, 如: 0-n, 数字代表不同策略
+        # 需要整篇上下文的策略在 process 模式下提前提交到工作进程并行切片
+        stage = "chunk_markdown"
+        process_mode = get_ingest_mode() == "process"
+        streams = [
+            (
+                strat,
+                _stream(
+                    strat,
+                    submit_chunk_task(text_content, strat)
+                    if process_mode and not is_streaming_strategy(strat)
+                    else None,
+                ),
+            )
+            for strat in strategy_list
+        ]
+
+        # 第三部分 批量向量化并写入（每批一次 embed_documents + 单事务多行写入）
+        stage = "create_embeddings"
+        stats = bulk_create_multi_strategy_chunk_embeddings_service(
+            tenant_id=tenant_id,
+            doc_id=doc_id,
+            streams=streams,
+            publish_first_batch=True,
+        )
+        timings["chunk_ms"] = stats.get("chunk_ms", 0.0)
+        timings["first_batch_ms"] = stats.get("first_batch_ms")
+        timings["embed_ms"] = stats.get("embed_ms", 0.0)
+        timings["write_ms"] = stats.get("write_ms", 0.0)
+        bump_document_scope_versions(doc_id)
+        logger.info(
+            f"文档 {doc_id} 入库完成 chunks={stats.get('chunks')} per_strategy={stats.get('per_strategy')} inserted={stats.get('inserted')} "
+            f"batches={stats.get('batches')} embedded={stats.get('embedded')} dedup_hit_rate={stats.get('dedup_hit_rate')} strategies={strategy_list} mode={get_ingest_mode()} timings={timings}"
+        )
+        if failed:
+            stage = "chunk_markdown"
+            raise Exception(f"策略切片失败: {failed}")
+        return ""
+
     try:
         table_name, _ = _get_table_and_header()
         row = repo.get_document_by_id(doc_id=doc_id, tenant_id=tenant_id, table_name=table_name)
         if row and str(row.get("status") or "") in ["pending_scan", "scan_failed"]:
             raise Exception("扫描未通过，禁止解析")
+        stored_content = str((row or {}).get("content") or "")
+        if stored_content.strip():
+            # 已转换过的文档（追加策略/重新切片）直接复用 Markdown 内容
+            logger.info(f"文档 {doc_id} 复用已保存的Markdown内容，长度: {len(stored_content)} 字符，策略: {strategy_list}")
+            timings["convert_ms"] = 0.0
+            if str(row.get("status") or "") != "success":
+                stage = "save_markdown"
+                repo.update_document(
+                    doc_id=doc_id,
+                    payload={"status": "success"},
+                    tenant_id=tenant_id,
+                    table_name=table_name,
+                )
+            return _chunk_and_embed(stored_content)
         if "quarantine/" in str(save_https or ""):
             logger.info(f"发现隔离区对象, 尝试转正 doc_id={doc_id} save_https={save_https}")
             try:
@@ -1101,6 +1208,7 @@ def process_document_from_cos_https(
 
         # 确定文件扩展名
         stage = "convert_to_markdown"
+        t_stage = time.perf_counter()
         doc_type_norm = str(document_type or "").lower().strip()
         forced_ext = ext_map.get(doc_type_norm)
 
@@ -1290,40 +1398,23 @@ def process_document_from_cos_https(
             )
             return ""
 
+        timings["convert_ms"] = round((time.perf_counter() - t_stage) * 1000.0, 2)
         logger.info(f"文档 {doc_id} 转换为Markdown内容，长度: {len(text_content)} 字符")
         table_name, _ = _get_table_and_header()
         stage = "save_markdown"
+        t_stage = time.perf_counter()
         repo.update_document(
             doc_id=doc_id,
             payload={"content": text_content, "status": "success"},
             tenant_id=tenant_id,
             table_name=table_name,
         )
+        timings["save_markdown_ms"] = round((time.perf_counter() - t_stage) * 1000.0, 2)
 
-        # 第二部分 切割为Markdown块 可选策略 数字, 如: 0-n, 数字代表不同策略
-        stage = "chunk_markdown"
-        chunks = chunk_content_by_strategy(text_content, strategy)
-
-        index = 0
-        stage = "create_embeddings"
-        for chunk in chunks:
-            index += 1
-            logger.info(
-                f"文档 {doc_id} 切割为Markdown块，长度: {len(chunk)} 字符，策略: {strategy}"
-            )
-            create_chunk_embedding_service(
-                tenant_id=tenant_id,
-                chunk_id=f"{doc_id}_{index}",
-                doc_id=doc_id,
-                content=chunk,
-                chunk_index=index,
-                length=len(chunk),
-                strategy=str(strategy),
-            )
-        return ""
+        return _chunk_and_embed(text_content)
     except Exception as e:
         if stage == "create_embeddings":
-            logger.error(f"文档 {doc_id} 向量化失败: {e} (origin_url={ori_url}, strategy={strategy})")
+            logger.error(f"文档 {doc_id} 向量化失败: {e} (origin_url={ori_url}, strategies={strategy_list})")
             table_name, _ = _get_table_and_header()
             repo.update_document(
                 doc_id=doc_id,
@@ -1332,7 +1423,7 @@ def process_document_from_cos_https(
                 table_name=table_name,
             )
             return ""
-        logger.error(f"文档 {doc_id} 解析失败 stage={stage}: {e} (origin_url={ori_url}, strategy={strategy})")
+        logger.error(f"文档 {doc_id} 解析失败 stage={stage}: {e} (origin_url={ori_url}, strategies={strategy_list})")
         table_name, _ = _get_table_and_header()
         repo.update_document(
             doc_id=doc_id,
@@ -1355,23 +1446,19 @@ def list_agent_related_document_ids_service(*, agent_id: int) -> dict[str, list[
     """
     s = get_settings()
     rel_table = getattr(s, "agent_document_table_name", "agent_document")
-    table_name, _ = _get_table_and_header()
-    user_table_name = getattr(s, "user_table_name", "users")
-    tenant_table_name = "tenant"
     rows = agdoc_repo.list_agent_documents(agent_id=agent_id, table_name=rel_table)
+    ordered: list[str] = []
     seen: set[str] = set()
-    grouped: dict[str, list[str]] = {}
     for r in rows:
         d = str(r.get("document_id") or "").strip()
         if not d or d in seen:
             continue
         seen.add(d)
-        doc_row = repo.get_document_with_names_by_id_any_tenant(
-            doc_id=d,
-            table_name=table_name,
-            user_table_name=user_table_name,
-            tenant_table_name=tenant_table_name,
-        )
+        ordered.append(d)
+    meta = list_documents_meta_by_ids_service(doc_ids=ordered)
+    grouped: dict[str, list[str]] = {}
+    for d in ordered:
+        doc_row = meta.get(d)
         if not doc_row:
             continue
         tid = str(doc_row.get("tenant_id") or "")
@@ -1379,3 +1466,16 @@ def list_agent_related_document_ids_service(*, agent_id: int) -> dict[str, list[
             tid = "default"
         grouped.setdefault(tid, []).append(d)
     return grouped
+
+
+def list_documents_meta_by_ids_service(*, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """批量获取文档检索元数据（单次查询，供 RAG 召回链路共享）
+
+    参数：
+    - `doc_ids`: 文档ID列表。
+
+    返回：
+    - 字典 {doc_id: {id, tenant_id, disabled, title, tags, description}}；不存在的文档不出现在结果中。
+    """
+    table_name, _ = _get_table_and_header()
+    return repo.list_documents_meta_by_ids(doc_ids=list(doc_ids or []), table_name=table_name)
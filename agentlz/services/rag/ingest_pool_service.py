@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""文档入库进程池
+
+大文档的切块与向量化默认在 MQ 消费线程内执行，受 GIL 限制只能用满一个核。
+`rag_ingest_mode=process` 时改由独立的工作进程池完成：
+- 每个工作进程启动时设置 torch/OMP 线程数并预加载一次嵌入模型；
+- 切块在工作进程内执行，不占用 API 进程的 GIL；
+- 向量化按批并行提交，结果按原顺序流式返回给写库方，在途批次数有上限以控制内存；
+- 待向量化文本可以是生成器（流式切块），按需拉取成批，不要求一次性切完整篇文档。
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agentlz.config.settings import get_settings
+
+logger = setup_logging(level="DEBUG", name="agentlz.ingest_pool", prefix="[入库进程池]")
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_ingest_mode() -> str:
+    """入库执行模式：inline（MQ 线程内执行，默认）或 process（工作进程池）"""
+    mode = str(getattr(get_settings(), "rag_ingest_mode", "inline") or "inline").lower().strip()
+    return mode if mode in ("inline", "process") else "inline"
+
+
+def _pool_shape() -> Tuple[int, int]:
+    """返回 (工作进程数, 每进程 torch 线程数)；线程数为 0 时按核数均分"""
+    s = get_settings()
+    cpus = os.cpu_count() or 1
+    workers = int(getattr(s, "rag_ingest_workers", 0) or 0)
+    if workers <= 0:
+        workers = max(1, cpus // 4)
+    threads = int(getattr(s, "rag_ingest_torch_threads", 0) or 0)
+    if threads <= 0:
+        threads = max(1, cpus // workers)
+    return workers, threads
+
+
+def _worker_init(torch_threads: int) -> None:
+    """工作进程初始化：限制数学库线程数并预加载嵌入模型"""
+    n = str(max(1, int(torch_threads)))
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = n
+    try:
+        import torch
+
+        torch.set_num_threads(int(n))
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+    try:
+        from agentlz.services.rag.chunk_embeddings_service import _get_embedder
+
+        _get_embedder()
+    except Exception as e:
+        logger.error(f"工作进程预加载嵌入模型失败 pid={os.getpid()}: {e}")
+
+
+def _chunk_task(content: str, strategy: int) -> List[str]:
+    from agentlz.services.rag.chunk_embeddings_service import chunk_content_by_strategy
+
+    return chunk_content_by_strategy(content, strategy)
+
+
+def _embed_task(texts: List[str]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    from agentlz.services.rag.chunk_embeddings_service import embed_texts_dedup_service
+
+    t0 = time.perf_counter()
+    vectors, stats = embed_texts_dedup_service(texts=texts)
+    stats["forward_ms"] = (time.perf_counter() - t0) * 1000.0
+    return vectors, stats
+
+
+def get_ingest_pool() -> ProcessPoolExecutor:
+    """获取（懒加载）入库工作进程池；使用 spawn 启动，避免 fork 继承 torch 线程状态"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                workers, threads = _pool_shape()
+                _POOL = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init,
+                    initargs=(threads,),
+                )
+                logger.info(f"入库进程池已启动 workers={workers} torch_threads={threads}")
+    return _POOL
+
+
+def shutdown_ingest_pool(wait: bool = True) -> None:
+    """关闭入库进程池（应用退出时调用）"""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+        logger.info("入库进程池已关闭")
+
+
+def submit_chunk_task(content: str, strategy: int) -> Future:
+    """提交切块任务到工作进程，返回结果为分块列表的 Future（多个策略可并行切片）"""
+    return get_ingest_pool().submit(_chunk_task, content, int(strategy or 0))
+
+
+def chunk_in_pool(content: str, strategy: int) -> List[str]:
+    """在工作进程内按策略切块，返回分块列表"""
+    return submit_chunk_task(content, strategy).result()
+
+
+def iter_text_batches(texts: Iterable[str], size: int) -> Iterator[Tuple[int, List[str]]]:
+    """将文本流按 size 条一批惰性分组，产出 (批起始偏移, 批文本)；只持有当前一批"""
+    size = max(1, int(size))
+    batch: List[str] = []
+    offset = 0
+    for t in texts or ():
+        batch.append(str(t))
+        if len(batch) >= size:
+            yield offset, batch
+            offset += len(batch)
+            batch = []
+    if batch:
+        yield offset, batch
+
+
+def iter_embedded_batches(
+    texts: Iterable[str],
+    *,
+    batch_size: int,
+    max_inflight: Optional[int] = None,
+) -> Iterator[Tuple[int, List[str], List[List[float]], Dict[str, Any]]]:
+    """将文本分批提交到工作进程向量化，按原顺序逐批产出结果
+
+    参数：
+    - texts: 待向量化文本（列表或生成器；生成器按需拉取，在途批次满时暂停拉取）
+    - batch_size: 每批条数
+    - max_inflight: 同时在途的批次数上限；为空时读取 `rag_ingest_max_inflight`，0 表示进程数的 2 倍
+
+    返回：
+    - 迭代器，元素为 (批起始偏移, 批文本, 批向量, 批统计)；批统计含内容哈希去重 hits/computed 与 forward_ms
+
+    行为：
+    - 前一批结果返回后即可写库，同时后续批次仍在其他进程中计算；
+    - 任一批失败时取消尚未开始的批次并向上抛出异常。
+    """
+    pool = get_ingest_pool()
+    limit = max_inflight
+    if limit is None:
+        limit = int(getattr(get_settings(), "rag_ingest_max_inflight", 0) or 0)
+    if limit <= 0:
+        limit = _pool_shape()[0] * 2
+    pending: Deque[Tuple[int, List[str], Future]] = deque()
+    try:
+        for offset, batch in iter_text_batches(texts, batch_size):
+            pending.append((offset, batch, pool.submit(_embed_task, batch)))
+            if len(pending) >= limit:
+                off, b, fut = pending.popleft()
+                vectors, stats = fut.result()
+                yield off, b, vectors, stats
+        while pending:
+            off, b, fut = pending.popleft()
+            vectors, stats = fut.result()
+            yield off, b, vectors, stats
+    finally:
+        for _, _, fut in pending:
+            fut.cancel()
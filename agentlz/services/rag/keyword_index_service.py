@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""进程内 BM25 关键词召回（按 Agent 维护倒排索引）
+
+作为 `chunk_bm25` tsquery 检索之外的关键词召回后端（`rag_keyword_backend=memory`）：
+- 词条来自入库时写入的 `chunk_bm25.content_seg`，查询侧使用同一分词器（text_segmenter），两侧规则一致；
+- 懒加载：Agent 首次检索时按检索范围（启用文档 + 切割策略）从库中加载；
+- 增量同步：检索范围版本变化时按文档比对（租户、策略、分块指纹：分块数 + 文本摘要），
+  只重新加载变化的文档（含分块数不变的重新切片/文本更新）、移除已解除关联的文档；
+- 评分：BM25（k1/b 可配置），idf 使用 log(1 + (N - df + 0.5) / (df + 0.5))，倒排表只遍历命中词条。
+"""
+
+import heapq
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from agentlz.config.settings import get_settings
+from agentlz.core.text_segmenter import query_terms
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.repositories import chunk_bm25_repository as bm25_repo
+from agentlz.services.rag import retrieval_scope_service as scope_service
+
+logger = setup_logging(level="DEBUG", name="agentlz.keyword_index", prefix="[关键词索引]")
+
+_CACHE: Optional[TTLCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+class BM25Index:
+    """可增量更新的 BM25 倒排索引
+
+    参数:
+        - k1: 词频饱和参数
+        - b: 文档长度归一化参数
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = float(k1)
+        self.b = float(b)
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        self._doc_chunks: Dict[str, Set[str]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, chunk_id: str, doc_id: str, terms: Sequence[str], **fields: Any) -> None:
+        """加入一个分块（同 chunk_id 先移除再加入）"""
+        cid = str(chunk_id)
+        self.remove(cid)
+        tf: Dict[str, int] = {}
+        for t in terms:
+            tf[t] = tf.get(t, 0) + 1
+        for t, n in tf.items():
+            self._postings.setdefault(t, {})[cid] = n
+        self._chunks[cid] = {"doc_id": str(doc_id), "length": len(terms), "terms": tuple(tf), **fields}
+        self._doc_chunks.setdefault(str(doc_id), set()).add(cid)
+        self._total_len += len(terms)
+
+    def remove(self, chunk_id: str) -> None:
+        info = self._chunks.pop(str(chunk_id), None)
+        if info is None:
+            return
+        for t in info["terms"]:
+            posting = self._postings.get(t)
+            if posting is not None:
+                posting.pop(str(chunk_id), None)
+                if not posting:
+                    self._postings.pop(t, None)
+        chunks = self._doc_chunks.get(info["doc_id"])
+        if chunks is not None:
+            chunks.discard(str(chunk_id))
+            if not chunks:
+                self._doc_chunks.pop(info["doc_id"], None)
+        self._total_len -= int(info["length"])
+
+    def remove_document(self, doc_id: str) -> None:
+        for cid in list(self._doc_chunks.get(str(doc_id)) or []):
+            self.remove(cid)
+
+    def chunk(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        return self._chunks.get(str(chunk_id))
+
+    def search(self, terms: Iterable[str], *, doc_ids: Optional[Set[str]] = None, limit: int = 50) -> List[Tuple[str, float]]:
+        """BM25 打分，返回 [(chunk_id, score)]（按分数降序，至多 limit 条）"""
+        n = len(self._chunks)
+        if n == 0:
+            return []
+        avgdl = self._total_len / n if self._total_len > 0 else 1.0
+        k1, b = self.k1, self.b
+        scores: Dict[str, float] = {}
+        for t in set(terms):
+            posting = self._postings.get(t)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for cid, tf in posting.items():
+                if doc_ids is not None and self._chunks[cid]["doc_id"] not in doc_ids:
+                    continue
+                dl = self._chunks[cid]["length"]
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * dl / avgdl))
+        return heapq.nlargest(int(limit), scores.items(), key=lambda kv: (kv[1], kv[0]))
+
+
+class AgentKeywordIndex:
+    """单个 Agent 的关键词索引：BM25Index + 已加载文档的状态（用于增量同步）"""
+
+    def __init__(self, agent_id: int, *, k1: float, b: float) -> None:
+        self.agent_id = int(agent_id)
+        self.version: Optional[int] = None
+        self.index = BM25Index(k1=k1, b=b)
+        # doc_id -> (tenant_id, 策略元组或 None, 分块指纹)
+        self.entries: Dict[str, Tuple[str, Optional[Tuple[int, ...]], str]] = {}
+        self.lock = threading.Lock()
+
+
+def _get_cache() -> TTLCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                s = get_settings()
+                _CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_keyword_index_cache_size", 256) or 256),
+                    ttl=float(getattr(s, "rag_keyword_index_ttl", 3600) or 0),
+                )
+    return _CACHE
+
+
+def get_keyword_backend() -> str:
+    """关键词召回后端：tsquery（PG 全文检索，默认）或 memory（进程内 BM25）"""
+    v = str(getattr(get_settings(), "rag_keyword_backend", "tsquery") or "tsquery").strip().lower()
+    return "memory" if v == "memory" else "tsquery"
+
+
+def _sync(idx: AgentKeywordIndex, scope: Dict[str, Any]) -> Dict[str, int]:
+    """按检索范围增量同步索引，返回 {"loaded", "removed", "chunks"}"""
+    allowed_by_tenant = scope_service.scope_enabled_doc_ids(scope)
+    wanted: Dict[str, Tuple[str, Optional[Tuple[int, ...]]]] = {}
+    for tid, dids in allowed_by_tenant.items():
+        strategies = scope_service.scope_doc_strategies(scope, dids)
+        for d in dids:
+            st = strategies.get(d)
+            wanted[d] = (str(tid), tuple(st) if st else None)
+
+    removed = 0
+    for d in list(idx.entries):
+        if d not in wanted:
+            idx.index.remove_document(d)
+            idx.entries.pop(d, None)
+            removed += 1
+
+    loaded = 0
+    for tid, dids in allowed_by_tenant.items():
+        strategies = scope_service.scope_doc_strategies(scope, dids)
+        prints = bm25_repo.fingerprint_chunks_by_doc_ids(tenant_id=str(tid), doc_ids=dids, doc_strategies=strategies)
+        stale = [
+            d for d in dids
+            if idx.entries.get(d) != (*wanted[d], prints.get(d, ""))
+        ]
+        if not stale:
+            continue
+        for d in stale:
+            idx.index.remove_document(d)
+        rows = bm25_repo.list_chunk_terms_by_doc_ids(
+            tenant_id=str(tid),
+            doc_ids=stale,
+            doc_strategies={d: strategies[d] for d in stale if d in strategies},
+        )
+        for r in rows:
+            terms = [t.lower() for t in str(r.get("content_seg") or "").split()]
+            idx.index.add(
+                str(r["chunk_id"]),
+                str(r["doc_id"]),
+                terms,
+                tenant_id=str(tid),
+                content=r.get("content"),
+            )
+        for d in stale:
+            idx.entries[d] = (*wanted[d], prints.get(d, ""))
+        loaded += len(stale)
+    return {"loaded": loaded, "removed": removed, "chunks": len(idx.index)}
+
+
+def get_agent_keyword_index(agent_id: int, scope: Dict[str, Any]) -> AgentKeywordIndex:
+    """取出 Agent 的关键词索引；首次使用或检索范围版本变化时同步"""
+    s = get_settings()
+    cache = _get_cache()
+    aid = int(agent_id)
+    idx = cache.get(aid)
+    if idx is None:
+        idx = AgentKeywordIndex(
+            aid,
+            k1=float(getattr(s, "rag_bm25_k1", 1.5) or 1.5),
+            b=float(getattr(s, "rag_bm25_b", 0.75) or 0.75),
+        )
+        cache.set(aid, idx)
+    version = int(scope.get("version", 0) or 0)
+    if idx.version != version:
+        with idx.lock:
+            if idx.version != version:
+                t0 = time.perf_counter()
+                stats = _sync(idx, scope)
+                idx.version = version
+                logger.info(
+                    f"同步关键词索引 agent_id={aid} version={version} loaded={stats['loaded']} "
+                    f"removed={stats['removed']} chunks={stats['chunks']} cost_ms={(time.perf_counter() - t0) * 1000:.1f}"
+                )
+    return idx
+
+
+def search_keyword_memory(
+    *,
+    agent_id: int,
+    scope: Dict[str, Any],
+    message: str,
+    limit: int = 50,
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """进程内 BM25 关键词召回
+
+    参数:
+        - agent_id: Agent 主键 ID
+        - scope: 检索范围（`retrieval_scope_service.get_agent_retrieval_scope` 的返回值）
+        - message: 查询文本（与入库相同规则分词）
+        - limit: 返回条数上限（跨租户全局 Top-K）
+        - doc_ids: 可选的文档过滤
+
+    返回:
+        - 列表: {chunk_id, doc_id, tenant_id, content, score}，按 score 降序
+    """
+    terms = query_terms(message)
+    if not terms:
+        return []
+    idx = get_agent_keyword_index(agent_id, scope)
+    allowed = {str(d) for d in doc_ids} if doc_ids is not None else None
+    with idx.lock:
+        hits = idx.index.search(terms, doc_ids=allowed, limit=limit)
+        out: List[Dict[str, Any]] = []
+        for cid, score in hits:
+            info = idx.index.chunk(cid) or {}
+            out.append({
+                "chunk_id": cid,
+                "doc_id": info.get("doc_id"),
+                "tenant_id": info.get("tenant_id"),
+                "content": info.get("content"),
+                "score": float(score),
+            })
+    return out
+
+
+def keyword_index_stats() -> Dict[str, Any]:
+    """进程内关键词索引缓存统计"""
+    return _get_cache().stats()
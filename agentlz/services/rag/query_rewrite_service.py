@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""RAG 查询改写服务（LLM 改写 + 快速路径 + 改写缓存）
+
+检索前把用户消息改写为检索短句，决策顺序：
+1. 快速路径（`rag_rewrite_mode=auto`）：消息较短且不含指代/承接词（它、这个、上面、继续、it/that 等）时视为自包含，
+   直接用本地规则 `rag_build_queries` 提取短句，不调用 LLM；
+2. 改写缓存：按 (Agent, 归一化消息, 历史摘要) 缓存 LLM 改写结果（进程内 LRU + Redis）；
+3. LLM 改写：调用 `get_rag_query_agent(...).invoke`，失败或无可用短句时回退本地规则（回退结果不缓存）。
+
+每次决策返回指标字典（来源、耗时、缓存命中），由调用方写入观测指标。
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from agentlz.agents.rag.rag_agent import get_rag_query_agent, rag_build_queries
+from agentlz.config.settings import get_settings
+from agentlz.core.external_services import get_redis_client
+from agentlz.core.model_factory import get_model_by_name
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.repositories import agent_repository as agent_repo
+from agentlz.schemas.rag import RAGQueryInput
+
+logger = setup_logging(level="DEBUG", name="agentlz.query_rewrite", prefix="[查询改写]")
+
+_CACHE: Optional[TTLCache] = None
+_CACHE_LOCK = threading.Lock()
+# Redis 层计数（进程内 LRU 的统计由 TTLCache 自带）
+_REDIS_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "errors": 0}
+# 决策来源计数：fast_path / cache / llm / rules_fallback
+_DECISIONS: Dict[str, int] = {}
+_DECISIONS_LOCK = threading.Lock()
+
+# 指代/承接词：出现时消息依赖上下文，需要 LLM 结合历史改写
+_ANAPHORA_ZH = re.compile(r"它|他们|她们|它们|这个|那个|这些|那些|这里|那里|这种|那种|上面|上述|前面|刚才|之前|继续|还有呢|然后呢|同上")
+_ANAPHORA_EN = re.compile(r"\b(it|its|this|that|these|those|they|them|above|previous|again)\b", re.IGNORECASE)
+_MAX_ITEMS = 6
+
+
+def _get_cache() -> TTLCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                s = get_settings()
+                _CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_rewrite_cache_size", 2048) or 2048),
+                    ttl=float(getattr(s, "rag_rewrite_cache_ttl", 3600) or 3600),
+                )
+    return _CACHE
+
+
+def rewrite_mode() -> str:
+    """改写模式：auto（快速路径 + 缓存 + LLM，默认）/ llm（缓存 + LLM）/ rules（只用本地规则）"""
+    v = str(getattr(get_settings(), "rag_rewrite_mode", "auto") or "auto").strip().lower()
+    return v if v in ("auto", "llm", "rules") else "auto"
+
+
+def speculative_enabled() -> bool:
+    """推测执行：LLM 改写期间先用原始消息检索，改写返回后合并两路结果"""
+    return bool(getattr(get_settings(), "rag_rewrite_speculative", False))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", str(text or "")).split())
+
+
+def _record(source: str) -> None:
+    with _DECISIONS_LOCK:
+        _DECISIONS[source] = _DECISIONS.get(source, 0) + 1
+
+
+def is_self_contained(message: str) -> bool:
+    """判断消息是否可走快速路径：长度不超过 `rag_rewrite_fast_max_chars` 且不含指代/承接词"""
+    text = _normalize(message)
+    max_chars = int(getattr(get_settings(), "rag_rewrite_fast_max_chars", 24) or 0)
+    if text == "" or len(text) > max_chars:
+        return False
+    return not (_ANAPHORA_ZH.search(text) or _ANAPHORA_EN.search(text))
+
+
+def rule_queries(message: str) -> List[str]:
+    """本地规则提取检索短句（`rag_build_queries`），异常时返回空列表"""
+    try:
+        res = rag_build_queries(RAGQueryInput(message=str(message), max_items=_MAX_ITEMS))
+        return list(getattr(res, "messages", []) or [])
+    except Exception:
+        return []
+
+
+def _cache_key(agent_id: int, message: str, history: str) -> str:
+    his_digest = hashlib.sha1(str(history or "").encode("utf-8")).hexdigest()
+    digest = hashlib.sha1(f"{_normalize(message)}\n{his_digest}".encode("utf-8")).hexdigest()
+    return f"rag:rewrite:{int(agent_id)}:{digest}"
+
+
+def _cache_get(key: str) -> Optional[List[str]]:
+    cache = _get_cache()
+    msgs = cache.get(key)
+    if msgs is not None:
+        return list(msgs)
+    try:
+        raw = get_redis_client().get(key)
+    except Exception:
+        _REDIS_STATS["errors"] += 1
+        return None
+    if not raw:
+        _REDIS_STATS["misses"] += 1
+        return None
+    _REDIS_STATS["hits"] += 1
+    msgs = [str(x) for x in json.loads(raw)]
+    cache.set(key, msgs)
+    return msgs
+
+
+def _cache_set(key: str, msgs: List[str]) -> None:
+    _get_cache().set(key, list(msgs))
+    try:
+        ttl = int(getattr(get_settings(), "rag_rewrite_cache_ttl", 3600) or 3600)
+        get_redis_client().set(key, json.dumps(msgs, ensure_ascii=False), ex=ttl)
+    except Exception:
+        _REDIS_STATS["errors"] += 1
+
+
+def _agent_llm_override(agent_id: int) -> Any:
+    """根据 Agent meta（模型名与密钥）构建模型实例；未配置时返回 None（使用全局模型）"""
+    s = get_settings()
+    try:
+        agent_table = getattr(s, "agent_table_name", "agent")
+        arow = agent_repo.get_agent_by_id_any_tenant(agent_id=int(agent_id), table_name=agent_table)
+    except Exception:
+        arow = None
+    if not arow:
+        return None
+    mc = arow.get("meta")
+    if isinstance(mc, str):
+        try:
+            mc = json.loads(mc)
+        except Exception:
+            mc = None
+    if not isinstance(mc, dict):
+        return None
+    model_name = str(mc.get("model_name") or "") or None
+    chat_api_key = mc.get("chatopenai_api_key")
+    chat_base_url = mc.get("chatopenai_base_url")
+    openai_key = mc.get("openai_api_key")
+    if not (model_name or chat_api_key or chat_base_url or openai_key):
+        return None
+    return get_model_by_name(
+        settings=s,
+        model_name=model_name or s.model_name,
+        streaming=False,
+        chatopenai_api_key=chat_api_key,
+        chatopenai_base_url=chat_base_url,
+        openai_api_key=openai_key,
+    )
+
+
+def _parse_agent_response(resp: Any) -> List[str]:
+    """解析查询代理响应，兼容 structured_response / dict.messages / 属性 / list / JSON 字符串"""
+    try:
+        if isinstance(resp, dict) and resp.get("structured_response") is not None:
+            return list(getattr(resp["structured_response"], "messages", []) or [])
+        if isinstance(resp, dict) and resp.get("messages") is not None:
+            return list(resp.get("messages") or [])
+        if hasattr(resp, "messages"):
+            return list(getattr(resp, "messages", []) or [])
+        if isinstance(resp, list):
+            return [str(x) for x in resp]
+        if isinstance(resp, str):
+            tmp = json.loads(resp)
+            if isinstance(tmp, list):
+                return [str(x) for x in tmp]
+    except Exception:
+        return []
+    return []
+
+
+def resolve_without_llm(*, agent_id: int, message: str, history: str) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+    """不调用 LLM 即可得到改写结果时返回 (短句, 指标)，否则返回 (None, 指标)
+
+    行为：
+    - rules 模式或快速路径：本地规则提取（source=rules/fast_path）；
+    - 改写缓存命中：返回缓存的 LLM 改写结果（source=cache）。
+    """
+    t0 = time.perf_counter()
+    mode = rewrite_mode()
+    metrics: Dict[str, Any] = {"rewrite_mode": mode}
+    if mode == "rules" or (mode == "auto" and is_self_contained(message)):
+        source = "rules" if mode == "rules" else "fast_path"
+        msgs = rule_queries(message)
+        _record(source)
+        metrics.update({"rewrite_source": source, "rewrite_ms": round((time.perf_counter() - t0) * 1000.0, 2)})
+        return msgs, metrics
+    msgs = _cache_get(_cache_key(agent_id, message, history))
+    if msgs:
+        _record("cache")
+        metrics.update({"rewrite_source": "cache", "rewrite_ms": round((time.perf_counter() - t0) * 1000.0, 2)})
+        return msgs, metrics
+    return None, metrics
+
+
+def rewrite_with_llm(*, agent_id: int, message: str, history: str) -> Tuple[List[str], Dict[str, Any]]:
+    """调用查询代理改写；成功时写入改写缓存，失败或无短句时回退本地规则（source=rules_fallback，不缓存）"""
+    t0 = time.perf_counter()
+    msgs: List[str] = []
+    try:
+        agent = get_rag_query_agent(_agent_llm_override(agent_id))
+        payload = RAGQueryInput(message=str(message), max_items=_MAX_ITEMS).model_dump()
+        payload["history"] = str(history or "")
+        resp: Any = agent.invoke(payload)
+        logger.debug(f"查询代理返回 resp={resp}")
+        msgs = [str(x) for x in _parse_agent_response(resp) if str(x).strip()]
+    except Exception:
+        logger.exception(f"查询代理改写失败 agent_id={agent_id} message={message}")
+        msgs = []
+    if msgs:
+        source = "llm"
+        _cache_set(_cache_key(agent_id, message, history), msgs)
+    else:
+        source = "rules_fallback"
+        msgs = rule_queries(message)
+    _record(source)
+    return msgs, {
+        "rewrite_mode": rewrite_mode(),
+        "rewrite_source": source,
+        "rewrite_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+    }
+
+
+def rewrite_queries(*, agent_id: int, message: str, history: str) -> Tuple[List[str], Dict[str, Any]]:
+    """改写检索短句：快速路径/缓存优先，其次 LLM
+
+    参数：
+    - agent_id: Agent 主键 ID（缓存键与模型覆盖）
+    - message: 用户消息
+    - history: 历史上下文文本（参与缓存键，仅用于指代消解）
+
+    返回：
+    - (短句列表, 指标字典 {rewrite_mode, rewrite_source, rewrite_ms})
+    """
+    msgs, metrics = resolve_without_llm(agent_id=agent_id, message=message, history=history)
+    if msgs is not None:
+        return msgs, metrics
+    return rewrite_with_llm(agent_id=agent_id, message=message, history=history)
+
+
+def rewrite_stats() -> Dict[str, Any]:
+    """改写缓存统计与决策来源计数"""
+    out = _get_cache().stats()
+    out["redis"] = dict(_REDIS_STATS)
+    with _DECISIONS_LOCK:
+        out["decisions"] = dict(_DECISIONS)
+    return out
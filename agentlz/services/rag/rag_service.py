@@ -15,18 +15,23 @@ from agentlz.repositories import record_repository as repo
 from agentlz.repositories import document_repository as doc_repo
 from agentlz.services.rag import document_service as doc_service
 from agentlz.services.rag import chunk_embeddings_service as emb_service
+from agentlz.services.rag import retrieval_scope_service as scope_service
+from agentlz.services.rag.vector_hot_tier_service import hot_tier_enabled
+from agentlz.services.rag import keyword_index_service as kw_service
+from agentlz.services.rag import retrieval_cache_service as result_cache
+from agentlz.services.rag import query_rewrite_service as rewrite_service
+from agentlz.services.rag import context_packer_service as context_packer
+from agentlz.core.text_segmenter import query_terms
 from agentlz.repositories import session_repository as sess_repo
 from agentlz.repositories import chunk_bm25_repository as bm25_repo
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 import json
-from agentlz.agents.rag.rag_agent import get_rag_query_agent, rag_build_queries
-from agentlz.schemas.rag import RAGQueryInput, RAGQueryOutput
+from agentlz.schemas.rag import RAGQueryOutput
 from agentlz.core.external_services import get_redis_client
 import time
 import uuid
-from agentlz.core.model_factory import get_model_by_name, get_model
-from agentlz.repositories import agent_repository as agent_repo
+from agentlz.core.reranker_factory import rerank_scores
 from agentlz.services.cache_service import chat_history_get, chat_history_overwrite
 
 
@@ -164,7 +169,8 @@ def get_doc_topk_messages(
 
     if int(limit) <= 0:
         limit = 5
-    doc_ids_grouped = doc_service.list_agent_related_document_ids_service(agent_id=int(agent_id))
+    scope = scope_service.get_agent_retrieval_scope(int(agent_id))
+    doc_ids_grouped = scope_service.scope_enabled_doc_ids(scope)
     if not doc_ids_grouped:
         return []
     merged: list[Dict[str, Any]] = []
@@ -175,6 +181,7 @@ def get_doc_topk_messages(
             message=message,
             messages=messages,
             doc_ids=[str(x) for x in did_list],
+            doc_strategies=scope_service.scope_doc_strategies(scope, [str(x) for x in did_list]),
             distance_metric=distance_metric,
             limit=limit,
             include_vector=include_vector,
@@ -208,6 +215,13 @@ def get_doc_topk_multi(
     - limit：最终返回 Top-K
     - distance_metric：向量距离（euclidean/cosine）
     - include_vector：是否返回向量
+
+    行为：
+    - `rag_hybrid_mode=sql`（默认）：每个租户一条 SQL 完成向量/全文召回、RRF 与元数据提升，只取回最终候选；
+    - `rag_hybrid_mode=python` 或需要返回向量时：两路分别查询，在 Python 内融合；
+    - 关键词召回后端由 `rag_keyword_backend` 选择：tsquery（PG 全文检索）或 memory（进程内 BM25，结果以数组参与 SQL 融合）；
+    - 结果缓存（`rag_result_cache_enabled`）：按 Agent 检索范围版本 + 归一化消息/短句 + 检索配置缓存最终 Top-K 的分块 ID 与分数，
+      命中时一次批量查询回填正文；需要返回向量时不走缓存。
     """
     logger = setup_logging(level="DEBUG", name="agentlz.rag_service", prefix="[RAG 服务]")
     logger.debug(f"进入 [get_doc_topk_multi] agent_id={agent_id} limit={limit}")
@@ -218,28 +232,31 @@ def get_doc_topk_multi(
     RERANK_ENABLED = bool(getattr(s, "rag_rerank_enabled", True))
     BM25_ENABLED = bool(getattr(s, "rag_bm25_enabled", True))
     rerank_model_name = str(getattr(s, "rag_rerank_model", "cross-encoder/ms-marco-MiniLM-L-6-v2"))
+    RERANK_MAX_CANDIDATES = int(getattr(s, "rag_rerank_max_candidates", 30) or 30)
+    HYBRID_MODE = str(getattr(s, "rag_hybrid_mode", "sql") or "sql").strip().lower()
 
-    grouped = doc_service.list_agent_related_document_ids_service(agent_id=int(agent_id))
-    if not grouped:
+    # 检索范围（关联文档分组、启用状态、切割策略、元数据词条）走版本化缓存，三条召回链路共享
+    scope = scope_service.get_agent_retrieval_scope(int(agent_id))
+    allowed_by_tenant = scope_service.scope_enabled_doc_ids(scope)
+    if not allowed_by_tenant:
         logger.debug("无关联文档，返回空列表")
         return []
+    scope_docs: Dict[str, Dict[str, Any]] = scope.get("docs") or {}
 
-    def _allowed_docs_for_tenant(tenant_id: str, dids: List[str]) -> List[str]:
-        table_name = getattr(get_settings(), "document_table_name", "document")
-        allowed: List[str] = []
-        for did in dids:
-            try:
-                row = doc_repo.get_document_with_names_by_id_any_tenant(
-                    doc_id=str(did),
-                    table_name=table_name,
-                    user_table_name=getattr(s, "user_table_name", "users"),
-                    tenant_table_name=getattr(s, "tenant_table_name", "tenant"),
-                )
-            except Exception:
-                row = None
-            if row and int(row.get("disabled") or 0) == 0:
-                allowed.append(str(did))
-        return allowed
+    cache_key: Optional[str] = None
+    if not include_vector and result_cache.result_cache_enabled():
+        cache_key = result_cache.build_cache_key(
+            agent_id=int(agent_id),
+            version=int(scope.get("version", 0) or 0),
+            message=message,
+            messages=messages,
+            limit=FINAL_TOP_K,
+            distance_metric=distance_metric,
+        )
+        cached = result_cache.get_cached_results(cache_key)
+        if cached is not None:
+            logger.debug(f"命中检索结果缓存 [get_doc_topk_multi] count={len(cached)}")
+            return cached
 
     def _to_terms(text: str) -> List[str]:
         """将消息拆分为词条（简单中文/英文混合），用于 tsquery 与元数据匹配"""
@@ -253,22 +270,25 @@ def get_doc_topk_multi(
         """构造 tsquery（AND 连接），示例: ['配置','Agent'] -> '配置 & Agent'"""
         return " & ".join(terms[:8])  # 控制最大项数，避免过长
 
-    best_by_chunk: Dict[str, Dict[str, Any]] = {}
-    vec_list: List[Dict[str, Any]] = []
-    bm25_list: List[Dict[str, Any]] = []
-    doc_boost: Dict[str, float] = {}
+    KEYWORD_BACKEND = kw_service.get_keyword_backend() if BM25_ENABLED else "tsquery"
+
+    def _keyword_memory_hits() -> List[Dict[str, Any]]:
+        """进程内 BM25 召回（跨租户一次打分）；失败时返回空列表，不影响向量链路"""
+        try:
+            return kw_service.search_keyword_memory(agent_id=int(agent_id), scope=scope, message=message, limit=BM25_TOP_K)
+        except Exception:
+            logger.exception("进程内 BM25 召回失败")
+            return []
 
     def _vec_task():
         local: List[Dict[str, Any]] = []
-        for tid, did_list in grouped.items():
-            allowed = _allowed_docs_for_tenant(str(tid), [str(x) for x in did_list])
-            if not allowed:
-                continue
+        for tid, allowed in allowed_by_tenant.items():
             res = emb_service.search_similar_chunks_service(
                 tenant_id=str(tid),
                 message=message,
                 messages=messages,
                 doc_ids=allowed,
+                doc_strategies=scope_service.scope_doc_strategies(scope, allowed),
                 distance_metric=distance_metric,
                 limit=VECTOR_TOP_K,
                 include_vector=include_vector,
@@ -281,6 +301,7 @@ def get_doc_topk_multi(
                 local.append({
                     "chunk_id": str(r.get("chunk_id") or ""),
                     "doc_id": str(r.get("doc_id") or ""),
+                    "tenant_id": str(tid),
                     "content": r.get("content"),
                     "score": float(sim),
                     "type": "vector",
@@ -292,19 +313,28 @@ def get_doc_topk_multi(
         local: List[Dict[str, Any]] = []
         if not BM25_ENABLED:
             return local
-        terms = _to_terms(message)
-        tsq = _to_tsquery_str(terms)
+        if KEYWORD_BACKEND == "memory":
+            return [
+                {"chunk_id": h["chunk_id"], "doc_id": h["doc_id"], "tenant_id": h["tenant_id"], "content": h["content"], "score": h["score"], "type": "bm25"}
+                for h in _keyword_memory_hits()
+            ]
+        # 查询词条与入库 content_seg 使用同一分词器
+        tsq = _to_tsquery_str(query_terms(message))
         if tsq.strip() == "":
             return local
-        for tid, did_list in grouped.items():
-            allowed = _allowed_docs_for_tenant(str(tid), [str(x) for x in did_list])
-            if not allowed:
-                continue
-            rows = bm25_repo.search_chunks_by_tsquery(tenant_id=str(tid), doc_ids=allowed, tsquery=tsq, limit=BM25_TOP_K)
+        for tid, allowed in allowed_by_tenant.items():
+            rows = bm25_repo.search_chunks_by_tsquery(
+                tenant_id=str(tid),
+                doc_ids=allowed,
+                tsquery=tsq,
+                limit=BM25_TOP_K,
+                doc_strategies=scope_service.scope_doc_strategies(scope, allowed),
+            )
             for r in rows or []:
                 local.append({
                     "chunk_id": str(r.get("chunk_id") or ""),
                     "doc_id": str(r.get("doc_id") or ""),
+                    "tenant_id": str(tid),
                     "content": r.get("content"),
                     "score": float(r.get("score") or 0.0),
                     "type": "bm25",
@@ -317,103 +347,131 @@ def get_doc_topk_multi(
         if not terms:
             return boost
         tset = set(terms)
-        for tid, did_list in grouped.items():
-            allowed = _allowed_docs_for_tenant(str(tid), [str(x) for x in did_list])
+        for tid, allowed in allowed_by_tenant.items():
             for did in allowed:
-                try:
-                    row = doc_repo.get_document_with_names_by_id_any_tenant(
-                        doc_id=str(did),
-                        table_name=getattr(get_settings(), "document_table_name", "document"),
-                        user_table_name=getattr(get_settings(), "user_table_name", "users"),
-                        tenant_table_name=getattr(get_settings(), "tenant_table_name", "tenant"),
-                    )
-                except Exception:
-                    row = None
-                if not row:
-                    continue
-                title = str(row.get("title") or "")
-                tags = str(row.get("tags") or "")
-                desc = str(row.get("description") or "")
-                text = " ".join([title, tags, desc])
-                words = set(_to_terms(text))
+                words = set((scope_docs.get(str(did)) or {}).get("terms") or [])
                 inter = words & tset
                 if inter:
                     # 简单提升：匹配项数量作为 boost
                     boost[str(did)] = float(len(inter))
         return boost
 
-    with ThreadPoolExecutor(max_workers=3) as ex:
-        f_vec = ex.submit(_vec_task)
-        f_bm = ex.submit(_bm25_task)
-        f_meta = ex.submit(_meta_task)
-        vec_list = f_vec.result()
-        bm25_list = f_bm.result()
-        doc_boost = f_meta.result()
-
-    # RRF 融合（k=60）；按来源排名计算倒数和
-    k_rrf = 60.0
-    # 构建排名索引
-    vec_sorted = sorted(vec_list, key=lambda x: float(x.get("score", 0.0)), reverse=True)
-    bm_sorted = sorted(bm25_list, key=lambda x: float(x.get("score", 0.0)), reverse=True)
-    rank_vec: Dict[str, int] = {x["chunk_id"]: i + 1 for i, x in enumerate(vec_sorted)}
-    rank_bm: Dict[str, int] = {x["chunk_id"]: i + 1 for i, x in enumerate(bm_sorted)}
-
-    # 合并并计算 RRF + 元数据提升
-    seen_chunks: Dict[str, Dict[str, Any]] = {}
-    for x in vec_sorted + bm_sorted:
-        cid = x["chunk_id"]
-        existed = seen_chunks.get(cid)
-        if existed is None:
-            seen_chunks[cid] = {
-                "chunk_id": cid,
-                "doc_id": x["doc_id"],
-                "content": x["content"],
-                "score": float(x.get("score", 0.0)),
-                "type": x["type"],
-            }
-        else:
-            # 保留更高的原始分数
-            if float(existed.get("score", 0.0)) < float(x.get("score", 0.0)):
-                existed["score"] = float(x.get("score", 0.0))
-    fused: List[Dict[str, Any]] = []
-    for cid, item in seen_chunks.items():
-        r1 = rank_vec.get(cid)
-        r2 = rank_bm.get(cid)
-        rrf = 0.0
-        if r1 is not None:
-            rrf += 1.0 / (k_rrf + float(r1))
-        if r2 is not None:
-            rrf += 1.0 / (k_rrf + float(r2))
-        # 元数据提升按 doc_id 叠加
-        boost = float(doc_boost.get(item["doc_id"], 0.0))
-        fused.append({
-            **item,
-            "rrf_score": rrf,
-            "boost": boost,
-            "fused_score": rrf + (0.02 * boost),  # 每个命中项加微小权重
-        })
+    def _fuse_in_python() -> List[Dict[str, Any]]:
+        """旧路径：两路召回分别查询，Python 内排名、合并与 RRF 融合（需要返回向量时使用）"""
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            f_vec = ex.submit(_vec_task)
+            f_bm = ex.submit(_bm25_task)
+            f_meta = ex.submit(_meta_task)
+            vec_list = f_vec.result()
+            bm25_list = f_bm.result()
+            doc_boost = f_meta.result()
+
+        # RRF 融合（k=60）；按来源排名计算倒数和
+        k_rrf = 60.0
+        # 构建排名索引
+        vec_sorted = sorted(vec_list, key=lambda x: float(x.get("score", 0.0)), reverse=True)
+        bm_sorted = sorted(bm25_list, key=lambda x: float(x.get("score", 0.0)), reverse=True)
+        rank_vec: Dict[str, int] = {x["chunk_id"]: i + 1 for i, x in enumerate(vec_sorted)}
+        rank_bm: Dict[str, int] = {x["chunk_id"]: i + 1 for i, x in enumerate(bm_sorted)}
+
+        # 合并并计算 RRF + 元数据提升
+        seen_chunks: Dict[str, Dict[str, Any]] = {}
+        for x in vec_sorted + bm_sorted:
+            cid = x["chunk_id"]
+            existed = seen_chunks.get(cid)
+            if existed is None:
+                seen_chunks[cid] = {
+                    "chunk_id": cid,
+                    "doc_id": x["doc_id"],
+                    "tenant_id": x.get("tenant_id"),
+                    "content": x["content"],
+                    "score": float(x.get("score", 0.0)),
+                    "type": x["type"],
+                }
+            else:
+                # 保留更高的原始分数
+                if float(existed.get("score", 0.0)) < float(x.get("score", 0.0)):
+                    existed["score"] = float(x.get("score", 0.0))
+        fused: List[Dict[str, Any]] = []
+        for cid, item in seen_chunks.items():
+            r1 = rank_vec.get(cid)
+            r2 = rank_bm.get(cid)
+            rrf = 0.0
+            if r1 is not None:
+                rrf += 1.0 / (k_rrf + float(r1))
+            if r2 is not None:
+                rrf += 1.0 / (k_rrf + float(r2))
+            # 元数据提升按 doc_id 叠加
+            boost = float(doc_boost.get(item["doc_id"], 0.0))
+            fused.append({
+                **item,
+                "rrf_score": rrf,
+                "boost": boost,
+                "fused_score": rrf + (0.02 * boost),  # 每个命中项加微小权重
+            })
+        return fused
+
+    def _fuse_in_sql() -> List[Dict[str, Any]]:
+        """单条 SQL 完成向量 + 全文召回、RRF 与元数据提升，每个租户一次往返，只取回最终 Top-K"""
+        tsq = _to_tsquery_str(query_terms(message)) if BM25_ENABLED and KEYWORD_BACKEND == "tsquery" else ""
+        keyword_by_tenant: Optional[Dict[str, List[Tuple[str, float]]]] = None
+        if BM25_ENABLED and KEYWORD_BACKEND == "memory":
+            keyword_by_tenant = {}
+            for h in _keyword_memory_hits():
+                keyword_by_tenant.setdefault(str(h["tenant_id"]), []).append((h["chunk_id"], h["score"]))
+        doc_boost = _meta_task()
+        out: List[Dict[str, Any]] = []
+        for tid, allowed in allowed_by_tenant.items():
+            rows = emb_service.search_hybrid_chunks_service(
+                tenant_id=str(tid),
+                message=message,
+                messages=messages,
+                doc_ids=allowed,
+                tsquery=tsq or None,
+                doc_boosts={d: doc_boost[d] for d in allowed if d in doc_boost},
+                doc_strategies=scope_service.scope_doc_strategies(scope, allowed),
+                keyword_hits=keyword_by_tenant.get(str(tid), []) if keyword_by_tenant is not None else None,
+                distance_metric=distance_metric,
+                vector_top_k=VECTOR_TOP_K,
+                bm25_top_k=BM25_TOP_K,
+                limit=max(FINAL_TOP_K, RERANK_MAX_CANDIDATES) if RERANK_ENABLED else FINAL_TOP_K,
+            )
+            out.extend({**r, "tenant_id": str(tid)} for r in rows or [])
+        return out
+
+    # 需要返回向量或向量热层已启用（向量召回走进程内索引）时保留分路召回
+    if HYBRID_MODE == "sql" and not include_vector and not hot_tier_enabled():
+        fused = _fuse_in_sql()
+    else:
+        fused = _fuse_in_python()
 
     if not fused:
         logger.debug("召回为空，返回空列表")
+        if cache_key is not None:
+            result_cache.store_results(cache_key, [])
         return []
 
-    # RRF + 重排器（Cross-Encoder）：先用 RRF 选出候选，再由重排器排序
+    # RRF + 重排器（Cross-Encoder）：只对综合分 Top-N（`rag_rerank_max_candidates`）重排，限定重排开销；
+    # 其余候选保持综合分顺序排在其后（limit 大于 N 时，最终列表尾部未经重排）
+    fused.sort(key=lambda x: float(x.get("fused_score", 0.0)), reverse=True)
     if RERANK_ENABLED:
+        candidates = fused[:RERANK_MAX_CANDIDATES]
         try:
-            from sentence_transformers import CrossEncoder
-            ce = CrossEncoder(rerank_model_name)
-            pairs = [(message, str(r.get("content") or "")) for r in fused]
-            rs = ce.predict(pairs)
-            for i, r in enumerate(fused):
+            rs = rerank_scores(
+                message,
+                [str(r.get("content") or "") for r in candidates],
+                model_name=rerank_model_name,
+            )
+            for i, r in enumerate(candidates):
                 r["rerank_score"] = float(rs[i])
-            fused.sort(key=lambda x: (float(x.get("rerank_score", 0.0)), float(x.get("fused_score", 0.0))), reverse=True)
+            candidates.sort(key=lambda x: (float(x.get("rerank_score", 0.0)), float(x.get("fused_score", 0.0))), reverse=True)
+            fused = candidates + fused[len(candidates):]
         except Exception:
             logger.exception("重排失败，退回按综合分排序")
-            fused.sort(key=lambda x: float(x.get("fused_score", 0.0)), reverse=True)
-    else:
-        fused.sort(key=lambda x: float(x.get("fused_score", 0.0)), reverse=True)
 
     final = fused[:FINAL_TOP_K]
+    if cache_key is not None:
+        result_cache.store_results(cache_key, final)
     logger.debug(f"完成 [get_doc_topk_multi] count={len(final)}")
     return final
 def check_all_session_detail_by_record(*, record_id: int) -> List[Dict[str, Any]]:
@@ -685,6 +743,21 @@ def get_sessions_by_record_paginated(
     return {"rows": out_rows, "total": int(total)}
 
 
+def _merge_ranked_results(lists: List[List[Dict[str, Any]]], *, limit: int, k_rrf: float = 60.0) -> List[Dict[str, Any]]:
+    """按 RRF 合并多次检索的有序结果（按 chunk_id 去重，保留首次出现的条目），截取前 limit 条（与单次检索的 Top-K 一致）"""
+    items: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    for results in lists:
+        for rank, item in enumerate(results or [], start=1):
+            cid = str(item.get("chunk_id") or "")
+            if not cid:
+                continue
+            items.setdefault(cid, item)
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k_rrf + float(rank))
+    order = sorted(scores, key=lambda c: scores[c], reverse=True)
+    return [items[c] for c in order[:limit]]
+
+
 def agent_chat_get_rag(*, agent_id: int, message: str, record_id: int=-1, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """ RAG 检索 部分
 
@@ -698,6 +771,8 @@ def agent_chat_get_rag(*, agent_id: int, message: str, record_id: int=-1, meta:
      "history": his_joined, // 当前用户的历史问答记录 str
      "message": message, // 用户输入消息 str
      "messages": optimized_msgs // rag优化后的查询短句数组 str[]
+     "rag_metrics": {...} // 改写决策与耗时（rewrite_source: fast_path/cache/llm/rules_fallback，speculative 等）
+                          // 及上下文打包指标（context_tokens_raw/packed/saved 等），供观测推送
      }
     """
 
@@ -774,118 +849,54 @@ def agent_chat_get_rag(*, agent_id: int, message: str, record_id: int=-1, meta:
         except Exception:
             record_id = int(created_row.get("id") or -1)
     logger.debug(f"当前查询轮次属于的历史纪录: record_id={record_id}")
-    # 阶段5：调用查询代理生成“优化后的检索短句”，并据此执行检索
+    # 阶段5：生成“优化后的检索短句”（快速路径/改写缓存/LLM），并据此执行检索
     try:
         rag: List[Dict[str, Any]] = []
         optimized_msgs: List[str] = []
-        
+        rag_metrics: Dict[str, Any] = {}
 
         # message 不为空时，才进行rag检索
         if isinstance(message, str) and message.strip() != "":
-            try:
-                # 阶段5.1：根据 agent 的 meta（模型名与密钥）构建或覆盖模型实例
-                llm_override = None
-                try:
-                    s_agent = get_settings()
-                    agent_table = getattr(s_agent, "agent_table_name", "agent")
-                    arow = agent_repo.get_agent_by_id_any_tenant(agent_id=int(agent_id), table_name=agent_table)
-                except Exception:
-                    arow = None
-                if arow:
-                    mc = arow.get("meta")
-                    if isinstance(mc, str):
-                        try:
-                            mc = json.loads(mc)
-                        except Exception:
-                            mc = None
-                    if isinstance(mc, dict):
-                        model_name = str(mc.get("model_name") or "") or None
-                        chat_api_key = mc.get("chatopenai_api_key")
-                        chat_base_url = mc.get("chatopenai_base_url")
-                        openai_key = mc.get("openai_api_key")
-                        if model_name or chat_api_key or chat_base_url or openai_key:
-                            llm_override = get_model_by_name(
-                                settings=s_agent,
-                                model_name=model_name or s_agent.model_name,
-                                streaming=False,
-                                chatopenai_api_key=chat_api_key,
-                                chatopenai_base_url=chat_base_url,
-                                openai_api_key=openai_key,
-                            )
-                # 阶段5.2：构造符合提示词规范的输入文本（历史仅用于指代消解，短句仅从当前问题抽取）
-                agent = get_rag_query_agent(llm_override)
-                rq_inp = RAGQueryInput(message=str(message), max_items=6)
-                payload = rq_inp.model_dump()
-                payload["history"] = str(his_joined or "")
-                logger.debug(f"进入 agent 整合 messages")
-                # 阶段5.3：调用查询代理，期望返回结构化的检索短句
-                resp: Any = agent.invoke(payload)
-
-                logger.debug(f"继续 [agent_chat_get_rag] agent理解message完毕, 输出了: resp={resp}")
-
-                # 阶段5.4：解析响应，兼容多种返回结构（structured_response / dict.messages / 属性 / list / JSON字符串）
-                if isinstance(resp, dict) and resp.get("structured_response") is not None:
-                    sr = resp["structured_response"]
-                    try:
-                        optimized_msgs = list(getattr(sr, "messages", []) or [])
-                    except Exception:
-                        optimized_msgs = []
-                elif isinstance(resp, dict) and resp.get("messages") is not None:
-                    try:
-                        optimized_msgs = list(resp.get("messages") or [])
-                    except Exception:
-                        optimized_msgs = []
-                elif hasattr(resp, "messages"):
-                    try:
-                        optimized_msgs = list(getattr(resp, "messages", []) or [])
-                    except Exception:
-                        optimized_msgs = []
-                elif isinstance(resp, list):
-                    try:
-                        optimized_msgs = [str(x) for x in resp]
-                    except Exception:
-                        optimized_msgs = []
-                elif isinstance(resp, str):
-                    try:
-                        _tmp = json.loads(resp)
-                        if isinstance(_tmp, list):
-                            optimized_msgs = [str(x) for x in _tmp]
-                    except Exception:
-                        optimized_msgs = []
-                # 阶段5.5：若代理未返回可用短句，回退到本地规则提取
-                if not optimized_msgs:
-                    try:
-                        _q = RAGQueryInput(message=str(message), max_items=6)
-                        _res = rag_build_queries(_q)
-                        optimized_msgs = list(getattr(_res, "messages", []) or [])
-                    except Exception:
-                        optimized_msgs = []
-            except Exception:
-                # 阶段5.6：代理调用发生异常时的防御性回退（本地规则提取）
-                logger.exception(f"错误 [agent_chat_get_rag] agent理解message失败, message={message}")
-                try:
-                    _q = RAGQueryInput(message=str(message), max_items=6)
-                    _res = rag_build_queries(_q)
-                    optimized_msgs = list(getattr(_res, "messages", []) or [])
-                except Exception:
-                    optimized_msgs = []
-            
-            # 阶段6：使用优化后的短句数组执行文档检索，获取 TopK 文档
-            logger.debug(f"继续 [agent_chat_get_rag] 开始[get_doc_topk_multi] 优化后的messages={optimized_msgs}")
-            # 多链路召回
-            rag = get_doc_topk_multi(agent_id=int(agent_id), message=message, messages=optimized_msgs)
-            
-        
-        # 阶段7：汇总检索到的文档内容为字符串，组装最终输出对象
-        doc_texts: List[str] = []
-        for x in rag:
-            c = x.get("content")
-            if c:
-                doc_texts.append(str(c))
-        doc_joined = "\n".join(doc_texts)
+            t_start = time.perf_counter()
+            # 各路径（快速路径/缓存/LLM/推测执行合并）统一返回的 Top-K
+            topk = 5
+            # 阶段5.1：不需要 LLM 的决策（rules 模式、自包含短消息的快速路径、改写缓存命中）
+            planned, rag_metrics = rewrite_service.resolve_without_llm(agent_id=int(agent_id), message=message, history=his_joined)
+            if planned is not None:
+                optimized_msgs = planned
+                logger.debug(f"继续 [agent_chat_get_rag] 跳过 LLM 改写 source={rag_metrics.get('rewrite_source')} messages={optimized_msgs}")
+                rag = get_doc_topk_multi(agent_id=int(agent_id), message=message, messages=optimized_msgs, limit=topk)
+            elif rewrite_service.speculative_enabled():
+                # 阶段5.2：推测执行——LLM 改写期间先用原始消息检索，改写返回后合并两路结果
+                with ThreadPoolExecutor(max_workers=1) as ex:
+                    f_raw = ex.submit(get_doc_topk_multi, agent_id=int(agent_id), message=message, messages=[message], limit=topk)
+                    optimized_msgs, rag_metrics = rewrite_service.rewrite_with_llm(agent_id=int(agent_id), message=message, history=his_joined)
+                    raw_rag = f_raw.result()
+                rag_metrics["speculative"] = True
+                if {m.strip() for m in optimized_msgs if m.strip()} <= {message.strip()}:
+                    rag = raw_rag
+                    rag_metrics["speculative_result"] = "raw"
+                else:
+                    rewritten_rag = get_doc_topk_multi(agent_id=int(agent_id), message=message, messages=optimized_msgs, limit=topk)
+                    rag = _merge_ranked_results([rewritten_rag, raw_rag], limit=topk)
+                    rag_metrics["speculative_result"] = "merged"
+            else:
+                # 阶段5.3：LLM 改写（失败或无短句时回退本地规则），再执行多链路召回
+                optimized_msgs, rag_metrics = rewrite_service.rewrite_with_llm(agent_id=int(agent_id), message=message, history=his_joined)
+                logger.debug(f"继续 [agent_chat_get_rag] 开始[get_doc_topk_multi] 优化后的messages={optimized_msgs}")
+                rag = get_doc_topk_multi(agent_id=int(agent_id), message=message, messages=optimized_msgs, limit=topk)
+            rag_metrics["rag_pipeline_ms"] = round((time.perf_counter() - t_start) * 1000.0, 2)
+
+        # 阶段7：按 token 预算打包检索内容（按文档/分块序号排序、去除相邻分块重叠），组装最终输出对象
+        doc_joined = ""
+        if rag:
+            doc_joined, pack_metrics = context_packer.pack_context(rag, budget_tokens=context_packer.agent_context_budget(int(agent_id)))
+            rag_metrics.update(pack_metrics)
 
         out: Dict[str, Any] = {"doc": doc_joined, "history": his_joined, "message": message, "record_id": int(record_id)}
         out.update(RAGQueryOutput(messages=optimized_msgs or [str(message)]).model_dump())
+        if rag_metrics:
+            out["rag_metrics"] = rag_metrics
         logger.debug(f"完成 [agent_chat_get_rag] record_id={record_id}")
         return out
     except Exception:
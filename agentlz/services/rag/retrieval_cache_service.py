@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""RAG 检索结果缓存（按 Agent 语料版本 + 归一化查询）
+
+`get_doc_topk_multi` 的最终 Top-K 结果按以下要素缓存：
+- Agent ID 与检索范围版本号（文档入库/更新/禁用/删除、分块增删改、关联变更都会递增版本，旧结果自然失效）；
+- 归一化后的原始消息与改写短句（NFKC + 折叠空白，短句去重排序）；
+- 影响结果的检索配置（Top-K、距离度量、融合方式、关键词后端、重排模型等）。
+
+缓存值只保存分块 ID、租户与各项分数，不保存正文；命中时按租户一次批量查询取回内容，
+任一分块已不存在时视为未命中并重新检索。缓存分两级：进程内 LRU（TTLCache）与 Redis（JSON），
+Redis 键包含版本号，版本递增后旧键等待 TTL 过期。
+"""
+
+import hashlib
+import json
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+
+from agentlz.config.settings import get_settings
+from agentlz.core.external_services import get_redis_client
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.repositories import chunk_embeddings_repository as emb_repo
+
+logger = setup_logging(level="DEBUG", name="agentlz.retrieval_cache", prefix="[检索结果缓存]")
+
+_CACHE: Optional[TTLCache] = None
+_CACHE_LOCK = threading.Lock()
+# Redis 层计数（进程内 LRU 的统计由 TTLCache 自带）；stale=缓存命中但分块已不存在
+_REDIS_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "errors": 0, "stale": 0}
+
+# 参与缓存键的检索配置项（变化后旧结果不再命中）
+_SETTING_FIELDS = (
+    "rag_vector_top_k",
+    "rag_bm25_top_k",
+    "rag_bm25_enabled",
+    "rag_rerank_enabled",
+    "rag_rerank_model",
+    "rag_rerank_max_candidates",
+    "rag_hybrid_mode",
+    "rag_keyword_backend",
+    "rag_default_strategy",
+    "rag_hot_tier_enabled",
+    "hf_embedding_model",
+)
+# 不进入缓存值的字段：正文与向量在命中时重新取回
+_HYDRATED_FIELDS = ("content", "created_at", "embedding")
+
+
+def _get_cache() -> TTLCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                s = get_settings()
+                _CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_result_cache_size", 4096) or 4096),
+                    ttl=float(getattr(s, "rag_result_cache_ttl", 600) or 600),
+                )
+    return _CACHE
+
+
+def result_cache_enabled() -> bool:
+    return bool(getattr(get_settings(), "rag_result_cache_enabled", True))
+
+
+def _normalize(text: str) -> str:
+    """NFKC 全半角统一 + 折叠空白（与查询向量缓存的归一化一致）"""
+    return " ".join(unicodedata.normalize("NFKC", str(text or "")).split())
+
+
+def build_cache_key(
+    *,
+    agent_id: int,
+    version: int,
+    message: str,
+    messages: Sequence[str],
+    limit: int,
+    distance_metric: str,
+) -> str:
+    """生成检索结果缓存键：rag:res:{agent_id}:v{version}:{digest}
+
+    参数：
+    - agent_id: Agent 主键 ID
+    - version: 检索范围版本号（`scope["version"]`）
+    - message: 原始消息
+    - messages: 改写后的查询短句（去重排序后参与摘要）
+    - limit: 最终 Top-K
+    - distance_metric: 向量距离度量
+    """
+    s = get_settings()
+    payload = {
+        "m": _normalize(message),
+        "q": sorted({_normalize(x) for x in (messages or []) if _normalize(x)}),
+        "k": int(limit),
+        "d": str(distance_metric),
+        "s": [getattr(s, f, None) for f in _SETTING_FIELDS],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"rag:res:{int(agent_id)}:v{int(version)}:{digest}"
+
+
+def _hydrate(entries: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """按租户批量取回分块正文；任一分块缺失时返回 None"""
+    by_tenant: Dict[str, List[str]] = {}
+    for e in entries:
+        by_tenant.setdefault(str(e.get("tenant_id") or ""), []).append(str(e["chunk_id"]))
+    found: Dict[str, Dict[str, Any]] = {}
+    for tid, ids in by_tenant.items():
+        rows = emb_repo.get_chunks_by_ids(tenant_id=tid, chunk_ids=ids)
+        for cid, row in rows.items():
+            found[f"{tid}\n{cid}"] = row
+    out: List[Dict[str, Any]] = []
+    for e in entries:
+        row = found.get(f"{e.get('tenant_id') or ''}\n{e['chunk_id']}")
+        if row is None:
+            return None
+        item = {k: v for k, v in e.items() if k != "_created_at"}
+        item["content"] = row.get("content")
+        if e.get("_created_at"):
+            item["created_at"] = row.get("created_at")
+        out.append(item)
+    return out
+
+
+def get_cached_results(key: str) -> Optional[List[Dict[str, Any]]]:
+    """读取缓存结果（进程内 -> Redis），命中时批量回填正文
+
+    返回：
+    - 与检索结果同结构的列表；未命中、分块已删除或读取失败时返回 None
+    """
+    cache = _get_cache()
+    entries = cache.get(key)
+    if entries is None:
+        try:
+            raw = get_redis_client().get(key)
+        except Exception:
+            _REDIS_STATS["errors"] += 1
+            raw = None
+        if not raw:
+            _REDIS_STATS["misses"] += 1
+            return None
+        _REDIS_STATS["hits"] += 1
+        entries = json.loads(raw)
+        cache.set(key, entries)
+    if not entries:
+        return []
+    try:
+        out = _hydrate(entries)
+    except Exception as e:
+        logger.warning(f"回填检索结果失败 key={key}: {e}")
+        return None
+    if out is None:
+        _REDIS_STATS["stale"] += 1
+        cache.pop(key)
+    return out
+
+
+def store_results(key: str, results: List[Dict[str, Any]]) -> None:
+    """写入缓存：只保存分块 ID、租户、类型与各项分数（不含正文/向量）"""
+    entries: List[Dict[str, Any]] = []
+    for r in results:
+        if not r.get("chunk_id"):
+            return
+        e = {k: v for k, v in r.items() if k not in _HYDRATED_FIELDS}
+        if "created_at" in r:
+            e["_created_at"] = True
+        entries.append(e)
+    _get_cache().set(key, entries)
+    try:
+        ttl = int(getattr(get_settings(), "rag_result_cache_ttl", 600) or 600)
+        get_redis_client().set(key, json.dumps(entries, ensure_ascii=False, default=str), ex=ttl)
+    except Exception:
+        _REDIS_STATS["errors"] += 1
+
+
+def result_cache_stats() -> Dict[str, Any]:
+    """检索结果缓存统计：进程内 LRU（size/hits/misses/hit_rate）与 Redis 层计数"""
+    out = _get_cache().stats()
+    out["redis"] = dict(_REDIS_STATS)
+    return out
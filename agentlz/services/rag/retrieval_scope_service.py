@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""Agent 检索范围缓存服务
+
+检索范围（scope）= Agent 关联文档按租户分组 + 每个文档的启用状态、检索使用的切割策略 + 用于元数据加权的词条。
+缓存分两级：进程内 LRU（TTLCache）与 Redis，均以版本号区分；
+文档新增/更新/禁用/删除、Agent 与文档关联变更时递增版本号，旧版本缓存自然失效。
+
+缓存命中后解析 scope 只需一次 Redis 版本读取，不访问数据库。
+"""
+
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from agentlz.config.settings import get_settings
+from agentlz.core.external_services import get_redis_client
+from agentlz.core.ttl_cache import TTLCache
+from agentlz.repositories import agent_document_repository as agdoc_repo
+from agentlz.repositories import chunk_embeddings_repository as emb_repo
+from agentlz.repositories import document_repository as doc_repo
+
+logger = setup_logging(level="DEBUG", name="agentlz.retrieval_scope", prefix="[检索范围]")
+
+_SCOPE_CACHE: Optional[TTLCache] = None
+_SCOPE_CACHE_LOCK = threading.Lock()
+# Redis 不可用时的进程内版本号（仅保证单进程内失效）
+_LOCAL_VERSIONS: Dict[int, int] = {}
+_LOCAL_VERSIONS_LOCK = threading.Lock()
+
+
+def _version_key(agent_id: int) -> str:
+    return f"rag:scope:ver:{int(agent_id)}"
+
+
+def _scope_key(agent_id: int, version: int) -> str:
+    return f"rag:scope:{int(agent_id)}:v{int(version)}"
+
+
+def _get_cache() -> TTLCache:
+    global _SCOPE_CACHE
+    if _SCOPE_CACHE is None:
+        with _SCOPE_CACHE_LOCK:
+            if _SCOPE_CACHE is None:
+                s = get_settings()
+                _SCOPE_CACHE = TTLCache(
+                    maxsize=int(getattr(s, "rag_scope_cache_size", 1024) or 1024),
+                    ttl=float(getattr(s, "rag_scope_cache_ttl", 600) or 600),
+                )
+    return _SCOPE_CACHE
+
+
+def meta_terms(text: str) -> List[str]:
+    """将标题/标签/描述拆分为词条（英文数字按词，中文按连续汉字），与消息词条规则一致"""
+    if not isinstance(text, str) or text.strip() == "":
+        return []
+    return [p for p in re.findall(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+", text) if p]
+
+
+def get_scope_version(agent_id: int) -> int:
+    """读取 Agent 检索范围的当前版本号（优先 Redis，失败时回退进程内版本）"""
+    try:
+        v = get_redis_client().get(_version_key(agent_id))
+        return int(v or 0)
+    except Exception:
+        with _LOCAL_VERSIONS_LOCK:
+            return int(_LOCAL_VERSIONS.get(int(agent_id), 0))
+
+
+def bump_agent_scope_version(agent_id: int) -> int:
+    """递增 Agent 检索范围版本号，使进程内与 Redis 中的旧缓存失效
+
+    返回：
+    - 递增后的版本号（Redis 不可用时为进程内版本号）
+    """
+    aid = int(agent_id)
+    with _LOCAL_VERSIONS_LOCK:
+        _LOCAL_VERSIONS[aid] = int(_LOCAL_VERSIONS.get(aid, 0)) + 1
+        local_v = _LOCAL_VERSIONS[aid]
+    _get_cache().pop(aid)
+    try:
+        return int(get_redis_client().incr(_version_key(aid)))
+    except Exception as e:
+        logger.warning(f"递增检索范围版本失败 agent_id={aid}: {e}")
+        return local_v
+
+
+def bump_document_scope_versions(doc_id: str) -> List[int]:
+    """文档变更后递增所有关联 Agent 的检索范围版本号
+
+    参数：
+    - doc_id: 文档ID
+
+    返回：
+    - 被递增版本的 agent_id 列表
+    """
+    did = str(doc_id or "").strip()
+    if not did:
+        return []
+    try:
+        rel_table = getattr(get_settings(), "agent_document_table_name", "agent_document")
+        agent_ids = agdoc_repo.list_agent_ids_by_document(document_id=did, table_name=rel_table)
+    except Exception as e:
+        logger.warning(f"查询文档关联 Agent 失败 doc_id={did}: {e}")
+        return []
+    for aid in agent_ids:
+        bump_agent_scope_version(aid)
+    return agent_ids
+
+
+def _resolve_default_strategies(grouped: Dict[str, List[str]], pinned: Dict[str, List[int]]) -> Dict[str, List[int]]:
+    """为未固定策略的文档选择默认切割策略
+
+    行为：
+    - `rag_default_strategy` 为负数时不选择（检索全部策略）；
+    - 按租户批量查询文档已入库的策略，文档存在默认策略时使用默认策略，否则使用其编号最小的策略；
+    - 查询失败或文档尚无分块时不限制策略。
+    """
+    default = int(getattr(get_settings(), "rag_default_strategy", 0))
+    if default < 0:
+        return {}
+    out: Dict[str, List[int]] = {}
+    for tid, dids in grouped.items():
+        free = [d for d in dids if d not in pinned]
+        if not free:
+            continue
+        try:
+            available = emb_repo.list_distinct_doc_strategies_by_doc_ids(tenant_id=str(tid), doc_ids=free)
+        except Exception as e:
+            logger.warning(f"查询文档切割策略失败 tenant={tid}: {e}")
+            continue
+        for d in free:
+            strategies = available.get(d) or []
+            if strategies:
+                out[d] = [default] if default in strategies else [min(strategies)]
+    return out
+
+
+def build_agent_retrieval_scope(agent_id: int) -> Dict[str, Any]:
+    """从数据库构建 Agent 检索范围（关联列表 + 批量文档元数据 + 按租户批量查询已入库策略）
+
+    返回：
+    - {"agent_id", "grouped": {tenant_id: [doc_id]}, "docs": {doc_id: {tenant_id, enabled, terms, strategies}}}
+    - strategies：关联上固定的策略列表（agent_document.strategy），未固定时为默认策略；None 表示不限制
+    """
+    s = get_settings()
+    rel_table = getattr(s, "agent_document_table_name", "agent_document")
+    table_name = getattr(s, "document_table_name", "document")
+    rows = agdoc_repo.list_agent_documents(agent_id=int(agent_id), table_name=rel_table)
+    ordered: List[str] = []
+    seen: set[str] = set()
+    pinned: Dict[str, List[int]] = {}
+    for r in rows or []:
+        d = str(r.get("document_id") or "").strip()
+        if not d or d in seen:
+            continue
+        seen.add(d)
+        ordered.append(d)
+        if r.get("strategy"):
+            pinned[d] = [int(x) for x in r["strategy"]]
+    meta = doc_repo.list_documents_meta_by_ids(doc_ids=ordered, table_name=table_name) if ordered else {}
+    grouped: Dict[str, List[str]] = {}
+    docs: Dict[str, Dict[str, Any]] = {}
+    for d in ordered:
+        row = meta.get(d)
+        if not row:
+            continue
+        tid = str(row.get("tenant_id") or "") or "default"
+        grouped.setdefault(tid, []).append(d)
+        text = " ".join([str(row.get("title") or ""), str(row.get("tags") or ""), str(row.get("description") or "")])
+        docs[d] = {
+            "tenant_id": tid,
+            "enabled": int(row.get("disabled") or 0) == 0,
+            "terms": sorted(set(meta_terms(text))),
+            "strategies": pinned.get(d),
+        }
+    for d, strategies in _resolve_default_strategies(grouped, pinned).items():
+        docs[d]["strategies"] = strategies
+    return {"agent_id": int(agent_id), "grouped": grouped, "docs": docs}
+
+
+def get_agent_retrieval_scope(agent_id: int) -> Dict[str, Any]:
+    """获取 Agent 检索范围（进程内缓存 -> Redis -> 数据库构建）
+
+    参数：
+    - agent_id: Agent 主键 ID
+
+    返回：
+    - 检索范围字典（含 version 字段）；调用方应视为只读
+    """
+    aid = int(agent_id)
+    version = get_scope_version(aid)
+    cache = _get_cache()
+    scope = cache.get(aid)
+    if scope is not None and int(scope.get("version", -1)) == version:
+        return scope
+
+    rc = None
+    try:
+        rc = get_redis_client()
+        raw = rc.get(_scope_key(aid, version))
+        if raw:
+            scope = json.loads(raw)
+            scope["version"] = version
+            cache.set(aid, scope)
+            return scope
+    except Exception as e:
+        rc = None
+        logger.debug(f"读取 Redis 检索范围失败 agent_id={aid}: {e}")
+
+    scope = build_agent_retrieval_scope(aid)
+    scope["version"] = version
+    cache.set(aid, scope)
+    if rc is not None:
+        try:
+            ttl = int(getattr(get_settings(), "rag_scope_cache_ttl", 600) or 600)
+            rc.set(_scope_key(aid, version), json.dumps(scope, ensure_ascii=False), ex=ttl)
+        except Exception as e:
+            logger.debug(f"写入 Redis 检索范围失败 agent_id={aid}: {e}")
+    logger.debug(f"构建检索范围 agent_id={aid} version={version} docs={len(scope.get('docs') or {})}")
+    return scope
+
+
+def scope_enabled_doc_ids(scope: Dict[str, Any]) -> Dict[str, List[str]]:
+    """从检索范围中取出已启用的文档，按租户分组 {tenant_id: [doc_id]}"""
+    docs = scope.get("docs") or {}
+    out: Dict[str, List[str]] = {}
+    for tid, dids in (scope.get("grouped") or {}).items():
+        allowed = [d for d in dids if (docs.get(d) or {}).get("enabled")]
+        if allowed:
+            out[str(tid)] = allowed
+    return out
+
+
+def scope_doc_strategies(scope: Dict[str, Any], doc_ids: List[str]) -> Dict[str, List[int]]:
+    """从检索范围中取出文档的检索策略 {doc_id: [strategy]}（未限制策略的文档不出现）"""
+    docs = scope.get("docs") or {}
+    out: Dict[str, List[int]] = {}
+    for d in doc_ids:
+        strategies = (docs.get(d) or {}).get("strategies")
+        if strategies:
+            out[d] = [int(x) for x in strategies]
+    return out
+
+
+def scope_cache_stats() -> Dict[str, Any]:
+    """进程内检索范围缓存命中统计"""
+    return _get_cache().stats()
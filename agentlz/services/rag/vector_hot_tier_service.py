@@ -0,0 +1,517 @@
+from __future__ import annotations
+
+from agentlz.core.logger import setup_logging
+
+"""向量检索热层（进程内 hnswlib）
+
+按租户在内存中维护 hnswlib 索引，命中时向量召回不访问 PostgreSQL：
+- 懒加载：租户首次检索未命中时在后台线程从 `chunk_embeddings` 流式构建，本次请求回退 PG；
+- 增量维护：入库/更新/删除分块时同步更新已加载的索引（标记删除 + 槽位复用）；
+- 跨进程一致：Redis 中维护租户向量版本号，其他进程写入后本进程视为未命中并重建；
+  版本号按 `rag_hot_tier_version_check_ms` 间隔校验（间隔内命中不访问 Redis），本进程写入直接更新本地版本；
+- 内存预算：按估算字节数做 LRU 淘汰，超出 `rag_hot_tier_max_mb` 时淘汰最久未用的租户；
+  增量写入后复核预算与单租户分块上限，超出上限的租户索引直接丢弃（一段时间内不再构建）。
+
+索引使用 l2 空间；嵌入向量均已归一化，余弦距离按 l2²/2 换算，两种度量共用一个索引。
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from agentlz.config.settings import get_settings
+from agentlz.core.external_services import get_redis_client
+from agentlz.repositories import chunk_embeddings_repository as emb_repo
+
+logger = setup_logging(level="DEBUG", name="agentlz.vector_hot_tier", prefix="[向量热层]")
+
+_HNSW_M = 16
+_HNSW_EF_CONSTRUCTION = 100
+
+
+def _version_key(tenant_id: str) -> str:
+    return f"rag:hot:ver:{tenant_id}"
+
+
+class TenantHotIndex:
+    """单租户的 hnswlib 索引与分块元数据
+
+    参数:
+        - tenant_id: 租户标识
+        - dim: 向量维度
+        - capacity: 初始容量（不足时自动扩容）
+    """
+
+    def __init__(self, tenant_id: str, dim: int, capacity: int = 1024) -> None:
+        import hnswlib
+
+        self.tenant_id = tenant_id
+        self.dim = int(dim)
+        self.version = 0
+        self.built_at = time.monotonic()
+        # 最近一次与 Redis 校验版本号的时间（未校验过为 -inf）
+        self.checked_at = -math.inf
+        self._index = hnswlib.Index(space="l2", dim=self.dim)
+        self._index.init_index(
+            max_elements=max(16, int(capacity)),
+            ef_construction=_HNSW_EF_CONSTRUCTION,
+            M=_HNSW_M,
+            allow_replace_deleted=True,
+        )
+        self._lock = threading.RLock()
+        self._labels: Dict[str, int] = {}
+        self._meta: Dict[int, Dict[str, Any]] = {}
+        self._doc_labels: Dict[str, Set[int]] = {}
+        # 每个文档各切割策略的分块数（随写入/删除增量维护，检索时按范围求和，不遍历分块）
+        self._doc_strategy_counts: Dict[str, Dict[int, int]] = {}
+        self._next_label = 0
+        self._content_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def memory_bytes(self) -> int:
+        """估算内存占用：向量 + 图邻接表 + 分块文本"""
+        per_item = self.dim * 4 + _HNSW_M * 2 * 4 + 96
+        return self._index.get_max_elements() * per_item + self._content_bytes
+
+    def upsert(self, rows: Sequence[Dict[str, Any]]) -> None:
+        """写入或替换分块（同 chunk_id 先标记删除再写入新向量）"""
+        items = [r for r in rows if r.get("embedding") is not None and len(r.get("embedding")) == self.dim]
+        if not items:
+            return
+        with self._lock:
+            for r in items:
+                self._remove_locked(str(r["chunk_id"]))
+            need = len(self._meta) + len(items)
+            if need > self._index.get_max_elements():
+                self._index.resize_index(max(need, self._index.get_max_elements() * 2))
+            labels: List[int] = []
+            for r in items:
+                label = self._next_label
+                self._next_label += 1
+                cid = str(r["chunk_id"])
+                did = str(r.get("doc_id") or "")
+                content = r.get("content")
+                self._labels[cid] = label
+                strategy = int(r.get("strategy") or 0)
+                self._meta[label] = {
+                    "chunk_id": cid,
+                    "doc_id": did,
+                    "content": content,
+                    "created_at": r.get("created_at"),
+                    "strategy": strategy,
+                }
+                self._doc_labels.setdefault(did, set()).add(label)
+                counts = self._doc_strategy_counts.setdefault(did, {})
+                counts[strategy] = counts.get(strategy, 0) + 1
+                self._content_bytes += len(content.encode("utf-8")) if isinstance(content, str) else 0
+                labels.append(label)
+            data = np.asarray([r["embedding"] for r in items], dtype=np.float32)
+            self._index.add_items(data, labels, num_threads=1, replace_deleted=True)
+
+    def remove(self, chunk_ids: Sequence[str]) -> None:
+        with self._lock:
+            for cid in chunk_ids:
+                self._remove_locked(str(cid))
+
+    def remove_document(self, doc_id: str) -> None:
+        with self._lock:
+            for label in list(self._doc_labels.get(str(doc_id)) or []):
+                self._remove_locked(self._meta[label]["chunk_id"])
+
+    def _remove_locked(self, chunk_id: str) -> None:
+        label = self._labels.pop(chunk_id, None)
+        if label is None:
+            return
+        meta = self._meta.pop(label, {})
+        did = meta.get("doc_id", "")
+        labels = self._doc_labels.get(did)
+        if labels is not None:
+            labels.discard(label)
+            if not labels:
+                self._doc_labels.pop(did, None)
+        counts = self._doc_strategy_counts.get(did)
+        if counts is not None:
+            strategy = meta.get("strategy", 0)
+            counts[strategy] = counts.get(strategy, 0) - 1
+            if counts[strategy] <= 0:
+                counts.pop(strategy, None)
+            if not counts:
+                self._doc_strategy_counts.pop(did, None)
+        content = meta.get("content")
+        self._content_bytes -= len(content.encode("utf-8")) if isinstance(content, str) else 0
+        self._index.mark_deleted(label)
+
+    def _count_in_scope_locked(self, doc_ids: Optional[Set[str]], pinned: Dict[str, Set[int]]) -> int:
+        """范围内的分块数：按文档/策略计数求和，代价与范围内文档数成正比（与分块数无关）"""
+
+        def _doc_count(doc: str) -> int:
+            counts = self._doc_strategy_counts.get(doc)
+            if not counts:
+                return 0
+            st = pinned.get(doc)
+            return sum(counts.values()) if st is None else sum(counts.get(s, 0) for s in st)
+
+        if doc_ids is not None:
+            return sum(_doc_count(d) for d in doc_ids)
+        # 不限文档、仅限定部分文档的策略：总数减去被排除的策略
+        excluded = sum(sum((self._doc_strategy_counts.get(d) or {}).values()) - _doc_count(d) for d in pinned)
+        return len(self._meta) - excluded
+
+    def search(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        *,
+        doc_ids: Optional[Set[str]],
+        distance_metric: str,
+        limit: int,
+        ef_search: int,
+        doc_strategies: Optional[Dict[str, Set[int]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """多查询近邻检索：每个查询取 Top-limit，按 chunk 保留最小距离后全局排序
+
+        doc_strategies 中出现的文档只保留指定切割策略的分块（与 PG 侧 (doc_id, strategy) 过滤一致）。
+        """
+        pinned = {d: st for d, st in (doc_strategies or {}).items() if st}
+        with self._lock:
+            meta = self._meta
+
+            def _allowed(label: int) -> bool:
+                m = meta.get(label)
+                if m is None or (doc_ids is not None and m["doc_id"] not in doc_ids):
+                    return False
+                st = pinned.get(m["doc_id"])
+                return st is None or m["strategy"] in st
+
+            alive = len(meta) if doc_ids is None and not pinned else self._count_in_scope_locked(doc_ids, pinned)
+            # 范围覆盖全部分块时不传过滤器；否则过滤器只在图遍历访问到的节点上调用（O(1) 字典查找）
+            label_filter = None if alive == len(meta) else _allowed
+            k = min(int(limit), alive)
+            if k <= 0:
+                return []
+            self._index.set_ef(max(int(ef_search), k))
+            data = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+            labels, dists = self._index.knn_query(data, k=k, num_threads=1, filter=label_filter)
+            best: Dict[int, tuple[float, int]] = {}
+            for qi in range(labels.shape[0]):
+                for label, d2 in zip(labels[qi].tolist(), dists[qi].tolist()):
+                    if label not in self._meta:
+                        continue
+                    dist = math.sqrt(max(d2, 0.0)) if distance_metric == "euclidean" else max(d2, 0.0) / 2.0
+                    if label not in best or dist < best[label][0]:
+                        best[label] = (dist, qi)
+            ranked = sorted(best.items(), key=lambda kv: kv[1][0])[: int(limit)]
+            return [
+                {
+                    "chunk_id": self._meta[label]["chunk_id"],
+                    "tenant_id": self.tenant_id,
+                    "doc_id": self._meta[label]["doc_id"],
+                    "content": self._meta[label]["content"],
+                    "created_at": self._meta[label]["created_at"],
+                    "similarity_score": float(dist),
+                    "query_index": int(qi),
+                }
+                for label, (dist, qi) in ranked
+            ]
+
+
+class VectorHotTier:
+    """按租户管理 TenantHotIndex 的 LRU 容器（内存预算 + 后台单飞构建）"""
+
+    def __init__(self, *, max_bytes: int, max_chunks: int, ttl: float, version_check_s: float = 0.0) -> None:
+        self.max_bytes = int(max_bytes)
+        self.max_chunks = int(max_chunks)
+        self.ttl = float(ttl)
+        # 跨进程版本校验间隔（秒）；<=0 时每次检索都读取 Redis
+        self.version_check_s = float(version_check_s)
+        self._indexes: "OrderedDict[str, TenantHotIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Set[str] = set()
+        self._too_large: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, tenant_id: str) -> Optional[TenantHotIndex]:
+        """取出可用的租户索引；超过 TTL 或（按校验间隔读取的）远端版本落后时丢弃并返回 None"""
+        with self._lock:
+            idx = self._indexes.get(tenant_id)
+            if idx is not None:
+                self._indexes.move_to_end(tenant_id)
+        if idx is None:
+            return None
+        now = time.monotonic()
+        if self.ttl > 0 and now - idx.built_at > self.ttl:
+            self.drop(tenant_id)
+            return None
+        if self.version_check_s <= 0 or now - idx.checked_at >= self.version_check_s:
+            remote = _read_tenant_version(tenant_id)
+            idx.checked_at = now
+            if remote is not None and remote != idx.version:
+                self.drop(tenant_id)
+                return None
+        return idx
+
+    def get_loaded(self, tenant_id: str) -> Optional[TenantHotIndex]:
+        """取出已加载的租户索引（不做版本/TTL 校验，供增量维护使用）"""
+        with self._lock:
+            return self._indexes.get(tenant_id)
+
+    def put(self, idx: TenantHotIndex) -> None:
+        with self._lock:
+            self._indexes[idx.tenant_id] = idx
+            self._indexes.move_to_end(idx.tenant_id)
+            self._evict_locked()
+
+    def drop(self, tenant_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(tenant_id, None)
+
+    def enforce_limits(self, tenant_id: str) -> bool:
+        """增量写入后复核上限：该租户分块数超过 `max_chunks` 或单独超出内存预算时丢弃并暂停构建，
+        否则按 LRU 淘汰至预算以内；返回该租户索引是否仍在热层"""
+        with self._lock:
+            idx = self._indexes.get(tenant_id)
+            if idx is None:
+                return False
+            if len(idx) > self.max_chunks or idx.memory_bytes() > self.max_bytes:
+                self._indexes.pop(tenant_id, None)
+                self._too_large[tenant_id] = time.monotonic() + max(self.ttl, 60.0)
+                self.evictions += 1
+                logger.info(f"租户索引超出上限，丢弃 tenant={tenant_id} chunks={len(idx)} max_chunks={self.max_chunks}")
+                return False
+            self._evict_locked()
+            return tenant_id in self._indexes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._too_large.clear()
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(i.memory_bytes() for i in self._indexes.values())
+
+    def _evict_locked(self) -> None:
+        total = sum(i.memory_bytes() for i in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            tid, idx = self._indexes.popitem(last=False)
+            total -= idx.memory_bytes()
+            self.evictions += 1
+            logger.info(f"淘汰租户索引 tenant={tid} chunks={len(idx)}")
+
+    def schedule_build(self, tenant_id: str) -> None:
+        """后台构建租户索引（同一租户同时只构建一次；超出分块上限的租户一段时间内不再尝试）"""
+        with self._lock:
+            if tenant_id in self._building or tenant_id in self._indexes:
+                return
+            skip_until = self._too_large.get(tenant_id, 0.0)
+            if skip_until > time.monotonic():
+                return
+            self._building.add(tenant_id)
+        threading.Thread(target=self._build, args=(tenant_id,), name=f"hot-tier-build-{tenant_id}", daemon=True).start()
+
+    def _build(self, tenant_id: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            version = _read_tenant_version(tenant_id) or 0
+            total = emb_repo.count_tenant_chunks(tenant_id=tenant_id)
+            if total <= 0 or total > self.max_chunks:
+                with self._lock:
+                    self._too_large[tenant_id] = time.monotonic() + max(self.ttl, 60.0)
+                logger.debug(f"跳过构建 tenant={tenant_id} chunks={total} max={self.max_chunks}")
+                return
+            idx: Optional[TenantHotIndex] = None
+            batch: List[Dict[str, Any]] = []
+            for row in emb_repo.iter_tenant_chunk_vectors(tenant_id=tenant_id):
+                if idx is None:
+                    idx = TenantHotIndex(tenant_id, len(row["embedding"]), capacity=total)
+                batch.append(row)
+                if len(batch) >= 1000:
+                    idx.upsert(batch)
+                    batch = []
+            if idx is None:
+                return
+            idx.upsert(batch)
+            idx.version = version
+            idx.built_at = time.monotonic()
+            self.put(idx)
+            logger.info(
+                f"构建租户索引 tenant={tenant_id} chunks={len(idx)} "
+                f"mem={idx.memory_bytes() / 1048576:.1f}MB cost_ms={(time.perf_counter() - t0) * 1000:.1f}"
+            )
+        except Exception as e:
+            logger.warning(f"构建租户索引失败 tenant={tenant_id}: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(tenant_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tenants = {tid: len(i) for tid, i in self._indexes.items()}
+            building = sorted(self._building)
+        total = self.hits + self.misses
+        return {
+            "tenants": tenants,
+            "building": building,
+            "memory_mb": round(self.memory_bytes() / 1048576, 2),
+            "max_mb": round(self.max_bytes / 1048576, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_TIER: Optional[VectorHotTier] = None
+_TIER_LOCK = threading.Lock()
+
+
+def _read_tenant_version(tenant_id: str) -> Optional[int]:
+    try:
+        return int(get_redis_client().get(_version_key(tenant_id)) or 0)
+    except Exception:
+        return None
+
+
+def _bump_tenant_version(tenant_id: str) -> Optional[int]:
+    try:
+        return int(get_redis_client().incr(_version_key(tenant_id)))
+    except Exception:
+        return None
+
+
+def hot_tier_enabled() -> bool:
+    return bool(getattr(get_settings(), "rag_hot_tier_enabled", False))
+
+
+def get_hot_tier() -> VectorHotTier:
+    global _TIER
+    if _TIER is None:
+        with _TIER_LOCK:
+            if _TIER is None:
+                s = get_settings()
+                _TIER = VectorHotTier(
+                    max_bytes=int(float(getattr(s, "rag_hot_tier_max_mb", 512) or 512) * 1048576),
+                    max_chunks=int(getattr(s, "rag_hot_tier_max_chunks", 50000) or 50000),
+                    ttl=float(getattr(s, "rag_hot_tier_ttl", 3600) or 0),
+                    version_check_s=float(getattr(s, "rag_hot_tier_version_check_ms", 1000) or 0) / 1000.0,
+                )
+    return _TIER
+
+
+def search_hot_tier(
+    *,
+    tenant_id: str,
+    embeddings: Sequence[Sequence[float]],
+    doc_id: Optional[str] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    distance_metric: str = "euclidean",
+    limit: int = 10,
+    doc_strategies: Optional[Dict[str, Sequence[int]]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """在热层检索；租户索引未就绪时安排后台构建并返回 None（调用方回退 PG）
+
+    返回：
+    - 与 PG 检索相同结构的结果列表（含 query_index）；None 表示未命中
+    """
+    if not hot_tier_enabled():
+        return None
+    tier = get_hot_tier()
+    tid = str(tenant_id)
+    idx = tier.get(tid)
+    if idx is None:
+        tier.misses += 1
+        tier.schedule_build(tid)
+        return None
+    if doc_ids is not None:
+        allowed: Optional[Set[str]] = {str(d) for d in doc_ids}
+    elif doc_id:
+        allowed = {str(doc_id)}
+    else:
+        allowed = None
+    vecs = [v for v in embeddings if v is not None and len(v) == idx.dim]
+    if not vecs:
+        tier.misses += 1
+        return None
+    ef = int(getattr(get_settings(), "rag_hot_tier_ef_search", 64) or 64)
+    try:
+        results = idx.search(
+            vecs,
+            doc_ids=allowed,
+            distance_metric=distance_metric,
+            limit=limit,
+            ef_search=ef,
+            doc_strategies={str(d): {int(x) for x in st} for d, st in (doc_strategies or {}).items() if st},
+        )
+    except RuntimeError as e:
+        # 过滤条件过严时 hnswlib 可能凑不满 k 个结果，交由 PG 精确检索
+        logger.debug(f"热层检索失败，回退 PG tenant={tid}: {e}")
+        tier.misses += 1
+        return None
+    tier.hits += 1
+    return results
+
+
+def on_chunks_written(*, tenant_id: str, rows: Sequence[Dict[str, Any]]) -> None:
+    """分块写入/更新后同步到已加载的租户索引，并递增租户向量版本（使其他进程的热层失效）"""
+    if not hot_tier_enabled() or not rows:
+        return
+    tid = str(tenant_id)
+    version = _bump_tenant_version(tid)
+    idx = get_hot_tier().get_loaded(tid)
+    if idx is None:
+        return
+    if version is not None and version != idx.version + 1:
+        # 期间有其他进程写入，本地索引已不完整
+        get_hot_tier().drop(tid)
+        return
+    try:
+        idx.upsert(rows)
+        if version is not None:
+            idx.version = version
+    except Exception as e:
+        logger.warning(f"增量写入热层失败 tenant={tid}: {e}")
+        get_hot_tier().drop(tid)
+        return
+    get_hot_tier().enforce_limits(tid)
+
+
+def on_chunks_deleted(*, tenant_id: str, chunk_ids: Sequence[str] = (), doc_id: Optional[str] = None) -> None:
+    """分块或文档删除后从已加载的租户索引移除，并递增租户向量版本"""
+    if not hot_tier_enabled():
+        return
+    tid = str(tenant_id)
+    version = _bump_tenant_version(tid)
+    idx = get_hot_tier().get_loaded(tid)
+    if idx is None:
+        return
+    if version is not None and version != idx.version + 1:
+        get_hot_tier().drop(tid)
+        return
+    if chunk_ids:
+        idx.remove(chunk_ids)
+    if doc_id:
+        idx.remove_document(doc_id)
+    if version is not None:
+        idx.version = version
+
+
+def on_tenant_changed(*, tenant_id: str) -> None:
+    """无法增量同步的变更（如仅更新分块文本）：丢弃租户索引，下次检索时重建"""
+    if not hot_tier_enabled():
+        return
+    _bump_tenant_version(str(tenant_id))
+    get_hot_tier().drop(str(tenant_id))
+
+
+def hot_tier_stats() -> Dict[str, Any]:
+    """热层统计：已加载租户、内存占用、命中率、淘汰次数"""
+    if not hot_tier_enabled():
+        return {"enabled": False}
+    return {"enabled": True, **get_hot_tier().stats()}
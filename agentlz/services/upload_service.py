@@ -33,6 +33,7 @@ from agentlz.services.cos_service import (
     abort_multipart_upload,
 )
 from agentlz.services.rag import document_service
+from agentlz.services.rag.retrieval_scope_service import bump_document_scope_versions
 from agentlz.core.logger import setup_logging
 logger = setup_logging()
 
@@ -222,6 +223,8 @@ def _create_document_for_upload_task(task: Dict[str, Any]) -> Dict[str, Any]:
         )
     except Exception:
         pass
+    if row and row.get("id"):
+        bump_document_scope_versions(str(row.get("id")))
     logger.debug(f"创建文档成功 doc_id={row.get('id')}")
     return row
 
@@ -8,6 +8,8 @@ CREATE TABLE IF NOT EXISTS chunk_embeddings (
     chunk_index INTEGER DEFAULT 0, -- 分块索引 对于整个文本的第几个分块
     tenant_id VARCHAR(64) NOT NULL,
     doc_id VARCHAR(64) NOT NULL,
+    -- 默认 padded 模式（补零到 1536）；EMBEDDING_STORAGE_MODE=native 时改为模型原生维度，
+    -- 例如 bge-small-zh-v1.5: VECTOR(512) 或 HALFVEC(512)，存量数据用 python -m test.sql.migrate_embedding_storage 迁移
     embedding VECTOR(1536) NOT NULL,
     content TEXT,
     length INTEGER DEFAULT 0, -- 分块长度
@@ -18,6 +20,9 @@ CREATE TABLE IF NOT EXISTS chunk_embeddings (
 -- 为分块向量创建索引 在 chunk_embeddings 上创建一个复合 B-Tree 索引，用于加速按租户和文档筛选、关联。
 --  常见查询如 WHERE tenant_id = :tenant_id AND doc_id = :doc_id 会显著加速。
 CREATE INDEX IF NOT EXISTS idx_ce_tenant_doc ON chunk_embeddings (tenant_id, doc_id);
+-- 检索按 (doc_id, strategy) 限定切割策略（Agent 关联固定策略或 RAG_DEFAULT_STRATEGY），复合索引用于精确检索路径的粗筛；
+--  存量库可并发创建：CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ce_tenant_doc_strategy ON chunk_embeddings (tenant_id, doc_id, strategy);
+CREATE INDEX IF NOT EXISTS idx_ce_tenant_doc_strategy ON chunk_embeddings (tenant_id, doc_id, strategy);
 
 
 -- 启行级安全，使该表只能访问符合策略的行。
@@ -41,8 +46,13 @@ CREATE POLICY tenant_isolate ON chunk_embeddings
 --  lists = 100 控制索引的倒排列表数量，影响速度/召回率的权衡；查询时可用 SET ivfflat.probes = N; 调整检索精度（如 10、20、50）。 
 
 
-CREATE INDEX IF NOT EXISTS idx_ce_embedding_l2
-  ON chunk_embeddings USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);
+-- 默认改用 HNSW（每个距离度量一个索引：<-> 对应 l2，<=> 对应 cosine），召回/延迟由查询侧 hnsw.ef_search 调节；
+--  存量库请用 python -m test.sql.manage_ann_indexes build --metric all 并发建索引（halfvec 时 opclass 为 halfvec_*_ops）。
+--  如需继续使用 ivfflat：CREATE INDEX ... USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS idx_ce_hnsw_l2
+  ON chunk_embeddings USING hnsw (embedding vector_l2_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_ce_hnsw_cosine
+  ON chunk_embeddings USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 -- 文本检索支持（无需扩展：代码分词 + simple 配置）
 DROP TABLE IF EXISTS chunk_bm25;
@@ -70,3 +80,13 @@ CREATE POLICY tenant_isolate ON chunk_bm25
   FOR ALL
   USING (tenant_id = current_setting('app.current_tenant', true)::varchar)
   WITH CHECK (tenant_id = current_setting('app.current_tenant', true)::varchar);
+
+-- 内容哈希向量库：按 (文本 sha256, 模型标识) 复用已计算的向量，入库时先批量查询，命中则跳过模型前向。
+--  键不含租户信息（相同文本在任意租户下向量相同），因此不启用 RLS；向量列不限定维度，兼容 padded/native 两种存储模式。
+CREATE TABLE IF NOT EXISTS embedding_store (
+    content_hash CHAR(64) NOT NULL,
+    model_id VARCHAR(255) NOT NULL,
+    embedding VECTOR NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (content_hash, model_id)
+);
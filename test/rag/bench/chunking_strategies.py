@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+from agentlz.services.rag.context_packer_service import count_tokens, tokenizer_name
+from test.rag.ingest.chunking_golden import STRATEGIES, HashEmbedder, run_case
+
+"""切片策略基准与剖析：`chunk_content_by_strategy` 全部策略在固定语料上的耗时、内存、块分布与嵌入成本
+
+- 语料：`test/rag/bench/corpus/` 下随仓库发布的中英文 Markdown（另含 `test/rag/chunk_test/test1.md` 中英混排样例），
+  `--scale` 将每篇文档自身重复拼接 N 次以放大规模；报告记录语料指纹，不同版本的结果仅在指纹一致时可直接比较；
+- 环境与金标准回放一致：策略 3 使用确定性 HashEmbedder（统计切片阶段的句向量调用），策略 4 走 LLM 不可用时的回退路径；
+- 每个策略：
+  - wall_ms：全部文档切片耗时，取 `--repeat` 次中的最小值；
+  - peak_kb：tracemalloc 单独一轮测得的单篇文档最大峰值（含切片结果本身）；
+  - 块数、块长度（字符 / token）的 min/p50/p90/p99/max；
+  - 嵌入成本预估：入库嵌入次数（= 块数）、嵌入 token 总数、相对原文的字符放大倍数（重叠/重复带来的冗余），
+    切片阶段额外的句向量次数（语料内重复句只计一次），以及入库嵌入 token 按 `--price-per-1k-tokens` 折算的费用；
+- `--baseline` 传入上一版本的 JSON 时，附加各策略耗时/峰值内存/块数/token 的相对变化，超过 `--tolerance` 的列入 regressions。
+
+运行：
+    python -m test.rag.bench.chunking_strategies --scale 20 --out .cache/bench/chunking_strategies.json
+    python -m test.rag.bench.chunking_strategies --scale 20 --baseline .cache/bench/chunking_strategies.json
+"""
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+EXTRA_FILES = [ROOT / "test" / "rag" / "chunk_test" / "test1.md"]
+
+
+class CountingEmbedder(HashEmbedder):
+    """HashEmbedder + 调用计数（策略 3 切片阶段的句向量次数）"""
+
+    def __init__(self) -> None:
+        self.texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts += len(texts)
+        return super().embed_documents(texts)
+
+
+def load_corpus(scale: int) -> List[Tuple[str, str]]:
+    files = sorted(CORPUS_DIR.glob("*.md")) + [p for p in EXTRA_FILES if p.exists()]
+    docs: List[Tuple[str, str]] = []
+    for p in files:
+        text = p.read_text(encoding="utf-8")
+        docs.append((p.name, "\n\n".join([text] * max(1, scale))))
+    return docs
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def _dist(values: List[int]) -> Dict[str, float]:
+    if not values:
+        return {"min": 0, "p50": 0, "p90": 0, "p99": 0, "max": 0, "mean": 0.0}
+    return {
+        "min": min(values),
+        "p50": _percentile(values, 0.5),
+        "p90": _percentile(values, 0.9),
+        "p99": _percentile(values, 0.99),
+        "max": max(values),
+        "mean": round(statistics.fmean(values), 1),
+    }
+
+
+def bench_strategy(strategy: int, docs: List[Tuple[str, str]], repeat: int, price_per_1k: float) -> Dict[str, Any]:
+    # 计时：多轮取最小值（不开 tracemalloc，避免其开销计入耗时）
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        for _, content in docs:
+            run_case(content, strategy, {})
+        best = min(best, time.perf_counter() - t0)
+
+    # 剖析：单独一轮测峰值内存，同时收集块与切片阶段的嵌入调用
+    emb = CountingEmbedder()
+    chunks: List[str] = []
+    by_doc: Dict[str, int] = {}
+    peak = 0
+    tracemalloc.start()
+    try:
+        for name, content in docs:
+            tracemalloc.reset_peak()
+            out = run_case(content, strategy, {}, embedder=emb)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            by_doc[name] = len(out)
+            chunks.extend(out)
+    finally:
+        tracemalloc.stop()
+
+    source_chars = sum(len(c) for _, c in docs)
+    lengths = [len(c) for c in chunks]
+    tokens = [count_tokens(c) for c in chunks]
+    total_tokens = sum(tokens)
+    return {
+        "strategy": strategy,
+        "wall_ms": round(best * 1000.0, 1),
+        "mb_per_s": round(source_chars / max(best, 1e-9) / (1024 * 1024), 3),
+        "peak_kb": round(peak / 1024.0, 1),
+        "chunks": len(chunks),
+        "chunks_by_doc": by_doc,
+        "chars": _dist(lengths),
+        "tokens": _dist(tokens),
+        "embedding": {
+            "calls": len(chunks),
+            "tokens": total_tokens,
+            "amplification": round(sum(lengths) / max(1, source_chars), 3),
+            "chunking_calls": emb.texts,
+            "projected_cost": round(total_tokens / 1000.0 * price_per_1k, 6),
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> Dict[str, Any]:
+    """与上一版本结果逐策略比较：相对变化 = 当前 / 基线 - 1"""
+    base = {int(r["strategy"]): r for r in baseline.get("strategies", [])}
+    metrics = {
+        "wall_ms": lambda r: r["wall_ms"],
+        "peak_kb": lambda r: r["peak_kb"],
+        "chunks": lambda r: r["chunks"],
+        "tokens": lambda r: r["embedding"]["tokens"],
+    }
+    deltas: Dict[str, Dict[str, float]] = {}
+    regressions: List[str] = []
+    for r in report["strategies"]:
+        b = base.get(int(r["strategy"]))
+        if not b:
+            continue
+        d: Dict[str, float] = {}
+        for key, get in metrics.items():
+            old, new = float(get(b)), float(get(r))
+            d[key] = round(new / old - 1.0, 4) if old else 0.0
+            if d[key] > tolerance:
+                regressions.append(f"strategy {r['strategy']} {key} +{d[key]:.1%}")
+        deltas[str(r["strategy"])] = d
+    return {
+        "corpus_match": baseline.get("corpus", {}).get("sha1") == report["corpus"]["sha1"],
+        "tolerance": tolerance,
+        "deltas": deltas,
+        "regressions": regressions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="切片策略基准与剖析")
+    parser.add_argument("--scale", type=int, default=10, help="每篇文档自身重复拼接次数")
+    parser.add_argument("--repeat", type=int, default=3, help="计时轮数（取最小值）")
+    parser.add_argument("--strategies", default=",".join(str(s) for s in STRATEGIES))
+    parser.add_argument("--price-per-1k-tokens", type=float, default=0.00002, help="嵌入单价（每千 token）")
+    parser.add_argument("--baseline", default="", help="上一版本的结果 JSON，用于回归比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="相对变化超过该比例记为回归")
+    parser.add_argument("--out", default="")
+    args = parser.parse_args()
+
+    docs = load_corpus(args.scale)
+    if not docs:
+        print("语料为空")
+        return
+    strategies = [int(s) for s in args.strategies.split(",") if s]
+
+    # 预热：首次调用会导入服务模块与 LangChain，不计入计时
+    for strategy in strategies:
+        run_case("预热。", strategy, {})
+
+    digest = hashlib.sha1()
+    for name, content in docs:
+        digest.update(name.encode("utf-8"))
+        digest.update(content.encode("utf-8"))
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "tokenizer": tokenizer_name(),
+        "price_per_1k_tokens": args.price_per_1k_tokens,
+        "corpus": {
+            "files": [name for name, _ in docs],
+            "scale": args.scale,
+            "chars": sum(len(c) for _, c in docs),
+            "sha1": digest.hexdigest(),
+        },
+        "strategies": [],
+    }
+    for strategy in strategies:
+        row = bench_strategy(strategy, docs, args.repeat, args.price_per_1k_tokens)
+        report["strategies"].append(row)
+        print(
+            f"strategy={strategy} wall_ms={row['wall_ms']} peak_kb={row['peak_kb']} chunks={row['chunks']} "
+            f"p50_chars={row['chars']['p50']} tokens={row['embedding']['tokens']} "
+            f"amplification={row['embedding']['amplification']}"
+        )
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        report["baseline"] = compare(report, baseline, args.tolerance)
+        print(json.dumps(report["baseline"], ensure_ascii=False, indent=2))
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
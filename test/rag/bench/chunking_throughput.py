@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+from test.rag.ingest.chunking_golden import build_inputs, run_case
+
+"""切片策略吞吐微基准：各策略在 1MB / 10MB / 50MB 输入上的 chunks/s
+
+- 输入：金标准中的中英文 Markdown 样本（`chunking_golden.build_inputs`）循环拼接到目标字符数；
+- 环境与金标准回放一致：策略 3 使用确定性 HashEmbedder，策略 4 走 LLM 不可用时的回退路径；
+- 计时前对每个策略预热一次（排除模块导入）；每个 (策略, 规模) 只跑一次，输出耗时、块数、chunks/s 与 MB/s（按字符数计）。
+
+运行：
+    python -m test.rag.bench.chunking_throughput --sizes 1,10,50 --out .cache/bench/chunking_throughput.json
+"""
+
+
+def build_document(size_mb: float) -> str:
+    inputs = build_inputs()
+    unit = "\n\n".join([inputs["zh"], inputs["en"], inputs["tiny"], inputs["short_lines"]]) + "\n\n"
+    target = int(size_mb * 1024 * 1024)
+    return (unit * (target // len(unit) + 1))[:target]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="切片策略吞吐微基准")
+    parser.add_argument("--sizes", default="1,10,50", help="输入规模（MB，按字符数计），逗号分隔")
+    parser.add_argument("--strategies", default="0,1,2,3,4,5,6,7,8,9")
+    parser.add_argument("--out", default="")
+    args = parser.parse_args()
+
+    sizes = [float(s) for s in args.sizes.split(",") if s]
+    strategies = [int(s) for s in args.strategies.split(",") if s]
+    # 预热：首次调用会导入服务模块与 LangChain，不计入计时
+    for strategy in strategies:
+        run_case("预热。", strategy, {})
+
+    results: List[Dict[str, Any]] = []
+    for size in sizes:
+        content = build_document(size)
+        for strategy in strategies:
+            t0 = time.perf_counter()
+            chunks = run_case(content, strategy, {})
+            sec = max(time.perf_counter() - t0, 1e-9)
+            row = {
+                "size_mb": size,
+                "strategy": strategy,
+                "seconds": round(sec, 3),
+                "chunks": len(chunks),
+                "chunks_per_s": round(len(chunks) / sec, 1),
+                "mb_per_s": round(len(content) / sec / (1024 * 1024), 3),
+            }
+            results.append(row)
+            print(json.dumps(row, ensure_ascii=False))
+
+    report = {"sizes_mb": sizes, "strategies": strategies, "results": results}
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
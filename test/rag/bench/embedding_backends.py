@@ -0,0 +1,151 @@
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+from agentlz.core.embedding_model_factory import DEFAULT_EMBEDDING_MODEL, get_hf_embeddings
+
+"""嵌入后端基准与精度对比
+
+以 torch 后端为基准，对比 onnx（fp32）与 onnx（int8 动态量化）：
+- 吞吐：批量 embed_documents 的条/秒，单条 embed_query 的 p50/p95 延迟；
+- 精度：逐条向量与 torch 的余弦相似度（均值/最小值），
+  以及以语料内句子为查询时 top-k 检索结果与 torch 的重合率。
+
+运行：
+    python -m test.rag.bench.embedding_backends --out .cache/bench/embedding_backends.json
+"""
+
+CORPUS_FILES = [
+    ROOT / "test" / "rag" / "rag_test_1.txt",
+    ROOT / "test" / "rag" / "chunk_test" / "test1.md",
+]
+
+
+def load_corpus(limit: int) -> List[str]:
+    texts: List[str] = []
+    for p in CORPUS_FILES:
+        if not p.exists():
+            continue
+        for line in p.read_text(encoding="utf-8").splitlines():
+            line = line.strip().lstrip("#").strip()
+            if len(line) >= 8:
+                texts.append(line)
+    return texts[:limit] if limit > 0 else texts
+
+
+def _cos(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def _topk(query: List[float], docs: List[List[float]], k: int) -> List[int]:
+    scored = sorted(range(len(docs)), key=lambda i: _cos(query, docs[i]), reverse=True)
+    return scored[:k]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    idx = min(len(s) - 1, int(round(q * (len(s) - 1))))
+    return s[idx]
+
+
+def run_backend(name: str, backend: str, quantize: bool, texts: List[str], queries: List[str], repeat: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    emb = get_hf_embeddings(model_name=name, backend=backend, quantize=quantize)
+    # 比较原生向量，避免补零包装影响
+    emb = getattr(emb, "base_embeddings", emb)
+    load_s = time.perf_counter() - t0
+
+    emb.embed_documents(texts[:8])  # 预热
+    doc_vecs: List[List[float]] = []
+    batch_s: List[float] = []
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        doc_vecs = emb.embed_documents(texts)
+        batch_s.append(time.perf_counter() - t)
+
+    query_vecs: List[List[float]] = []
+    lat_ms: List[float] = []
+    for q in queries:
+        t = time.perf_counter()
+        query_vecs.append(emb.embed_query(q))
+        lat_ms.append((time.perf_counter() - t) * 1000.0)
+
+    best = min(batch_s)
+    return {
+        "backend": backend,
+        "quantize": quantize,
+        "load_s": round(load_s, 3),
+        "docs": len(texts),
+        "docs_per_s": round(len(texts) / best, 2) if best > 0 else 0.0,
+        "query_p50_ms": round(_percentile(lat_ms, 0.5), 3),
+        "query_p95_ms": round(_percentile(lat_ms, 0.95), 3),
+        "_doc_vecs": doc_vecs,
+        "_query_vecs": query_vecs,
+    }
+
+
+def compare(base: Dict[str, Any], other: Dict[str, Any], k: int) -> Dict[str, Any]:
+    sims = [_cos(a, b) for a, b in zip(base["_doc_vecs"], other["_doc_vecs"])]
+    overlaps: List[float] = []
+    for qb, qo in zip(base["_query_vecs"], other["_query_vecs"]):
+        top_b = set(_topk(qb, base["_doc_vecs"], k))
+        top_o = set(_topk(qo, other["_doc_vecs"], k))
+        overlaps.append(len(top_b & top_o) / float(k))
+    return {
+        "cosine_mean": round(statistics.fmean(sims), 6) if sims else 0.0,
+        "cosine_min": round(min(sims), 6) if sims else 0.0,
+        f"top{k}_overlap": round(statistics.fmean(overlaps), 4) if overlaps else 0.0,
+        "speedup_vs_torch": round(other["docs_per_s"] / base["docs_per_s"], 3) if base["docs_per_s"] else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="torch / onnx / onnx-int8 嵌入后端基准与精度对比")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--limit", type=int, default=256, help="语料条数上限")
+    parser.add_argument("--queries", type=int, default=32, help="查询条数（取语料前 N 条）")
+    parser.add_argument("--repeat", type=int, default=3, help="批量嵌入重复次数（取最快一次）")
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--out", default="", help="结果 JSON 输出路径，为空则仅打印")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.limit)
+    queries = texts[: max(1, args.queries)]
+    print(f"模型={args.model} 语料={len(texts)} 查询={len(queries)}")
+
+    runs = [
+        run_backend(args.model, "torch", False, texts, queries, args.repeat),
+        run_backend(args.model, "onnx", False, texts, queries, args.repeat),
+        run_backend(args.model, "onnx", True, texts, queries, args.repeat),
+    ]
+    base = runs[0]
+    report: Dict[str, Any] = {"model": args.model, "results": []}
+    for r in runs:
+        row = {k: v for k, v in r.items() if not k.startswith("_")}
+        if r is not base:
+            row.update(compare(base, r, args.topk))
+        report["results"].append(row)
+        print(json.dumps(row, ensure_ascii=False))
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
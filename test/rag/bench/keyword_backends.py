@@ -0,0 +1,173 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+from agentlz.core.text_segmenter import query_terms, segment_for_bm25
+from agentlz.services.rag.keyword_index_service import BM25Index
+
+"""关键词召回后端基准：进程内 BM25 vs PG tsquery
+
+- 参照：rank-bm25（BM25Okapi）对全量语料逐条打分得到的 Top-K，视为关键词相关性的标准答案；
+- memory：`keyword_index_service.BM25Index`（倒排表，只遍历命中词条），统计构建耗时、查询 p50/p95 与 recall@k；
+- tsquery（需 `--db`）：`chunk_bm25_repository.search_chunks_by_tsquery`（查询词条与入库同一分词器，AND 连接），
+  统计查询 p50/p95（含数据库往返）与 recall@k。
+
+默认语料为仓库内测试文本（按行切分，可用 --scale 复制扩大）；`--db` 时从指定租户/文档的 chunk_bm25 读取语料，
+两种后端在同一语料上比较。
+
+运行：
+    python -m test.rag.bench.keyword_backends --scale 20 --queries 200
+    python -m test.rag.bench.keyword_backends --db --tenant t1 --doc-ids d1,d2 --out .cache/bench/keyword_backends.json
+"""
+
+CORPUS_FILES = [
+    ROOT / "test" / "rag" / "rag_test_1.txt",
+    ROOT / "test" / "rag" / "chunk_test" / "test1.md",
+    ROOT / "test" / "rag" / "chunk_test" / "test_conclusion.md",
+]
+
+
+def load_local_corpus(scale: int) -> List[Dict[str, Any]]:
+    lines: List[str] = []
+    for p in CORPUS_FILES:
+        if not p.exists():
+            continue
+        for line in p.read_text(encoding="utf-8").splitlines():
+            line = line.strip().lstrip("#").strip()
+            if len(line) >= 8:
+                lines.append(line)
+    rows: List[Dict[str, Any]] = []
+    for r in range(max(1, scale)):
+        for i, line in enumerate(lines):
+            rows.append({"chunk_id": f"c{r}_{i}", "doc_id": f"d{r}", "content": line, "content_seg": segment_for_bm25(line)})
+    return rows
+
+
+def load_db_corpus(tenant: str, doc_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    from agentlz.repositories import chunk_bm25_repository as bm25_repo
+
+    return bm25_repo.list_chunk_terms_by_doc_ids(tenant_id=tenant, doc_ids=list(doc_ids))
+
+
+def sample_queries(rows: List[Dict[str, Any]], n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    out: List[str] = []
+    while len(out) < n and rows:
+        terms = query_terms(str(rng.choice(rows).get("content") or ""))
+        if len(terms) < 2:
+            continue
+        k = min(len(terms), rng.randint(2, 4))
+        out.append(" ".join(rng.sample(terms, k)))
+    return out
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def _timed_queries(queries: List[str], fn: Callable[[str], List[str]]) -> Tuple[List[List[str]], Dict[str, float]]:
+    results: List[List[str]] = []
+    lat: List[float] = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q))
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return results, {
+        "p50_ms": round(_percentile(lat, 0.5), 3),
+        "p95_ms": round(_percentile(lat, 0.95), 3),
+        "mean_ms": round(statistics.fmean(lat), 3) if lat else 0.0,
+    }
+
+
+def _recall(results: List[List[str]], reference: List[List[str]], tie_sets: List[set]) -> float:
+    """recall@k：参照 Top-K（含同分）中被召回的比例"""
+    vals = [min(1.0, len(set(r) & ties) / len(ref)) for r, ref, ties in zip(results, reference, tie_sets) if ref]
+    return round(statistics.fmean(vals), 4) if vals else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="关键词召回后端基准（进程内 BM25 / PG tsquery）")
+    parser.add_argument("--scale", type=int, default=10, help="本地语料复制倍数")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topk", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", action="store_true", help="从 chunk_bm25 读取语料并测 tsquery 路径")
+    parser.add_argument("--tenant", default="")
+    parser.add_argument("--doc-ids", default="")
+    parser.add_argument("--out", default="")
+    args = parser.parse_args()
+
+    doc_ids = [d for d in args.doc_ids.split(",") if d]
+    rows = load_db_corpus(args.tenant, doc_ids) if args.db else load_local_corpus(args.scale)
+    if not rows:
+        print("语料为空")
+        return
+    queries = sample_queries(rows, args.queries, args.seed)
+    tokenized = [[t.lower() for t in str(r.get("content_seg") or "").split()] for r in rows]
+    ids = [str(r["chunk_id"]) for r in rows]
+
+    from rank_bm25 import BM25Okapi
+
+    t0 = time.perf_counter()
+    ref_model = BM25Okapi(tokenized, k1=1.5, b=0.75)
+    ref_build_ms = (time.perf_counter() - t0) * 1000.0
+
+    tie_sets: List[set] = []
+
+    def _ref(q: str) -> List[str]:
+        scores = ref_model.get_scores(query_terms(q))
+        order = sorted(range(len(ids)), key=lambda i: scores[i], reverse=True)
+        top = [i for i in order[: args.topk] if scores[i] > 0]
+        # 与第 k 名同分的分块都视为正确答案（语料复制后同分很常见）
+        floor = scores[top[-1]] if top else float("inf")
+        tie_sets.append({ids[i] for i in order if scores[i] >= floor - 1e-9 and scores[i] > 0})
+        return [ids[i] for i in top]
+
+    reference, ref_lat = _timed_queries(queries, _ref)
+
+    t0 = time.perf_counter()
+    index = BM25Index(k1=1.5, b=0.75)
+    for r, terms in zip(rows, tokenized):
+        index.add(str(r["chunk_id"]), str(r["doc_id"]), terms)
+    mem_build_ms = (time.perf_counter() - t0) * 1000.0
+    mem_results, mem_lat = _timed_queries(queries, lambda q: [c for c, _ in index.search(query_terms(q), limit=args.topk)])
+
+    report: Dict[str, Any] = {
+        "chunks": len(rows),
+        "queries": len(queries),
+        "topk": args.topk,
+        "rank_bm25": {"build_ms": round(ref_build_ms, 1), **ref_lat},
+        "memory": {"build_ms": round(mem_build_ms, 1), **mem_lat, "recall": _recall(mem_results, reference, tie_sets)},
+    }
+    if args.db:
+        from agentlz.repositories import chunk_bm25_repository as bm25_repo
+
+        def _tsq(q: str) -> List[str]:
+            tsq = " & ".join(query_terms(q)[:8])
+            hits = bm25_repo.search_chunks_by_tsquery(tenant_id=args.tenant, doc_ids=doc_ids, tsquery=tsq, limit=args.topk)
+            return [str(h["chunk_id"]) for h in hits]
+
+        tsq_results, tsq_lat = _timed_queries(queries, _tsq)
+        report["tsquery"] = {**tsq_lat, "recall": _recall(tsq_results, reference, tie_sets)}
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(ROOT))
+
+from agentlz.core.pgvector_codec import build_copy_binary, copy_binary, decode_vector, encode_vector, vector_to_text
+
+"""pgvector 传输基准：文本字面量 vs 二进制
+
+对比两条路径：
+- text：`"[" + ",".join(str(float(x)) ...) + "]"` 写入，`embedding::text` 读回后逐元素 float() 解析（旧实现）；
+- binary：COPY BINARY 写入，`vector_send(embedding)` 读回后 numpy 解码（现实现）。
+
+默认只做客户端编解码基准；加 `--db` 时在 PostgreSQL 临时表上做实际写入与 Top-K 检索（需配置 PG 连接）。
+
+运行：
+    python -m test.rag.bench.pgvector_transport --dim 1536 --rows 2000
+    python -m test.rag.bench.pgvector_transport --db --out .cache/bench/pgvector_transport.json
+"""
+
+
+def legacy_to_literal(vec) -> str:
+    return "[" + ",".join(str(float(x)) for x in vec) + "]"
+
+
+def legacy_parse(s: str) -> List[float]:
+    t = s.strip()
+    if t.startswith("[") and t.endswith("]"):
+        t = t[1:-1]
+    return [float(x) for x in t.split(",") if x]
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000.0, 3)
+
+
+def bench_codec(vectors: List[List[float]], repeat: int) -> Dict[str, Any]:
+    texts = [legacy_to_literal(v) for v in vectors]
+    blobs = [encode_vector(v) for v in vectors]
+    rows = [(f"c{i}", v) for i, v in enumerate(vectors)]
+    return {
+        "encode_text_ms": _timed(lambda: [legacy_to_literal(v) for v in vectors], repeat),
+        "encode_text_fast_ms": _timed(lambda: [vector_to_text(v) for v in vectors], repeat),
+        "encode_copy_binary_ms": _timed(lambda: build_copy_binary(rows, ("text", "vector")), repeat),
+        "decode_text_ms": _timed(lambda: [legacy_parse(t) for t in texts], repeat),
+        "decode_binary_ms": _timed(lambda: [decode_vector(b) for b in blobs], repeat),
+        "bytes_text": sum(len(t) for t in texts),
+        "bytes_binary": sum(len(b) for b in blobs),
+    }
+
+
+def bench_db(vectors: List[List[float]], dim: int, repeat: int, topk: int) -> Dict[str, Any]:
+    from psycopg2.extras import execute_values
+
+    from agentlz.core.database import get_pg_conn
+
+    query = vectors[0]
+    out: Dict[str, Any] = {}
+    with closing(get_pg_conn()) as conn:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            cur.execute(f"CREATE TEMP TABLE bench_vec (id TEXT PRIMARY KEY, embedding VECTOR({dim}))")
+
+            def _insert_text() -> None:
+                cur.execute("TRUNCATE bench_vec")
+                execute_values(
+                    cur,
+                    "INSERT INTO bench_vec (id, embedding) VALUES %s",
+                    [(f"c{i}", legacy_to_literal(v)) for i, v in enumerate(vectors)],
+                    template="(%s,%s::vector)",
+                    page_size=500,
+                )
+
+            def _insert_binary() -> None:
+                cur.execute("TRUNCATE bench_vec")
+                copy_binary(cur, "bench_vec", ("id", "embedding"), ((f"c{i}", v) for i, v in enumerate(vectors)), ("text", "vector"))
+
+            out["insert_text_ms"] = _timed(_insert_text, repeat)
+            out["insert_binary_ms"] = _timed(_insert_binary, repeat)
+
+            def _search_text() -> None:
+                cur.execute(
+                    "SELECT id, embedding::text FROM bench_vec ORDER BY embedding <-> %s::vector LIMIT %s",
+                    (legacy_to_literal(query), topk),
+                )
+                [legacy_parse(r[1]) for r in cur.fetchall()]
+
+            def _search_binary() -> None:
+                cur.execute(
+                    "SELECT id, vector_send(embedding) FROM bench_vec ORDER BY embedding <-> %s::vector LIMIT %s",
+                    (vector_to_text(query), topk),
+                )
+                [decode_vector(r[1]) for r in cur.fetchall()]
+
+            out["search_text_ms"] = _timed(_search_text, repeat)
+            out["search_binary_ms"] = _timed(_search_binary, repeat)
+        conn.rollback()
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pgvector 文本 vs 二进制传输基准")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--topk", type=int, default=50)
+    parser.add_argument("--db", action="store_true", help="同时在 PostgreSQL 临时表上测写入与检索")
+    parser.add_argument("--out", default="")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim)).astype(np.float32).tolist()
+    report: Dict[str, Any] = {"dim": args.dim, "rows": args.rows, "codec": bench_codec(vectors, args.repeat)}
+    print(json.dumps(report["codec"], ensure_ascii=False))
+    if args.db:
+        report["db"] = bench_db(vectors, args.dim, args.repeat, args.topk)
+        print(json.dumps(report["db"], ensure_ascii=False))
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+"""切片策略金标准（golden）生成与回放
+
+`chunk_embeddings_service` 中十种切片策略的输出以 JSON 固化在 `golden/chunking.json`，
+`test_chunking_golden.py` 逐条回放比对，保证重写/优化后的实现与固化时的输出逐字一致。
+
+重新生成（仅在有意改变切片行为时执行）：
+    python -m test.rag.ingest.chunking_golden --write
+"""
+
+import argparse
+import json
+import os
+import random
+from contextlib import ExitStack
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "chunking.json")
+
+STRATEGIES = list(range(10))
+
+# 小尺寸参数：覆盖重叠、强制切片与短块合并等分支
+SMALL_META: Dict[str, Any] = {
+    "max_size": 120,
+    "overlap": 30,
+    "target_length": 90,
+    "chunk_size": 100,
+    "chunk_overlap": 20,
+    "window_size": 150,
+    "base_chunk_size": 150,
+    "min_size": 40,
+    "threshold": 0.5,
+}
+
+
+class HashEmbedder:
+    """确定性嵌入：按字符码位分桶计数（整数向量，float32 下点积与范数计算可复现）"""
+
+    dim = 8
+
+    def _vec(self, text: str) -> List[float]:
+        v = [0.0] * self.dim
+        for ch in text:
+            v[ord(ch) % self.dim] += 1.0
+        return v
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vec(text)
+
+
+def build_inputs() -> Dict[str, str]:
+    """固化用的输入文档（生成后随金标准一起写入 JSON，不依赖本函数的后续改动）"""
+    rng = random.Random(20240601)
+    zh = (
+        "# 部署指南\n\n本文介绍检索服务的部署。首先准备数据库；然后配置向量索引！最后启动服务？\n\n"
+        "## 配置项\n\n- 模型名称，默认 bge-small-zh。\n- 批大小，默认 64。\n* 缓存时间，单位秒。\n\n"
+        "| 参数 | 说明 |\n|---|---|\n| top_k | 返回条数 |\n| threshold | 相似度阈值 |\n\n"
+        "```python\ndef main():\n    print('hello')\n```\n\n"
+        "参见[配置文档](https://example.com/config)，引用自上一章。更多细节参考附录；"
+        "检索阶段先做向量召回，再做关键词召回，最后融合排序。" * 2
+        + "\n\n### 常见问题\n\n" + "".join(f"问题{i}：服务启动失败怎么办？检查端口{i}是否被占用。\n" for i in range(8))
+    )
+    en = (
+        "# Retrieval Guide\n\nThis guide covers deployment. Prepare the database; configure the index! Start the service?\n\n"
+        "## Options\n\n- model: embedding model name.\n- batch: batch size, default 64.\n\n"
+        "See also [the API reference](https://example.com/api) for details. " * 2
+        + "\n\n```bash\npip install agentlz\n```\n\n"
+        + " ".join(f"Sentence {i} explains one more detail of hybrid retrieval." for i in range(8))
+    )
+    tiny = "".join("短句。" if i % 7 else "参见附录。" for i in range(150))
+    short_lines = "".join(f"第{i}行\n" for i in range(100))
+    one_line = "字" * 700 + "。结尾句子。\n\n" + "x" * 300
+    breaks = "第一段\r\n第二行\r第三行\x0c第四行 第五行\n\n   \n\n\t\n尾段。。。\n\n"
+    atoms = [
+        "。", "！", "？", "；", ";", "!", "?", "\n", "\n\n", "# ", "## 标题", "### H3 ", "```", "- 列表", "* 星",
+        "| 表 | 格 |", "[链接](http://x)", "参见第二章", "see also", "，", " ", "\r\n", "中文句子内容",
+        "English words here", "长" * 80, "  ",
+    ]
+    soups = {f"soup_{k}": "".join(rng.choice(atoms) for _ in range(80)) for k in range(3)}
+    return {"zh": zh, "en": en, "tiny": tiny, "short_lines": short_lines, "one_line": one_line, "breaks": breaks,
+            "blank": "  \n\t", "empty": "", **soups}
+
+
+def run_case(content: str, strategy: int, meta: Dict[str, Any], embedder: Any = None) -> List[str]:
+    """在确定性环境中执行一次切片：策略 3 使用 HashEmbedder（可传入 embedder 替换），策略 4 走 LLM 不可用时的回退路径"""
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.dict(os.environ, {"RAG_INGEST_BATCH_SIZE": "64"}))
+        stack.enter_context(patch.object(svc, "_get_embedder", return_value=embedder or HashEmbedder()))
+        stack.enter_context(
+            patch(
+                "agentlz.agents.rag.chunk_semantic_agent.get_chunk_semantic_agent",
+                side_effect=RuntimeError("llm_unavailable"),
+            )
+        )
+        stack.enter_context(patch.object(svc, "setup_logging"))
+        return svc.chunk_content_by_strategy(content, strategy, dict(meta))
+
+
+def build_golden() -> Dict[str, Any]:
+    inputs = build_inputs()
+    cases: List[Dict[str, Any]] = []
+    for name, content in inputs.items():
+        for meta_name, meta in (("default", {}), ("small", SMALL_META)):
+            for strategy in STRATEGIES:
+                cases.append(
+                    {
+                        "input": name,
+                        "meta": meta_name,
+                        "strategy": strategy,
+                        "chunks": run_case(content, strategy, meta),
+                    }
+                )
+    return {"inputs": inputs, "metas": {"default": {}, "small": SMALL_META}, "cases": cases}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="生成切片策略金标准")
+    parser.add_argument("--write", action="store_true", help="写入 golden/chunking.json")
+    args = parser.parse_args()
+    data = build_golden()
+    if args.write:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+            f.write("\n")
+    print(json.dumps({"cases": len(data["cases"]), "chunks": sum(len(c["chunks"]) for c in data["cases"])}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+
+class FakeEmbedder:
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(t))] * 4 for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        raise AssertionError("bulk ingest should not call embed_query")
+
+
+def test_bulk_ingest_batches_embed_and_write() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = FakeEmbedder()
+    written: List[List[Dict[str, Any]]] = []
+
+    def _fake_bulk(*, tenant_id: str, rows: List[Dict[str, Any]]) -> int:
+        assert tenant_id == "t1"
+        written.append(list(rows))
+        return len(rows)
+
+    chunks = [f"chunk-{i}" for i in range(5)]
+    with (
+        patch.object(svc, "_get_embedder", return_value=emb),
+        patch.object(svc, "_bulk_create", side_effect=_fake_bulk),
+        patch.object(svc, "_store_get", return_value={}),
+        patch.object(svc, "_store_put", return_value=0),
+    ):
+        stats = svc.bulk_create_chunk_embeddings_service(
+            tenant_id="t1", doc_id="d1", chunks=chunks, strategy=2, batch_size=2
+        )
+
+    assert [len(c) for c in emb.calls] == [2, 2, 1]
+    assert [len(b) for b in written] == [2, 2, 1]
+    flat = [r for b in written for r in b]
+    assert [r["chunk_id"] for r in flat] == [f"d1_s2_{i}" for i in range(1, 6)]
+    assert [r["chunk_index"] for r in flat] == [1, 2, 3, 4, 5]
+    assert all(r["strategy"] == 2 for r in flat)
+    assert flat[0]["embedding"] == [7.0] * 4
+    assert stats["chunks"] == 5 and stats["inserted"] == 5 and stats["batches"] == 3
+    assert "embed_ms" in stats and "write_ms" in stats
+
+
+def test_bulk_ingest_reuses_embeddings_by_content_hash() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = FakeEmbedder()
+    store: Dict[str, List[float]] = {}
+
+    def _fake_get(*, model_id: str, hashes: List[str]) -> Dict[str, List[float]]:
+        return {h: store[h] for h in hashes if h in store}
+
+    def _fake_put(*, model_id: str, items: List[Any]) -> int:
+        store.update(dict(items))
+        return len(items)
+
+    chunks = ["alpha", "beta", "alpha", "gamma"]
+    with (
+        patch.object(svc, "_get_embedder", return_value=emb),
+        patch.object(svc, "_embedding_model_id", return_value="m:4"),
+        patch.object(svc, "_bulk_create", side_effect=lambda *, tenant_id, rows: len(rows)),
+        patch.object(svc, "_store_get", side_effect=_fake_get),
+        patch.object(svc, "_store_put", side_effect=_fake_put),
+    ):
+        first = svc.bulk_create_chunk_embeddings_service(tenant_id="t1", doc_id="d1", chunks=chunks, batch_size=10)
+        second = svc.bulk_create_chunk_embeddings_service(tenant_id="t2", doc_id="d2", chunks=chunks, batch_size=10)
+
+    assert emb.calls == [["alpha", "beta", "gamma"]]
+    assert first["embedded"] == 3 and first["dedup_hits"] == 1
+    assert second["embedded"] == 0 and second["dedup_hit_rate"] == 1.0
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict
+
+from test.rag.ingest.chunking_golden import GOLDEN_PATH, run_case
+
+
+def _load() -> Dict[str, Any]:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_chunkers_match_golden_outputs() -> None:
+    data = _load()
+    mismatched = []
+    for case in data["cases"]:
+        content = data["inputs"][case["input"]]
+        got = run_case(content, case["strategy"], data["metas"][case["meta"]])
+        if got != case["chunks"]:
+            mismatched.append((case["input"], case["meta"], case["strategy"]))
+    assert not mismatched, f"切片输出与金标准不一致: {mismatched[:10]}"
+
+
+def test_streaming_chunkers_match_golden_outputs() -> None:
+    from agentlz.services.rag.chunk_embeddings_service import STREAMING_STRATEGIES, iter_chunks_by_strategy
+
+    data = _load()
+    for case in data["cases"]:
+        if case["strategy"] not in STREAMING_STRATEGIES:
+            continue
+        meta = dict(data["metas"][case["meta"]])
+        assert list(iter_chunks_by_strategy(data["inputs"][case["input"]], case["strategy"], meta)) == case["chunks"]
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+from unittest.mock import patch
+
+
+def _fake_embed_task(texts: List[str]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    return [[float(len(t))] for t in texts], {"lookups": len(texts), "hits": 1, "computed": len(texts) - 1}
+
+
+def test_iter_embedded_batches_streams_in_order() -> None:
+    from agentlz.services.rag import ingest_pool_service as pool_svc
+
+    texts = [f"t{i}" * (i + 1) for i in range(7)]
+    with ThreadPoolExecutor(max_workers=3) as ex, patch.object(pool_svc, "get_ingest_pool", return_value=ex), patch.object(
+        pool_svc, "_embed_task", _fake_embed_task
+    ):
+        out = list(pool_svc.iter_embedded_batches(texts, batch_size=3, max_inflight=2))
+
+    assert [o[0] for o in out] == [0, 3, 6]
+    assert [t for o in out for t in o[1]] == texts
+    assert [v[0] for o in out for v in o[2]] == [float(len(t)) for t in texts]
+
+
+def test_bulk_ingest_uses_pool_in_process_mode() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+    from agentlz.services.rag import ingest_pool_service as pool_svc
+
+    written: List[Dict[str, Any]] = []
+
+    def _fake_bulk(*, tenant_id: str, rows: List[Dict[str, Any]]) -> int:
+        written.extend(rows)
+        return len(rows)
+
+    chunks = [f"chunk-{i}" for i in range(5)]
+    with (
+        patch.dict(os.environ, {"RAG_INGEST_MODE": "process"}),
+        ThreadPoolExecutor(max_workers=2) as ex,
+        patch.object(pool_svc, "get_ingest_pool", return_value=ex),
+        patch.object(pool_svc, "_embed_task", _fake_embed_task),
+        patch.object(svc, "_get_embedder", side_effect=AssertionError("inline embed in process mode")),
+        patch.object(svc, "_bulk_create", side_effect=_fake_bulk),
+    ):
+        stats = svc.bulk_create_chunk_embeddings_service(tenant_id="t1", doc_id="d1", chunks=chunks, batch_size=2)
+
+    assert stats["inserted"] == 5 and stats["batches"] == 3
+    assert stats["dedup_hits"] == 3 and stats["embedded"] == 2
+    assert [r["chunk_id"] for r in written] == [f"d1_{i}" for i in range(1, 6)]
+    assert written[0]["embedding"] == [7.0]
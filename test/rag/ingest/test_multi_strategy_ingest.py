@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+from contextlib import ExitStack
+from typing import Any, Dict, List, Tuple
+from unittest.mock import patch
+
+
+def _fake_embed(*, texts: List[str]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    return [[float(len(t))] for t in texts], {"lookups": len(texts), "hits": 0, "computed": len(texts)}
+
+
+def _document() -> str:
+    return "\n\n".join(f"## 第{i}节\n第{i}节介绍检索服务的部署与配置；包括模型、索引与缓存参数。" * 3 for i in range(12))
+
+
+def _run(strategies: List[int], **patches: Any) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    written: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    with ExitStack() as stack:
+        for name, value in patches.items():
+            stack.enter_context(patch.object(svc, name, value))
+        _ingest(strategies, written, updates)
+    return written, updates
+
+
+def _ingest(strategies: List[int], written: List[Dict[str, Any]], updates: List[Dict[str, Any]]) -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+    from agentlz.services.rag import document_service as doc_svc
+
+    def _fake_bulk(*, tenant_id: str, rows: List[Dict[str, Any]]) -> int:
+        written.extend(rows)
+        return len(rows)
+
+    with (
+        patch.dict(os.environ, {"RAG_INGEST_MODE": "inline", "RAG_INGEST_BATCH_SIZE": "8"}),
+        patch.object(doc_svc.repo, "get_document_by_id", return_value={"status": "NEED_RECHUNK", "content": _document()}),
+        patch.object(doc_svc.repo, "update_document", side_effect=lambda **kw: updates.append(kw["payload"])),
+        patch.object(doc_svc, "get_origin_url_from_save_https", side_effect=AssertionError("should not download")),
+        patch.object(doc_svc, "MarkItDown", side_effect=AssertionError("should not convert")),
+        patch.object(doc_svc, "bump_document_scope_versions", return_value=[]),
+        patch.object(svc, "bump_document_scope_versions", return_value=[]),
+        patch.object(svc, "embed_texts_dedup_service", side_effect=_fake_embed),
+        patch.object(svc, "_bulk_create", side_effect=_fake_bulk),
+    ):
+        doc_svc.process_document_from_cos_https("https://cos/x.md", "md", "d1", "t1", strategies=strategies)
+
+
+def test_multi_strategy_ingest_reuses_stored_markdown_and_keeps_chunk_ids_unique() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    written, updates = _run([0, 2, 6, 2])
+
+    assert updates == [{"status": "success"}]
+    by_strategy: Dict[int, List[Dict[str, Any]]] = {}
+    for r in written:
+        by_strategy.setdefault(r["strategy"], []).append(r)
+    assert sorted(by_strategy) == [0, 2, 6]
+    for strat, rows in by_strategy.items():
+        expected = svc.chunk_content_by_strategy(_document(), strat)
+        assert [r["content"] for r in rows] == expected
+        assert [r["chunk_index"] for r in rows] == list(range(1, len(expected) + 1))
+        assert [r["chunk_id"] for r in rows] == [svc.make_chunk_id("d1", strat, i) for i in range(1, len(expected) + 1)]
+    assert len({r["chunk_id"] for r in written}) == len(written)
+    assert svc.make_chunk_id("d1", 0, 3) == "d1_3" and svc.make_chunk_id("d1", 7, 3) == "d1_s7_3"
+
+
+def test_failed_strategy_does_not_block_others() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    def _broken(content: str, max_size: int = 800) -> Any:
+        yield "第一块"
+        raise RuntimeError("bad markdown")
+
+    written, updates = _run([7, 2], iter_structure_aware=_broken)
+
+    assert {r["strategy"] for r in written} == {7, 2}
+    assert [r["content"] for r in written if r["strategy"] == 2] == svc.chunk_content_by_strategy(_document(), 2)
+    assert updates[-1] == {"status": "NEED_RECHUNK"}
+
+
+def test_publish_sends_one_message_with_all_strategies() -> None:
+    from agentlz.services.rag import document_service as doc_svc
+
+    with patch.object(doc_svc, "publish_to_rabbitmq") as pub:
+        doc_svc.publish_document_chunk_tasks_after_scan(
+            doc_id="d1", save_https="https://cos/x.pdf", document_type="pdf", tenant_id="t1", strategy=[2, 0, 2]
+        )
+    pub.assert_called_once()
+    msg = pub.call_args.args[1]
+    assert msg["strategies"] == [2, 0] and msg["strategy"] == 2
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, List
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+
+def _read_copy_rows(buf: bytes) -> List[List[Any]]:
+    assert buf.startswith(b"PGCOPY\n\xff\r\n\x00")
+    pos = 19
+    rows: List[List[Any]] = []
+    while True:
+        (n,) = struct.unpack_from(">h", buf, pos)
+        pos += 2
+        if n == -1:
+            assert pos == len(buf)
+            return rows
+        row: List[Any] = []
+        for _ in range(n):
+            (length,) = struct.unpack_from(">i", buf, pos)
+            pos += 4
+            row.append(None if length == -1 else buf[pos: pos + length])
+            pos += max(length, 0)
+        rows.append(row)
+
+
+def test_vector_binary_roundtrip() -> None:
+    from agentlz.core import pgvector_codec as codec
+
+    vec = [0.25, -1.5, 3.0]
+    raw = codec.encode_vector(vec)
+    assert raw[:4] == struct.pack(">HH", 3, 0)
+    out = codec.decode_vector(memoryview(raw))
+    assert out.dtype == np.float32 and out.tolist() == vec
+    half = codec.decode_vector(codec.encode_vector(vec, "halfvec"), "halfvec")
+    assert half.tolist() == vec
+    assert codec.vector_to_text(vec) == "[0.25,-1.5,3]"
+
+
+def test_copy_binary_stream_layout() -> None:
+    from agentlz.core import pgvector_codec as codec
+
+    buf = codec.build_copy_binary([("c1", 7, [1.0, 2.0]), ("c2", None, [0.5, 0.5])], ("text", "int4", "vector"))
+    rows = _read_copy_rows(buf)
+    assert rows[0][0] == b"c1" and struct.unpack(">i", rows[0][1])[0] == 7
+    assert codec.decode_vector(rows[0][2]).tolist() == [1.0, 2.0]
+    assert rows[1][1] is None
+
+
+def test_bulk_create_copies_vectors_in_binary() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchall.return_value = [("d1_1",), ("d1_2",)]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    rows = [
+        {"chunk_id": f"d1_{i}", "doc_id": "d1", "embedding": [float(i)] * 4, "content": None, "chunk_index": i}
+        for i in (1, 2)
+    ]
+    with patch.object(repo, "get_pg_conn", return_value=conn):
+        assert repo.bulk_create_chunk_embeddings(tenant_id="t1", rows=rows) == 2
+
+    sql, stream = cur.copy_expert.call_args.args
+    assert "FORMAT BINARY" in sql and "_ce_stage" in sql
+    copied = _read_copy_rows(stream.getvalue())
+    assert [r[0] for r in copied] == [b"d1_1", b"d1_2"]
+    assert repo.decode_vector(copied[1][3]).tolist() == [2.0] * 4
+    executed = " ".join(str(c.args[0]) for c in cur.execute.call_args_list)
+    assert "INSERT INTO chunk_embeddings" in executed and "FROM _ce_stage" in executed
+    assert "::vector" not in executed
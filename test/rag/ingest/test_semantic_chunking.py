@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import math
+import re
+from typing import List, Sequence
+from unittest.mock import patch
+
+import numpy as np
+
+_TOPICS = ["部署", "检索", "计费"]
+
+
+class TopicEmbedder:
+    """按句中主题词生成向量：同主题句相似度高，换主题时相似度骤降"""
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    def _vec(self, text: str) -> List[float]:
+        rng = np.random.default_rng(len(text))
+        base = np.zeros(16, dtype=np.float32)
+        for i, t in enumerate(_TOPICS):
+            if t in text:
+                base[i] = 4.0
+        return (base + rng.standard_normal(16).astype(np.float32) * 0.3).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        raise AssertionError("semantic chunking should embed sentences in batches")
+
+
+def _legacy_chunk(content: str, vec_fn, max_size=800, min_size=200, overlap=100, threshold=0.35) -> List[str]:
+    """旧实现（逐句向量 + 纯 Python 余弦），作为切分结果的对照"""
+    parts = re.split(r"([。！？；;!?]\s*|\n+|#{1,6}\s+)", content)
+    sentences: List[str] = []
+    for i in range(0, len(parts), 2):
+        s = parts[i] or ""
+        if i + 1 < len(parts) and parts[i + 1]:
+            s += parts[i + 1]
+        if s.strip():
+            sentences.append(s.strip())
+
+    def cosine(u: Sequence[float], v: Sequence[float]) -> float:
+        if not u or not v:
+            return 0.0
+        dot = sum(x * y for x, y in zip(u, v))
+        nu = math.sqrt(sum(x * x for x in u))
+        nv = math.sqrt(sum(y * y for y in v))
+        return 0.0 if nu == 0 or nv == 0 else dot / (nu * nv)
+
+    chunks: List[str] = []
+    buf = ""
+    last = None
+    for s in sentences:
+        v = vec_fn(s)
+        sim = cosine(last or [], v)
+        if len(buf) >= min_size and (len(buf) + len(s) > max_size or sim < threshold):
+            if buf.strip():
+                chunks.append(buf.strip())
+                buf = (buf[-overlap:] if len(buf) > overlap else buf) + s
+        else:
+            buf += s
+        last = v
+    if buf.strip():
+        chunks.append(buf.strip())
+    return chunks
+
+
+def _document() -> str:
+    lines: List[str] = []
+    for block in range(6):
+        topic = _TOPICS[block % 3]
+        for i in range(12):
+            lines.append(f"关于{topic}的第{block}-{i}条说明，包含若干细节与注意事项。")
+        lines.append("重复出现的句子。")
+    return "\n".join(lines)
+
+
+def test_semantic_chunking_batches_embeddings_and_matches_legacy_boundaries() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = TopicEmbedder()
+    content = _document()
+    with patch.object(svc, "_get_embedder", return_value=emb), patch.dict("os.environ", {"RAG_INGEST_BATCH_SIZE": "32"}):
+        chunks = svc.chunk_semantic_similarity(content, max_size=400, min_size=120, overlap=40)
+
+    sentences = [t for batch in emb.calls for t in batch]
+    assert len(sentences) == len(set(sentences)) == 6 * 12 + 1
+    assert [len(b) for b in emb.calls] == [32, 32, 9]
+    assert chunks == _legacy_chunk(content, emb._vec, max_size=400, min_size=120, overlap=40)
+    # 主题切换处产生断点：没有分块同时包含三个主题
+    assert len(chunks) > 1 and not any(all(t in c for t in _TOPICS) for c in chunks)
+
+
+def test_adjacent_cosine_similarities_handles_zero_rows() -> None:
+    from agentlz.services.rag.chunk_embeddings_service import adjacent_cosine_similarities
+
+    mat = np.array([[1, 0], [1, 0], [0, 0], [0, 2], [1, 1]], dtype=np.float32)
+    sims = adjacent_cosine_similarities(mat)
+    assert sims.dtype == np.float32
+    assert np.allclose(sims, [0.0, 1.0, 0.0, 0.0, math.sqrt(0.5)])
+    assert adjacent_cosine_similarities(np.zeros((1, 4), dtype=np.float32)).tolist() == [0.0]
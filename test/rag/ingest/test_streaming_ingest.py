@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+from unittest.mock import patch
+
+
+def _document(sections: int) -> str:
+    parts: List[str] = []
+    for i in range(sections):
+        parts.append(f"## 第{i}节 部署说明\n")
+        parts.append("".join(f"第{i}-{j}句介绍检索服务的配置项；包括模型与索引参数。" for j in range(6)) + "\n\n")
+        if i % 3 == 0:
+            parts.append("```python\nprint('hello')\n```\n参见[配置文档](http://example.com/cfg)。\n\n")
+        parts.append("- 列表项一\n- 列表项二\n\n")
+    return "".join(parts)
+
+
+def test_streaming_chunkers_match_list_strategies_and_stay_flat() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    content = _document(40)
+    for strategy in sorted(svc.STREAMING_STRATEGIES):
+        assert list(svc.iter_chunks_by_strategy(content, strategy)) == svc.chunk_content_by_strategy(content, strategy)
+    assert svc.is_streaming_strategy(6) and svc.is_streaming_strategy(-1)
+    assert not svc.is_streaming_strategy(3)
+
+    # 流式切片的峰值内存只与当前缓冲区有关，不随文档长度增长
+    big = _document(2000)
+    tracemalloc.start()
+    try:
+        for _ in svc.iter_chunks_by_strategy(big, 2):
+            pass
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        svc.chunk_content_by_strategy(big, 2)
+        list_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert stream_peak * 10 < list_peak
+
+
+def _fake_embed_task(texts: List[str]) -> Tuple[List[List[float]], Dict[str, Any]]:
+    return [[float(len(t))] for t in texts], {"lookups": len(texts), "hits": 0, "computed": len(texts)}
+
+
+def test_pipeline_writes_first_batch_before_chunking_finishes() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+    from agentlz.services.rag import ingest_pool_service as pool_svc
+
+    for mode in ("inline", "process"):
+        events: List[str] = []
+
+        def _chunks() -> Iterator[str]:
+            for i in range(10):
+                events.append(f"chunk:{i}")
+                yield f"分块-{i}"
+
+        def _fake_bulk(*, tenant_id: str, rows: List[Dict[str, Any]]) -> int:
+            events.append(f"write:{rows[0]['chunk_index']}")
+            return len(rows)
+
+        with (
+            patch.dict(os.environ, {"RAG_INGEST_MODE": mode}),
+            ThreadPoolExecutor(max_workers=2) as ex,
+            patch.object(pool_svc, "get_ingest_pool", return_value=ex),
+            patch.object(pool_svc, "_embed_task", _fake_embed_task),
+            patch.object(svc, "embed_texts_dedup_service", side_effect=lambda *, texts: _fake_embed_task(texts)),
+            patch.object(svc, "_bulk_create", side_effect=_fake_bulk),
+            patch.object(svc, "bump_document_scope_versions", side_effect=lambda d: events.append(f"publish:{d}")) as bump,
+        ):
+            stats = svc.bulk_create_chunk_embeddings_service(
+                tenant_id="t1", doc_id="d1", chunks=_chunks(), batch_size=3, publish_first_batch=True
+            )
+
+        assert stats["chunks"] == 10 and stats["inserted"] == 10 and stats["batches"] == 4
+        assert stats["first_batch_ms"] is not None and "chunk_ms" in stats
+        # 首批写入并发布时，生成器尚未切出最后一块
+        assert events.index("write:1") < events.index("chunk:9")
+        assert events.index("publish:d1") < events.index("chunk:9")
+        bump.assert_called_once_with("d1")
+        assert [e for e in events if e.startswith("write:")] == ["write:1", "write:4", "write:7", "write:10"]
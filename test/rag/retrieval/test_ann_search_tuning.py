@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+from typing import Any, List
+from unittest.mock import MagicMock, patch
+
+
+def _conn_with(cur: MagicMock) -> MagicMock:
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    return conn
+
+
+def _statements(cur: MagicMock) -> List[Any]:
+    return [(str(c.args[0]), c.args[1] if len(c.args) > 1 else None) for c in cur.execute.call_args_list]
+
+
+def test_filtered_search_uses_exact_scan_for_small_candidate_sets() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (12,)
+    cur.fetchall.return_value = []
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3", "RAG_ANN_EXACT_MAX_ROWS": "100"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        repo.search_similar_chunks(tenant_id="t1", embedding=[0.1, 0.2, 0.3], doc_ids=["d1", "d2"], limit=5)
+
+    stmts = _statements(cur)
+    count_sql, count_params = next(s for s in stmts if "count(*)" in s[0])
+    assert "doc_id = ANY(%s)" in count_sql and count_params == (["d1", "d2"], 101)
+    assert any("enable_indexscan = off" in s[0] for s in stmts)
+    assert not any(p and "hnsw.ef_search" in p for _, p in stmts)
+
+
+def test_unfiltered_search_sets_ann_parameters() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    env = {
+        "EMBEDDING_STORAGE_MODE": "native",
+        "EMBEDDING_DIMENSION": "3",
+        "RAG_HNSW_EF_SEARCH": "200",
+        "RAG_IVFFLAT_PROBES": "7",
+        "RAG_ANN_ITERATIVE_SCAN": "strict_order",
+    }
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        repo.search_similar_chunks_multi(tenant_id="t1", embeddings=[[0.1, 0.2, 0.3]], limit=5)
+
+    gucs = {p[0]: p[1] for sql, p in _statements(cur) if "set_config" in sql}
+    assert gucs == {
+        "hnsw.ef_search": "200",
+        "ivfflat.probes": "7",
+        "hnsw.iterative_scan": "strict_order",
+        "ivfflat.iterative_scan": "relaxed_order",
+    }
+    assert not any("count(*)" in s[0] for s in _statements(cur))
+
+
+def test_filtered_search_skips_count_query_by_default() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        os.environ.pop("RAG_ANN_EXACT_MAX_ROWS", None)
+        repo.search_similar_chunks(tenant_id="t1", embedding=[0.1, 0.2, 0.3], doc_ids=["d1", "d2"], limit=5)
+
+    stmts = _statements(cur)
+    assert not any("count(*)" in s[0] or "enable_indexscan" in s[0] for s in stmts)
+    gucs = {p[0]: p[1] for sql, p in stmts if "set_config" in sql}
+    assert gucs["hnsw.iterative_scan"] == "relaxed_order" and "hnsw.ef_search" in gucs
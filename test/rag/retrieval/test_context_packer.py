@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+
+def _sliding_chunks(text: str, doc_id: str, window: int, overlap: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    start, i = 0, 0
+    while start < len(text):
+        out.append({"chunk_id": f"{doc_id}_{i}", "doc_id": doc_id, "content": text[start:start + window]})
+        if start + window >= len(text):
+            break
+        start += window - overlap
+        i += 1
+    return out
+
+
+def test_pack_removes_sliding_window_overlap_and_orders_by_document() -> None:
+    from agentlz.services.rag import context_packer_service as packer
+
+    text_a = "".join(f"第{i}段：Agent 配置项说明，包括模型、密钥与检索参数。" for i in range(12))
+    text_b = "".join(f"Section {i}: deployment notes for the retrieval service. " for i in range(8))
+    chunks_a = _sliding_chunks(text_a, "da", 60, 22)
+    chunks_b = _sliding_chunks(text_b, "db", 80, 30)
+    # 相关度顺序：b 的分块最相关，a 的分块乱序
+    ranked = [chunks_b[1], chunks_a[2], chunks_b[0], chunks_a[0], chunks_a[1]] + chunks_b[2:] + chunks_a[3:]
+
+    with patch.object(packer, "_get_encoder", return_value=None):
+        doc, m = packer.pack_context(ranked, budget_tokens=0)
+
+    assert doc == text_b + "\n" + text_a
+    assert m["context_chunks_in"] == len(ranked) == m["context_chunks_packed"]
+    assert m["context_overlap_chars"] == 22 * (len(chunks_a) - 1) + 30 * (len(chunks_b) - 1)
+    assert m["context_tokens_saved"] == m["context_tokens_raw"] - m["context_tokens_packed"] > 0
+    assert m["context_tokenizer"] == "estimate"
+
+
+def test_pack_respects_token_budget_in_relevance_order() -> None:
+    from agentlz.services.rag import context_packer_service as packer
+
+    ranked = [
+        {"chunk_id": "d1_4", "doc_id": "d1", "content": "最相关的分块内容" * 5},
+        {"chunk_id": "d2_0", "doc_id": "d2", "content": "很长的次相关分块" * 40},
+        {"chunk_id": "d1_1", "doc_id": "d1", "content": "同文档较早的分块" * 5},
+    ]
+    with patch.object(packer, "_get_encoder", return_value=None):
+        doc, m = packer.pack_context(ranked, budget_tokens=100)
+        assert packer.count_tokens(doc) <= 100
+        # 超预算的分块被跳过，后续能放下的分块仍纳入，并按文档内序号排在前面
+        assert doc == "同文档较早的分块" * 5 + "\n" + "最相关的分块内容" * 5
+        assert m["context_chunks_packed"] == 2 and m["context_budget"] == 100
+
+        doc, m = packer.pack_context(ranked[1:2], budget_tokens=50)
+        assert doc == ("很长的次相关分块" * 40)[:50] and m["context_tokens_packed"] == 50
+
+
+
+def test_pack_tokenizes_each_part_once_as_chunks_accumulate() -> None:
+    from agentlz.services.rag import context_packer_service as packer
+
+    # 每个文档 4 个互不重叠的分块，共 50 个文档：逐块尝试纳入时不重复对整段上下文分词
+    ranked = [
+        {"chunk_id": f"d{d}_{i}", "doc_id": f"d{d}", "content": f"文档{d}第{i}块 " + "内容" * 20}
+        for i in range(4)
+        for d in range(50)
+    ]
+    calls: List[int] = []
+    real = packer.count_tokens
+
+    def _count(text: str) -> int:
+        calls.append(len(text))
+        return real(text)
+
+    with patch.object(packer, "_get_encoder", return_value=None), patch.object(packer, "count_tokens", _count):
+        doc, m = packer.pack_context(ranked, budget_tokens=10_000)
+
+    assert m["context_chunks_packed"] == len(ranked)
+    assert doc.split("\n")[:2] == [ranked[0]["content"], ranked[50]["content"]]
+    # 原始/最终计数各 1~2 次整段，其余为单个段落；总分词字符量与上下文长度同阶
+    assert len(calls) <= len(ranked) + 3
+    assert sum(calls) <= 4 * len(doc)
+
+
+def test_agent_budget_prefers_agent_meta() -> None:
+    from agentlz.services.rag import context_packer_service as packer
+
+    packer._get_budget_cache().clear()
+    with (
+        patch.dict(os.environ, {"RAG_CONTEXT_TOKEN_BUDGET": "2000"}),
+        patch.object(
+            packer.agent_repo,
+            "get_agent_by_id_any_tenant",
+            side_effect=[{"meta": '{"rag_context_tokens": 800}'}, {"meta": None}, {"meta": {"rag_context_tokens": 1200}}],
+        ) as get,
+    ):
+        assert packer.agent_context_budget(1) == 800
+        assert packer.agent_context_budget(1) == 800
+        assert packer.agent_context_budget(2) == 2000
+        assert get.call_count == 2
+
+        # Agent meta 更新后失效，下次读取新预算
+        packer.invalidate_agent_context_budget(1)
+        assert packer.agent_context_budget(1) == 1200 and get.call_count == 3
+    packer._get_budget_cache().clear()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.kv: Dict[str, str] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self.kv.get(key)
+
+    def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        self.kv[key] = str(value)
+        return True
+
+    def incr(self, key: str) -> int:
+        v = int(self.kv.get(key) or 0) + 1
+        self.kv[key] = str(v)
+        return v
+
+
+def _meta_rows() -> Dict[str, Dict[str, Any]]:
+    return {
+        "d1": {"id": "d1", "tenant_id": "t1", "disabled": 0, "title": "指南", "tags": "配置", "description": ""},
+        "d2": {"id": "d2", "tenant_id": "t1", "disabled": 1, "title": "配置", "tags": "", "description": ""},
+    }
+
+
+def test_get_doc_topk_multi_shares_one_meta_lookup() -> None:
+    from agentlz.services.rag import rag_service
+    from agentlz.services.rag import retrieval_scope_service as scope_service
+
+    meta_calls: List[List[str]] = []
+    searched: List[List[str]] = []
+    strategies: List[Any] = []
+
+    def _fake_meta(*, doc_ids: List[str], table_name: str) -> Dict[str, Dict[str, Any]]:
+        meta_calls.append(list(doc_ids))
+        return _meta_rows()
+
+    def _fake_search(**kwargs: Any) -> List[Dict[str, Any]]:
+        searched.append(list(kwargs.get("doc_ids") or []))
+        strategies.append(kwargs.get("doc_strategies"))
+        return [{"chunk_id": "d1_1", "doc_id": "d1", "content": "c", "similarity_score": 0.5}]
+
+    links = [{"document_id": d} for d in ["d1", "d2", "d3"]]
+    scope_service._get_cache().clear()
+    with (
+        patch.dict(os.environ, {"RAG_HYBRID_MODE": "python", "RAG_RESULT_CACHE_ENABLED": "false"}),
+        patch.object(scope_service, "get_redis_client", return_value=FakeRedis()),
+        patch.object(scope_service.agdoc_repo, "list_agent_documents", return_value=links),
+        patch.object(scope_service.doc_repo, "list_documents_meta_by_ids", side_effect=_fake_meta),
+        patch.object(scope_service.emb_repo, "list_distinct_doc_strategies_by_doc_ids", return_value={"d1": [0, 2]}),
+        patch.object(rag_service.emb_service, "search_similar_chunks_service", side_effect=_fake_search),
+        patch.object(rag_service.bm25_repo, "search_chunks_by_tsquery", return_value=[]),
+    ):
+        out = rag_service.get_doc_topk_multi(agent_id=101, message="配置", messages=["配置"], limit=3)
+
+    assert len(meta_calls) == 1
+    assert searched == [["d1"]]
+    assert strategies == [{"d1": [0]}]
+    assert [x["chunk_id"] for x in out] == ["d1_1"]
+    assert out[0]["boost"] > 0
+
+
+def test_retrieval_scope_cached_until_version_bump() -> None:
+    from agentlz.services.rag import retrieval_scope_service as scope_service
+
+    rc = FakeRedis()
+    links = [{"document_id": "d1"}, {"document_id": "d2"}]
+    scope_service._get_cache().clear()
+    with (
+        patch.object(scope_service, "get_redis_client", return_value=rc),
+        patch.object(scope_service.agdoc_repo, "list_agent_documents", return_value=links) as m_links,
+        patch.object(scope_service.doc_repo, "list_documents_meta_by_ids", return_value=_meta_rows()) as m_meta,
+        patch.object(scope_service.agdoc_repo, "list_agent_ids_by_document", return_value=[102]),
+        patch.object(scope_service.emb_repo, "list_distinct_doc_strategies_by_doc_ids", return_value={}),
+    ):
+        s1 = scope_service.get_agent_retrieval_scope(102)
+        s2 = scope_service.get_agent_retrieval_scope(102)
+        assert s1 is s2
+        assert m_links.call_count == 1 and m_meta.call_count == 1
+        assert scope_service.scope_enabled_doc_ids(s1) == {"t1": ["d1"]}
+        assert "配置" in s1["docs"]["d1"]["terms"]
+
+        # 另一进程视角：清空进程内缓存后从 Redis 读取，不访问数据库
+        scope_service._get_cache().clear()
+        s3 = scope_service.get_agent_retrieval_scope(102)
+        assert s3["grouped"] == s1["grouped"]
+        assert m_links.call_count == 1
+
+        assert scope_service.bump_document_scope_versions("d1") == [102]
+        s4 = scope_service.get_agent_retrieval_scope(102)
+        assert s4["version"] == s1["version"] + 1
+        assert m_links.call_count == 2
+    scope_service._get_cache().clear()
+
+
+def test_scope_pins_link_strategy_and_resolves_default() -> None:
+    from agentlz.services.rag import retrieval_scope_service as scope_service
+
+    links = [
+        {"document_id": "d1", "strategy": [3]},
+        {"document_id": "d2", "strategy": None},
+        {"document_id": "d3", "strategy": []},
+        {"document_id": "d4", "strategy": None},
+    ]
+    meta = {d: {"id": d, "tenant_id": "t1", "disabled": 0, "title": "", "tags": "", "description": ""} for d in ["d1", "d2", "d3", "d4"]}
+    available = {"d2": [0, 1], "d3": [2, 5]}
+    with (
+        patch.dict(os.environ, {"RAG_DEFAULT_STRATEGY": "1"}),
+        patch.object(scope_service.agdoc_repo, "list_agent_documents", return_value=links),
+        patch.object(scope_service.doc_repo, "list_documents_meta_by_ids", return_value=meta),
+        patch.object(scope_service.emb_repo, "list_distinct_doc_strategies_by_doc_ids", return_value=available) as m_strat,
+    ):
+        scope = scope_service.build_agent_retrieval_scope(7)
+
+    m_strat.assert_called_once_with(tenant_id="t1", doc_ids=["d2", "d3", "d4"])
+    assert scope_service.scope_doc_strategies(scope, ["d1", "d2", "d3", "d4"]) == {"d1": [3], "d2": [1], "d3": [2]}
+
+    with (
+        patch.dict(os.environ, {"RAG_DEFAULT_STRATEGY": "-1"}),
+        patch.object(scope_service.agdoc_repo, "list_agent_documents", return_value=links),
+        patch.object(scope_service.doc_repo, "list_documents_meta_by_ids", return_value=meta),
+        patch.object(scope_service.emb_repo, "list_distinct_doc_strategies_by_doc_ids") as m_strat,
+    ):
+        scope = scope_service.build_agent_retrieval_scope(7)
+    m_strat.assert_not_called()
+    assert scope_service.scope_doc_strategies(scope, ["d1", "d2"]) == {"d1": [3]}
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+from unittest.mock import patch
+
+
+class FakeHFEmbeddings:
+    def __init__(self, model_name: str, model_kwargs: dict, encode_kwargs: dict) -> None:
+        self.model_name = model_name
+        self.model_kwargs = model_kwargs
+        self.encode_kwargs = encode_kwargs
+
+
+def test_onnx_backend_loads_exported_model() -> None:
+    from agentlz.core import embedding_model_factory as f
+
+    prepared = ("/tmp/onnx/BAAI__bge-small-zh-v1.5", {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model_qint8_avx2.onnx"}})
+    env = {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_QUANTIZE": "true", "EMBEDDING_STORAGE_MODE": "native"}
+    with patch.dict(os.environ, env), patch.object(f, "HuggingFaceEmbeddings", FakeHFEmbeddings), patch.object(
+        f, "prepare_onnx_model", return_value=prepared
+    ) as prep:
+        emb = f.get_hf_embeddings()
+    prep.assert_called_once()
+    assert prep.call_args.kwargs["quantize"] is True
+    assert emb.model_name == prepared[0]
+    assert emb.model_kwargs["device"] == "cpu"
+    assert emb.model_kwargs["model_kwargs"]["file_name"].endswith("qint8_avx2.onnx")
+
+
+def test_torch_backend_is_default() -> None:
+    from agentlz.core import embedding_model_factory as f
+
+    with patch.dict(os.environ, {"EMBEDDING_BACKEND": "bogus", "EMBEDDING_STORAGE_MODE": "native"}), patch.object(
+        f, "HuggingFaceEmbeddings", FakeHFEmbeddings
+    ), patch.object(f, "prepare_onnx_model") as prep:
+        assert f.get_embedding_backend() == "torch"
+        emb = f.get_hf_embeddings()
+    prep.assert_not_called()
+    assert emb.model_name == f.DEFAULT_EMBEDDING_MODEL
+    assert "backend" not in emb.model_kwargs
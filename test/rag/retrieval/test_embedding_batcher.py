@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import List
+
+
+def test_batcher_coalesces_concurrent_requests() -> None:
+    from agentlz.core.embedding_batcher import EmbeddingBatcher
+
+    batches: List[List[str]] = []
+
+    def _embed(texts: List[str]) -> List[List[float]]:
+        batches.append(list(texts))
+        time.sleep(0.01)
+        return [[float(len(t))] for t in texts]
+
+    b = EmbeddingBatcher(_embed, max_batch_size=8, max_wait_ms=50)
+    results: dict[int, List[float]] = {}
+
+    def _call(i: int) -> None:
+        results[i] = b.embed("x" * i)
+
+    threads = [threading.Thread(target=_call, args=(i,)) for i in range(1, 9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: [float(i)] for i in range(1, 9)}
+    assert len(batches) < 8
+    m = b.metrics()
+    assert m["items"] == 8 and m["batches"] == len(batches)
+    assert m["max_batch_size_seen"] >= 2 and m["queue_depth"] == 0
+
+    async def _acall() -> List[float]:
+        return await b.aembed("abc")
+
+    assert asyncio.run(_acall()) == [3.0]
+    b.close()
+
+
+def test_batcher_propagates_errors_to_callers() -> None:
+    import pytest
+    from agentlz.core.embedding_batcher import EmbeddingBatcher
+
+    def _boom(texts: List[str]) -> List[List[float]]:
+        raise ValueError("model down")
+
+    b = EmbeddingBatcher(_boom, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        b.embed("a", timeout=2)
+    assert b.metrics()["errors"] == 1
+    b.close()
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+from unittest.mock import patch
+
+
+def test_embedding_dimension_follows_storage_mode() -> None:
+    from agentlz.core import embedding_model_factory as f
+
+    with patch.dict(os.environ, {"EMBEDDING_STORAGE_MODE": "padded"}):
+        assert f.get_embedding_dimension() == 1536
+    with patch.dict(os.environ, {"EMBEDDING_STORAGE_MODE": "native"}):
+        assert f.get_embedding_dimension() == 512
+        assert f.get_embedding_dimension("BAAI/bge-m3") == 1024
+    with patch.dict(os.environ, {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "256"}):
+        assert f.get_embedding_dimension("unknown/model") == 256
+    with patch.dict(os.environ, {"EMBEDDING_VECTOR_TYPE": "halfvec"}):
+        assert f.get_vector_type() == "halfvec"
+
+
+def test_search_rejects_mismatched_dimension_in_native_mode() -> None:
+    import pytest
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    with patch.dict(os.environ, {"EMBEDDING_STORAGE_MODE": "native"}):
+        with pytest.raises(ValueError):
+            repo._validate_dimension([0.0] * 1536)
+        repo._validate_dimension([0.0] * 512)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+
+def _conn_with(cur: MagicMock) -> MagicMock:
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    return conn
+
+
+def test_hybrid_search_runs_one_statement_and_maps_scores() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (3,)
+    cur.fetchall.return_value = [
+        ("d1_0", "d1", "both", None, 0.25, 0.4, 1 / 61 + 1 / 62, 2.0, 1 / 61 + 1 / 62 + 0.04, 0),
+        ("d2_3", "d2", "fts only", None, None, 0.3, 1 / 61, 0.0, 1 / 61, 3),
+    ]
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        out = repo.search_hybrid_chunks(
+            tenant_id="t1",
+            embeddings=[[0.1, 0.2, 0.3], [0.3, 0.2, 0.1]],
+            doc_ids=["d1", "d2"],
+            tsquery="配置 & Agent",
+            doc_boosts={"d1": 2.0, "d3": 0.0},
+            vector_top_k=40,
+            bm25_top_k=30,
+            limit=5,
+        )
+
+    hybrid = [c for c in cur.execute.call_args_list if "FULL JOIN" in str(c.args[0])]
+    assert len(hybrid) == 1
+    sql, params = str(hybrid[0].args[0]), hybrid[0].args[1]
+    assert "chunk_bm25" in sql and "to_tsquery('simple', %s)" in sql
+    assert params[0] == ["[0.100000001,0.200000003,0.300000012]", "[0.300000012,0.200000003,0.100000001]"]
+    assert params[1:4] == [["d1", "d2"], 40, 40]
+    assert params[4:8] == ["配置 & Agent", ["d1", "d2"], "配置 & Agent", 30]
+    assert params[10:] == [["d1"], [2.0], 0.02, 5]
+
+    assert [r["chunk_id"] for r in out] == ["d1_0", "d2_3"]
+    assert out[0]["type"] == "vector" and out[0]["score"] == 0.8
+    assert out[1]["type"] == "bm25" and out[1]["score"] == 0.3 and out[1]["distance"] is None
+    assert out[0]["boost"] == 2.0 and out[1]["chunk_index"] == 3
+
+
+def test_hybrid_search_without_tsquery_skips_fulltext() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (3,)
+    cur.fetchall.return_value = []
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        assert repo.search_hybrid_chunks(tenant_id="t1", embeddings=[[0.1, 0.2, 0.3]], doc_ids=["d1"], tsquery=None) == []
+
+    sql = next(str(c.args[0]) for c in cur.execute.call_args_list if "FULL JOIN" in str(c.args[0]))
+    assert "chunk_bm25" not in sql
+
+
+def test_get_doc_topk_multi_uses_hybrid_sql_per_tenant() -> None:
+    from agentlz.services.rag import rag_service
+
+    calls: List[Dict[str, Any]] = []
+
+    def _fake_hybrid(**kwargs: Any) -> List[Dict[str, Any]]:
+        calls.append(kwargs)
+        return [
+            {"chunk_id": f"{kwargs['tenant_id']}_c", "doc_id": kwargs["doc_ids"][0], "content": "x", "fused_score": 0.1 if kwargs["tenant_id"] == "t1" else 0.2}
+        ]
+
+    scope = {"docs": {"d1": {"terms": ["配置"]}, "d2": {"terms": []}}}
+    env = {"RAG_HYBRID_MODE": "sql", "RAG_RERANK_ENABLED": "false", "RAG_HOT_TIER_ENABLED": "false", "RAG_RESULT_CACHE_ENABLED": "false"}
+    with (
+        patch.dict(os.environ, env),
+        patch.object(rag_service.scope_service, "get_agent_retrieval_scope", return_value=scope),
+        patch.object(rag_service.scope_service, "scope_enabled_doc_ids", return_value={"t1": ["d1"], "t2": ["d2"]}),
+        patch.object(rag_service.emb_service, "search_hybrid_chunks_service", side_effect=_fake_hybrid),
+        patch.object(rag_service.emb_service, "search_similar_chunks_service") as legacy_vec,
+        patch.object(rag_service.bm25_repo, "search_chunks_by_tsquery") as legacy_bm25,
+    ):
+        out = rag_service.get_doc_topk_multi(agent_id=1, message="配置 Agent", messages=["配置"], limit=2)
+
+    legacy_vec.assert_not_called()
+    legacy_bm25.assert_not_called()
+    assert [c["tenant_id"] for c in calls] == ["t1", "t2"]
+    from agentlz.core.text_segmenter import query_terms
+
+    # tsquery 词条与入库 content_seg 同一分词器
+    assert calls[0]["tsquery"] == " & ".join(query_terms("配置 Agent"))
+    assert calls[0]["doc_boosts"] == {"d1": 1.0} and calls[0]["keyword_hits"] is None
+    assert calls[1]["doc_boosts"] == {}
+    assert [x["chunk_id"] for x in out] == ["t2_c", "t1_c"]
+
+
+def test_doc_strategy_filter_applies_to_both_recall_paths() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (3,)
+    cur.fetchall.return_value = []
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        repo.search_hybrid_chunks(
+            tenant_id="t1",
+            embeddings=[[0.1, 0.2, 0.3]],
+            doc_ids=["d1", "d2"],
+            tsquery="配置",
+            doc_strategies={"d1": [2]},
+        )
+
+    call = next(c for c in cur.execute.call_args_list if "FULL JOIN" in str(c.args[0]))
+    sql, params = str(call.args[0]), call.args[1]
+    assert sql.count("(doc_id, strategy) IN") == 2
+    assert params[1:5] == [["d1", "d2"], ["d2"], ["d1"], [2]]
+    assert params[7:15] == ["配置", ["d1", "d2"], "配置", ["d1", "d2"], ["d2"], ["d1"], [2], 50]
+
+
+def test_doc_scope_conditions() -> None:
+    from agentlz.repositories.chunk_embeddings_repository import _doc_scope_conditions
+
+    assert _doc_scope_conditions(doc_ids=[]) is None
+    assert _doc_scope_conditions() == ([], [])
+    assert _doc_scope_conditions(doc_ids=["a"], doc_strategies={"b": [1]}) == (["doc_id = ANY(%s)"], [["a"]])
+    conds, params = _doc_scope_conditions(doc_ids=["a", "b"], doc_strategies={"a": [0, 1], "b": [2]})
+    assert len(conds) == 2 and "OR" not in conds[1]
+    assert params == [["a", "b"], ["a", "a", "b"], [0, 1, 2]]
+    assert _doc_scope_conditions(doc_id="a", doc_strategies={"a": [4]}) == (["doc_id = %s", "strategy = ANY(%s)"], ["a", [4]])
+
+
+def test_hybrid_search_accepts_external_keyword_hits() -> None:
+    from agentlz.repositories import chunk_embeddings_repository as repo
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (3,)
+    cur.fetchall.return_value = []
+    env = {"EMBEDDING_STORAGE_MODE": "native", "EMBEDDING_DIMENSION": "3"}
+    with patch.dict(os.environ, env), patch.object(repo, "get_pg_conn", return_value=_conn_with(cur)):
+        repo.search_hybrid_chunks(
+            tenant_id="t1",
+            embeddings=[[0.1, 0.2, 0.3]],
+            doc_ids=["d1"],
+            tsquery="配置",
+            keyword_hits=[("d1_0", 2.5), ("d1_4", 1.0)],
+        )
+
+    call = next(c for c in cur.execute.call_args_list if "FULL JOIN" in str(c.args[0]))
+    sql, params = str(call.args[0]), call.args[1]
+    assert "chunk_bm25" not in sql and "unnest(%s::varchar[], %s::float8[])" in sql
+    assert params[4:6] == [["d1_0", "d1_4"], [2.5, 1.0]]
+
+
+def test_rerank_is_capped_at_max_candidates_and_keeps_fused_tail() -> None:
+    from agentlz.services.rag import rag_service
+
+    calls: List[Dict[str, Any]] = []
+    reranked: List[List[str]] = []
+
+    def _fake_hybrid(**kwargs: Any) -> List[Dict[str, Any]]:
+        calls.append(kwargs)
+        return [{"chunk_id": f"c{i}", "doc_id": "d1", "content": f"text{i}", "fused_score": 1.0 - i * 0.1} for i in range(6)]
+
+    def _fake_rerank(query: str, texts: List[str], model_name: str = "") -> List[float]:
+        reranked.append(list(texts))
+        return [float(i) for i in range(len(texts))]
+
+    env = {
+        "RAG_HYBRID_MODE": "sql",
+        "RAG_RERANK_ENABLED": "true",
+        "RAG_RERANK_MAX_CANDIDATES": "2",
+        "RAG_HOT_TIER_ENABLED": "false",
+        "RAG_RESULT_CACHE_ENABLED": "false",
+    }
+    with (
+        patch.dict(os.environ, env),
+        patch.object(rag_service.scope_service, "get_agent_retrieval_scope", return_value={"docs": {"d1": {"terms": []}}}),
+        patch.object(rag_service.scope_service, "scope_enabled_doc_ids", return_value={"t1": ["d1"]}),
+        patch.object(rag_service.emb_service, "search_hybrid_chunks_service", side_effect=_fake_hybrid),
+        patch.object(rag_service, "rerank_scores", side_effect=_fake_rerank),
+    ):
+        out = rag_service.get_doc_topk_multi(agent_id=1, message="配置", messages=["配置"], limit=5)
+
+    # SQL 取回 max(limit, 重排上限) 条；重排只处理前 2 条，其余按综合分排在其后
+    assert calls[0]["limit"] == 5
+    assert reranked == [["text0", "text1"]]
+    assert [x["chunk_id"] for x in out] == ["c1", "c0", "c2", "c3", "c4"]
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+
+def test_bm25_index_scores_and_updates_incrementally() -> None:
+    from agentlz.services.rag.keyword_index_service import BM25Index
+
+    corpus = {
+        "c1": "agent 配置 mcp 工具".split(),
+        "c2": "文档 切割 策略 配置".split(),
+        "c3": "向量 检索 agent agent".split(),
+        "c4": "部署 redis 缓存".split(),
+    }
+    idx = BM25Index(k1=1.5, b=0.75)
+    for cid, terms in corpus.items():
+        idx.add(cid, "d1" if cid in ("c1", "c2") else "d2", terms)
+
+    hits = idx.search(["agent", "配置"], limit=10)
+    assert [c for c, _ in hits] == ["c1", "c3", "c2"]
+    n, avgdl = 4, 15 / 4
+    idf = math.log(1 + (n - 2 + 0.5) / (2 + 0.5))
+    norm = 1 + 1.5 * (1 - 0.75 + 0.75 * 4 / avgdl)
+    assert abs(dict(hits)["c1"] - 2 * idf * 2.5 / norm) < 1e-9
+
+    assert [c for c, _ in idx.search(["agent"], doc_ids={"d2"})] == ["c3"]
+    idx.remove_document("d1")
+    assert len(idx) == 2 and [c for c, _ in idx.search(["配置"])] == []
+    idx.add("c3", "d2", ["redis"])
+    assert idx.search(["agent"]) == [] and [c for c, _ in idx.search(["redis"])][0] in ("c3", "c4")
+
+
+def test_agent_index_loads_lazily_and_syncs_changed_documents_only() -> None:
+    from agentlz.services.rag import keyword_index_service as kw
+
+    chunks: Dict[str, List[Dict[str, Any]]] = {
+        "d1": [{"chunk_id": "d1_0", "doc_id": "d1", "content": "A", "content_seg": "Agent 配置"}],
+        "d2": [{"chunk_id": "d2_0", "doc_id": "d2", "content": "B", "content_seg": "redis 缓存"}],
+    }
+    loads: List[List[str]] = []
+
+    def _list(*, tenant_id: str, doc_ids: List[str], doc_strategies: Any = None) -> List[Dict[str, Any]]:
+        loads.append(list(doc_ids))
+        return [r for d in doc_ids for r in chunks.get(d, [])]
+
+    def _fingerprint(*, tenant_id: str, doc_ids: List[str], doc_strategies: Any = None) -> Dict[str, str]:
+        return {
+            d: f"{len(chunks[d])}:{hash(tuple((r['chunk_id'], r['content'], r['content_seg']) for r in chunks[d]))}"
+            for d in doc_ids
+            if d in chunks
+        }
+
+    def _scope(version: int, docs: List[str]) -> Dict[str, Any]:
+        return {
+            "version": version,
+            "grouped": {"t1": docs},
+            "docs": {d: {"tenant_id": "t1", "enabled": True, "terms": [], "strategies": [0]} for d in docs},
+        }
+
+    kw._get_cache().clear()
+    with (
+        patch.object(kw.bm25_repo, "list_chunk_terms_by_doc_ids", side_effect=_list),
+        patch.object(kw.bm25_repo, "fingerprint_chunks_by_doc_ids", side_effect=_fingerprint),
+    ):
+        out = kw.search_keyword_memory(agent_id=9, scope=_scope(1, ["d1", "d2"]), message="agent", limit=5)
+        assert [(r["chunk_id"], r["tenant_id"], r["content"]) for r in out] == [("d1_0", "t1", "A")]
+        assert loads == [["d1", "d2"]]
+
+        kw.search_keyword_memory(agent_id=9, scope=_scope(1, ["d1", "d2"]), message="redis")
+        assert len(loads) == 1
+
+        chunks["d2"].append({"chunk_id": "d2_1", "doc_id": "d2", "content": "C", "content_seg": "agent 部署"})
+        out = kw.search_keyword_memory(agent_id=9, scope=_scope(2, ["d2"]), message="agent")
+        assert loads[-1] == ["d2"]
+        assert [r["chunk_id"] for r in out] == ["d2_1"]
+
+        # 重新切片后分块数不变：指纹变化，旧词条与旧正文不再返回
+        chunks["d2"] = [
+            {"chunk_id": "d2_0", "doc_id": "d2", "content": "D", "content_seg": "melon grape"},
+            {"chunk_id": "d2_1", "doc_id": "d2", "content": "E", "content_seg": "redis 部署"},
+        ]
+        assert kw.search_keyword_memory(agent_id=9, scope=_scope(3, ["d2"]), message="agent") == []
+        assert loads[-1] == ["d2"]
+        out = kw.search_keyword_memory(agent_id=9, scope=_scope(3, ["d2"]), message="melon")
+        assert [(r["chunk_id"], r["content"]) for r in out] == [("d2_0", "D")]
+    kw._get_cache().clear()
+
+
+def test_fingerprint_query_hashes_chunk_text_per_document() -> None:
+    from unittest.mock import MagicMock
+
+    from agentlz.repositories import chunk_bm25_repository as repo
+
+    cur = MagicMock()
+    cur.fetchall.return_value = [("d1", 2, "abc")]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    with patch.object(repo, "get_pg_conn", return_value=conn):
+        assert repo.fingerprint_chunks_by_doc_ids(tenant_id="t1", doc_ids=["d1", ""]) == {"d1": "2:abc"}
+    sql = str(cur.execute.call_args_list[-1].args[0])
+    assert "md5(string_agg(" in sql and "content_seg" in sql and "GROUP BY doc_id" in sql
+
+
+def test_python_path_uses_memory_backend_when_selected() -> None:
+    from agentlz.services.rag import rag_service
+
+    scope = {"version": 1, "docs": {"d1": {"terms": []}}}
+    hits = [{"chunk_id": "d1_0", "doc_id": "d1", "tenant_id": "t1", "content": "x", "score": 3.0}]
+    env = {"RAG_HYBRID_MODE": "python", "RAG_KEYWORD_BACKEND": "memory", "RAG_RERANK_ENABLED": "false", "RAG_RESULT_CACHE_ENABLED": "false"}
+    with (
+        patch.dict(os.environ, env),
+        patch.object(rag_service.scope_service, "get_agent_retrieval_scope", return_value=scope),
+        patch.object(rag_service.scope_service, "scope_enabled_doc_ids", return_value={"t1": ["d1"]}),
+        patch.object(rag_service.emb_service, "search_similar_chunks_service", return_value=[]),
+        patch.object(rag_service.kw_service, "search_keyword_memory", return_value=hits) as mem,
+        patch.object(rag_service.bm25_repo, "search_chunks_by_tsquery") as tsq,
+    ):
+        out = rag_service.get_doc_topk_multi(agent_id=3, message="配置", messages=["配置"], limit=3)
+
+    tsq.assert_not_called()
+    assert mem.call_args.kwargs["agent_id"] == 3
+    assert [(x["chunk_id"], x["type"]) for x in out] == [("d1_0", "bm25")]
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+
+class BatchEmbedder:
+    model_name = "fake-model"
+
+    def __init__(self) -> None:
+        self.batches: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        raise AssertionError("multi-query path should use embed_documents")
+
+
+def test_multi_query_search_embeds_once_and_searches_once() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = BatchEmbedder()
+    calls: List[Dict[str, Any]] = []
+
+    def _fake_multi(**kwargs: Any) -> List[Dict[str, Any]]:
+        calls.append(kwargs)
+        return [{"chunk_id": "c1", "similarity_score": 0.1, "query_index": 0}]
+
+    svc._get_query_cache().clear()
+    with (
+        patch.object(svc, "_get_embedder", return_value=emb),
+        patch.object(svc, "_search_similar_multi", side_effect=_fake_multi),
+        patch.object(svc, "_search_similar", side_effect=AssertionError("single search not expected")),
+    ):
+        svc._get_query_cache().set(("fake-model", "cached"), [9.0, 9.0])
+        out = svc.search_similar_chunks_service(
+            tenant_id="t1",
+            message="ignored",
+            messages=["a", "bb", "a", "", "cached"],
+            doc_ids=["d1"],
+            limit=4,
+        )
+
+    assert emb.batches == [["a", "bb"]]
+    assert len(calls) == 1
+    assert calls[0]["embeddings"] == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [9.0, 9.0]]
+    assert calls[0]["doc_ids"] == ["d1"] and calls[0]["limit"] == 4
+    assert out[0]["chunk_id"] == "c1"
+    svc._get_query_cache().clear()
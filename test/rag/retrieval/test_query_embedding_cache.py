@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+
+class CountingEmbedder:
+    model_name = "fake-model"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return [0.25, 0.5, float(len(text))]
+
+
+class FakeBinaryRedis:
+    def __init__(self) -> None:
+        self.kv: Dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.kv.get(key)
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        assert isinstance(value, bytes)
+        self.kv[key] = value
+        return True
+
+
+def test_query_embedding_lru_hits_on_normalized_text() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = CountingEmbedder()
+    svc._get_query_cache().clear()
+    with patch.object(svc, "_get_embedder", return_value=emb):
+        v1 = svc.embed_message_service(message="如何 配置  Agent")
+        v2 = svc.embed_message_service(message=" 如何 配置 Agent ")
+    assert v1 == v2
+    assert emb.calls == 1
+    stats = svc.query_embedding_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    svc._get_query_cache().clear()
+
+
+def test_query_embedding_redis_tier_stores_float32_bytes() -> None:
+    from agentlz.services.rag import chunk_embeddings_service as svc
+
+    emb = CountingEmbedder()
+    rc = FakeBinaryRedis()
+    svc._get_query_cache().clear()
+    with (
+        patch.dict(os.environ, {"RAG_QUERY_EMB_REDIS_ENABLED": "true"}),
+        patch.object(svc, "_get_embedder", return_value=emb),
+        patch.object(svc, "get_redis_binary_client", return_value=rc),
+    ):
+        v1 = svc.embed_message_service(message="hello")
+        assert len(rc.kv) == 1
+        assert len(next(iter(rc.kv.values()))) == 3 * 4
+        # 模拟另一进程：清空进程内缓存后由 Redis 命中
+        svc._get_query_cache().clear()
+        v2 = svc.embed_message_service(message="hello")
+    assert emb.calls == 1
+    assert v2 == v1
+    svc._get_query_cache().clear()
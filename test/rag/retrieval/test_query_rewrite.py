@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+
+def _no_redis() -> MagicMock:
+    rc = MagicMock()
+    rc.get.side_effect = ConnectionError("redis down")
+    rc.set.side_effect = ConnectionError("redis down")
+    return rc
+
+
+def _fake_agent(messages: List[str]) -> MagicMock:
+    agent = MagicMock()
+    agent.invoke.return_value = {"messages": messages}
+    return agent
+
+
+def test_fast_path_skips_llm_for_short_self_contained_queries() -> None:
+    from agentlz.services.rag import query_rewrite_service as rw
+
+    with (
+        patch.dict(os.environ, {"RAG_REWRITE_MODE": "auto", "RAG_REWRITE_FAST_MAX_CHARS": "24"}),
+        patch.object(rw, "get_redis_client", return_value=_no_redis()),
+        patch.object(rw, "_agent_llm_override", return_value=None),
+        patch.object(rw, "get_rag_query_agent", return_value=_fake_agent(["配置 Agent 的方式"])) as build,
+    ):
+        msgs, m = rw.rewrite_queries(agent_id=1, message="如何配置 Agent", history="")
+        assert m["rewrite_source"] == "fast_path" and "如何配置 Agent" in msgs
+        build.assert_not_called()
+
+        # 含指代词：依赖上下文，走 LLM
+        msgs, m = rw.rewrite_queries(agent_id=1, message="它支持哪些模型", history="第1轮: human:介绍 Agent")
+        assert m["rewrite_source"] == "llm" and msgs == ["配置 Agent 的方式"]
+        assert not rw.is_self_contained("how do I configure it")
+
+    with patch.dict(os.environ, {"RAG_REWRITE_MODE": "llm"}), patch.object(rw, "get_redis_client", return_value=_no_redis()):
+        assert rw.resolve_without_llm(agent_id=1, message="如何配置 Agent", history="x")[0] is None
+
+
+def test_llm_rewrite_cached_per_agent_message_and_history() -> None:
+    from agentlz.services.rag import query_rewrite_service as rw
+
+    rw._get_cache().clear()
+    agent = _fake_agent(["上一轮的 Agent 配置项"])
+    with (
+        patch.dict(os.environ, {"RAG_REWRITE_MODE": "llm"}),
+        patch.object(rw, "get_redis_client", return_value=_no_redis()),
+        patch.object(rw, "_agent_llm_override", return_value=None),
+        patch.object(rw, "get_rag_query_agent", return_value=agent),
+    ):
+        rw.rewrite_queries(agent_id=2, message="它怎么配置", history="h1")
+        msgs, m = rw.rewrite_queries(agent_id=2, message=" 它怎么配置 ", history="h1")
+        assert m["rewrite_source"] == "cache" and msgs == ["上一轮的 Agent 配置项"]
+        assert agent.invoke.call_count == 1
+        rw.rewrite_queries(agent_id=2, message="它怎么配置", history="h2")
+        rw.rewrite_queries(agent_id=3, message="它怎么配置", history="h1")
+        assert agent.invoke.call_count == 3
+
+        # LLM 失败时回退本地规则，且不写入缓存
+        agent.invoke.side_effect = RuntimeError("timeout")
+        msgs, m = rw.rewrite_queries(agent_id=2, message="那个接口报错", history="h1")
+        assert m["rewrite_source"] == "rules_fallback" and msgs == ["那个接口报错"]
+        assert rw.resolve_without_llm(agent_id=2, message="那个接口报错", history="h1")[0] is None
+
+
+def test_speculative_mode_merges_raw_and_rewritten_retrieval() -> None:
+    from agentlz.services.rag import rag_service
+
+    searched: List[List[str]] = []
+    limits: List[int] = []
+
+    def _fake_topk(*, agent_id: int, message: str, messages: List[str], limit: int = 5) -> List[Dict[str, Any]]:
+        searched.append(list(messages))
+        limits.append(limit)
+        if messages == [message]:
+            extra = [{"chunk_id": f"raw{i}", "content": f"原始消息补充命中{i}"} for i in range(limit - 2)]
+            return [{"chunk_id": "raw", "content": "原始消息命中"}, {"chunk_id": "both", "content": "共同命中"}, *extra]
+        extra = [{"chunk_id": f"new{i}", "content": f"改写补充命中{i}"} for i in range(limit - 2)]
+        return [{"chunk_id": "both", "content": "共同命中"}, {"chunk_id": "new", "content": "改写命中"}, *extra]
+
+    metrics = {"rewrite_mode": "auto", "rewrite_source": "llm", "rewrite_ms": 1200.0}
+    with (
+        patch.dict(os.environ, {"RAG_REWRITE_SPECULATIVE": "true"}),
+        patch.object(rag_service.repo, "create_record", return_value={"id": 9}),
+        patch.object(rag_service.rewrite_service, "resolve_without_llm", return_value=(None, {})),
+        patch.object(rag_service.rewrite_service, "rewrite_with_llm", return_value=(["Agent 模型列表"], dict(metrics))),
+        patch.object(rag_service, "get_doc_topk_multi", side_effect=_fake_topk),
+        patch.object(rag_service.context_packer, "pack_context", wraps=rag_service.context_packer.pack_context) as pack,
+    ):
+        out = rag_service.agent_chat_get_rag(agent_id=1, message="它支持哪些模型", record_id=-1)
+
+    assert sorted(searched) == [["Agent 模型列表"], ["它支持哪些模型"]]
+    # 两路共 2*limit-1 个不同分块，合并后仍只保留与其他路径一致的 Top-K
+    assert limits == [5, 5]
+    merged = pack.call_args.args[0]
+    assert len(merged) == 5 and len({c["chunk_id"] for c in merged}) == 5 and merged[0]["chunk_id"] == "both"
+    assert out["doc"].split("\n")[0] == "共同命中" and "原始消息命中" in out["doc"] and "改写命中" in out["doc"]
+    assert out["messages"] == ["Agent 模型列表"]
+    assert out["rag_metrics"]["rewrite_source"] == "llm"
+    assert out["rag_metrics"]["speculative"] is True and out["rag_metrics"]["speculative_result"] == "merged"
+    assert out["rag_metrics"]["context_chunks_packed"] == 5 and "context_tokens_saved" in out["rag_metrics"]
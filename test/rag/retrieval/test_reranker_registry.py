@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import sys
+import threading
+import types
+from typing import Any, List
+from unittest.mock import patch
+
+
+class FakeCrossEncoder:
+    loads = 0
+
+    def __init__(self, name: str, device: str = "cpu") -> None:
+        FakeCrossEncoder.loads += 1
+        self.name = name
+        self.batch_sizes: List[int] = []
+
+    def predict(self, pairs: List[Any], batch_size: int = 32, show_progress_bar: bool = False) -> List[float]:
+        self.batch_sizes.append(batch_size)
+        return [float(len(p[1])) for p in pairs]
+
+
+def test_cross_encoder_loaded_once_across_threads() -> None:
+    from agentlz.core import reranker_factory as rf
+
+    fake_mod = types.SimpleNamespace(CrossEncoder=FakeCrossEncoder)
+    FakeCrossEncoder.loads = 0
+    rf.clear_rerankers()
+    with patch.dict(sys.modules, {"sentence_transformers": fake_mod}):
+        got: List[Any] = []
+        threads = [threading.Thread(target=lambda: got.append(rf.get_cross_encoder("m1", "cpu", False))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert FakeCrossEncoder.loads == 1
+        assert all(x is got[0] for x in got)
+
+        scores = rf.rerank_scores("q", ["a", "bbb"], model_name="m1", batch_size=4)
+        assert scores == [1.0, 3.0]
+        assert got[0].batch_sizes == [4]
+    rf.clear_rerankers()
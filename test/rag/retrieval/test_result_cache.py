@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+_ENV = {"RAG_HYBRID_MODE": "sql", "RAG_RERANK_ENABLED": "false", "RAG_HOT_TIER_ENABLED": "false", "RAG_RESULT_CACHE_ENABLED": "true"}
+
+
+def _no_redis() -> MagicMock:
+    rc = MagicMock()
+    rc.get.side_effect = ConnectionError("redis down")
+    rc.set.side_effect = ConnectionError("redis down")
+    return rc
+
+
+def test_cache_key_normalizes_query_and_tracks_version_and_settings() -> None:
+    from agentlz.services.rag import retrieval_cache_service as rc
+
+    base = dict(agent_id=7, version=3, message="配置  Agent", messages=["b", "a"], limit=5, distance_metric="euclidean")
+    with patch.dict(os.environ, _ENV):
+        k1 = rc.build_cache_key(**base)
+        # 全角字母、多余空白、短句顺序不影响缓存键
+        assert rc.build_cache_key(**{**base, "message": "配置 Ａｇｅｎｔ ", "messages": ["a", "b", "a"]}) == k1
+        assert k1.startswith("rag:res:7:v3:")
+        assert rc.build_cache_key(**{**base, "version": 4}) != k1
+        assert rc.build_cache_key(**{**base, "limit": 6}) != k1
+    with patch.dict(os.environ, {**_ENV, "RAG_KEYWORD_BACKEND": "memory"}):
+        assert rc.build_cache_key(**base) != k1
+
+
+def test_get_doc_topk_multi_served_from_cache_until_version_bump() -> None:
+    from agentlz.services.rag import rag_service
+    from agentlz.services.rag import retrieval_cache_service as rc
+
+    rc._get_cache().clear()
+    calls: List[Dict[str, Any]] = []
+
+    def _fake_hybrid(**kwargs: Any) -> List[Dict[str, Any]]:
+        calls.append(kwargs)
+        return [
+            {"chunk_id": "d1_0", "doc_id": "d1", "content": "旧正文", "created_at": None, "fused_score": 0.5, "type": "vector"},
+            {"chunk_id": "d1_1", "doc_id": "d1", "content": "旧正文", "created_at": None, "fused_score": 0.2, "type": "bm25"},
+        ]
+
+    def _fake_fetch(*, tenant_id: str, chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {c: {"chunk_id": c, "doc_id": "d1", "content": f"正文 {c}", "created_at": "t"} for c in chunk_ids}
+
+    scope = {"version": 5, "docs": {"d1": {"terms": []}}}
+    with (
+        patch.dict(os.environ, _ENV),
+        patch.object(rc, "get_redis_client", return_value=_no_redis()),
+        patch.object(rag_service.scope_service, "get_agent_retrieval_scope", return_value=scope),
+        patch.object(rag_service.scope_service, "scope_enabled_doc_ids", return_value={"t1": ["d1"]}),
+        patch.object(rag_service.emb_service, "search_hybrid_chunks_service", side_effect=_fake_hybrid),
+        patch.object(rc.emb_repo, "get_chunks_by_ids", side_effect=_fake_fetch) as fetch,
+    ):
+        first = rag_service.get_doc_topk_multi(agent_id=11, message="配置", messages=["配置"], limit=2)
+        second = rag_service.get_doc_topk_multi(agent_id=11, message=" 配置 ", messages=["配置"], limit=2)
+        assert len(calls) == 1
+        # 只缓存 ID 与分数：命中时一次批量查询回填正文
+        assert fetch.call_count == 1 and fetch.call_args.kwargs["chunk_ids"] == ["d1_0", "d1_1"]
+        assert [x["chunk_id"] for x in second] == [x["chunk_id"] for x in first]
+        assert second[0]["content"] == "正文 d1_0" and second[0]["fused_score"] == 0.5
+        assert second[0]["tenant_id"] == "t1" and "created_at" in second[0]
+
+        scope["version"] = 6
+        rag_service.get_doc_topk_multi(agent_id=11, message="配置", messages=["配置"], limit=2)
+        assert len(calls) == 2
+
+
+def test_cached_entry_with_deleted_chunk_is_a_miss() -> None:
+    from agentlz.services.rag import retrieval_cache_service as rc
+
+    rc._get_cache().clear()
+    results = [{"chunk_id": "d1_0", "doc_id": "d1", "tenant_id": "t1", "content": "x", "fused_score": 0.5}]
+    with (
+        patch.dict(os.environ, _ENV),
+        patch.object(rc, "get_redis_client", return_value=_no_redis()),
+        patch.object(rc.emb_repo, "get_chunks_by_ids", return_value={}),
+    ):
+        rc.store_results("k", results)
+        assert rc._get_cache().get("k") == [{"chunk_id": "d1_0", "doc_id": "d1", "tenant_id": "t1", "fused_score": 0.5}]
+        assert rc.get_cached_results("k") is None
+        assert rc._get_cache().get("k") is None
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+pytest.importorskip("hnswlib")
+
+
+def _rows(n: int, dim: int = 8, *, docs: int = 2, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return [
+        {"chunk_id": f"d{i % docs}_{i}", "doc_id": f"d{i % docs}", "content": f"c{i}", "created_at": None, "strategy": i % 3, "embedding": vecs[i]}
+        for i in range(n)
+    ]
+
+
+def _exact_top(rows: List[Dict[str, Any]], query: np.ndarray, k: int, doc: str | None = None) -> List[str]:
+    cand = [r for r in rows if doc is None or r["doc_id"] == doc]
+    cand.sort(key=lambda r: float(np.linalg.norm(r["embedding"] - query)))
+    return [r["chunk_id"] for r in cand[:k]]
+
+
+def test_tenant_index_matches_exact_search_with_doc_filter() -> None:
+    from agentlz.services.rag.vector_hot_tier_service import TenantHotIndex
+
+    rows = _rows(200)
+    idx = TenantHotIndex("t1", 8, capacity=64)
+    idx.upsert(rows)
+    q = rows[3]["embedding"]
+
+    out = idx.search([q], doc_ids={"d1"}, distance_metric="euclidean", limit=5, ef_search=200)
+    assert [r["chunk_id"] for r in out] == _exact_top(rows, q, 5, "d1")
+    assert all(r["doc_id"] == "d1" for r in out)
+
+    cos = idx.search([q], doc_ids=None, distance_metric="cosine", limit=1, ef_search=200)
+    assert cos[0]["chunk_id"] == rows[3]["chunk_id"] and cos[0]["similarity_score"] == pytest.approx(0.0, abs=1e-5)
+
+
+def test_tenant_index_filters_pinned_strategies() -> None:
+    from agentlz.services.rag.vector_hot_tier_service import TenantHotIndex
+
+    rows = _rows(60)
+    idx = TenantHotIndex("t1", 8)
+    idx.upsert(rows)
+    out = idx.search([rows[0]["embedding"]], doc_ids={"d0", "d1"}, distance_metric="euclidean", limit=60, ef_search=100, doc_strategies={"d0": {1}})
+    assert {(r["doc_id"], rows[int(r["chunk_id"].split("_")[1])]["strategy"]) for r in out} == {("d0", 1), ("d1", 0), ("d1", 1), ("d1", 2)}
+    assert len(out) == 10 + 30
+
+
+def test_tenant_index_upsert_replace_and_remove() -> None:
+    from agentlz.services.rag.vector_hot_tier_service import TenantHotIndex
+
+    rows = _rows(20)
+    idx = TenantHotIndex("t1", 8)
+    idx.upsert(rows)
+    moved = dict(rows[0], embedding=rows[1]["embedding"], content="new")
+    idx.upsert([moved])
+    assert len(idx) == 20
+    hit = idx.search([rows[1]["embedding"]], doc_ids={"d0"}, distance_metric="euclidean", limit=1, ef_search=50)
+    assert hit[0]["chunk_id"] == rows[0]["chunk_id"] and hit[0]["content"] == "new"
+
+    idx.remove_document("d1")
+    idx.remove([rows[0]["chunk_id"]])
+    assert len(idx) == 9
+    out = idx.search([rows[1]["embedding"]], doc_ids=None, distance_metric="euclidean", limit=20, ef_search=50)
+    assert len(out) == 9 and all(r["doc_id"] == "d0" for r in out)
+
+
+def test_tier_evicts_least_recently_used_tenant() -> None:
+    from agentlz.services.rag.vector_hot_tier_service import TenantHotIndex, VectorHotTier
+
+    a, b, c = (TenantHotIndex(t, 8, capacity=100) for t in ("a", "b", "c"))
+    tier = VectorHotTier(max_bytes=int(a.memory_bytes() * 2.5), max_chunks=1000, ttl=0)
+    with patch("agentlz.services.rag.vector_hot_tier_service._read_tenant_version", return_value=None):
+        tier.put(a)
+        tier.put(b)
+        assert tier.get("a") is a
+        tier.put(c)
+        assert tier.get("b") is None and tier.get("a") is a and tier.get("c") is c
+    assert tier.evictions == 1
+
+
+def test_search_service_builds_lazily_and_tracks_writes() -> None:
+    from agentlz.services.rag import vector_hot_tier_service as svc
+
+    rows = _rows(50)
+    env = {"RAG_HOT_TIER_ENABLED": "true", "RAG_HOT_TIER_EF_SEARCH": "100"}
+    versions = iter(range(1, 100))
+    tier = svc.VectorHotTier(max_bytes=1 << 30, max_chunks=1000, ttl=0)
+    with patch.dict(os.environ, env), \
+            patch.object(svc, "get_hot_tier", return_value=tier), \
+            patch.object(svc, "_read_tenant_version", return_value=None), \
+            patch.object(svc, "_bump_tenant_version", side_effect=lambda tid: next(versions)), \
+            patch.object(svc.emb_repo, "count_tenant_chunks", return_value=len(rows)), \
+            patch.object(svc.emb_repo, "iter_tenant_chunk_vectors", return_value=iter(rows)), \
+            patch.object(tier, "schedule_build", side_effect=tier._build) as build:
+        q = rows[7]["embedding"]
+        assert svc.search_hot_tier(tenant_id="t1", embeddings=[q], limit=3) is None
+        build.assert_called_once_with("t1")
+
+        out = svc.search_hot_tier(tenant_id="t1", embeddings=[q], doc_id="d1", limit=3)
+        assert out is not None and [r["chunk_id"] for r in out] == _exact_top(rows, q, 3, "d1")
+
+        svc.on_chunks_deleted(tenant_id="t1", doc_id="d1")
+        out = svc.search_hot_tier(tenant_id="t1", embeddings=[q], limit=3)
+        assert out is not None and all(r["doc_id"] == "d0" for r in out)
+
+        extra = _rows(1, seed=9)[0] | {"chunk_id": "d2_0", "doc_id": "d2"}
+        svc.on_chunks_written(tenant_id="t1", rows=[extra])
+        out = svc.search_hot_tier(tenant_id="t1", embeddings=[extra["embedding"]], limit=1)
+        assert out[0]["chunk_id"] == "d2_0"
+        assert tier.hits == 3 and tier.misses == 1
+
+
+def test_search_service_disabled_returns_none() -> None:
+    from agentlz.services.rag import vector_hot_tier_service as svc
+
+    with patch.dict(os.environ, {"RAG_HOT_TIER_ENABLED": "false"}), patch.object(svc, "get_hot_tier") as tier:
+        assert svc.search_hot_tier(tenant_id="t1", embeddings=[[0.1] * 8]) is None
+        svc.on_chunks_written(tenant_id="t1", rows=_rows(1))
+    tier.assert_not_called()
+
+
+def test_tier_checks_remote_version_at_most_once_per_interval() -> None:
+    from agentlz.services.rag import vector_hot_tier_service as svc
+
+    idx = svc.TenantHotIndex("t1", 8)
+    idx.version = 3
+    tier = svc.VectorHotTier(max_bytes=1 << 30, max_chunks=1000, ttl=0, version_check_s=60)
+    tier.put(idx)
+    with patch.object(svc, "_read_tenant_version", return_value=3) as read:
+        assert all(tier.get("t1") is idx for _ in range(5))
+    assert read.call_count == 1
+
+    # 间隔到期后重新校验：其他进程已写入（版本前进），本地索引失效
+    idx.checked_at -= 61
+    with patch.object(svc, "_read_tenant_version", return_value=4) as read:
+        assert tier.get("t1") is None
+    read.assert_called_once_with("t1")
+
+
+def test_incremental_writes_enforce_chunk_and_memory_limits() -> None:
+    from agentlz.services.rag import vector_hot_tier_service as svc
+
+    rows = _rows(40)
+    idx = svc.TenantHotIndex("t1", 8, capacity=20)
+    idx.upsert(rows[:20])
+    other = svc.TenantHotIndex("t2", 8, capacity=20)
+    tier = svc.VectorHotTier(max_bytes=1 << 30, max_chunks=30, ttl=0)
+    tier.put(other)
+    tier.put(idx)
+    versions = iter(range(1, 100))
+    with patch.dict(os.environ, {"RAG_HOT_TIER_ENABLED": "true"}), \
+            patch.object(svc, "get_hot_tier", return_value=tier), \
+            patch.object(svc, "_bump_tenant_version", side_effect=lambda tid: next(versions)):
+        svc.on_chunks_written(tenant_id="t1", rows=rows[20:25])
+        assert tier.get_loaded("t1") is idx and len(idx) == 25
+
+        # 超过单租户分块上限：丢弃并暂停重建
+        svc.on_chunks_written(tenant_id="t1", rows=rows[25:40])
+        assert tier.get_loaded("t1") is None and tier.evictions == 1
+        tier.schedule_build("t1")
+        assert "t1" not in tier.stats()["building"]
+
+        # 增量写入让总内存超出预算：按 LRU 淘汰其他租户
+        small = svc.TenantHotIndex("t3", 8, capacity=16)
+        small.version = 2
+        tier.put(small)
+        tier.max_bytes = other.memory_bytes() + small.memory_bytes() + 1
+        svc.on_chunks_written(tenant_id="t3", rows=[dict(r, chunk_id=f"x{i}") for i, r in enumerate(rows[:20])])
+        assert tier.get_loaded("t2") is None and tier.get_loaded("t3") is small and len(small) == 20
+
+
+def test_scope_counts_track_upserts_and_removals_without_scanning() -> None:
+    from agentlz.services.rag.vector_hot_tier_service import TenantHotIndex
+
+    rows = _rows(30)
+    idx = TenantHotIndex("t1", 8)
+    idx.upsert(rows)
+    # d0: 策略 0/1/2 各 5 条；d1 同理
+    assert idx._count_in_scope_locked({"d0"}, {}) == 15
+    assert idx._count_in_scope_locked({"d0", "d1", "dx"}, {"d0": {1}}) == 5 + 15
+    assert idx._count_in_scope_locked(None, {"d1": {0, 2}}) == 30 - 5
+
+    # 同 chunk_id 换策略、删除分块与文档后计数同步
+    idx.upsert([dict(rows[0], strategy=2)])
+    idx.remove([rows[2]["chunk_id"]])
+    assert idx._count_in_scope_locked({"d0"}, {"d0": {0}}) == 4
+    assert idx._count_in_scope_locked({"d0"}, {"d0": {2}}) == 5
+    idx.remove_document("d1")
+    assert idx._count_in_scope_locked({"d1"}, {}) == 0 and idx._count_in_scope_locked(None, {}) == len(idx) == 14
+
+    # 范围覆盖全部分块时不带过滤器检索
+    real = idx._index
+    filters: List[Any] = []
+
+    class _Spy:
+        def __getattr__(self, name: str) -> Any:
+            return getattr(real, name)
+
+        def knn_query(self, *args: Any, **kwargs: Any) -> Any:
+            filters.append(kwargs.get("filter"))
+            return real.knn_query(*args, **kwargs)
+
+    idx._index = _Spy()
+    idx.search([rows[4]["embedding"]], doc_ids={"d0"}, distance_metric="euclidean", limit=3, ef_search=50)
+    idx.search([rows[4]["embedding"]], doc_ids={"d0"}, distance_metric="euclidean", limit=3, ef_search=50, doc_strategies={"d0": {1}})
+    assert filters[0] is None and callable(filters[1])
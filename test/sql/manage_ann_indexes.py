@@ -0,0 +1,130 @@
+"""chunk_embeddings 向量索引管理：按距离度量维护 HNSW（或 IVFFlat）索引
+
+用法：
+    python -m test.sql.manage_ann_indexes status
+    python -m test.sql.manage_ann_indexes build --metric all --m 16 --ef-construction 64
+    python -m test.sql.manage_ann_indexes build --metric l2 --type ivfflat --lists 200
+    python -m test.sql.manage_ann_indexes drop --name idx_ce_embedding_l2
+
+说明：
+    - 每个度量一个索引：l2 对应检索中的 `<->`（euclidean），cosine 对应 `<=>`；
+    - 索引名固定为 idx_ce_<type>_<metric>，build 使用 CREATE INDEX CONCURRENTLY（autocommit，不阻塞读写），
+      构建失败留下的 INVALID 索引会先删除再重建；--replace 时同名索引先并发删除；
+    - HNSW 需要 pgvector >= 0.5；halfvec 需要 >= 0.7；查询侧参数（ef_search/probes/iterative_scan）
+      由 RAG_HNSW_EF_SEARCH / RAG_IVFFLAT_PROBES / RAG_ANN_ITERATIVE_SCAN 配置；
+    - 旧的 ivfflat 索引 idx_ce_embedding_l2 与新建的 HNSW l2 索引功能重复，确认新索引 VALID 后可 drop。
+"""
+import argparse
+import sys
+from contextlib import closing
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agentlz.core.database import get_pg_conn
+from agentlz.core.embedding_model_factory import get_vector_type
+
+TABLE = "chunk_embeddings"
+_METRIC_OPS = {"l2": "l2_ops", "cosine": "cosine_ops"}
+
+
+def index_name(index_type: str, metric: str) -> str:
+    return f"idx_ce_{index_type}_{metric}"
+
+
+def build_index_sql(index_type: str, metric: str, vtype: str, *, m: int, ef_construction: int, lists: int) -> str:
+    opclass = f"{vtype}_{_METRIC_OPS[metric]}"
+    if index_type == "hnsw":
+        with_clause = f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    else:
+        with_clause = f"WITH (lists = {int(lists)})"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(index_type, metric)} "
+        f"ON {TABLE} USING {index_type} (embedding {opclass}) {with_clause}"
+    )
+
+
+def _list_indexes(cur):
+    cur.execute(
+        """
+        SELECT c.relname, i.indisvalid, am.amname, pg_size_pretty(pg_relation_size(c.oid)), pg_get_indexdef(c.oid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE t.relname = %s
+        ORDER BY c.relname
+        """,
+        (TABLE,),
+    )
+    return cur.fetchall()
+
+
+def cmd_status(conn) -> None:
+    with conn.cursor() as cur:
+        for name, valid, am, size, ddl in _list_indexes(cur):
+            print(f"{name:32s} {am:8s} valid={valid} size={size}\n    {ddl}")
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cur.fetchone()
+        print(f"pgvector={row[0] if row else 'missing'}")
+
+
+def cmd_build(conn, args) -> None:
+    vtype = get_vector_type()
+    metrics = list(_METRIC_OPS) if args.metric == "all" else [args.metric]
+    with conn.cursor() as cur:
+        if args.maintenance_work_mem:
+            cur.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+        if args.parallel_workers:
+            cur.execute(f"SET max_parallel_maintenance_workers = {int(args.parallel_workers)}")
+        existing = {r[0]: r[1] for r in _list_indexes(cur)}
+        for metric in metrics:
+            name = index_name(args.type, metric)
+            if name in existing and (args.replace or not existing[name]):
+                print(f"drop {name} (valid={existing[name]})")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            sql = build_index_sql(args.type, metric, vtype, m=args.m, ef_construction=args.ef_construction, lists=args.lists)
+            print(sql)
+            cur.execute(sql)
+        cur.execute(f"ANALYZE {TABLE}")
+    cmd_status(conn)
+
+
+def cmd_drop(conn, args) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {args.name}")
+    print(f"dropped {args.name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="chunk_embeddings 向量索引管理")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    b = sub.add_parser("build")
+    b.add_argument("--type", choices=["hnsw", "ivfflat"], default="hnsw")
+    b.add_argument("--metric", choices=["l2", "cosine", "all"], default="all")
+    b.add_argument("--m", type=int, default=16)
+    b.add_argument("--ef-construction", type=int, default=64)
+    b.add_argument("--lists", type=int, default=100)
+    b.add_argument("--maintenance-work-mem", default="1GB")
+    b.add_argument("--parallel-workers", type=int, default=0)
+    b.add_argument("--replace", action="store_true", help="同名索引已存在时先删除再重建")
+    d = sub.add_parser("drop")
+    d.add_argument("--name", required=True)
+    args = parser.parse_args()
+
+    with closing(get_pg_conn()) as conn:
+        # CREATE/DROP INDEX CONCURRENTLY 不能在事务块内执行
+        conn.autocommit = True
+        if args.cmd == "status":
+            cmd_status(conn)
+        elif args.cmd == "build":
+            cmd_build(conn, args)
+        else:
+            cmd_drop(conn, args)
+
+
+if __name__ == "__main__":
+    main()
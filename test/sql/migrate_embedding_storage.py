@@ -0,0 +1,121 @@
+"""向量存储迁移工具：将补零到 1536 维的向量改写为模型原生维度（可选 halfvec）
+
+用法：
+    python -m test.sql.migrate_embedding_storage --table all --batch-size 2000
+    python -m test.sql.migrate_embedding_storage --table chunk_embeddings --swap
+
+步骤：
+    1. 校验：补零区间（第 dim+1 维之后）必须全为 0，否则说明数据并非补零产生，拒绝迁移
+    2. 新增列 embedding_native，分批执行 subvector(embedding, 1, dim) 回填，每批独立提交
+    3. --swap：删除旧向量索引与旧列，重命名新列为 embedding，并重建 ivfflat 索引
+
+说明：
+    - 需要 pgvector >= 0.7（subvector / halfvec）
+    - chunk_embeddings 启用了 RLS，请使用表属主或具备 BYPASSRLS 的账号执行
+    - 迁移完成后设置 EMBEDDING_STORAGE_MODE=native（及 EMBEDDING_VECTOR_TYPE=halfvec）再重启服务
+"""
+import argparse
+import sys
+from contextlib import closing
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agentlz.core.database import get_pg_conn
+from agentlz.core.embedding_model_factory import PADDED_EMBEDDING_DIM, get_native_embedding_dimension
+
+# 表名 -> (主键, 旧向量索引名, 迁移后是否 NOT NULL)
+_TABLES = {
+    "chunk_embeddings": ("chunk_id", "idx_ce_embedding_l2", True),
+    "mcp_agents_vec": ("id", "idx_mcp_agents_vec_embedding", False),
+}
+
+
+def _check_padding(cur, table: str, dim: int) -> int:
+    """统计补零区间存在非零值的行数（应为 0）"""
+    if dim >= PADDED_EMBEDDING_DIM:
+        return 0
+    cur.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE embedding IS NOT NULL "
+        f"AND vector_norm(subvector(embedding, {dim + 1}, {PADDED_EMBEDDING_DIM - dim})) > 0"
+    )
+    return int(cur.fetchone()[0])
+
+
+def _backfill(conn, table: str, pk: str, dim: int, vtype: str, batch_size: int) -> int:
+    total = 0
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_native {vtype}({dim})")
+    conn.commit()
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                UPDATE {table} SET embedding_native = subvector(embedding, 1, {dim})::{vtype}({dim})
+                WHERE {pk} IN (
+                    SELECT {pk} FROM {table}
+                    WHERE embedding_native IS NULL AND embedding IS NOT NULL
+                    LIMIT %s
+                )
+                """,
+                (int(batch_size),),
+            )
+            n = cur.rowcount
+        conn.commit()
+        total += max(0, n)
+        print(f"[{table}] backfilled +{n} (total {total})")
+        if n <= 0:
+            return total
+
+
+def _swap(conn, table: str, index_name: str, not_null: bool, vtype: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+        cur.execute(f"ALTER TABLE {table} DROP COLUMN embedding")
+        cur.execute(f"ALTER TABLE {table} RENAME COLUMN embedding_native TO embedding")
+        if not_null:
+            cur.execute(f"ALTER TABLE {table} ALTER COLUMN embedding SET NOT NULL")
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING ivfflat (embedding {vtype}_l2_ops) WITH (lists = 100)"
+        )
+    conn.commit()
+    print(f"[{table}] swapped embedding column -> {vtype}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="将 1536 维补零向量迁移为原生维度存储")
+    parser.add_argument("--table", choices=["all", *_TABLES.keys()], default="all")
+    parser.add_argument("--dim", type=int, default=None, help="目标维度（默认按 HF_EMBEDDING_MODEL/EMBEDDING_DIMENSION 推断）")
+    parser.add_argument("--type", dest="vtype", choices=["vector", "halfvec"], default="vector")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--swap", action="store_true", help="回填完成后替换旧列并重建索引")
+    args = parser.parse_args()
+
+    dim = args.dim or get_native_embedding_dimension()
+    if not dim:
+        print("error: 无法推断原生维度，请通过 --dim 指定")
+        sys.exit(1)
+    tables = list(_TABLES.keys()) if args.table == "all" else [args.table]
+    try:
+        with closing(get_pg_conn()) as conn:
+            for table in tables:
+                pk, index_name, not_null = _TABLES[table]
+                with conn.cursor() as cur:
+                    bad = _check_padding(cur, table, dim)
+                conn.rollback()
+                if bad:
+                    print(f"[{table}] error: {bad} 行在第 {dim} 维之后存在非零值，停止迁移")
+                    sys.exit(1)
+                _backfill(conn, table, pk, dim, args.vtype, args.batch_size)
+                if args.swap:
+                    _swap(conn, table, index_name, not_null, args.vtype)
+        sys.exit(0)
+    except Exception as e:
+        print("error:", str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()